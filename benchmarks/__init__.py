@@ -0,0 +1 @@
+"""Benchmarks of mapwidget, run as modules from the repository root."""
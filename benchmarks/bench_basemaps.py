@@ -0,0 +1,44 @@
+"""Measure the cost of basemap catalog lookups.
+
+The catalog is built on first use; afterwards `get_basemap_list`,
+`get_xyz_dict` and `leaflet.Map.add_basemap` should cost next to nothing. Run
+it from the repository root with ``python -m benchmarks.bench_basemaps``.
+"""
+
+import time
+
+from mapwidget import basemaps
+from mapwidget.leaflet import Map
+
+
+def timeit(func, repeat=1000):
+    """Returns the mean time of func in microseconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    basemaps.catalog.clear()
+    start = time.perf_counter()
+    basemaps.get_basemap_list()
+    print(
+        f"{'first call (catalog build)':<32}{(time.perf_counter() - start) * 1e6:>12.1f} us"
+    )
+
+    m = Map()
+    m.send = lambda content, buffers=None: None
+    results = {
+        "get_basemap_list()": timeit(basemaps.get_basemap_list),
+        "get_xyz_dict()": timeit(basemaps.get_xyz_dict),
+        "get_xyz_dict(free_only=False)": timeit(lambda: basemaps.get_xyz_dict(False)),
+        "get_basemap(name)": timeit(lambda: basemaps.get_basemap("OpenTopoMap")),
+        "leaflet add_basemap(name)": timeit(lambda: m.add_basemap("OpenTopoMap")),
+    }
+    for name, elapsed in results.items():
+        print(f"{name:<32}{elapsed:>12.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Compare the JSON and binary transports for GeoJSON sources.
+
+Measures the payload size and the kernel-side cost of sending a polygon layer
+through `Map.add_source` (JSON) and `Map.add_geojson` (binary buffers). Run it
+from the repository root with ``python -m benchmarks.bench_geojson [vertices]``.
+
+Time-to-render can only be measured in a browser: display the map, add both
+sources, and read ``m.render_timings``, which the frontend fills in with the
+decode and render times of each source.
+"""
+
+import json
+import math
+import sys
+import time
+
+from mapwidget.maplibre import Map
+
+
+def make_polygons(vertices=200_000, ring_size=500):
+    """Returns a FeatureCollection of circles with the given total vertex count."""
+    features = []
+    for index in range(vertices // ring_size):
+        cx = -180 + (index * 7.3) % 360
+        cy = -80 + (index * 3.1) % 160
+        ring = [
+            [
+                cx + math.cos(2 * math.pi * k / (ring_size - 1)),
+                cy + math.sin(2 * math.pi * k / (ring_size - 1)),
+            ]
+            for k in range(ring_size)
+        ]
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {"type": "Polygon", "coordinates": [ring]},
+                "properties": {"index": index},
+            }
+        )
+    return {"type": "FeatureCollection", "features": features}
+
+
+def measure(send_source):
+    """Returns the payload size in bytes and the time in ms to build it."""
+    m = Map(controls=[])
+    sent = []
+    m.send = lambda content, buffers=None: sent.append((content, buffers or []))
+    start = time.perf_counter()
+    send_source(m)
+    content, buffers = sent[-1]
+    # Include the JSON serialization done by the comm in the timing
+    size = len(json.dumps(content)) + sum(memoryview(b).nbytes for b in buffers)
+    return size, (time.perf_counter() - start) * 1000
+
+
+def main(vertices=200_000):
+    data = make_polygons(vertices)
+    results = {
+        "json": measure(
+            lambda m: m.add_source("src", {"type": "geojson", "data": data})
+        ),
+        "binary float64": measure(lambda m: m.add_geojson("src", data)),
+        "binary float32": measure(
+            lambda m: m.add_geojson("src", data, dtype="float32")
+        ),
+    }
+    print(f"{vertices} vertices")
+    print(f"{'transport':<16}{'payload (MB)':>14}{'time (ms)':>12}")
+    for name, (size, elapsed) in results.items():
+        print(f"{name:<16}{size / 1e6:>14.2f}{elapsed:>12.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
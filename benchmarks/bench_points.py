@@ -0,0 +1,66 @@
+"""Compare the point encoding of `add_points` with building GeoJSON.
+
+Encodes random GPS points with two attribute columns as quantized binary
+chunks, and times building the equivalent GeoJSON FeatureCollection and its
+JSON text on a sample, extrapolated to the full count. Run it from the
+repository root with ``python -m benchmarks.bench_points``.
+"""
+
+import json
+import time
+
+import numpy as np
+
+from mapwidget.points import encode_points
+
+
+def make_points(count):
+    rng = np.random.default_rng(0)
+    lng = rng.uniform(-180, 180, count)
+    lat = rng.uniform(-80, 80, count)
+    columns = {
+        "speed": rng.uniform(0, 120, count),
+        "kind": rng.choice(["car", "bike", "walk"], count),
+    }
+    return lng, lat, columns
+
+
+def geojson(lng, lat, columns):
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [x, y]},
+                "properties": {name: values[i] for name, values in columns.items()},
+            }
+            for i, (x, y) in enumerate(zip(lng.tolist(), lat.tolist()))
+        ],
+    }
+
+
+def main(count=10_000_000, sample=200_000):
+    lng, lat, columns = make_points(count)
+
+    start = time.perf_counter()
+    info, chunks = encode_points(lng, lat, columns)
+    encode_s = time.perf_counter() - start
+    size = sum(b.nbytes for _, buffers in chunks for b in buffers)
+    print(
+        f"binary   {count:>10,} points  {encode_s:7.2f} s  "
+        f"{size / 1e6:8.1f} MB  {len(chunks)} chunks"
+    )
+
+    lists = {name: values[:sample].tolist() for name, values in columns.items()}
+    start = time.perf_counter()
+    text = json.dumps(geojson(lng[:sample], lat[:sample], lists))
+    factor = count / sample
+    geojson_s = (time.perf_counter() - start) * factor
+    print(
+        f"geojson  {count:>10,} points  {geojson_s:7.2f} s  "
+        f"{len(text) * factor / 1e6:8.1f} MB  (extrapolated from {sample:,})"
+    )
+
+
+if __name__ == "__main__":
+    main()
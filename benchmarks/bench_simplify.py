@@ -0,0 +1,58 @@
+"""Time the level-of-detail precomputation of `add_geojson_lod`.
+
+Builds a grid of wavy parcel polygons, about a million vertices, and times
+`build_levels` with both simplification methods, printing the size of each
+level. Run it from the repository root with
+``python -m benchmarks.bench_simplify``.
+"""
+
+import time
+
+import numpy as np
+
+from mapwidget.simplify import build_levels
+
+
+def make_parcels(rows=50, cols=50, vertices=400):
+    t = np.linspace(0, 2 * np.pi, vertices)
+    features = []
+    for i in range(rows * cols):
+        x, y = i % cols * 0.1, i // cols * 0.1
+        ring = np.column_stack(
+            [
+                x + 0.04 * np.cos(t) + 0.0005 * np.sin(40 * t + i),
+                y + 0.04 * np.sin(t) + 0.0005 * np.cos(30 * t + i),
+            ]
+        )
+        ring[-1] = ring[0]
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {"type": "Polygon", "coordinates": [ring.tolist()]},
+                "properties": {"parcel": i},
+            }
+        )
+    return {"type": "FeatureCollection", "features": features}
+
+
+def main():
+    data = make_parcels()
+    for method in ("dp", "vw"):
+        for preserve_topology in (False, True):
+            start = time.perf_counter()
+            levels = build_levels(
+                data, method=method, preserve_topology=preserve_topology
+            )
+            total_ms = (time.perf_counter() - start) * 1000
+            print(f"{method} preserve_topology={preserve_topology}: {total_ms:.0f} ms")
+            for level in levels:
+                print(
+                    f"  z{level['min_zoom']:>2}-{level['max_zoom'] or '':<2} "
+                    f"{level['features']:>6,} features {level['vertices']:>10,} "
+                    f"vertices {level['bytes'] / 1e6:7.2f} MB "
+                    f"{level['simplify_ms']:7.0f} ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Compare spatial index queries with a linear scan over the features.
+
+Builds 100k random points and 100k random small polygons, then times
+`features_at` and `features_in_bounds` on a `SpatialIndex` against a Python
+scan of the features. Run it from the repository root with
+``python -m benchmarks.bench_spatial``.
+"""
+
+import random
+import time
+
+from mapwidget.spatial import SpatialIndex, _bbox, geometry_contains
+
+
+def make_features(count, polygons=False):
+    random.seed(0)
+    features = []
+    for _ in range(count):
+        x, y = random.uniform(-180, 179), random.uniform(-85, 84)
+        if polygons:
+            size = random.uniform(0.01, 0.2)
+            ring = [[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]]
+            geometry = {"type": "Polygon", "coordinates": [ring]}
+        else:
+            geometry = {"type": "Point", "coordinates": [x, y]}
+        features.append({"type": "Feature", "geometry": geometry, "properties": {}})
+    return features
+
+
+def linear_at(features, lng, lat, tolerance):
+    return [
+        f for f in features if geometry_contains(f["geometry"], lng, lat, tolerance)
+    ]
+
+
+def linear_in_bounds(features, bbox):
+    result = []
+    for feature in features:
+        box = _bbox(feature["geometry"])
+        if (
+            box[0] <= bbox[2]
+            and box[2] >= bbox[0]
+            and box[1] <= bbox[3]
+            and box[3] >= bbox[1]
+        ):
+            result.append(feature)
+    return result
+
+
+def timeit(func, queries):
+    start = time.perf_counter()
+    for query in queries:
+        func(*query)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main(count=100_000):
+    for label, polygons in (("points", False), ("polygons", True)):
+        features = make_features(count, polygons)
+        data = {"type": "FeatureCollection", "features": features}
+        index = SpatialIndex()
+        start = time.perf_counter()
+        index.insert_many(list(range(count)), data)
+        build = (time.perf_counter() - start) * 1000
+
+        points = [
+            (random.uniform(-180, 180), random.uniform(-85, 85)) for _ in range(200)
+        ]
+        boxes = [(x, y, x + 2, y + 1) for x, y in points]
+        tolerance = 0.01
+        print(
+            f"{count} {label}: bulk load {build:.0f} ms, cell size {index.cell_size:.3f}"
+        )
+        rows = {
+            "features_at (index)": timeit(
+                lambda x, y: index.features_at(x, y, tolerance), points
+            ),
+            "features_at (scan)": timeit(
+                lambda x, y: linear_at(features, x, y, tolerance), points[:5]
+            ),
+            "features_in_bounds (index)": timeit(
+                index.features_in_bounds, [(b,) for b in boxes]
+            ),
+            "features_in_bounds (scan)": timeit(
+                lambda b: linear_in_bounds(features, b), [(b,) for b in boxes[:5]]
+            ),
+        }
+        for name, elapsed in rows.items():
+            print(f"  {name:<30}{elapsed:>10.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Measure rendering and serving of array raster tiles.
+
+Renders the zoom 4 tiles of a global 0.05 degree array cold, then again from
+the cache, and fetches them over HTTP. Run it from the repository root with
+``python -m benchmarks.bench_tileserver``.
+"""
+
+import time
+import urllib.request
+
+import numpy as np
+
+from mapwidget.tileserver import ArrayTiler, TileServer
+
+
+def main():
+    y, x = np.mgrid[0:3600, 0:7200]
+    array = (np.sin(x / 300) * np.cos(y / 200)).astype(np.float32)
+    tiles = [(4, x, y) for x in range(16) for y in range(16)]
+
+    for resampling in ("nearest", "bilinear"):
+        tiler = ArrayTiler(array, [-180, -90, 180, 90], resampling=resampling)
+        start = time.perf_counter()
+        tiler.prerender()
+        print(
+            f"{resampling + ' prerender':<28}{(time.perf_counter() - start) * 1000:>10.1f} ms"
+        )
+        for label in ("cold", "cached"):
+            start = time.perf_counter()
+            for tile in tiles:
+                tiler.tile(*tile)
+            elapsed = (time.perf_counter() - start) / len(tiles) * 1000
+            print(f"{resampling + ' ' + label:<28}{elapsed:>10.2f} ms/tile")
+
+    server = TileServer()
+    url = server.add_tiler("bench", tiler)
+    start = time.perf_counter()
+    for z, x, y in tiles:
+        with urllib.request.urlopen(url.format(z=z, x=x, y=y)) as response:
+            response.read()
+    elapsed = (time.perf_counter() - start) / len(tiles) * 1000
+    print(f"{'http cached':<28}{elapsed:>10.2f} ms/tile")
+    server.stop()
+    print(tiler.stats())
+
+
+if __name__ == "__main__":
+    main()
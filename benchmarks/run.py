@@ -0,0 +1,274 @@
+"""Run the hot-path benchmarks headless and compare them with baselines.
+
+Every benchmark drives the widgets through `mapwidget.testing.FakeFrontend`,
+so no browser or network is needed. The metrics are:
+
+- the cost of `add_call` as the call history grows,
+- the bytes sent per map operation,
+- the cost of `get_xyz_dict` and `get_basemap_list`,
+- the volume and cost of draw feature syncs,
+- the time of ``import mapwidget`` in a fresh interpreter.
+
+Run it, like the ``bench_*`` scripts, as a module from the repository root:
+
+- ``python -m benchmarks.run`` prints the metrics.
+- ``python -m benchmarks.run --save`` also saves them as the baselines.
+- ``python -m benchmarks.run --compare`` exits with status 1 if a metric
+  regressed past the tolerance of its unit compared with the baselines.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+# Relative increase over the baseline tolerated for each unit. Timings vary
+# between runs and machines, byte counts do not.
+TOLERANCES = {"us": 1.0, "ms": 1.0, "bytes": 0.05}
+
+# Absolute increase tolerated for each unit whatever the baseline, so that
+# timings of a few microseconds or milliseconds do not fail on noise
+NOISE_FLOORS = {"us": 20.0, "ms": 10.0, "bytes": 0}
+
+
+def timeit(func, repeat):
+    """Returns the mean time of func in microseconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def bench_add_call():
+    """add_call cost with a growing, unbounded call history."""
+    from mapwidget.maplibre import Map
+    from mapwidget.testing import FakeFrontend
+
+    m = Map(controls=[], call_history=None)
+    FakeFrontend(m, keep=False)
+    metrics = {}
+    made = 0
+    for history in (0, 10_000, 100_000):
+        while made < history:
+            m.set_paint_property(f"layer-{made % 100}", "fill-opacity", 0.5)
+            made += 1
+        metrics[f"add_call at {history} calls"] = (
+            timeit(lambda: m.set_zoom(5), 1000),
+            "us",
+        )
+        made += 1000
+    return metrics
+
+
+def bench_bytes():
+    """Bytes sent to the frontend per map operation."""
+    from mapwidget.maplibre import Map
+    from mapwidget.testing import FakeFrontend
+
+    points = {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "id": i,
+                "geometry": {"type": "Point", "coordinates": [i * 0.01, i * 0.005]},
+                "properties": {"value": i},
+            }
+            for i in range(1000)
+        ],
+    }
+    operations = {
+        "set_paint_property": lambda m: m.set_paint_property(
+            "water", "fill-color", "#00f"
+        ),
+        "fly_to": lambda m: m.fly_to(center=[10, 20], zoom=5),
+        "add_source (1k points)": lambda m: m.add_source(
+            "points", {"type": "geojson", "data": points}
+        ),
+        "add_geojson (1k points)": lambda m: m.add_geojson("points", points),
+        "set_feature_states (1k)": lambda m: m.set_feature_states(
+            "points", list(range(1000)), [i * 0.5 for i in range(1000)]
+        ),
+        "sync replay (1k paint calls)": None,
+    }
+    metrics = {}
+    for name, operation in operations.items():
+        m = Map(controls=[])
+        frontend = FakeFrontend(m)
+        if operation is None:
+            for i in range(1000):
+                m.set_paint_property(f"layer-{i % 100}", "fill-opacity", i / 1000)
+            frontend.clear()
+            frontend.sync()
+        else:
+            frontend.clear()
+            operation(m)
+        metrics[f"bytes {name}"] = (frontend.bytes_sent, "bytes")
+    return metrics
+
+
+def bench_basemaps():
+    """Basemap catalog lookups, once the catalog is built."""
+    from mapwidget import basemaps
+
+    basemaps.get_basemap_list()
+    return {
+        "get_xyz_dict()": (timeit(basemaps.get_xyz_dict, 1000), "us"),
+        "get_basemap_list()": (timeit(basemaps.get_basemap_list, 1000), "us"),
+    }
+
+
+def bench_draw():
+    """Draw syncs: creating 1000 features, then updating one 100 times."""
+    from mapwidget.maplibre import Map
+    from mapwidget.testing import FakeFrontend
+
+    def polygon(i, shift=0.0):
+        x, y = i % 40 + shift, i // 40
+        ring = [[x, y], [x + 0.5, y], [x + 0.5, y + 0.5], [x, y + 0.5], [x, y]]
+        return {
+            "type": "Feature",
+            "id": f"f{i}",
+            "geometry": {"type": "Polygon", "coordinates": [ring]},
+            "properties": {},
+        }
+
+    m = Map(controls=[])
+    frontend = FakeFrontend(m)
+    start = time.perf_counter()
+    for i in range(1000):
+        frontend.draw("create", [{"op": "upsert", "feature": polygon(i)}])
+    create_ms = (time.perf_counter() - start) * 1000
+    create_bytes = frontend.bytes_received + frontend.trait_bytes
+
+    frontend.clear()
+    start = time.perf_counter()
+    for step in range(100):
+        frontend.draw("update", [{"op": "upsert", "feature": polygon(0, step * 0.01)}])
+    update_us = (time.perf_counter() - start) / 100 * 1e6
+    return {
+        "draw create 1000 features": (create_ms, "ms"),
+        "draw create 1000 features bytes": (create_bytes, "bytes"),
+        "draw update 1 of 1000": (update_us, "us"),
+        "draw update 1 of 1000 bytes": (
+            (frontend.bytes_received + frontend.trait_bytes) // 100,
+            "bytes",
+        ),
+    }
+
+
+def bench_import(repeat=5):
+    """``import mapwidget`` and ``import mapwidget.basemaps`` in a fresh interpreter."""
+    metrics = {}
+    for module in ("mapwidget", "mapwidget.basemaps"):
+        code = (
+            "import time; start = time.perf_counter(); "
+            f"import {module}; print(time.perf_counter() - start)"
+        )
+        samples = [
+            float(
+                subprocess.run(
+                    [sys.executable, "-c", code],
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                ).stdout
+            )
+            for _ in range(repeat)
+        ]
+        metrics[f"import {module}"] = (statistics.median(samples) * 1000, "ms")
+    return metrics
+
+
+BENCHMARKS = [bench_add_call, bench_bytes, bench_basemaps, bench_draw, bench_import]
+
+
+def run():
+    """Runs every benchmark.
+
+    Returns:
+        dict: The value and unit of each metric, by name.
+    """
+    results = {}
+    for benchmark in BENCHMARKS:
+        for name, (value, unit) in benchmark().items():
+            results[name] = {"value": value, "unit": unit}
+    return results
+
+
+def compare(results, baselines, scale=1.0):
+    """Compares results with baselines.
+
+    A metric regresses when it exceeds its baseline by more than both the
+    relative tolerance and the noise floor of its unit.
+
+    Args:
+        results (dict): The metrics of `run`.
+        baselines (dict): The saved metrics.
+        scale (float, optional): A factor applied to the tolerances and the
+            noise floors. Defaults to 1.0.
+
+    Returns:
+        list: The names of the metrics that regressed.
+    """
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+        unit = result["unit"]
+        margin = max(baseline["value"] * TOLERANCES[unit], NOISE_FLOORS[unit])
+        limit = baseline["value"] + margin * scale
+        if result["value"] > limit:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--save", action="store_true", help="save the baselines")
+    parser.add_argument(
+        "--compare", action="store_true", help="fail on regressions from the baselines"
+    )
+    parser.add_argument(
+        "--tolerance-scale",
+        type=float,
+        default=1.0,
+        help="scale the tolerances and noise floors of every unit",
+    )
+    args = parser.parse_args(argv)
+
+    results = run()
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as f:
+            baselines = json.load(f)
+    regressions = compare(results, baselines, args.tolerance_scale)
+
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        line = f"{name:<40}{result['value']:>14.1f} {result['unit']:<6}"
+        if baseline is not None:
+            line += f"  baseline {baseline['value']:>12.1f}"
+        if name in regressions:
+            line += "  REGRESSION"
+        print(line)
+
+    if args.save:
+        with open(BASELINES, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Saved the baselines to {BASELINES}")
+    if args.compare and regressions:
+        print(f"{len(regressions)} metric(s) regressed")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,5 +4,51 @@ __author__ = """Qiusheng Wu"""
 __email__ = "giswqs@gmail.com"
 __version__ = "0.2.0"
 
+import importlib
 
-from .maplibre import *
+__all__ = ["Map"]
+
+# Submodules are imported on first access, so that ``import mapwidget`` does
+# not import anywidget, and ``mapwidget.basemaps`` does not import the maps.
+_SUBMODULES = {
+    "animation",
+    "assets",
+    "basemaps",
+    "cache",
+    "calls",
+    "cesium",
+    "encoding",
+    "features",
+    "leaflet",
+    "mapbox",
+    "maplibre",
+    "openlayers",
+    "points",
+    "query",
+    "simplify",
+    "spatial",
+    "stats",
+    "streaming",
+    "style",
+    "testing",
+    "tiler",
+    "tileserver",
+}
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    if not name.startswith("_"):
+        # The names of mapwidget.maplibre, such as Map, are also exported
+        # from the package
+        maplibre = importlib.import_module(".maplibre", __name__)
+        if hasattr(maplibre, name):
+            value = getattr(maplibre, name)
+            globals()[name] = value
+            return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | _SUBMODULES | {"Map"})
@@ -0,0 +1,139 @@
+"""Module for timeline animations played by the map frontends.
+
+A timeline is a list of frames, each a dict of the changes it makes:
+
+- 'filter': {layer_id: filter expression}
+- 'paint': {layer_id: {property: value}}
+- 'layout': {layer_id: {property: value}}
+- 'data': {source_id: GeoJSON dict or URL} for GeoJSON sources
+- 'tiles': {source_id: [tile URL templates]} for tiled sources
+- 'camera': jumpTo options, e.g. {'center': [lng, lat], 'zoom': 5}
+- 'duration': how long the frame is shown in milliseconds, overriding the
+  interval of the animation
+
+The whole timeline is uploaded once. The frontend plays it on animation
+frames, fetches the GeoJSON URLs and warms the tiles of the next frames
+ahead of time, and skips the frames whose time has passed when rendering
+falls behind, reporting them as dropped. Python only sends control changes:
+play, pause, seek and speed.
+"""
+
+FRAME_KEYS = ("filter", "paint", "layout", "data", "tiles", "camera", "duration")
+
+
+def validate_frames(frames):
+    """Checks that frames only hold supported changes.
+
+    Args:
+        frames (list): The frames, see the module docstring.
+
+    Raises:
+        ValueError: If there are no frames or a frame holds an unsupported
+            key.
+    """
+    if not frames:
+        raise ValueError("An animation needs at least one frame")
+    for index, frame in enumerate(frames):
+        unknown = set(frame) - set(FRAME_KEYS)
+        if unknown:
+            raise ValueError(
+                f"Frame {index} has unsupported keys {sorted(unknown)}. "
+                f"Frames can hold {list(FRAME_KEYS)}."
+            )
+
+
+class Animation:
+    """A handle on an animation played by the frontends of a map.
+
+    Created by `mapwidget.maplibre.Map.add_animation`.
+
+    Attributes:
+        id (str): The ID of the animation.
+        frames (list): The frames of the timeline.
+        stats (dict): The playback reported by the frontend: the current
+            'frame', whether it is 'playing', the number of frames 'played'
+            and 'dropped', and the frame rate ('fps').
+    """
+
+    def __init__(self, map, animation_id, frames, playing=False, speed=1.0):
+        self.map = map
+        self.id = animation_id
+        self.frames = frames
+        self._playing = playing
+        self._speed = speed
+        self.stats = {
+            "frame": 0,
+            "playing": playing,
+            "played": 0,
+            "dropped": 0,
+            "fps": None,
+        }
+
+    def __len__(self):
+        return len(self.frames)
+
+    def _send(self, frame=None):
+        control = {"playing": self._playing, "speed": self._speed}
+        if frame is not None:
+            control["frame"] = frame
+        self.map.add_call("setAnimationState", [self.id, control])
+
+    @property
+    def playing(self):
+        """bool: Whether the animation was last asked to play."""
+        return self._playing
+
+    @property
+    def frame(self):
+        """int: The frame last shown by the frontend."""
+        return self.stats["frame"]
+
+    @property
+    def speed(self):
+        """float: The playback rate. 2.0 plays the frames twice as fast."""
+        return self._speed
+
+    @speed.setter
+    def speed(self, value):
+        if value <= 0:
+            raise ValueError("speed must be positive")
+        self._speed = float(value)
+        self._send()
+
+    def play(self):
+        """Plays the animation from its current frame."""
+        self._playing = True
+        self._send()
+
+    def pause(self):
+        """Pauses the animation on its current frame."""
+        self._playing = False
+        self._send()
+
+    def seek(self, frame):
+        """Shows a frame, keeping the animation playing or paused.
+
+        Only the changes of that frame are applied, so frames should set
+        every property that changes along the timeline.
+
+        Args:
+            frame (int): The index of the frame. Negative indices count from
+                the end.
+
+        Raises:
+            IndexError: If the frame is out of range.
+        """
+        if not -len(self.frames) <= frame < len(self.frames):
+            raise IndexError(f"Frame {frame} out of range")
+        self._send(frame % len(self.frames))
+
+    def remove(self):
+        """Stops the animation and removes it from the map."""
+        self._playing = False
+        self.map.remove_animation(self.id)
+
+    def _update(self, content):
+        """Update the stats from a report of the frontend."""
+        for key in self.stats:
+            if key in content:
+                self.stats[key] = content[key]
@@ -0,0 +1,230 @@
+"""Module for the frontend assets (JS and CSS bundles) used by the maps.
+
+The maps load their JS libraries either from CDNs or, in local mode, from
+pinned bundles served by the kernel through the widget comm, which works on
+air-gapped machines. The package does not ship the bundles. They are looked
+up in the asset cache directory, which `download_assets` fills on a
+connected machine, and in the ``static`` directory of the package, which is
+absent from the released package but packaged when present, so builds for
+offline sites can fill it with ``download_assets(cache_dir=...)``. The mode
+is set with `set_asset_mode` or the MAPWIDGET_ASSETS environment variable:
+
+- 'cdn': load every asset from its CDN (the default).
+- 'local': serve every asset from the kernel.
+- 'auto': serve the assets available locally, and load the others from CDNs.
+
+Either way, each asset is loaded once per page, and independent assets are
+loaded in parallel, by the loader of ``js/assets.js``, which `map_esm` inlines
+in the frontend module of each map.
+"""
+
+import os
+
+# Pinned CDN URLs of the assets, by asset name
+ASSETS = {
+    "maplibre-gl.js": "https://unpkg.com/maplibre-gl@5.5.0/dist/maplibre-gl.js",
+    "maplibre-gl.css": "https://unpkg.com/maplibre-gl@5.5.0/dist/maplibre-gl.css",
+    "mapbox-gl-draw.js": "https://www.unpkg.com/@mapbox/mapbox-gl-draw@1.5.0/dist/mapbox-gl-draw.js",
+    "mapbox-gl-draw.css": "https://www.unpkg.com/@mapbox/mapbox-gl-draw@1.5.0/dist/mapbox-gl-draw.css",
+    "mapbox-gl-legend.js": "https://watergis.github.io/mapbox-gl-legend/mapbox-gl-legend.js",
+    "mapbox-gl-legend.css": "https://watergis.github.io/mapbox-gl-legend/mapbox-gl-legend.css",
+    "maplibre-gl-opacity.js": "https://www.unpkg.com/maplibre-gl-opacity@1.8.0/build/maplibre-gl-opacity.umd.js",
+    "maplibre-gl-opacity.css": "https://www.unpkg.com/maplibre-gl-opacity@1.8.0/build/maplibre-gl-opacity.css",
+    "maplibre-cog-protocol.js": "https://unpkg.com/@geomatico/maplibre-cog-protocol@0.4.0/dist/index.js",
+    "leaflet.js": "https://unpkg.com/leaflet@1.9.3/dist/leaflet-src.esm.js",
+    "leaflet.css": "https://unpkg.com/leaflet@1.9.3/dist/leaflet.css",
+    "ol.js": "https://cdn.jsdelivr.net/npm/ol@v7.3.0/dist/ol.js",
+    "ol.css": "https://cdn.jsdelivr.net/npm/ol@v7.3.0/ol.css",
+}
+
+# The assets that are ES modules, which the frontend imports
+ES_MODULES = {"leaflet.js"}
+
+ASSET_MODES = ("cdn", "local", "auto")
+
+_JS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "js")
+
+_PACKAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+_mode = os.environ.get("MAPWIDGET_ASSETS", "cdn")
+_contents = {}
+
+
+def set_asset_mode(mode):
+    """Sets how the maps created afterwards load their frontend assets.
+
+    Args:
+        mode (str): 'cdn', 'local' or 'auto'.
+
+    Raises:
+        ValueError: If mode is not a valid asset mode.
+    """
+    global _mode
+    if mode not in ASSET_MODES:
+        raise ValueError(f"mode must be one of {ASSET_MODES}")
+    _mode = mode
+
+
+def get_asset_mode():
+    """Returns the current asset mode.
+
+    Returns:
+        str: 'cdn', 'local' or 'auto'.
+    """
+    return _mode
+
+
+def get_cache_dir():
+    """Returns the asset cache directory.
+
+    It can be set with the MAPWIDGET_ASSET_DIR environment variable and
+    defaults to ~/.cache/mapwidget/assets.
+
+    Returns:
+        str: The path of the directory.
+    """
+    return os.environ.get(
+        "MAPWIDGET_ASSET_DIR",
+        os.path.join(os.path.expanduser("~"), ".cache", "mapwidget", "assets"),
+    )
+
+
+def find_asset(name):
+    """Returns the path of a local copy of an asset.
+
+    Args:
+        name (str): The name of the asset, e.g. 'maplibre-gl.js'.
+
+    Returns:
+        str: The path of the asset, or None if there is no local copy.
+    """
+    for directory in (_PACKAGE_DIR, get_cache_dir()):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def read_asset(name):
+    """Returns the content of a local asset, reading it once per kernel.
+
+    Args:
+        name (str): The name of the asset.
+
+    Raises:
+        FileNotFoundError: If there is no local copy of the asset.
+
+    Returns:
+        bytes: The content of the asset.
+    """
+    if name not in _contents:
+        path = find_asset(name)
+        if path is None:
+            raise FileNotFoundError(
+                f"Asset {name} not found. Run mapwidget.assets.download_assets() "
+                "on a connected machine to fill the asset cache."
+            )
+        with open(path, "rb") as f:
+            _contents[name] = f.read()
+    return _contents[name]
+
+
+def download_assets(names=None, cache_dir=None, overwrite=False, timeout=30):
+    """Downloads the pinned assets into the asset cache directory.
+
+    Args:
+        names (list, optional): The names of the assets to download. Defaults
+            to all assets.
+        cache_dir (str, optional): The directory to download to. Defaults to
+            the asset cache directory.
+        overwrite (bool, optional): Whether to download assets that are
+            already present. Defaults to False.
+        timeout (float, optional): The timeout of each download in seconds.
+            Defaults to 30.
+
+    Returns:
+        list: The paths of the downloaded assets.
+    """
+    import urllib.request
+
+    if names is None:
+        names = list(ASSETS)
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+
+    paths = []
+    for name in names:
+        path = os.path.join(cache_dir, name)
+        if overwrite or not os.path.isfile(path):
+            with urllib.request.urlopen(ASSETS[name], timeout=timeout) as response:
+                content = response.read()
+            with open(path, "wb") as f:
+                f.write(content)
+            _contents.pop(name, None)
+        paths.append(path)
+    return paths
+
+
+def asset_sources(names):
+    """Returns where the frontend should load each asset from.
+
+    Args:
+        names (list): The names of the assets.
+
+    Returns:
+        dict: For each asset, its CDN 'url', whether it is served by the
+            kernel ('local') and whether it is an ES 'module'. The frontend
+            falls back to the CDN if the kernel cannot serve an asset.
+    """
+    return {
+        name: {
+            "url": ASSETS[name],
+            "local": _mode == "local"
+            or (_mode == "auto" and find_asset(name) is not None),
+            "module": name in ES_MODULES,
+        }
+        for name in names
+    }
+
+
+def map_esm(name):
+    """Returns the frontend module of a map, with the asset loader inlined.
+
+    anywidget loads each module on its own, so the loader shared by the maps
+    cannot be imported and is prepended instead.
+
+    Args:
+        name (str): The file name of the module in the ``js`` directory.
+
+    Returns:
+        str: The source of the module.
+    """
+    parts = []
+    for filename in ("assets.js", name):
+        with open(os.path.join(_JS_DIR, filename), encoding="utf-8") as f:
+            parts.append(f.read())
+    return "\n".join(parts)
+
+
+def handle_asset_message(widget, content, buffers):
+    """Handles the asset requests and startup timings sent by a map frontend.
+
+    Args:
+        widget (anywidget.AnyWidget): The map widget.
+        content (dict): The message content.
+        buffers (list): The message buffers.
+    """
+    msg_type = content.get("type")
+    if msg_type == "asset_request":
+        reply = {"type": "asset_response", "name": content["name"]}
+        try:
+            data = read_asset(content["name"])
+        except (KeyError, OSError) as e:
+            reply["error"] = str(e)
+            widget.send(reply)
+        else:
+            widget.send(reply, buffers=[data])
+    elif msg_type == "startup":
+        widget.startup_timings.append(
+            {key: content.get(key) for key in ("mode", "assets_ms", "load_ms")}
+        )
@@ -1,7 +1,6 @@
 """Module for basemaps."""
 
-import collections
-import xyzservices.providers as xyz
+import threading
 
 # Custom XYZ tile services.
 xyz_tiles = {
@@ -210,11 +209,108 @@ wms_tiles = {
 }
 
 
-def _unpack_sub_parameters(var, param):
-    temp = var
-    for sub_param in param.split("."):
-        temp = getattr(temp, sub_param)
-    return temp
+class BasemapCatalog:
+    """A catalog of XYZ basemaps, indexed by name.
+
+    The catalog combines the custom tile services in `xyz_tiles` with the
+    xyzservices providers. It is built on first use only, and keeps separate
+    views of the free basemaps and of all basemaps, so lookups by name are O(1)
+    and repeated listings cost next to nothing. xyzservices is imported lazily
+    when the catalog is built.
+    """
+
+    def __init__(self):
+        self._free = None
+        self._full = None
+        self._lock = threading.Lock()
+
+    def _build(self):
+        import xyzservices.providers as xyz
+
+        free = dict(xyz_tiles)
+        full = dict(xyz_tiles)
+        providers = xyz.flatten()
+        for name in sorted(providers):
+            provider = providers[name]
+            requires_token = provider.requires_token()
+            # Keep the token placeholders, e.g. {apikey}, in the URL template
+            tokens = {
+                key: f"{{{key}}}"
+                for key, value in provider.items()
+                if requires_token and isinstance(value, str) and "<insert your" in value
+            }
+            entry = {
+                "name": provider.name,
+                "url": provider.build_url(**tokens),
+                "attribution": provider.attribution,
+                "max_zoom": provider.get("max_zoom", 24),
+            }
+            full[name] = entry
+            if not requires_token:
+                free[name] = entry
+        self._free, self._full = free, full
+
+    def _view(self, free_only):
+        if self._full is None:
+            with self._lock:
+                if self._full is None:
+                    self._build()
+        return self._free if free_only else self._full
+
+    def get(self, name, free_only=True):
+        """Returns a basemap by name.
+
+        Args:
+            name (str): The name of the basemap.
+            free_only (bool, optional): Whether to only look up basemaps that do not require an access token. Defaults to True.
+
+        Returns:
+            dict: The basemap with its name, url, attribution and max_zoom, or None if not found.
+        """
+        return self._view(free_only).get(name)
+
+    def names(self, free_only=True):
+        """Returns the names of the basemaps.
+
+        Args:
+            free_only (bool, optional): Whether to only list basemaps that do not require an access token. Defaults to True.
+
+        Returns:
+            list: The basemap names.
+        """
+        return list(self._view(free_only))
+
+    def to_dict(self, free_only=True):
+        """Returns the basemaps as a dictionary keyed by name.
+
+        Args:
+            free_only (bool, optional): Whether to only include basemaps that do not require an access token. Defaults to True.
+
+        Returns:
+            dict: A new dictionary of basemaps.
+        """
+        return dict(self._view(free_only))
+
+    def clear(self):
+        """Clears the catalog, so that it is rebuilt on next use."""
+        with self._lock:
+            self._free = self._full = None
+
+
+catalog = BasemapCatalog()
+
+
+def get_basemap(name, free_only=True):
+    """Returns an xyz service by name.
+
+    Args:
+        name (str): The name of the xyz service.
+        free_only (bool, optional): Whether to only look up xyz tile services that do not require an access token. Defaults to True.
+
+    Returns:
+        dict: The xyz service with its name, url, attribution and max_zoom, or None if not found.
+    """
+    return catalog.get(name, free_only)
 
 
 def get_xyz_dict(free_only=True):
@@ -226,53 +322,7 @@ def get_xyz_dict(free_only=True):
     Returns:
         dict: A dictionary of xyz services.
     """
-
-    xyz_dict = {}
-    for item in xyz.values():
-        try:
-            name = item["name"]
-            tile = _unpack_sub_parameters(xyz, name)
-            if _unpack_sub_parameters(xyz, name).requires_token():
-                if free_only:
-                    pass
-                else:
-                    xyz_dict[name] = tile
-            else:
-                xyz_dict[name] = tile
-
-        except Exception:
-            for sub_item in item:
-                name = item[sub_item]["name"]
-                tile = _unpack_sub_parameters(xyz, name)
-                if _unpack_sub_parameters(xyz, name).requires_token():
-                    if free_only:
-                        pass
-                    else:
-                        xyz_dict[name] = tile
-                else:
-                    xyz_dict[name] = tile
-
-    xyz_dict = collections.OrderedDict(sorted(xyz_dict.items()))
-
-    tiles = xyz_tiles
-
-    for item in xyz_dict:
-        name = xyz_dict[item].name
-        url = xyz_dict[item].build_url()
-        attribution = xyz_dict[item].attribution
-        if "max_zoom" in xyz_dict[item].keys():
-            max_zoom = xyz_dict[item]["max_zoom"]
-        else:
-            max_zoom = 24
-
-        tiles[item] = {
-            "name": name,
-            "url": url,
-            "attribution": attribution,
-            "max_zoom": max_zoom,
-        }
-
-    return tiles
+    return catalog.to_dict(free_only)
 
 
 def get_basemap_list(free_only=True):
@@ -285,4 +335,4 @@ def get_basemap_list(free_only=True):
         list: A list of xyz services.
     """
 
-    return list(get_xyz_dict(free_only).keys())
+    return catalog.names(free_only)
@@ -0,0 +1,262 @@
+"""Module for caching generated content such as map tiles, and fetched URLs."""
+
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class LRUCache:
+    """A thread-safe least-recently-used cache with hit and miss counters.
+
+    Args:
+        maxsize (int, optional): The maximum number of entries. Defaults to 512.
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """Returns the cached value for key, marking it as recently used."""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """Caches a value, evicting the least recently used entry if full."""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Removes the entry of key and returns its value, or default."""
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        """Removes every entry from the cache."""
+        with self._lock:
+            self._data.clear()
+
+    def info(self):
+        """Returns the cache statistics.
+
+        Returns:
+            dict: The hits, misses, current size and maximum size.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
+
+
+class URLCache:
+    """A cache of the content of URLs, in memory and on disk.
+
+    Entries are stored on disk under the SHA-256 hash of their URL, with the
+    ETag and Last-Modified validators of the response. Entries older than
+    ``max_age`` are revalidated with a conditional request, which costs a
+    304 response when the content has not changed. If the server cannot be
+    reached, a stale entry is served rather than failing.
+
+    Args:
+        cache_dir (str, optional): The directory of the disk cache. Defaults
+            to the MAPWIDGET_URL_CACHE_DIR environment variable or
+            ~/.cache/mapwidget/urls. Set it to False to only cache in memory.
+        maxsize (int, optional): The number of entries kept in memory.
+            Defaults to 128.
+        max_age (float, optional): The age in seconds after which entries
+            are revalidated. Defaults to 3600.
+        timeout (float, optional): The timeout of requests in seconds.
+            Defaults to 10.
+    """
+
+    def __init__(self, cache_dir=None, maxsize=128, max_age=3600, timeout=10):
+        if cache_dir is None:
+            cache_dir = os.environ.get(
+                "MAPWIDGET_URL_CACHE_DIR",
+                os.path.join(os.path.expanduser("~"), ".cache", "mapwidget", "urls"),
+            )
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.timeout = timeout
+        self.requests = 0
+        self._memory = LRUCache(maxsize)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._executor = None
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return base + ".body", base + ".json"
+
+    def _load(self, url):
+        """Returns the entry of url from memory or disk, or None."""
+        entry = self._memory.get(url)
+        if entry is not None or not self.cache_dir:
+            return entry
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                content = f.read()
+        except (OSError, ValueError):
+            return None
+        entry = (content, meta)
+        self._memory.put(url, entry)
+        return entry
+
+    def _store(self, url, content, meta):
+        self._memory.put(url, (content, meta))
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        body_path, meta_path = self._paths(url)
+        # Write to temporary files first, so readers never see partial entries
+        for path, data in (
+            (body_path, content),
+            (meta_path, json.dumps(meta).encode()),
+        ):
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+    def fetch(self, url, timeout=None, refresh=False):
+        """Returns the content of a URL, from the cache if it is fresh.
+
+        Args:
+            url (str): The URL.
+            timeout (float, optional): The timeout of the request in seconds.
+                Defaults to the timeout of the cache.
+            refresh (bool, optional): Whether to revalidate the entry even if
+                it is fresh. Defaults to False.
+
+        Raises:
+            urllib.error.URLError: If the URL cannot be fetched and is not
+                cached.
+
+        Returns:
+            bytes: The content.
+        """
+        import urllib.error
+        import urllib.request
+
+        entry = self._load(url)
+        if entry is not None and not refresh:
+            if time.time() - entry[1]["fetched"] < self.max_age:
+                return entry[0]
+
+        request = urllib.request.Request(url)
+        if entry is not None:
+            if entry[1].get("etag"):
+                request.add_header("If-None-Match", entry[1]["etag"])
+            if entry[1].get("last_modified"):
+                request.add_header("If-Modified-Since", entry[1]["last_modified"])
+        self.requests += 1
+        try:
+            with urllib.request.urlopen(
+                request, timeout=self.timeout if timeout is None else timeout
+            ) as response:
+                content = response.read()
+                headers = response.headers
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and entry is not None:
+                self._store(url, entry[0], dict(entry[1], fetched=time.time()))
+                return entry[0]
+            if entry is not None:
+                return entry[0]
+            raise
+        except (urllib.error.URLError, OSError):
+            if entry is not None:
+                return entry[0]  # Stale, but better than nothing offline
+            raise
+
+        meta = {
+            "url": url,
+            "fetched": time.time(),
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+        }
+        self._store(url, content, meta)
+        return content
+
+    def fetch_async(self, url, timeout=None, refresh=False):
+        """Fetches a URL on a background thread.
+
+        Concurrent fetches of the same URL share one request.
+
+        Args:
+            url (str): The URL.
+            timeout (float, optional): The timeout of the request in seconds.
+                Defaults to the timeout of the cache.
+            refresh (bool, optional): Whether to revalidate the entry even if
+                it is fresh. Defaults to False.
+
+        Returns:
+            concurrent.futures.Future: The future of the content.
+        """
+        import concurrent.futures
+
+        with self._lock:
+            future = self._inflight.get(url)
+            if future is not None:
+                return future
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=4, thread_name_prefix="mapwidget-fetch"
+                )
+            future = self._executor.submit(self.fetch, url, timeout, refresh)
+            self._inflight[url] = future
+
+        def done(_):
+            with self._lock:
+                self._inflight.pop(url, None)
+
+        future.add_done_callback(done)
+        return future
+
+    def clear(self, disk=True):
+        """Removes every entry from memory and, optionally, from disk."""
+        self._memory.clear()
+        if disk and self.cache_dir and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith((".body", ".json")):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+
+_url_cache = None
+
+
+def get_url_cache():
+    """Returns the URL cache shared by the maps, creating it on first use.
+
+    Returns:
+        URLCache: The cache.
+    """
+    global _url_cache
+    if _url_cache is None:
+        _url_cache = URLCache()
+    return _url_cache
@@ -0,0 +1,506 @@
+"""Module for sequencing the method calls sent to the map frontends."""
+
+import collections
+
+# Methods whose latest call supersedes the earlier ones
+_SUPERSEDING = {"setStyle", "setDrawMode", "drawFeaturesDeleteAll", "resize"}
+
+# Camera methods and the camera properties each one sets
+_CAMERA_PROPS = ("center", "zoom", "bearing", "pitch")
+_CAMERA_SETTERS = {
+    "setCenter": {"center"},
+    "setZoom": {"zoom"},
+    "setBearing": {"bearing"},
+    "setPitch": {"pitch"},
+    "panTo": {"center"},
+    "fitBounds": {"center", "zoom"},
+}
+
+# Calls dropped along with the layer, source or control they apply to
+_LAYER_KEYS = {
+    "layer",
+    "moveLayer",
+    "setPaintProperty",
+    "setLayoutProperty",
+    "setFilter",
+    "pointsChunk",
+    "setPointsStyle",
+}
+_SOURCE_KEYS = {"source", "setSourceTiles", "setFeatureStates"}
+_STYLE_KEYS = _LAYER_KEYS | _SOURCE_KEYS | {"removeLayer", "removeSource"}
+
+
+def _camera_props(entry):
+    method = entry["method"]
+    if method in _CAMERA_SETTERS:
+        props = set(_CAMERA_SETTERS[method])
+        if method == "fitBounds" and len(entry["args"]) > 1:
+            props |= set(entry["args"][1]) & {"bearing", "pitch"}
+        return props
+    if method in ("flyTo", "jumpTo", "easeTo") and entry["args"]:
+        return set(entry["args"][0]) & set(_CAMERA_PROPS)
+    return None
+
+
+def _layer_reference(entry):
+    """Returns the layer a call places another layer below, if any."""
+    method, args = entry["method"], entry["args"]
+    if method in ("addLayer", "moveLayer") and len(args) > 1:
+        return args[1]
+    if method == "addPoints" and len(args) > 2:
+        return args[2]
+    return None
+
+
+def call_key(entry):
+    """Returns the key under which a call is kept in the compacted state.
+
+    A later call with the same key supersedes an earlier one.
+
+    Args:
+        entry (dict): A call entry.
+
+    Returns:
+        tuple: The key.
+    """
+    method = entry["method"]
+    args = entry["args"]
+    if method in _SUPERSEDING:
+        return (method,)
+    if method in ("setPaintProperty", "setLayoutProperty") and len(args) >= 2:
+        return (method, args[0], args[1])
+    if method == "setFilter" and args:
+        return (method, args[0])
+    if method == "addLayer" and args and isinstance(args[0], dict):
+        return ("layer", args[0].get("id"))
+    if method == "addPoints" and args:
+        return ("layer", args[0])
+    if method == "addPointsChunk" and len(args) >= 2:
+        return ("pointsChunk", args[0], args[1]["index"])
+    if method == "setPointsStyle" and args:
+        return (method, args[0])
+    if method == "addCogLayer" and len(args) >= 3:
+        return ("layer", args[2])
+    if method in ("addSource", "addGeoJSONBinary") and args:
+        return ("source", args[0])
+    if method == "setFeatureStates" and len(args) >= 2:
+        header = args[1]
+        states = tuple(header["states"])
+        return (method, args[0], header.get("source_layer"), states, header["key"])
+    if method == "addAnimation" and args:
+        return ("animation", args[0])
+    if method == "setAnimationState" and args:
+        return ("animationState", args[0])
+    if method == "setSourceTiles" and args:
+        return (method, args[0])
+    if method == "addControl" and args:
+        return ("control", args[0])
+    if method == "addDrawControl":
+        return ("control", "draw")
+    if method == "addLegendControl":
+        return ("control", "legend")
+    if method == "addOpacityControl":
+        return ("control", "opacity")
+    if method == "moveLayer" and args:
+        # Moves are compacted by CallState._compact_moves
+        return (method, args[0], entry["seq"])
+    return ("seq", entry["seq"])
+
+
+class CallState:
+    """The minimal set of calls equivalent to every call made on a map.
+
+    Calls are folded in as they are made, so its size follows the state of
+    the map rather than the length of the session:
+
+    - A call supersedes the earlier calls with the same `call_key`, such as
+      paint properties set again or a new draw mode.
+    - A camera call supersedes the earlier camera calls whose properties it
+      all sets again, such as setZoom after flyTo with a zoom.
+    - Removing a layer, source, control or animation drops the call that
+      added it and the calls that modified it. The removal itself is only
+      kept if the layer, source or control came from elsewhere, e.g. the
+      initial style. Otherwise it is kept as a tombstone, which is only
+      replayed to views that have seen the dropped calls.
+    - setStyle drops every earlier layer and source call.
+    - A move of a layer supersedes its earlier moves, unless a kept call in
+      between placed another layer below it, so the moves kept are those
+      that still determine the order of the layers.
+
+    Changes can be undone back to a checkpoint, see `CallLog.checkpoint`.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._camera = {}
+        # Removals that dropped the calls they undo, by key: the sequence
+        # number of the first dropped call and the removal
+        self._tombstones = {}
+        self._journal = None
+
+    def __len__(self):
+        return len(self._calls)
+
+    def entries(self, seq=0):
+        """Returns the calls a view that has seen the calls up to ``seq`` needs.
+
+        Args:
+            seq (int, optional): The last sequence number seen by the view.
+                Defaults to 0, for a new view.
+
+        Returns:
+            list: The call entries after ``seq``, in sequence order, with the
+                removals of what the view has seen but the state dropped.
+        """
+        entries = [entry for entry in self._calls.values() if entry["seq"] > seq]
+        entries.extend(
+            entry
+            for first, entry in self._tombstones.values()
+            if first <= seq < entry["seq"]
+        )
+        return sorted(entries, key=lambda entry: entry["seq"])
+
+    def _remove(self, key, removed):
+        entry = self._calls.pop(key)
+        self._camera.pop(key, None)
+        removed.append((key, entry))
+        return entry
+
+    def _drop(self, kinds, name, removed):
+        """Drop the calls keyed by kinds and name, returning whether any was."""
+        keys = [key for key in self._calls if key[0] in kinds and key[1] == name]
+        for key in keys:
+            self._remove(key, removed)
+        return bool(keys)
+
+    def add(self, entry):
+        """Folds a call into the state.
+
+        Args:
+            entry (dict): The call entry.
+        """
+        removed = []
+        key = call_key(entry)
+        method = entry["method"]
+        args = entry["args"]
+        keep = True
+
+        props = _camera_props(entry)
+        if props is not None:
+            for camera_key, camera_props in list(self._camera.items()):
+                if camera_props <= props:
+                    self._remove(camera_key, removed)
+        elif method == "removeLayer" and args:
+            added = ("layer", args[0]) in self._calls
+            self._drop(_LAYER_KEYS, args[0], removed)
+            keep = not added
+            key = (method, args[0])
+        elif method == "removeSource" and args:
+            added = ("source", args[0]) in self._calls
+            self._drop(_SOURCE_KEYS, args[0], removed)
+            keep = not added
+            key = (method, args[0])
+        elif method == "removeControl" and args:
+            keep = not self._drop({"control"}, args[0], removed)
+            key = (method, args[0])
+        elif method == "removeAnimation" and args:
+            self._drop({"animation", "animationState"}, args[0], removed)
+            keep = False
+            key = (method, args[0])
+        elif method == "removeDrawControl":
+            keep = not self._drop({"control"}, "draw", removed)
+            for other in ("setDrawMode", "drawFeaturesDeleteAll"):
+                if (other,) in self._calls:
+                    self._remove((other,), removed)
+            key = (method,)
+        elif method == "setStyle":
+            for style_key in [k for k in self._calls if k[0] in _STYLE_KEYS]:
+                self._remove(style_key, removed)
+
+        if key in self._calls:
+            self._remove(key, removed)
+        tombstone = None
+        if keep:
+            self._calls[key] = entry
+            if props is not None:
+                self._camera[key] = props
+        elif removed:
+            # Views that saw the dropped calls still need the removal
+            tombstone = (key, self._tombstones.get(key))
+            first = min(old["seq"] for _, old in removed)
+            if tombstone[1] is not None:
+                first = min(first, tombstone[1][0])
+            self._tombstones[key] = (first, entry)
+        if method == "moveLayer" or any(
+            _layer_reference(old) is not None for _, old in removed
+        ):
+            self._compact_moves(removed)
+        if self._journal is not None:
+            self._journal.append(
+                (entry["seq"], key if keep else None, removed, tombstone)
+            )
+
+    def _compact_moves(self, removed):
+        """Drop the moves of layers that no longer affect the layer order.
+
+        The last move of a layer is kept. An earlier move is kept only if a
+        kept call placed another layer below the layer before its next move,
+        since its position in between matters to nothing else. Adding a layer
+        below another one is handled like a move, except that it is always
+        kept.
+
+        Args:
+            removed (list): The (key, entry) pairs removed so far.
+        """
+        entries = sorted(
+            (
+                (key, entry)
+                for key, entry in self._calls.items()
+                if key[0] == "moveLayer" or _layer_reference(entry) is not None
+            ),
+            key=lambda item: item[1]["seq"],
+            reverse=True,
+        )
+        moved = set()
+        referenced = set()
+        for key, entry in entries:
+            # Where a layer was placed only matters if it was not moved since,
+            # or if another layer was placed below it before its next move
+            layer = key[1]
+            placed = layer not in moved or layer in referenced
+            if key[0] == "moveLayer":
+                if not placed:
+                    self._remove(key, removed)
+                    continue
+                moved.add(layer)
+            referenced.discard(layer)
+            if placed and _layer_reference(entry) is not None:
+                referenced.add(_layer_reference(entry))
+
+    def checkpoint(self):
+        """Starts recording the changes, so they can be undone."""
+        if self._journal is None:
+            self._journal = []
+
+    def release(self):
+        """Stops recording the changes."""
+        self._journal = None
+
+    def undo(self, seq):
+        """Undoes the recorded changes of the calls after ``seq``.
+
+        Args:
+            seq (int): The sequence number of the last call to keep.
+        """
+        while self._journal and self._journal[-1][0] > seq:
+            _, key, removed, tombstone = self._journal.pop()
+            if key is not None:
+                self._calls.pop(key, None)
+                self._camera.pop(key, None)
+            if tombstone is not None:
+                tombstone_key, previous = tombstone
+                if previous is None:
+                    self._tombstones.pop(tombstone_key, None)
+                else:
+                    self._tombstones[tombstone_key] = previous
+            for old_key, entry in reversed(removed):
+                self._calls[old_key] = entry
+                props = _camera_props(entry)
+                if props is not None:
+                    self._camera[old_key] = props
+
+
+class CallLog:
+    """A sequenced, bounded log of the JS method calls made on a map.
+
+    Every call gets a monotonically increasing sequence number, so each call
+    only has to cross the wire once and the frontend can acknowledge what it
+    has applied. The last ``max_size`` calls are retained for views catching
+    up from a sequence number, whether or not a view acknowledged them, so
+    the log stays bounded for maps that are never displayed. A compacted
+    `CallState` of every call is kept alongside, which newly displayed views,
+    and views behind the retained calls, replay in one pass.
+
+    Args:
+        max_size (int, optional): The number of calls to retain. Set to None
+            to retain every call. Defaults to 1000.
+    """
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self.seq = 0
+        self.acked_seq = 0
+        self._entries = collections.deque()
+        self.state = CallState()
+        self._checkpoints = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def append(self, method, args=None, kwargs=None, buffers=None):
+        """Append a call to the log.
+
+        Args:
+            method (str): The name of the JS map method.
+            args (list, optional): The positional arguments. Defaults to None.
+            kwargs (dict, optional): The keyword arguments. Defaults to None.
+            buffers (list, optional): Binary buffers sent along with the call.
+                Defaults to None.
+
+        Returns:
+            dict: The sequenced call entry.
+        """
+        self.seq += 1
+        entry = {
+            "seq": self.seq,
+            "method": method,
+            "args": [] if args is None else args,
+            "kwargs": {} if kwargs is None else kwargs,
+        }
+        if buffers:
+            entry["buffers"] = list(buffers)
+        self._entries.append(entry)
+        self.state.add(entry)
+        self._trim()
+        return entry
+
+    def ack(self, seq):
+        """Record that a frontend has applied every call up to ``seq``.
+
+        Args:
+            seq (int): The sequence number of the last applied call.
+        """
+        self.acked_seq = max(self.acked_seq, min(int(seq), self.seq))
+
+    def since(self, seq=0):
+        """Returns the retained calls with a sequence number greater than ``seq``.
+
+        Args:
+            seq (int, optional): The last sequence number already seen by the
+                caller. Defaults to 0.
+
+        Returns:
+            list: The call entries, in order.
+        """
+        return [entry for entry in self._entries if entry["seq"] > seq]
+
+    def replay(self, seq=0):
+        """Returns the calls a view needs to catch up from ``seq``.
+
+        A new view (``seq`` 0) gets the compacted state. A view that has seen
+        some calls gets the retained calls after ``seq``, or, if some of them
+        were trimmed, the compacted state after ``seq`` along with the
+        removals of the calls it has seen that the state dropped.
+
+        Args:
+            seq (int, optional): The last sequence number seen by the view.
+                Defaults to 0.
+
+        Returns:
+            list: The call entries, in order.
+        """
+        if seq > 0 and (not self._entries or self._entries[0]["seq"] <= seq + 1):
+            return self.since(seq)
+        return self.state.entries(seq)
+
+    def checkpoint(self):
+        """Marks a point the log can be rolled back to.
+
+        Checkpoints nest. Call `release` when the calls made since the
+        checkpoint are final.
+
+        Returns:
+            int: The sequence number to pass to `rollback`.
+        """
+        self._checkpoints += 1
+        self.state.checkpoint()
+        return self.seq
+
+    def release(self):
+        """Releases the latest checkpoint."""
+        self._checkpoints -= 1
+        if self._checkpoints == 0:
+            self.state.release()
+
+    def rollback(self, seq):
+        """Remove the calls with a sequence number greater than ``seq``.
+
+        Sequence numbers are not reused, so frontends never confuse a later
+        call with a rolled back one. ``seq`` must come from `checkpoint`.
+
+        Args:
+            seq (int): The sequence number of the last call to keep.
+        """
+        while self._entries and self._entries[-1]["seq"] > seq:
+            self._entries.pop()
+        self.state.undo(seq)
+
+    def _trim(self):
+        if self.max_size is None:
+            return
+        while len(self._entries) > self.max_size:
+            self._entries.popleft()
+
+
+class CallBatch:
+    """The calls collected by a ``Map.batch()`` context.
+
+    The calls are shipped to the frontend as a single message when the
+    outermost batch exits, and are applied there within one animation frame.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    @property
+    def coalesced(self):
+        """int: The number of calls coalesced into the batch."""
+        return len(self.calls)
+
+
+class PendingCall:
+    """An awaitable on the completion of a call in the frontends of a map.
+
+    Returned by the methods of `mapwidget.maplibre.Map` that make calls.
+    Nothing is tracked unless it is awaited, so it costs nothing to ignore.
+    Awaiting it waits for:
+
+    - 'ack': a view to apply the call, e.g. for `add_layer`,
+    - 'moveend': a view to end the camera move started by the call, e.g. for
+      `fly_to`,
+    - 'loaded': the map to load, for `ready`.
+
+    In a notebook, the kernel handles the messages of the frontend between
+    cells, so await it in a task, e.g. ``asyncio.ensure_future``, rather
+    than at the top level of a cell.
+
+    Args:
+        map (mapwidget.maplibre.Map): The map.
+        seq (int): The sequence number of the call, or None for 'loaded'.
+        event (str, optional): 'ack', 'moveend' or 'loaded'. Defaults to
+            'ack'.
+    """
+
+    __slots__ = ("map", "seq", "event")
+
+    def __init__(self, map, seq, event="ack"):
+        self.map = map
+        self.seq = seq
+        self.event = event
+
+    def done(self):
+        """Returns whether the event already happened."""
+        return self.map._event_done(self.event, self.seq)
+
+    def __await__(self):
+        return self.map._wait_for(self.event, self.seq).__await__()
+
+    def __repr__(self):
+        state = "done" if self.done() else "pending"
+        return f"<PendingCall seq={self.seq} event={self.event!r} {state}>"
+
+    def _ipython_display_(self):
+        pass  # Not shown as the output of a notebook cell
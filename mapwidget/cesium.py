@@ -22,4 +22,6 @@ class Map(anywidget.AnyWidget):
     width = traitlets.Unicode("100%").tag(sync=True, o=True)
     height = traitlets.Unicode("600px").tag(sync=True, o=True)
     clicked_latlng = traitlets.List([None, None]).tag(sync=True, o=True)
+    # Milliseconds between view updates while moving; 0 syncs when a move ends
+    sync_interval = traitlets.Int(0).tag(sync=True, o=True)
     altitude = traitlets.Float(0).tag(sync=True, o=True)
@@ -0,0 +1,287 @@
+"""Module for encoding GeoJSON into binary columnar buffers.
+
+Every geometry is stored as a list of parts, every part as a list of rings and
+every ring as a list of vertices, so all geometry types share one layout:
+
+- Point: one part with one ring holding one vertex.
+- MultiPoint and LineString: one part with one ring holding all vertices.
+- MultiLineString and Polygon: one part with one ring per line or ring.
+- MultiPolygon: one part per polygon.
+
+The buffers are ``coords`` (interleaved x, y values), ``geometry_offsets``
+(the first part of each feature), ``part_offsets`` (the first ring of each
+part), ``ring_offsets`` (the first vertex of each ring) and ``types`` (one
+geometry type code per feature). Properties and feature ids stay in the JSON
+header, since they are usually small compared with the coordinates.
+
+Feature states are encoded the same way, as one buffer of feature IDs and one
+buffer of values per state, so that updating the states of many features
+never sends their geometries again.
+"""
+
+import itertools
+
+GEOMETRY_TYPES = [
+    "Point",
+    "MultiPoint",
+    "LineString",
+    "MultiLineString",
+    "Polygon",
+    "MultiPolygon",
+]
+
+BUFFER_NAMES = ["coords", "geometry_offsets", "part_offsets", "ring_offsets", "types"]
+
+
+def _features(data):
+    if data.get("type") == "FeatureCollection":
+        return data.get("features", [])
+    elif data.get("type") == "Feature":
+        return [data]
+    else:
+        return [{"type": "Feature", "geometry": data, "properties": {}}]
+
+
+def _parts(geometry):
+    """Returns the parts of a geometry as lists of rings."""
+    geom_type = geometry["type"]
+    coords = geometry["coordinates"]
+    if geom_type == "Point":
+        return [[[coords]]]
+    elif geom_type in ("MultiPoint", "LineString"):
+        return [[coords]]
+    elif geom_type in ("MultiLineString", "Polygon"):
+        return [coords]
+    elif geom_type == "MultiPolygon":
+        return coords
+    else:
+        raise ValueError(f"Unsupported geometry type: {geom_type}")
+
+
+def encode_geojson(data, dtype="float64"):
+    """Encodes GeoJSON into a JSON header and binary columnar buffers.
+
+    Args:
+        data (dict): A GeoJSON FeatureCollection, Feature or geometry.
+        dtype (str, optional): The coordinate type, 'float64' or 'float32'.
+            float32 halves the payload at the cost of about 1 m of precision.
+            Defaults to 'float64'.
+
+    Raises:
+        ValueError: If dtype is invalid, or a geometry is not one of
+            GEOMETRY_TYPES, e.g. a GeometryCollection.
+
+    Returns:
+        tuple: The header dict and the list of buffers, in the order of
+            BUFFER_NAMES.
+    """
+    import numpy as np
+
+    if dtype not in ("float64", "float32"):
+        raise ValueError("dtype must be 'float64' or 'float32'")
+
+    features = _features(data)
+    types = np.zeros(len(features), dtype=np.uint8)
+    geometry_offsets = [0]
+    part_offsets = [0]
+    ring_offsets = [0]
+    rings = []
+    properties = []
+    ids = []
+
+    for index, feature in enumerate(features):
+        geometry = feature.get("geometry")
+        if geometry:
+            if geometry.get("type") not in GEOMETRY_TYPES:
+                raise ValueError(
+                    f"Feature {index} has a {geometry.get('type')} geometry, which "
+                    "the binary encoding does not support. Add the data with "
+                    "Map.add_source instead."
+                )
+            types[index] = GEOMETRY_TYPES.index(geometry["type"])
+            for part in _parts(geometry):
+                for ring in part:
+                    rings.append(ring)
+                    ring_offsets.append(ring_offsets[-1] + len(ring))
+                part_offsets.append(len(ring_offsets) - 1)
+        else:
+            types[index] = 255
+        geometry_offsets.append(len(part_offsets) - 1)
+        properties.append(feature.get("properties") or {})
+        ids.append(feature.get("id"))
+
+    count = ring_offsets[-1]
+    coords = np.fromiter(
+        itertools.chain.from_iterable(
+            (vertex[0], vertex[1]) for ring in rings for vertex in ring
+        ),
+        dtype=dtype,
+        count=2 * count,
+    )
+
+    header = {
+        "dtype": dtype,
+        "count": len(features),
+        "properties": properties,
+    }
+    if any(feature_id is not None for feature_id in ids):
+        header["ids"] = ids
+
+    buffers = [
+        coords,
+        np.asarray(geometry_offsets, dtype=np.uint32),
+        np.asarray(part_offsets, dtype=np.uint32),
+        np.asarray(ring_offsets, dtype=np.uint32),
+        types,
+    ]
+    return header, [memoryview(buffer) for buffer in buffers]
+
+
+def _values(buffer, typecode):
+    """Returns the values of a binary buffer, in native byte order."""
+    return memoryview(buffer).cast("B").cast(typecode).tolist()
+
+
+def decode_geojson(header, buffers):
+    """Decodes a header and buffers created by `encode_geojson`.
+
+    Decoding does not need numpy, since the frontend also sends features in
+    this layout, e.g. as query results.
+
+    Args:
+        header (dict): The JSON header.
+        buffers (list): The binary buffers, in the order of BUFFER_NAMES.
+
+    Returns:
+        dict: A GeoJSON FeatureCollection.
+    """
+    values = _values(buffers[0], "f" if header["dtype"] == "float32" else "d")
+    coords = [[x, y] for x, y in zip(values[::2], values[1::2])]
+    geometry_offsets = _values(buffers[1], "I")
+    part_offsets = _values(buffers[2], "I")
+    ring_offsets = _values(buffers[3], "I")
+    types = _values(buffers[4], "B")
+    ids = header.get("ids")
+
+    features = []
+    for index in range(header["count"]):
+        geometry = None
+        if types[index] != 255:
+            geom_type = GEOMETRY_TYPES[types[index]]
+            parts = []
+            for part in range(geometry_offsets[index], geometry_offsets[index + 1]):
+                parts.append(
+                    [
+                        coords[ring_offsets[ring] : ring_offsets[ring + 1]]
+                        for ring in range(part_offsets[part], part_offsets[part + 1])
+                    ]
+                )
+            if geom_type == "Point":
+                coordinates = parts[0][0][0]
+            elif geom_type in ("MultiPoint", "LineString"):
+                coordinates = parts[0][0]
+            elif geom_type in ("MultiLineString", "Polygon"):
+                coordinates = parts[0]
+            else:
+                coordinates = parts
+            geometry = {"type": geom_type, "coordinates": coordinates}
+
+        feature = {
+            "type": "Feature",
+            "geometry": geometry,
+            "properties": header["properties"][index],
+        }
+        if ids is not None and ids[index] is not None:
+            feature["id"] = ids[index]
+        features.append(feature)
+
+    return {"type": "FeatureCollection", "features": features}
+
+
+def encode_feature_states(ids, states, dtype="float32"):
+    """Encodes the feature states of many features into binary buffers.
+
+    Args:
+        ids (array-like): The feature IDs, integers or strings.
+        states (dict): The values of each state by state name, as arrays with
+            one value per feature. NaN values remove the state of a feature.
+            Boolean arrays are decoded as booleans.
+        dtype (str, optional): The value type, 'float32' or 'float64'.
+            Defaults to 'float32'.
+
+    Returns:
+        tuple: The header dict and the list of buffers: the IDs, unless they
+            are strings and held in the header, then one buffer per state.
+    """
+    import numpy as np
+
+    if dtype not in ("float64", "float32"):
+        raise ValueError("dtype must be 'float64' or 'float32'")
+
+    ids = np.asarray(ids)
+    if ids.ndim != 1:
+        raise ValueError("ids must be a 1D array")
+    header = {"count": len(ids), "dtype": dtype, "states": list(states)}
+    buffers = []
+    if ids.dtype.kind in "iu":
+        if len(ids) == 0 or (
+            ids.min() >= np.iinfo(np.int32).min and ids.max() <= np.iinfo(np.int32).max
+        ):
+            header["id_dtype"] = "int32"
+        else:
+            # JS numbers hold integers exactly up to 2**53
+            header["id_dtype"] = "float64"
+        buffers.append(np.ascontiguousarray(ids, dtype=header["id_dtype"]))
+    else:
+        header["ids"] = ids.astype(str).tolist()
+
+    booleans = []
+    for name, values in states.items():
+        values = np.asarray(values)
+        if values.shape != ids.shape:
+            raise ValueError(f"State {name} must have one value per feature")
+        if values.dtype.kind == "b":
+            booleans.append(name)
+        buffers.append(np.ascontiguousarray(values, dtype=dtype))
+    if booleans:
+        header["booleans"] = booleans
+    return header, [memoryview(buffer) for buffer in buffers]
+
+
+def decode_feature_states(header, buffers):
+    """Decodes the feature states encoded by `encode_feature_states`.
+
+    Args:
+        header (dict): The header dict.
+        buffers (list): The list of buffers.
+
+    Returns:
+        dict: The states of each feature by feature ID. Removed states are
+            None.
+    """
+    import numpy as np
+
+    buffers = list(buffers)
+    if "ids" in header:
+        ids = header["ids"]
+    else:
+        ids = np.frombuffer(buffers.pop(0), dtype=header["id_dtype"]).tolist()
+        if header["id_dtype"] == "float64":
+            ids = [int(feature_id) for feature_id in ids]
+    booleans = set(header.get("booleans", []))
+    columns = [
+        np.frombuffer(buffer, dtype=header["dtype"]).tolist() for buffer in buffers
+    ]
+    result = {}
+    for index, feature_id in enumerate(ids):
+        state = {}
+        for name, values in zip(header["states"], columns):
+            value = values[index]
+            if value != value:
+                state[name] = None
+            elif name in booleans:
+                state[name] = bool(value)
+            else:
+                state[name] = value
+        result[feature_id] = state
+    return result
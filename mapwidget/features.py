@@ -0,0 +1,119 @@
+"""Module for kernel-side stores of features edited in the frontend."""
+
+import collections
+
+
+class FeatureStore:
+    """GeoJSON features keyed by feature ID, updated by feature operations.
+
+    The frontend sends the changes of its features as operations on the
+    features they touch instead of the whole collection:
+
+    - {'op': 'upsert', 'feature': feature} adds or replaces a feature.
+    - {'op': 'delete', 'id': feature_id} removes a feature.
+    - {'op': 'clear'} removes every feature.
+
+    Each feature is held once, and the FeatureCollection is only built when
+    it is requested.
+
+    Args:
+        features (list, optional): Initial features, each with an 'id'.
+            Defaults to None.
+    """
+
+    def __init__(self, features=None):
+        self._features = collections.OrderedDict()
+        self.version = 0
+        for feature in features or []:
+            self.upsert(feature)
+
+    def __len__(self):
+        return len(self._features)
+
+    def __contains__(self, feature_id):
+        return feature_id in self._features
+
+    def __getitem__(self, feature_id):
+        return self._features[feature_id]
+
+    def __iter__(self):
+        return iter(self._features.values())
+
+    @property
+    def ids(self):
+        """list: The feature IDs, in insertion order."""
+        return list(self._features)
+
+    def get(self, feature_id, default=None):
+        """Returns the feature with the given ID, or default."""
+        return self._features.get(feature_id, default)
+
+    def upsert(self, feature):
+        """Adds a feature or replaces the feature with the same ID.
+
+        Args:
+            feature (dict): A GeoJSON Feature with an 'id'.
+
+        Raises:
+            ValueError: If the feature has no ID.
+        """
+        if feature.get("id") is None:
+            raise ValueError("Features in a FeatureStore must have an 'id'")
+        self._features[feature["id"]] = feature
+        self.version += 1
+
+    def delete(self, feature_id):
+        """Removes a feature.
+
+        Args:
+            feature_id (str | int): The ID of the feature.
+
+        Returns:
+            dict: The removed feature, or None if there was no such feature.
+        """
+        feature = self._features.pop(feature_id, None)
+        if feature is not None:
+            self.version += 1
+        return feature
+
+    def clear(self):
+        """Removes every feature."""
+        self._features.clear()
+        self.version += 1
+
+    def apply(self, ops):
+        """Applies feature operations sent by the frontend.
+
+        Args:
+            ops (list): The operations, see `FeatureStore`.
+
+        Returns:
+            tuple: The list of upserted features and the list of deleted
+                features.
+        """
+        upserted = []
+        deleted = []
+        for op in ops:
+            if op["op"] == "upsert":
+                self.upsert(op["feature"])
+                upserted.append(op["feature"])
+            elif op["op"] == "delete":
+                feature = self.delete(op["id"])
+                if feature is not None:
+                    deleted.append(feature)
+            elif op["op"] == "clear":
+                deleted.extend(self._features.values())
+                self.clear()
+            else:
+                raise ValueError(f"Unsupported feature operation: {op['op']}")
+        return upserted, deleted
+
+    def to_geojson(self):
+        """Returns the features as a GeoJSON FeatureCollection.
+
+        The collection refers to the stored features rather than copies.
+
+        Returns:
+            dict: The FeatureCollection.
+        """
+        return {"type": "FeatureCollection", "features": list(self._features.values())}
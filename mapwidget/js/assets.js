@@ -0,0 +1,88 @@
+// The asset loader shared by the map frontends. mapwidget.assets.map_esm
+// inlines it at the top of the ESM of each map.
+
+// Assets loaded on the page, shared by every map: asset name -> Promise
+const loadedAssets =
+    globalThis.__mapwidgetAssets || (globalThis.__mapwidgetAssets = new Map());
+
+// Fetch an asset served by the kernel and return a Blob URL for it
+function fetchKernelAsset(model, name) {
+    return new Promise((resolve, reject) => {
+        const type = name.endsWith(".css") ? "text/css" : "text/javascript";
+        function onMessage(msg, buffers) {
+            if (msg.type !== "asset_response" || msg.name !== name) {
+                return;
+            }
+            model.off("msg:custom", onMessage);
+            if (msg.error) {
+                reject(new Error(msg.error));
+            } else {
+                resolve(URL.createObjectURL(new Blob([buffers[0]], { type })));
+            }
+        }
+        model.on("msg:custom", onMessage);
+        model.send({ type: "asset_request", name });
+    });
+}
+
+// Insert a stylesheet or script into the page, or import an ES module, and
+// wait until it is loaded
+function insertAsset(name, source, url) {
+    if (source.module) {
+        return import(url);
+    }
+    return new Promise((resolve, reject) => {
+        let element;
+        if (name.endsWith(".css")) {
+            element = Object.assign(document.createElement("link"), {
+                rel: "stylesheet",
+                href: url,
+            });
+            document.head.appendChild(element);
+        } else {
+            element = Object.assign(document.createElement("script"), {
+                src: url,
+            });
+            document.body.appendChild(element);
+        }
+        element.addEventListener("load", resolve);
+        element.addEventListener("error", () =>
+            reject(new Error(`Failed to load ${url}`))
+        );
+    });
+}
+
+// Load an asset once per page, from the kernel when it serves the asset and
+// from its CDN otherwise or if the kernel cannot serve it
+function loadAsset(model, name) {
+    if (!loadedAssets.has(name)) {
+        const source = model.get("_assets")[name];
+        let promise;
+        if (source.local) {
+            promise = fetchKernelAsset(model, name)
+                .then((url) => insertAsset(name, source, url))
+                .catch((err) => {
+                    console.warn(`Loading ${name} from ${source.url}:`, err);
+                    return insertAsset(name, source, source.url);
+                });
+        } else {
+            promise = insertAsset(name, source, source.url);
+        }
+        // Let a later map retry an asset that failed to load
+        promise.catch(() => loadedAssets.delete(name));
+        loadedAssets.set(name, promise);
+    }
+    return loadedAssets.get(name);
+}
+
+// Load several assets in parallel
+function loadAssets(model, names) {
+    return Promise.all(names.map((name) => loadAsset(model, name)));
+}
+
+// Report whether the assets were served by the kernel, CDNs or both
+function startupMode(model) {
+    const sources = Object.values(model.get("_assets"));
+    const local = sources.filter((source) => source.local).length;
+    return local === 0 ? "cdn" : local === sources.length ? "local" : "auto";
+}
@@ -11,9 +11,12 @@ function loadScript(src) {
     });
 }
 
-await loadScript(
-    "https://cesium.com/downloads/cesiumjs/releases/1.103/Build/Cesium/Cesium.js"
-);
+// Load CesiumJS once per page
+if (typeof Cesium === "undefined") {
+    await loadScript(
+        "https://cesium.com/downloads/cesiumjs/releases/1.103/Build/Cesium/Cesium.js"
+    );
+}
 
 export function render(view) {
     // Header
@@ -50,7 +53,13 @@ export function render(view) {
         },
     });
 
-    viewer.camera.moveEnd.addEventListener(function () {
+    // Sync the camera once per move, plus every sync_interval ms while it
+    // moves when it is set. Unchanged views are not sent.
+    var lastView = null;
+    var lastSyncTime = 0;
+
+    function syncView() {
+        lastSyncTime = performance.now();
         var cameraPosition = viewer.camera.position;
         var center =
             Cesium.Ellipsoid.WGS84.cartesianToCartographic(cameraPosition);
@@ -58,9 +67,23 @@ export function render(view) {
         var lat = Cesium.Math.toDegrees(center.latitude);
         var height = viewer.camera.positionCartographic.height;
         var zoomLevel = 18 - Math.log2(height);
+        var key = JSON.stringify([lat, lon, zoomLevel]);
+        if (key === lastView) {
+            return;
+        }
+        lastView = key;
         view.model.set("center", [lat, lon]);
         view.model.set("zoom", zoomLevel);
         view.model.save_changes();
+    }
+
+    viewer.camera.moveEnd.addEventListener(syncView);
+
+    viewer.scene.postRender.addEventListener(function () {
+        var interval = view.model.get("sync_interval");
+        if (interval > 0 && performance.now() - lastSyncTime >= interval) {
+            syncView();
+        }
     });
 
     // Footer
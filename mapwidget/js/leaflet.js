@@ -1,6 +1,10 @@
-// import ESM version of Leaflet
-import * as L from "https://unpkg.com/leaflet@1.9.3/dist/leaflet-src.esm.js";
-export function render(view) {
+export async function render(view) {
+    // Load the stylesheet and the ESM version of Leaflet in parallel, once
+    // per page
+    const startTime = performance.now();
+    const [, L] = await loadAssets(view.model, ["leaflet.css", "leaflet.js"]);
+    const assetsMs = performance.now() - startTime;
+
     // Header
     let center = view.model.get("center");
     let zoom = view.model.get("zoom");
@@ -14,6 +18,14 @@ export function render(view) {
     // Map content
 
     const map = L.map(container).setView(center, zoom);
+    map.whenReady(() => {
+        view.model.send({
+            type: "startup",
+            mode: startupMode(view.model),
+            assets_ms: assetsMs,
+            load_ms: performance.now() - startTime - assetsMs,
+        });
+    });
     L.tileLayer("https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png", {
         attribution:
             'Map data &copy; <a href="https://www.openstreetmap.org/">OpenStreetMap</a> contributors',
@@ -26,33 +38,44 @@ export function render(view) {
         view.model.save_changes();
     });
 
-    map.on("moveend", function (e) {
-        let center = map.getCenter();
-        view.model.set("center", [center.lat, center.lng]);
-        let bbox = map.getBounds();
-        let bounds = [
-            bbox._southWest.lng,
-            bbox._southWest.lat,
-            bbox._northEast.lng,
-            bbox._northEast.lat,
-        ];
-        view.model.set("bounds", bounds);
-        view.model.save_changes();
-    });
+    // Sync the view once per gesture, plus every sync_interval ms while the
+    // map moves when it is set. Unchanged views are not sent.
+    let lastView = null;
+    let lastSyncTime = 0;
 
-    map.on("zoomend", function (e) {
+    function syncView() {
+        lastSyncTime = performance.now();
         let center = map.getCenter();
-        view.model.set("center", [center.lat, center.lng]);
-        view.model.set("zoom", map.getZoom());
         let bbox = map.getBounds();
-        let bounds = [
-            bbox._southWest.lng,
-            bbox._southWest.lat,
-            bbox._northEast.lng,
-            bbox._northEast.lat,
-        ];
-        view.model.set("bounds", bounds);
+        let state = {
+            center: [center.lat, center.lng],
+            zoom: map.getZoom(),
+            bounds: [
+                bbox._southWest.lng,
+                bbox._southWest.lat,
+                bbox._northEast.lng,
+                bbox._northEast.lat,
+            ],
+        };
+        let key = JSON.stringify(state);
+        if (key === lastView) {
+            return;
+        }
+        lastView = key;
+        view.model.set("center", state.center);
+        view.model.set("zoom", state.zoom);
+        view.model.set("bounds", state.bounds);
         view.model.save_changes();
+    }
+
+    // moveend also fires at the end of zooming
+    map.on("moveend", syncView);
+
+    map.on("move", function (e) {
+        let interval = view.model.get("sync_interval");
+        if (interval > 0 && performance.now() - lastSyncTime >= interval) {
+            syncView();
+        }
     });
 
     view.model.on("msg:custom", (msg) => {
@@ -1,23 +1,420 @@
+// Kernel tile request functions of every map on the page, keyed by tile token
+const kernelTileClients =
+    globalThis.__mapwidgetTileClients ||
+    (globalThis.__mapwidgetTileClients = new Map());
+
+// Handle mapwidget://<token>/<source id>/<z>/<x>/<y> tile URLs
+function kernelTileProtocol(params, abortController) {
+    const path = params.url.replace("mapwidget://", "").split("?")[0];
+    const [token, sourceId, z, x, y] = path.split("/");
+    const requestTile = kernelTileClients.get(token);
+    if (!requestTile) {
+        return Promise.reject(new Error(`No map found for ${params.url}`));
+    }
+    return requestTile(decodeURIComponent(sourceId), +z, +x, +y, abortController);
+}
+
+// Linked maps of the page: the views of each link group, and whether a view
+// is moving the other views of its group, so they do not echo the move
+const linkState =
+    globalThis.__mapwidgetLinks ||
+    (globalThis.__mapwidgetLinks = { groups: new Map(), driving: false });
+
 function render({ model, el }) {
-    // Inject CSS if not already loaded
-    if (!document.getElementById("maplibre-css")) {
-        const link = document.createElement("link");
-        link.id = "maplibre-css";
-        link.rel = "stylesheet";
-        link.href = "https://unpkg.com/maplibre-gl@5.5.0/dist/maplibre-gl.css";
-        document.head.appendChild(link);
+    // Functions run when the view is removed
+    const cleanups = [];
+
+    // Startup timings: loading the assets, then loading the map
+    const startTime = performance.now();
+    let assetsMs = 0;
+
+    // Create a typed array over a binary buffer received from the kernel
+    function typedArray(Type, view) {
+        if (view.byteOffset % Type.BYTES_PER_ELEMENT === 0) {
+            return new Type(
+                view.buffer,
+                view.byteOffset,
+                view.byteLength / Type.BYTES_PER_ELEMENT
+            );
+        }
+        // Unaligned buffers need a copy
+        return new Type(
+            view.buffer.slice(view.byteOffset, view.byteOffset + view.byteLength)
+        );
     }
 
-    function updateModel(model, map) {
-        const viewState = {
-            center: map.getCenter(),
-            zoom: map.getZoom(),
-            bounds: map.getBounds(),
-            bearing: map.getBearing(),
-            pitch: map.getPitch(),
+    const GEOMETRY_TYPES = [
+        "Point",
+        "MultiPoint",
+        "LineString",
+        "MultiLineString",
+        "Polygon",
+        "MultiPolygon",
+    ];
+
+    // Rebuild GeoJSON from the binary columnar buffers of mapwidget.encoding
+    function decodeGeoJSON(header, buffers) {
+        const CoordArray =
+            header.dtype === "float32" ? Float32Array : Float64Array;
+        const coords = typedArray(CoordArray, buffers[0]);
+        const geometryOffsets = typedArray(Uint32Array, buffers[1]);
+        const partOffsets = typedArray(Uint32Array, buffers[2]);
+        const ringOffsets = typedArray(Uint32Array, buffers[3]);
+        const types = typedArray(Uint8Array, buffers[4]);
+
+        const features = new Array(header.count);
+        for (let i = 0; i < header.count; i++) {
+            let geometry = null;
+            if (types[i] !== 255) {
+                const type = GEOMETRY_TYPES[types[i]];
+                const parts = [];
+                for (let p = geometryOffsets[i]; p < geometryOffsets[i + 1]; p++) {
+                    const rings = [];
+                    for (let r = partOffsets[p]; r < partOffsets[p + 1]; r++) {
+                        const ring = new Array(ringOffsets[r + 1] - ringOffsets[r]);
+                        for (let v = ringOffsets[r], k = 0; v < ringOffsets[r + 1]; v++, k++) {
+                            ring[k] = [coords[2 * v], coords[2 * v + 1]];
+                        }
+                        rings.push(ring);
+                    }
+                    parts.push(rings);
+                }
+                let coordinates;
+                if (type === "Point") {
+                    coordinates = parts[0][0][0];
+                } else if (type === "MultiPoint" || type === "LineString") {
+                    coordinates = parts[0][0];
+                } else if (type === "MultiLineString" || type === "Polygon") {
+                    coordinates = parts[0];
+                } else {
+                    coordinates = parts;
+                }
+                geometry = { type, coordinates };
+            }
+            const feature = {
+                type: "Feature",
+                geometry,
+                properties: header.properties[i],
+            };
+            if (header.ids && header.ids[i] !== null) {
+                feature.id = header.ids[i];
+            }
+            features[i] = feature;
+        }
+        return { type: "FeatureCollection", features };
+    }
+
+    // Encode features into the binary columnar layout of mapwidget.encoding,
+    // the inverse of decodeGeoJSON
+    function encodeGeoJSON(features) {
+        const coords = [];
+        const geometryOffsets = [0];
+        const partOffsets = [0];
+        const ringOffsets = [0];
+        const types = new Uint8Array(features.length);
+        const ids = [];
+        features.forEach((feature, i) => {
+            const geometry = feature.geometry;
+            const type = geometry ? GEOMETRY_TYPES.indexOf(geometry.type) : -1;
+            if (type < 0) {
+                types[i] = 255; // No geometry, or a GeometryCollection
+            } else {
+                types[i] = type;
+                const c = geometry.coordinates;
+                let parts;
+                if (geometry.type === "Point") {
+                    parts = [[[c]]];
+                } else if (geometry.type === "MultiPoint" || geometry.type === "LineString") {
+                    parts = [[c]];
+                } else if (geometry.type === "MultiLineString" || geometry.type === "Polygon") {
+                    parts = [c];
+                } else {
+                    parts = c;
+                }
+                parts.forEach((part) => {
+                    part.forEach((ring) => {
+                        ring.forEach((vertex) => coords.push(vertex[0], vertex[1]));
+                        ringOffsets.push(ringOffsets[ringOffsets.length - 1] + ring.length);
+                    });
+                    partOffsets.push(ringOffsets.length - 1);
+                });
+            }
+            geometryOffsets.push(partOffsets.length - 1);
+            ids.push(feature.id === undefined ? null : feature.id);
+        });
+        const header = {
+            dtype: "float64",
+            count: features.length,
+            properties: features.map((feature) => feature.properties || {}),
+        };
+        if (ids.some((id) => id !== null)) {
+            header.ids = ids;
+        }
+        const buffers = [
+            new Float64Array(coords),
+            new Uint32Array(geometryOffsets),
+            new Uint32Array(partOffsets),
+            new Uint32Array(ringOffsets),
+            types,
+        ].map((array) => array.buffer);
+        return { header, buffers };
+    }
+
+    // Shaders of the point layers of Map.add_points. MapLibre provides the
+    // projection prelude, so the points follow the mercator and globe
+    // projections alike.
+    const POINTS_VERTEX_SHADER = `
+in vec2 a_pos;
+in float a_value;
+uniform float u_radius;
+uniform float u_vmin;
+uniform float u_vmax;
+uniform vec4 u_colors[8];
+uniform int u_ncolors;
+uniform bool u_discrete;
+out vec4 v_color;
+void main() {
+    gl_Position = projectTile(a_pos);
+    gl_PointSize = 2.0 * u_radius;
+    if (u_discrete) {
+        v_color = u_colors[int(mod(a_value, float(u_ncolors)))];
+    } else {
+        float range = u_vmax - u_vmin;
+        float t = range > 0.0 ? clamp((a_value - u_vmin) / range, 0.0, 1.0) : 0.0;
+        float scaled = t * float(u_ncolors - 1);
+        int i = int(floor(scaled));
+        int j = min(i + 1, u_ncolors - 1);
+        v_color = mix(u_colors[i], u_colors[j], scaled - float(i));
+    }
+}`;
+
+    const POINTS_FRAGMENT_SHADER = `#version 300 es
+precision highp float;
+in vec4 v_color;
+uniform float u_opacity;
+out highp vec4 fragColor;
+void main() {
+    vec2 p = 2.0 * gl_PointCoord - 1.0;
+    if (dot(p, p) > 1.0) {
+        discard;
+    }
+    float alpha = v_color.a * u_opacity;
+    fragColor = vec4(v_color.rgb * alpha, alpha);
+}`;
+
+    // Convert fixed-point degrees to Web Mercator coordinates in [0, 1]
+    function mercatorPositions(lngs, lats, scale) {
+        const positions = new Float32Array(lngs.length * 2);
+        const toRadians = Math.PI / 180 / scale;
+        for (let i = 0; i < lngs.length; i++) {
+            const lat = lats[i] * toRadians;
+            positions[2 * i] = 0.5 + lngs[i] / scale / 360;
+            positions[2 * i + 1] =
+                0.5 - Math.log(Math.tan(Math.PI / 4 + lat / 2)) / (2 * Math.PI);
+        }
+        return positions;
+    }
+
+    function compileProgram(gl, vertexSource, fragmentSource) {
+        const program = gl.createProgram();
+        [
+            [gl.VERTEX_SHADER, vertexSource],
+            [gl.FRAGMENT_SHADER, fragmentSource],
+        ].forEach(([type, source]) => {
+            const shader = gl.createShader(type);
+            gl.shaderSource(shader, source);
+            gl.compileShader(shader);
+            if (!gl.getShaderParameter(shader, gl.COMPILE_STATUS)) {
+                throw new Error(gl.getShaderInfoLog(shader));
+            }
+            gl.attachShader(program, shader);
+        });
+        gl.linkProgram(program);
+        if (!gl.getProgramParameter(program, gl.LINK_STATUS)) {
+            throw new Error(gl.getProgramInfoLog(program));
+        }
+        return program;
+    }
+
+    // A custom layer drawing the points of Map.add_points as GL points.
+    // Chunks are decoded as they arrive and uploaded to the GPU once, on the
+    // next frame. onReady is called after the frame drawing the last chunk.
+    function createPointsLayer(id, style, onReady) {
+        const chunks = [];
+        const programs = new Map();
+        let map = null;
+        let total = null;
+        let received = 0;
+        let decodeMs = 0;
+        let uploadMs = 0;
+        let firstChunkTime = null;
+        let reported = false;
+
+        function program(gl, shaderData) {
+            // MapLibre compiles one shader variant per projection
+            let entry = programs.get(shaderData.variantName);
+            if (!entry) {
+                const vertexSource =
+                    "#version 300 es\n" +
+                    shaderData.vertexShaderPrelude +
+                    "\n" +
+                    shaderData.define +
+                    "\n" +
+                    POINTS_VERTEX_SHADER;
+                const glProgram = compileProgram(gl, vertexSource, POINTS_FRAGMENT_SHADER);
+                entry = { program: glProgram, locations: {} };
+                [
+                    "u_projection_fallback_matrix",
+                    "u_projection_matrix",
+                    "u_projection_tile_mercator_coords",
+                    "u_projection_clipping_plane",
+                    "u_projection_transition",
+                    "u_radius",
+                    "u_opacity",
+                    "u_vmin",
+                    "u_vmax",
+                    "u_colors",
+                    "u_ncolors",
+                    "u_discrete",
+                ].forEach((name) => {
+                    entry.locations[name] = gl.getUniformLocation(glProgram, name);
+                });
+                entry.a_pos = gl.getAttribLocation(glProgram, "a_pos");
+                entry.a_value = gl.getAttribLocation(glProgram, "a_value");
+                programs.set(shaderData.variantName, entry);
+            }
+            return entry;
+        }
+
+        function upload(gl, chunk) {
+            const start = performance.now();
+            chunk.positionBuffer = gl.createBuffer();
+            gl.bindBuffer(gl.ARRAY_BUFFER, chunk.positionBuffer);
+            gl.bufferData(gl.ARRAY_BUFFER, chunk.positions, gl.STATIC_DRAW);
+            chunk.positions = null;
+            chunk.valueBuffers = {};
+            Object.entries(chunk.columns).forEach(([name, values]) => {
+                const buffer = gl.createBuffer();
+                gl.bindBuffer(gl.ARRAY_BUFFER, buffer);
+                gl.bufferData(gl.ARRAY_BUFFER, values, gl.STATIC_DRAW);
+                chunk.valueBuffers[name] = buffer;
+            });
+            chunk.columns = null;
+            uploadMs += performance.now() - start;
+        }
+
+        function deleteBuffers(gl, chunk) {
+            if (chunk.positionBuffer) {
+                gl.deleteBuffer(chunk.positionBuffer);
+                Object.values(chunk.valueBuffers).forEach((b) => gl.deleteBuffer(b));
+            }
+        }
+
+        return {
+            id,
+            type: "custom",
+            renderingMode: "2d",
+
+            onAdd(m) {
+                map = m;
+            },
+
+            onRemove(m, gl) {
+                chunks.forEach((chunk) => deleteBuffers(gl, chunk));
+                programs.forEach((entry) => gl.deleteProgram(entry.program));
+                programs.clear();
+            },
+
+            addChunk(header, buffers) {
+                const start = performance.now();
+                if (firstChunkTime === null) {
+                    firstChunkTime = start;
+                }
+                const lngs = typedArray(Int32Array, buffers[0]);
+                const lats = typedArray(Int32Array, buffers[1]);
+                const columns = {};
+                header.columns.forEach((name, i) => {
+                    columns[name] = typedArray(Float32Array, buffers[i + 2]);
+                });
+                chunks[header.index] = {
+                    count: header.count,
+                    positions: mercatorPositions(lngs, lats, header.scale),
+                    columns,
+                };
+                received++;
+                if (header.last) {
+                    total = header.index + 1;
+                }
+                decodeMs += performance.now() - start;
+                if (map) {
+                    map.triggerRepaint();
+                }
+            },
+
+            setStyle(newStyle) {
+                style = newStyle;
+                if (map) {
+                    map.triggerRepaint();
+                }
+            },
+
+            render(gl, args) {
+                const entry = program(gl, args.shaderData);
+                const loc = entry.locations;
+                const projection = args.defaultProjectionData;
+                gl.useProgram(entry.program);
+                gl.uniformMatrix4fv(loc.u_projection_fallback_matrix, false, projection.fallbackMatrix);
+                gl.uniformMatrix4fv(loc.u_projection_matrix, false, projection.mainMatrix);
+                gl.uniform4f(loc.u_projection_tile_mercator_coords, ...projection.tileMercatorCoords);
+                gl.uniform4f(loc.u_projection_clipping_plane, ...projection.clippingPlane);
+                gl.uniform1f(loc.u_projection_transition, projection.projectionTransition);
+                gl.uniform1f(loc.u_radius, style.radius * window.devicePixelRatio);
+                gl.uniform1f(loc.u_opacity, style.opacity);
+                gl.uniform1f(loc.u_vmin, style.vmin);
+                gl.uniform1f(loc.u_vmax, style.vmax);
+                gl.uniform4fv(loc.u_colors, style.colors.flat());
+                gl.uniform1i(loc.u_ncolors, style.colors.length);
+                gl.uniform1i(loc.u_discrete, style.discrete ? 1 : 0);
+
+                gl.enable(gl.BLEND);
+                gl.blendFunc(gl.ONE, gl.ONE_MINUS_SRC_ALPHA);
+                gl.enableVertexAttribArray(entry.a_pos);
+                chunks.forEach((chunk) => {
+                    if (!chunk) {
+                        return;
+                    }
+                    if (!chunk.positionBuffer) {
+                        upload(gl, chunk);
+                    }
+                    gl.bindBuffer(gl.ARRAY_BUFFER, chunk.positionBuffer);
+                    gl.vertexAttribPointer(entry.a_pos, 2, gl.FLOAT, false, 0, 0);
+                    const valueBuffer = style.value && chunk.valueBuffers[style.value];
+                    if (valueBuffer && entry.a_value >= 0) {
+                        gl.enableVertexAttribArray(entry.a_value);
+                        gl.bindBuffer(gl.ARRAY_BUFFER, valueBuffer);
+                        gl.vertexAttribPointer(entry.a_value, 1, gl.FLOAT, false, 0, 0);
+                    } else if (entry.a_value >= 0) {
+                        gl.disableVertexAttribArray(entry.a_value);
+                        gl.vertexAttrib1f(entry.a_value, 0);
+                    }
+                    gl.drawArrays(gl.POINTS, 0, chunk.count);
+                });
+                if (entry.a_value >= 0) {
+                    gl.disableVertexAttribArray(entry.a_value);
+                }
+
+                if (!reported && total !== null && received === total) {
+                    reported = true;
+                    const timing = {
+                        decode_ms: decodeMs,
+                        upload_ms: uploadMs,
+                        render_ms: performance.now() - firstChunkTime,
+                    };
+                    // Report outside of the render loop of the map
+                    setTimeout(() => onReady(timing), 0);
+                }
+            },
         };
-        model.set("view_state", viewState);
-        model.save_changes();
     }
 
     // Function to load MapboxDraw if not available
@@ -27,38 +424,25 @@ function render({ model, el }) {
             return;
         }
 
-        // Inject mapbox-gl-draw CSS if not already loaded
-        if (!document.getElementById("mapbox-gl-draw-css")) {
-            const link = document.createElement("link");
-            link.id = "mapbox-gl-draw-css";
-            link.rel = "stylesheet";
-            link.href =
-                "https://www.unpkg.com/@mapbox/mapbox-gl-draw@1.5.0/dist/mapbox-gl-draw.css";
-            document.head.appendChild(link);
-        }
-
-        const script = document.createElement("script");
-        script.src =
-            "https://www.unpkg.com/@mapbox/mapbox-gl-draw@1.5.0/dist/mapbox-gl-draw.js";
-        script.onload = () => {
-            // Patch MapboxDraw constants immediately after loading
-            if (MapboxDraw.constants && MapboxDraw.constants.classes) {
-                MapboxDraw.constants.classes.CANVAS = "maplibregl-canvas";
-                MapboxDraw.constants.classes.CONTROL_BASE = "maplibregl-ctrl";
-                MapboxDraw.constants.classes.CONTROL_PREFIX =
-                    "maplibregl-ctrl-";
-                MapboxDraw.constants.classes.CONTROL_GROUP =
-                    "maplibregl-ctrl-group";
-                MapboxDraw.constants.classes.ATTRIBUTION =
-                    "maplibregl-ctrl-attrib";
-            }
-            callback();
-        };
-        script.onerror = () => {
-            console.error("Failed to load MapboxDraw library");
-            callback(); // Still call callback to prevent hanging
-        };
-        document.body.appendChild(script);
+        loadAssets(model, ["mapbox-gl-draw.css", "mapbox-gl-draw.js"])
+            .then(() => {
+                // Patch MapboxDraw constants immediately after loading
+                if (MapboxDraw.constants && MapboxDraw.constants.classes) {
+                    MapboxDraw.constants.classes.CANVAS = "maplibregl-canvas";
+                    MapboxDraw.constants.classes.CONTROL_BASE =
+                        "maplibregl-ctrl";
+                    MapboxDraw.constants.classes.CONTROL_PREFIX =
+                        "maplibregl-ctrl-";
+                    MapboxDraw.constants.classes.CONTROL_GROUP =
+                        "maplibregl-ctrl-group";
+                    MapboxDraw.constants.classes.ATTRIBUTION =
+                        "maplibregl-ctrl-attrib";
+                }
+            })
+            .catch(() => {
+                console.error("Failed to load MapboxDraw library");
+            })
+            .finally(callback); // Still call callback to prevent hanging
     }
 
     // Function to load MapboxLegend if not available
@@ -68,27 +452,11 @@ function render({ model, el }) {
             return;
         }
 
-        // Inject mapbox-gl-legend CSS if not already loaded
-        if (!document.getElementById("mapbox-gl-legend-css")) {
-            const link = document.createElement("link");
-            link.id = "mapbox-gl-legend-css";
-            link.rel = "stylesheet";
-            link.href =
-                "https://watergis.github.io/mapbox-gl-legend/mapbox-gl-legend.css";
-            document.head.appendChild(link);
-        }
-
-        const script = document.createElement("script");
-        script.src =
-            "https://watergis.github.io/mapbox-gl-legend/mapbox-gl-legend.js";
-        script.onload = () => {
-            callback();
-        };
-        script.onerror = () => {
-            console.error("Failed to load MapboxLegend library");
-            callback(); // Still call callback to prevent hanging
-        };
-        document.body.appendChild(script);
+        loadAssets(model, ["mapbox-gl-legend.css", "mapbox-gl-legend.js"])
+            .catch(() => {
+                console.error("Failed to load MapboxLegend library");
+            })
+            .finally(callback); // Still call callback to prevent hanging
     }
 
     // Function to load MapLibre GL Opacity if not available
@@ -98,27 +466,11 @@ function render({ model, el }) {
             return;
         }
 
-        // Inject maplibre-gl-opacity CSS if not already loaded
-        if (!document.getElementById("maplibre-gl-opacity-css")) {
-            const link = document.createElement("link");
-            link.id = "maplibre-gl-opacity-css";
-            link.rel = "stylesheet";
-            link.href =
-                "https://www.unpkg.com/maplibre-gl-opacity@1.8.0/build/maplibre-gl-opacity.css";
-            document.head.appendChild(link);
-        }
-
-        const script = document.createElement("script");
-        script.src =
-            "https://www.unpkg.com/maplibre-gl-opacity@1.8.0/build/maplibre-gl-opacity.umd.js";
-        script.onload = () => {
-            callback();
-        };
-        script.onerror = () => {
-            console.error("Failed to load MapLibre GL Opacity library");
-            callback(); // Still call callback to prevent hanging
-        };
-        document.body.appendChild(script);
+        loadAssets(model, ["maplibre-gl-opacity.css", "maplibre-gl-opacity.js"])
+            .catch(() => {
+                console.error("Failed to load MapLibre GL Opacity library");
+            })
+            .finally(callback); // Still call callback to prevent hanging
     }
 
     // Function to load MapLibre COG Protocol if not available
@@ -128,17 +480,11 @@ function render({ model, el }) {
             return;
         }
 
-        const script = document.createElement("script");
-        script.src =
-            "https://unpkg.com/@geomatico/maplibre-cog-protocol@0.4.0/dist/index.js";
-        script.onload = () => {
-            callback();
-        };
-        script.onerror = () => {
-            console.error("Failed to load MapLibre COG Protocol library");
-            callback(); // Still call callback to prevent hanging
-        };
-        document.body.appendChild(script);
+        loadAssets(model, ["maplibre-cog-protocol.js"])
+            .catch(() => {
+                console.error("Failed to load MapLibre COG Protocol library");
+            })
+            .finally(callback); // Still call callback to prevent hanging
     }
 
     // Custom repeat modes for continuous drawing
@@ -320,142 +666,891 @@ function render({ model, el }) {
 
         // Registry to track added controls for removal
         const controlRegistry = new Map();
-        let processedCallsCount = 0;
 
-        // Initialize draw features in model
-        model.set("draw_features_selected", []);
-        model.set("draw_feature_collection_all", {
-            type: "FeatureCollection",
-            features: [],
-        });
-        model.set("draw_features_created", []);
-        model.set("draw_features_updated", []);
-        model.set("draw_features_deleted", []);
+        // Send draw changes as operations on the features they touch, keyed
+        // by feature ID, rather than the whole collection
+        function sendDrawOps(event, ops) {
+            model.send({ type: "draw", event, ops });
+        }
+
+        function upsertOps(features) {
+            return features.map((feature) => ({ op: "upsert", feature }));
+        }
+
+        function deleteOps(features) {
+            return features.map((feature) => ({ op: "delete", id: feature.id }));
+        }
 
         map.on("click", function (e) {
             model.set("clicked_latlng", [e.lngLat.lng, e.lngLat.lat]);
             model.save_changes();
         });
 
-        map.on("moveend", function () {
+        // Sync the view state once per gesture, plus every sync_interval ms
+        // while the map moves when it is set. Unchanged values are not sent.
+        let lastViewState = {};
+        let lastSyncTime = 0;
+
+        function syncViewState() {
+            lastSyncTime = performance.now();
             const c = map.getCenter();
             const bbox = map.getBounds();
-            model.set("center", [c.lng, c.lat]);
-            model.set("bounds", [
-                bbox.getWest(),
-                bbox.getSouth(),
-                bbox.getEast(),
-                bbox.getNorth(),
-            ]);
-            updateModel(model, map);
+            const state = {
+                center: [c.lng, c.lat],
+                zoom: map.getZoom(),
+                bearing: map.getBearing(),
+                pitch: map.getPitch(),
+                bounds: [
+                    bbox.getWest(),
+                    bbox.getSouth(),
+                    bbox.getEast(),
+                    bbox.getNorth(),
+                ],
+            };
+            let changed = false;
+            for (const [key, value] of Object.entries(state)) {
+                if (JSON.stringify(value) !== JSON.stringify(lastViewState[key])) {
+                    model.set(key, value);
+                    changed = true;
+                }
+            }
+            if (!changed) {
+                return;
+            }
+            lastViewState = state;
+            model.set("view_state", {
+                center: c,
+                zoom: state.zoom,
+                bounds: bbox,
+                bearing: state.bearing,
+                pitch: state.pitch,
+            });
             model.save_changes();
+        }
+
+        // Linked views follow each other in the browser, without a kernel
+        // round-trip. Views moved by another view of their group only sync
+        // their view state once the leading view settles.
+        const linkView = { map, settle: syncViewState, showCursor: null };
+        let linkGroup = null;
+
+        function linkedViews() {
+            const views = linkGroup && linkState.groups.get(linkGroup);
+            return views ? [...views].filter((view) => view !== linkView) : [];
+        }
+
+        function unlinkView() {
+            const views = linkGroup && linkState.groups.get(linkGroup);
+            if (views) {
+                views.delete(linkView);
+                if (views.size === 0) {
+                    linkState.groups.delete(linkGroup);
+                }
+            }
+            linkGroup = null;
+        }
+
+        function updateLinkGroup() {
+            unlinkView();
+            linkGroup = model.get("link_group") || null;
+            if (linkGroup) {
+                if (!linkState.groups.has(linkGroup)) {
+                    linkState.groups.set(linkGroup, new Set());
+                }
+                linkState.groups.get(linkGroup).add(linkView);
+            }
+        }
+
+        updateLinkGroup();
+        model.on("change:link_group", updateLinkGroup);
+        cleanups.push(unlinkView);
+
+        // moveend also fires at the end of zooming, rotating and pitching
+        map.on("moveend", () => {
+            if (linkState.driving) {
+                return;
+            }
+            syncViewState();
+            linkedViews().forEach((view) => view.settle());
         });
 
-        map.on("zoomend", function () {
-            const c = map.getCenter();
-            const bbox = map.getBounds();
-            model.set("center", [c.lng, c.lat]);
-            model.set("zoom", map.getZoom());
-            model.set("bounds", [
-                bbox.getWest(),
-                bbox.getSouth(),
-                bbox.getEast(),
-                bbox.getNorth(),
-            ]);
-            updateModel(model, map);
-            model.save_changes();
+        map.on("move", () => {
+            if (linkState.driving) {
+                return;
+            }
+            const others = linkedViews();
+            if (others.length > 0) {
+                const camera = {
+                    center: map.getCenter(),
+                    zoom: map.getZoom(),
+                    bearing: map.getBearing(),
+                    pitch: map.getPitch(),
+                };
+                linkState.driving = true;
+                try {
+                    others.forEach((view) => view.map.jumpTo(camera));
+                } finally {
+                    linkState.driving = false;
+                }
+            }
+            const interval = model.get("sync_interval");
+            if (interval > 0 && performance.now() - lastSyncTime >= interval) {
+                syncViewState();
+            }
         });
 
-        map.on("styledata", () => {
-            // console.log("Style or layer change detected");
-            model.set("root", map.getStyle());
-            model.save_changes();
+        // Show the cursor of the linked views, once per frame
+        let cursorMarker = null;
+        let cursorFrame = null;
+        let cursorLngLat = null;
+
+        linkView.showCursor = (lngLat) => {
+            if (!lngLat) {
+                if (cursorMarker) {
+                    cursorMarker.remove();
+                    cursorMarker = null;
+                }
+            } else if (cursorMarker) {
+                cursorMarker.setLngLat(lngLat);
+            } else {
+                const element = document.createElement("div");
+                element.style.cssText =
+                    "width: 12px; height: 12px; border: 2px solid #e5484d;" +
+                    "border-radius: 50%; pointer-events: none;";
+                cursorMarker = new maplibregl.Marker({ element })
+                    .setLngLat(lngLat)
+                    .addTo(map);
+            }
+        };
+
+        function broadcastCursor(lngLat) {
+            cursorLngLat = lngLat;
+            if (cursorFrame === null) {
+                cursorFrame = requestAnimationFrame(() => {
+                    cursorFrame = null;
+                    linkedViews().forEach((view) => view.showCursor(cursorLngLat));
+                });
+            }
+        }
+
+        map.on("mousemove", (e) => {
+            if (model.get("link_cursor")) {
+                broadcastCursor(e.lngLat);
+            }
+        });
+
+        map.on("mouseout", () => {
+            if (model.get("link_cursor")) {
+                broadcastCursor(null);
+            }
+        });
+
+        // Send structural diffs of the style rather than the whole style.
+        // Inline GeoJSON data is replaced by a placeholder and only sent on
+        // request. The placeholder holds a version of the data, bumped when
+        // it changes, e.g. with setData, so the kernel can tell when the data
+        // it fetched is stale.
+        let styleSnapshot = null;
+        let styleSyncRequested = false;
+        const dataVersions = new Map();
+
+        function summarizeSource(id, source) {
+            if (source.type === "geojson" && typeof source.data === "object") {
+                return { ...source, data: { inline: true, version: dataVersions.get(id) || 0 } };
+            }
+            return source;
+        }
+
+        function diffEntries(previous, current, patch, setKey, removedKey) {
+            current.forEach((json, id) => {
+                if (previous.get(id) !== json) {
+                    patch[setKey].push(id);
+                }
+            });
+            previous.forEach((json, id) => {
+                if (!current.has(id)) {
+                    patch[removedKey].push(id);
+                }
+            });
+        }
+
+        function syncStyle() {
+            styleSyncRequested = false;
+            const style = map.getStyle();
+            if (!style) {
+                return;
+            }
+            const { layers = [], sources = {}, ...meta } = style;
+            const snapshot = {
+                meta: JSON.stringify(meta),
+                order: JSON.stringify(layers.map((layer) => layer.id)),
+                layers: new Map(layers.map((l) => [l.id, JSON.stringify(l)])),
+                sources: new Map(
+                    Object.entries(sources).map(([id, source]) => [
+                        id,
+                        JSON.stringify(summarizeSource(id, source)),
+                    ])
+                ),
+            };
+            const previous = styleSnapshot || {
+                layers: new Map(),
+                sources: new Map(),
+            };
+            const changes = {
+                layers: [],
+                removed_layers: [],
+                sources: [],
+                removed_sources: [],
+            };
+            diffEntries(previous.layers, snapshot.layers, changes, "layers", "removed_layers");
+            diffEntries(previous.sources, snapshot.sources, changes, "sources", "removed_sources");
+
+            const patch = { type: "style_patch" };
+            if (styleSnapshot === null) {
+                patch.reset = true;
+            }
+            if (snapshot.meta !== previous.meta) {
+                patch.meta = meta;
+            }
+            if (snapshot.order !== previous.order) {
+                patch.order = JSON.parse(snapshot.order);
+            }
+            if (changes.layers.length) {
+                patch.layers = changes.layers.map((id) =>
+                    JSON.parse(snapshot.layers.get(id))
+                );
+            }
+            if (changes.removed_layers.length) {
+                patch.removed_layers = changes.removed_layers;
+            }
+            if (changes.sources.length) {
+                patch.sources = {};
+                changes.sources.forEach((id) => {
+                    patch.sources[id] = JSON.parse(snapshot.sources.get(id));
+                });
+            }
+            if (changes.removed_sources.length) {
+                patch.removed_sources = changes.removed_sources;
+                scheduleSourcesSync();
+            }
+            styleSnapshot = snapshot;
+            if (Object.keys(patch).length > 1) {
+                model.send(patch);
+            }
+        }
+
+        function requestStyleSync() {
+            // styledata fires in bursts, so diff at most once per frame
+            if (!styleSyncRequested) {
+                styleSyncRequested = true;
+                requestAnimationFrame(syncStyle);
+            }
+        }
+
+        map.on("styledata", requestStyleSync);
+
+        map.on("sourcedata", (e) => {
+            // New data of a GeoJSON source does not change the style itself
+            const source = e.sourceId && !e.tile && map.getSource(e.sourceId);
+            if (e.sourceDataType === "content" && source && source.type === "geojson") {
+                dataVersions.set(e.sourceId, (dataVersions.get(e.sourceId) || 0) + 1);
+                requestStyleSync();
+            }
+        });
+
+        function sendSourceData(sourceId) {
+            const style = map.getStyle();
+            const source = style && style.sources[sourceId];
+            model.send({
+                type: "source_data",
+                source_id: sourceId,
+                data: source ? source.data : null,
+                version: dataVersions.get(sourceId) || 0,
+            });
+        }
+
+        // Track source metadata only: type, loaded status and tile counts.
+        // It is synced at most every SOURCES_SYNC_INTERVAL ms, and only when
+        // it changed. Full definitions come from the mirrored style.
+        const SOURCES_SYNC_INTERVAL = 500;
+        const sourceStates = new Map();
+        let sourcesTimer = null;
+        let lastSources = "";
+
+        function sourceState(e) {
+            let state = sourceStates.get(e.sourceId);
+            if (!state) {
+                state = {
+                    type: e.source ? e.source.type : null,
+                    tiles_requested: 0,
+                    tiles_loaded: 0,
+                };
+                sourceStates.set(e.sourceId, state);
+            }
+            return state;
+        }
+
+        function syncSources() {
+            sourcesTimer = null;
+            const sources = {};
+            sourceStates.forEach((state, id) => {
+                if (!map.getSource(id)) {
+                    sourceStates.delete(id);
+                    return;
+                }
+                sources[id] = { ...state, loaded: map.isSourceLoaded(id) };
+            });
+            const json = JSON.stringify(sources);
+            if (json !== lastSources) {
+                lastSources = json;
+                model.set("sources", sources);
+                model.save_changes();
+            }
+        }
+
+        function scheduleSourcesSync() {
+            if (sourcesTimer === null) {
+                sourcesTimer = setTimeout(syncSources, SOURCES_SYNC_INTERVAL);
+            }
+        }
+
+        map.on("sourcedataloading", (e) => {
+            if (e.sourceId && e.tile) {
+                sourceState(e).tiles_requested++;
+            }
         });
 
         map.on("sourcedata", (e) => {
-            // console.log("Source data updated:", e);
-            model.set("sources", map.getStyle().sources);
-            model.save_changes();
+            if (!e.sourceId) {
+                return;
+            }
+            const state = sourceState(e);
+            if (e.tile) {
+                state.tiles_loaded++;
+            }
+            scheduleSourcesSync();
         });
 
         map.on("load", () => {
             console.log("Map loaded");
+            model.send({
+                type: "startup",
+                mode: startupMode(model),
+                assets_ms: assetsMs,
+                load_ms: performance.now() - startTime - assetsMs,
+            });
             model.set("loaded", true);
             model.save_changes();
             map.getCanvas().style.cursor = "pointer";
+            // Apply the calls held until the style could take them
+            mapLoaded = true;
+            flushCalls();
         });
 
-        // Support JS calls from Python
-        model.on("change:calls", () => {
-            const calls = model.get("calls") || [];
-
-            // Only process new calls that haven't been processed yet
-            const newCalls = calls.slice(processedCallsCount);
-
-            newCalls.forEach(({ method, args }, index) => {
-                const callIndex = processedCallsCount + index;
-                console.log(`Calling map.${method} with args:`, args);
-                if (method === "addControl") {
-                    // Handle addControl specially
-                    const [controlType, position, options] = args;
-                    addControlToMap(map, controlType, position, options);
-                } else if (method === "removeControl") {
-                    // Handle removeControl specially
-                    const [controlType] = args;
-                    removeControlFromMap(map, controlType);
-                } else if (method === "addDrawControl") {
-                    // Handle addDrawControl specially
-                    const [options, controls, position, geojson] = args;
-                    addDrawControlToMap(
-                        map,
-                        options,
-                        controls,
-                        position,
-                        geojson
+        // Support JS calls from Python. Calls arrive as sequenced deltas, each
+        // one exactly once, and are acknowledged back to the kernel.
+        let lastAppliedSeq = 0;
+        let synced = false;
+        let pendingMessages = [];
+        let ackTimer = null;
+
+        // Timings of the applied calls, sent with the ack when the kernel
+        // instruments the map: [seq, wait_ms, handler_ms, applied time]
+        let callTimings = [];
+
+        function sendAck() {
+            ackTimer = null;
+            const msg = { type: "ack", seq: lastAppliedSeq };
+            if (callTimings.length > 0) {
+                const now = performance.now();
+                msg.timings = callTimings.map(([seq, waitMs, handlerMs, applied]) => [
+                    seq,
+                    waitMs,
+                    handlerMs,
+                    now - applied,
+                ]);
+                callTimings = [];
+            }
+            model.send(msg);
+        }
+
+        function scheduleAck() {
+            // Coalesce acknowledgements so a burst of calls costs one message
+            if (ackTimer === null) {
+                ackTimer = setTimeout(sendAck, 50);
+            }
+        }
+
+        // Camera methods whose end is reported, for awaiting them in Python
+        const CAMERA_METHODS = new Set([
+            "flyTo",
+            "easeTo",
+            "jumpTo",
+            "panTo",
+            "fitBounds",
+            "setCenter",
+            "setZoom",
+            "setBearing",
+            "setPitch",
+        ]);
+
+        function applyCalls(calls) {
+            let applied = 0;
+            (calls || []).forEach((call) => {
+                if (call.seq <= lastAppliedSeq) {
+                    return; // Already applied by this view
+                }
+                if (CAMERA_METHODS.has(call.method)) {
+                    const seq = call.seq;
+                    map.once("moveend", () => model.send({ type: "moveend", seq }));
+                }
+                if (call.received !== undefined) {
+                    const start = performance.now();
+                    applyCall(call);
+                    const end = performance.now();
+                    callTimings.push([call.seq, start - call.received, end - start, end]);
+                } else {
+                    applyCall(call);
+                }
+                lastAppliedSeq = call.seq;
+                applied++;
+            });
+            if (applied > 0) {
+                scheduleAck();
+            }
+        }
+
+        // Point layers of Map.add_points, by layer ID
+        const pointLayers = new Map();
+
+        function applyCall({ method, args, buffers }) {
+            if (method === "addGeoJSONBinary") {
+                // Handle GeoJSON sent as binary buffers
+                const [sourceId, header, sourceOptions] = args;
+                addGeoJSONBinary(map, sourceId, header, sourceOptions, buffers);
+            } else if (method === "addPoints") {
+                // Add a GL point layer, filled by the addPointsChunk calls
+                const [layerId, style, beforeId] = args;
+                const layer = createPointsLayer(layerId, style, (timing) =>
+                    model.send({ type: "points_timing", layer_id: layerId, ...timing })
+                );
+                pointLayers.set(layerId, layer);
+                try {
+                    map.addLayer(layer, beforeId || undefined);
+                } catch (err) {
+                    console.warn(`Failed to add point layer ${layerId}`, err);
+                }
+            } else if (method === "addPointsChunk") {
+                const [layerId, header] = args;
+                const layer = pointLayers.get(layerId);
+                if (layer) {
+                    layer.addChunk(header, buffers);
+                }
+            } else if (method === "setPointsStyle") {
+                const [layerId, style] = args;
+                const layer = pointLayers.get(layerId);
+                if (layer) {
+                    layer.setStyle(style);
+                }
+            } else if (method === "setFeatureStates") {
+                const [sourceId, header] = args;
+                setFeatureStates(map, sourceId, header, buffers);
+            } else if (method === "addAnimation") {
+                const [animationId, frames, options] = args;
+                if (animations.has(animationId)) {
+                    animations.get(animationId).stop();
+                }
+                const animation = createAnimation(animationId, frames, options);
+                animations.set(animationId, animation);
+                animation.start();
+            } else if (method === "setAnimationState") {
+                const [animationId, control] = args;
+                const animation = animations.get(animationId);
+                if (animation) {
+                    animation.setState(control);
+                }
+            } else if (method === "removeAnimation") {
+                const [animationId] = args;
+                const animation = animations.get(animationId);
+                if (animation) {
+                    animation.stop();
+                    animations.delete(animationId);
+                }
+            } else if (method === "setSourceTiles") {
+                // Reload the tiles of a kernel tile source
+                const [sourceId, tiles] = args;
+                const source = map.getSource(sourceId);
+                if (source && typeof source.setTiles === "function") {
+                    source.setTiles(tiles);
+                } else {
+                    console.warn(`Source ${sourceId} does not support setTiles`);
+                }
+            } else if (method === "addControl") {
+                // Handle addControl specially
+                const [controlType, position, options] = args;
+                addControlToMap(map, controlType, position, options);
+            } else if (method === "removeControl") {
+                // Handle removeControl specially
+                const [controlType] = args;
+                removeControlFromMap(map, controlType);
+            } else if (method === "addDrawControl") {
+                // Handle addDrawControl specially
+                const [options, controls, position, geojson] = args;
+                addDrawControlToMap(map, options, controls, position, geojson);
+            } else if (method === "removeDrawControl") {
+                // Handle removeDrawControl specially
+                removeDrawControlFromMap(map);
+            } else if (method === "drawFeaturesDeleteAll") {
+                // Handle delete all draw features
+                deleteAllDrawFeatures(map);
+            } else if (method === "addLegendControl") {
+                // Handle addLegendControl specially
+                const [targets, options, position] = args;
+                addLegendControlToMap(map, targets, options, position);
+            } else if (method === "setDrawMode") {
+                const [mode] = args;
+                const draw = controlRegistry.get("draw");
+                if (draw && typeof draw.changeMode === "function") {
+                    draw.changeMode(mode);
+                } else {
+                    console.warn(
+                        "Draw control not available or changeMode is not a function"
                     );
-                } else if (method === "removeDrawControl") {
-                    // Handle removeDrawControl specially
-                    removeDrawControlFromMap(map);
-                } else if (method === "drawFeaturesDeleteAll") {
-                    // Handle delete all draw features
-                    deleteAllDrawFeatures(map);
-                } else if (method === "addLegendControl") {
-                    // Handle addLegendControl specially
-                    const [targets, options, position] = args;
-                    addLegendControlToMap(map, targets, options, position);
-                } else if (method === "setDrawMode") {
-                    const [mode] = args;
-                    const draw = controlRegistry.get("draw");
-                    if (draw && typeof draw.changeMode === "function") {
-                        draw.changeMode(mode);
-                    } else {
-                        console.warn(
-                            "Draw control not available or changeMode is not a function"
-                        );
-                    }
-                } else if (method === "addOpacityControl") {
-                    // Handle addOpacityControl specially
-                    const [baseLayers, overLayers, options, position, defaultVisibility] = args;
-                    addOpacityControlToMap(map, baseLayers, overLayers, options, position, defaultVisibility);
-                } else if (method === "addCogLayer") {
-                    // Handle addCogLayer specially
-                    const [url, sourceId, layerId, sourceOptions, layerOptions] = args;
-                    addCogLayer(map, url, sourceId, layerId, sourceOptions, layerOptions);
-                } else if (typeof map[method] === "function") {
-                    try {
-                        map[method](...(args || []));
-                    } catch (err) {
-                        console.warn(`map.${method} failed`, err);
+                }
+            } else if (method === "addOpacityControl") {
+                // Handle addOpacityControl specially
+                const [baseLayers, overLayers, options, position, defaultVisibility] = args;
+                addOpacityControlToMap(map, baseLayers, overLayers, options, position, defaultVisibility);
+            } else if (method === "addCogLayer") {
+                // Handle addCogLayer specially
+                const [url, sourceId, layerId, sourceOptions, layerOptions] = args;
+                addCogLayer(map, url, sourceId, layerId, sourceOptions, layerOptions);
+            } else if (typeof map[method] === "function") {
+                if (method === "removeLayer") {
+                    pointLayers.delete(args[0]);
+                }
+                if (method === "addSource" && args[1] && args[1].type === "geojson") {
+                    reportRenderTiming(args[0], "json", performance.now(), null);
+                }
+                try {
+                    map[method](...(args || []));
+                } catch (err) {
+                    console.warn(`map.${method} failed`, err);
+                }
+            } else {
+                console.warn(`map.${method} is not a function`);
+            }
+        }
+
+        // Request vector tiles from the kernel over the widget comm
+        let nextTileRequest = 0;
+        const pendingTiles = new Map();
+
+        function requestTile(sourceId, z, x, y, abortController) {
+            return new Promise((resolve, reject) => {
+                const id = nextTileRequest++;
+                pendingTiles.set(id, { resolve, reject });
+                abortController.signal.addEventListener("abort", () => {
+                    if (pendingTiles.delete(id)) {
+                        reject(new Error("Tile request aborted"));
                     }
+                });
+                model.send({ type: "tile_request", id, source_id: sourceId, z, x, y });
+            });
+        }
+
+        function resolveTile(msg, buffers) {
+            const pending = pendingTiles.get(msg.id);
+            if (!pending) {
+                return; // Aborted
+            }
+            pendingTiles.delete(msg.id);
+            if (msg.error) {
+                pending.reject(new Error(msg.error));
+            } else {
+                const view = buffers[0];
+                pending.resolve({
+                    data: view.buffer.slice(
+                        view.byteOffset,
+                        view.byteOffset + view.byteLength
+                    ),
+                });
+            }
+        }
+
+        kernelTileClients.set(model.get("_tile_token"), requestTile);
+        if (!globalThis.__mapwidgetTileProtocol) {
+            maplibregl.addProtocol("mapwidget", kernelTileProtocol);
+            globalThis.__mapwidgetTileProtocol = true;
+        }
+
+        // Calls waiting for the next animation frame. Batches are applied
+        // within a single frame, so the style is recalculated only once.
+        let queuedCalls = [];
+        let frameRequested = false;
+        // Calls are held until the map has loaded, since most of them need
+        // its style
+        let mapLoaded = false;
+
+        function flushCalls() {
+            frameRequested = false;
+            if (!mapLoaded) {
+                return;
+            }
+            const calls = queuedCalls;
+            queuedCalls = [];
+            applyCalls(calls);
+            flushQueries();
+        }
+
+        function enqueueCalls(calls, batch) {
+            queuedCalls.push(...(calls || []));
+            if (batch || frameRequested) {
+                // Later calls wait for a pending batch to keep them in order
+                if (!frameRequested) {
+                    frameRequested = true;
+                    requestAnimationFrame(flushCalls);
+                }
+            } else {
+                flushCalls();
+            }
+        }
+
+        // Replayed camera moves jump to their target instead of animating
+        function instantCall(call) {
+            if (call.method === "flyTo" || call.method === "easeTo") {
+                return { ...call, method: "jumpTo" };
+            } else if (call.method === "panTo") {
+                return { ...call, method: "jumpTo", args: [{ center: call.args[0] }] };
+            } else if (call.method === "fitBounds") {
+                const options = { ...(call.args[1] || {}), animate: false };
+                return { ...call, args: [call.args[0], options] };
+            }
+            return call;
+        }
+
+        // Replace the buffer indices of the calls with the buffers themselves
+        function resolveBuffers(calls, buffers) {
+            (calls || []).forEach((call) => {
+                if (call.buffers) {
+                    call.buffers = call.buffers.map((index) => buffers[index]);
+                }
+            });
+        }
+
+        // Features of the sources of Map.add_stream_layer, by source ID. The
+        // kernel adds and evicts features by ID, and the changes are applied
+        // to the source once per animation frame.
+        const streams = new Map();
+
+        function applyStream(msg, buffers) {
+            let stream = streams.get(msg.source_id);
+            if (!stream) {
+                stream = { features: new Map(), changed: new Set(), reset: true };
+                streams.set(msg.source_id, stream);
+            }
+            (msg.remove || []).forEach((id) => {
+                stream.features.delete(id);
+                stream.changed.add(id);
+            });
+            if (msg.header) {
+                decodeGeoJSON(msg.header, buffers).features.forEach((feature) => {
+                    stream.features.set(feature.id, feature);
+                    stream.changed.add(feature.id);
+                });
+            }
+            if (!stream.scheduled) {
+                stream.scheduled = true;
+                requestAnimationFrame(() => flushStream(msg.source_id));
+            }
+        }
+
+        function flushStream(sourceId) {
+            const stream = streams.get(sourceId);
+            stream.scheduled = false;
+            const source = map.getSource(sourceId);
+            if (!source) {
+                // The source is added by a call not applied yet
+                stream.reset = true;
+                if (!stream.waiting) {
+                    stream.waiting = true;
+                    map.once("sourcedata", () => {
+                        stream.waiting = false;
+                        flushStream(sourceId);
+                    });
+                }
+                return;
+            }
+            const changed = Array.from(stream.changed);
+            stream.changed.clear();
+            if (stream.source !== source) {
+                stream.reset = true; // A new source, e.g. after a style change
+            }
+            if (!stream.reset && typeof source.updateData === "function") {
+                try {
+                    source.updateData({
+                        add: changed
+                            .filter((id) => stream.features.has(id))
+                            .map((id) => stream.features.get(id)),
+                        remove: changed.filter((id) => !stream.features.has(id)),
+                    });
+                    return;
+                } catch (err) {
+                    console.warn(`Replacing the data of stream ${sourceId}`, err);
+                }
+            }
+            stream.reset = false;
+            stream.source = source;
+            source.setData({
+                type: "FeatureCollection",
+                features: Array.from(stream.features.values()),
+            });
+        }
+
+        // Queries of the kernel, e.g. Map.query_rendered_features. They wait
+        // for the calls made before them, so that they see their effects.
+        let queuedQueries = [];
+
+        function enqueueQuery(msg) {
+            queuedQueries.push(msg);
+            if (mapLoaded && !frameRequested) {
+                flushQueries();
+            }
+        }
+
+        function flushQueries() {
+            const queries = queuedQueries;
+            queuedQueries = [];
+            queries.forEach((msg) => {
+                if (msg.method === "queryRenderedFeatures" && !map.loaded()) {
+                    // Rendered features are only known once the map is idle
+                    map.once("idle", () => answerQuery(msg));
                 } else {
-                    console.warn(`map.${method} is not a function`);
+                    answerQuery(msg);
                 }
             });
+        }
+
+        // The geographic geometry of a query, in pixels of the view
+        function queryGeometry(geometry) {
+            if (!geometry) {
+                return undefined;
+            } else if (geometry.length === 2) {
+                return map.project(geometry);
+            }
+            const sw = map.project([geometry[0], geometry[1]]);
+            const ne = map.project([geometry[2], geometry[3]]);
+            return [
+                [Math.min(sw.x, ne.x), Math.min(sw.y, ne.y)],
+                [Math.max(sw.x, ne.x), Math.max(sw.y, ne.y)],
+            ];
+        }
 
-            // Update the count of processed calls
-            processedCallsCount = calls.length;
+        function answerQuery(msg) {
+            const params = msg.params || {};
+            const reply = { type: "query_result", id: msg.id };
+            let buffers;
+            try {
+                if (msg.method === "queryRenderedFeatures") {
+                    const options = {};
+                    if (params.layers) {
+                        // Layers not in the style would fail the whole query
+                        options.layers = params.layers.filter((id) => map.getLayer(id));
+                    }
+                    if (params.filter) {
+                        options.filter = params.filter;
+                    }
+                    const features = map.queryRenderedFeatures(
+                        queryGeometry(params.geometry),
+                        options
+                    );
+                    const encoded = encodeGeoJSON(features);
+                    encoded.header.layers = features.map((f) => (f.layer ? f.layer.id : null));
+                    encoded.header.sources = features.map((f) => f.source || null);
+                    encoded.header.source_layers = features.map((f) => f.sourceLayer || null);
+                    encoded.header.states = features.map((f) => f.state || null);
+                    reply.kind = "features";
+                    reply.result = encoded.header;
+                    buffers = encoded.buffers;
+                } else if (msg.method === "querySourceFeatures") {
+                    const options = {};
+                    if (params.source_layer) {
+                        options.sourceLayer = params.source_layer;
+                    }
+                    if (params.filter) {
+                        options.filter = params.filter;
+                    }
+                    const encoded = encodeGeoJSON(
+                        map.querySourceFeatures(params.source_id, options)
+                    );
+                    reply.kind = "features";
+                    reply.result = encoded.header;
+                    buffers = encoded.buffers;
+                } else if (msg.method === "getFeatureState") {
+                    const feature = { source: params.source_id, id: params.id };
+                    if (params.source_layer) {
+                        feature.sourceLayer = params.source_layer;
+                    }
+                    reply.result = map.getFeatureState(feature) || {};
+                } else if (msg.method === "project" || msg.method === "unproject") {
+                    const points = new Float64Array(2 * params.points.length);
+                    params.points.forEach((point, i) => {
+                        const result =
+                            msg.method === "project"
+                                ? map.project(point)
+                                : map.unproject(point);
+                        points[2 * i] = msg.method === "project" ? result.x : result.lng;
+                        points[2 * i + 1] = msg.method === "project" ? result.y : result.lat;
+                    });
+                    reply.kind = "points";
+                    reply.single = Boolean(params.single);
+                    buffers = [points.buffer];
+                } else {
+                    throw new Error(`Unknown query: ${msg.method}`);
+                }
+            } catch (err) {
+                delete reply.kind;
+                delete reply.result;
+                delete reply.single;
+                reply.error = String(err && err.message ? err.message : err);
+                buffers = undefined;
+            }
+            model.send(reply, undefined, buffers);
+        }
+
+        model.on("msg:custom", (msg, buffers) => {
+            if (msg.type === "query") {
+                enqueueQuery(msg);
+            } else if (msg.type === "tile_response") {
+                resolveTile(msg, buffers);
+            } else if (msg.type === "stream") {
+                applyStream(msg, buffers);
+            } else if (msg.type === "get_source_data") {
+                sendSourceData(msg.source_id);
+            } else if (msg.type === "calls") {
+                resolveBuffers(msg.calls, buffers);
+                if (model.get("instrument")) {
+                    const received = performance.now();
+                    msg.calls.forEach((call) => (call.received = received));
+                }
+                if (msg.replay) {
+                    // Apply the replayed state first, in one frame, then
+                    // anything that arrived while the replay was in flight
+                    synced = true;
+                    enqueueCalls(msg.calls.map(instantCall), msg.batch);
+                    pendingMessages.forEach((m) => enqueueCalls(m.calls, m.batch));
+                    pendingMessages = [];
+                } else if (!synced) {
+                    pendingMessages.push(msg);
+                } else {
+                    enqueueCalls(msg.calls, msg.batch);
+                }
+            }
         });
 
+        // Ask the kernel for the calls made before this view was displayed
+        model.send({ type: "sync", seq: lastAppliedSeq });
+
         // Function to add controls to the map
         function addControlToMap(
             map,
@@ -737,7 +1832,10 @@ function render({ model, el }) {
                     } else if (geojson.type === "Feature") {
                         draw.add(geojson);
                     }
-                    updateDrawFeatures(map, draw);
+                    sendDrawOps("reset", [
+                        { op: "clear" },
+                        ...upsertOps(draw.getAll().features),
+                    ]);
                 }
 
                 // Set up draw event handlers
@@ -810,38 +1908,29 @@ function render({ model, el }) {
         function setupDrawEventHandlers(map, draw) {
             map.on("draw.create", function (e) {
                 console.log("Features created:", e.features);
-                model.set("draw_features_created", e.features);
-                updateDrawFeatures(map, draw);
-                model.save_changes();
+                sendDrawOps("create", upsertOps(e.features));
             });
 
             map.on("draw.update", function (e) {
                 console.log("Features updated:", e.features);
-                model.set("draw_features_updated", e.features);
-                updateDrawFeatures(map, draw);
-                model.save_changes();
+                sendDrawOps("update", upsertOps(e.features));
             });
 
             map.on("draw.delete", function (e) {
                 console.log("Features deleted:", e.features);
-                model.set("draw_features_deleted", e.features);
-                updateDrawFeatures(map, draw);
-                model.save_changes();
+                sendDrawOps("delete", deleteOps(e.features));
             });
 
             map.on("draw.selectionchange", function (e) {
                 console.log("Selection changed:", e.features);
-                model.set("draw_features_selected", e.features);
-                model.save_changes();
+                model.send({
+                    type: "draw",
+                    event: "selection",
+                    ids: e.features.map((feature) => feature.id),
+                });
             });
         }
 
-        // Function to update all draw features in model
-        function updateDrawFeatures(map, draw) {
-            const allFeatures = draw.getAll();
-            model.set("draw_feature_collection_all", allFeatures);
-        }
-
         // Function to remove draw control from the map
         function removeDrawControlFromMap(map) {
             const draw = controlRegistry.get("draw");
@@ -850,16 +1939,8 @@ function render({ model, el }) {
                 console.log("Removed draw control");
                 controlRegistry.delete("draw");
 
-                // Clear draw features from model
-                model.set("draw_features_selected", []);
-                model.set("draw_feature_collection_all", {
-                    type: "FeatureCollection",
-                    features: [],
-                });
-                model.set("draw_features_created", []);
-                model.set("draw_features_updated", []);
-                model.set("draw_features_deleted", []);
-                model.save_changes();
+                // Clear draw features in the kernel
+                sendDrawOps("clear", [{ op: "clear" }]);
             } else {
                 console.warn("Draw control not found");
             }
@@ -875,10 +1956,8 @@ function render({ model, el }) {
                     draw.delete(featureIds);
                     console.log("Deleted all draw features");
 
-                    // Update model
-                    model.set("draw_features_deleted", allFeatures.features);
-                    updateDrawFeatures(map, draw);
-                    model.save_changes();
+                    // Update the kernel
+                    sendDrawOps("delete", deleteOps(allFeatures.features));
                 }
             } else {
                 console.warn("Draw control not found");
@@ -1094,6 +2173,316 @@ function render({ model, el }) {
             console.log('Toggle control added at position:', position);
         }
 
+        // Function to add GeoJSON sent as binary columnar buffers
+        function addGeoJSONBinary(map, sourceId, header, sourceOptions = {}, buffers = []) {
+            try {
+                const start = performance.now();
+                const data = decodeGeoJSON(header, buffers);
+                const decodeMs = performance.now() - start;
+
+                const source = map.getSource(sourceId);
+                if (source) {
+                    source.setData(data);
+                } else {
+                    map.addSource(sourceId, { type: "geojson", ...sourceOptions, data });
+                }
+                console.log(`Added binary GeoJSON source: ${sourceId}`);
+                reportRenderTiming(sourceId, "binary", start, decodeMs);
+            } catch (err) {
+                console.error("Failed to add binary GeoJSON source:", err);
+            }
+        }
+
+        // Apply feature states sent as binary buffers, see
+        // mapwidget.encoding.encode_feature_states
+        function setFeatureStates(map, sourceId, header, buffers = []) {
+            if (!map.getSource(sourceId)) {
+                console.warn(`Source ${sourceId} not found for feature states`);
+                return;
+            }
+            let ids = header.ids;
+            let offset = 0;
+            if (!ids) {
+                const IdArray = header.id_dtype === "int32" ? Int32Array : Float64Array;
+                ids = typedArray(IdArray, buffers[0]);
+                offset = 1;
+            }
+            const ValueArray = header.dtype === "float64" ? Float64Array : Float32Array;
+            const booleans = new Set(header.booleans || []);
+            const columns = header.states.map((name, i) => [
+                name,
+                typedArray(ValueArray, buffers[i + offset]),
+                booleans.has(name),
+            ]);
+            const target = { source: sourceId };
+            if (header.source_layer) {
+                target.sourceLayer = header.source_layer;
+            }
+            for (let i = 0; i < header.count; i++) {
+                target.id = ids[i];
+                const state = {};
+                let hasState = false;
+                columns.forEach(([name, values, isBoolean]) => {
+                    const value = values[i];
+                    if (Number.isNaN(value)) {
+                        map.removeFeatureState(target, name);
+                    } else {
+                        state[name] = isBoolean ? value !== 0 : value;
+                        hasState = true;
+                    }
+                });
+                if (hasState) {
+                    map.setFeatureState(target, state);
+                }
+            }
+        }
+
+        // Timelines uploaded by Map.add_animation, played on animation
+        // frames without any round trip to the kernel
+        const animations = new Map();
+        cleanups.push(() => animations.forEach((animation) => animation.stop()));
+
+        // Fill the URL templates of tiled sources with the tiles in view
+        function tileUrls(templates) {
+            const z = Math.max(0, Math.floor(map.getZoom()));
+            const n = 2 ** z;
+            const bounds = map.getBounds();
+            const toTileX = (lng) => Math.floor(((lng + 180) / 360) * n);
+            const toTileY = (lat) => {
+                const rad = (Math.max(-85.05, Math.min(85.05, lat)) * Math.PI) / 180;
+                return Math.floor(
+                    ((1 - Math.log(Math.tan(rad) + 1 / Math.cos(rad)) / Math.PI) / 2) * n
+                );
+            };
+            const x0 = Math.max(0, toTileX(bounds.getWest()));
+            const x1 = Math.min(n - 1, toTileX(bounds.getEast()));
+            const y0 = Math.max(0, toTileY(bounds.getNorth()));
+            const y1 = Math.min(n - 1, toTileY(bounds.getSouth()));
+            const urls = [];
+            templates.forEach((template) => {
+                for (let x = x0; x <= x1; x++) {
+                    for (let y = y0; y <= y1; y++) {
+                        urls.push(
+                            template
+                                .replace("{z}", z)
+                                .replace("{x}", x)
+                                .replace("{y}", y)
+                        );
+                    }
+                }
+            });
+            return urls;
+        }
+
+        function createAnimation(id, frames, options) {
+            const state = {
+                index: 0,
+                playing: false,
+                speed: 1,
+                raf: null,
+                lastTime: null,
+                elapsed: 0,
+                played: 0,
+                dropped: 0,
+                startTime: null,
+                lastReport: 0,
+            };
+            // GeoJSON fetched ahead of its frame, by URL
+            const prefetched = new Map();
+
+            function duration(index) {
+                return (frames[index].duration || options.interval) / state.speed;
+            }
+
+            function prefetch(index) {
+                const frame = frames[index];
+                Object.values(frame.data || {}).forEach((data) => {
+                    if (typeof data === "string" && !prefetched.has(data)) {
+                        prefetched.set(
+                            data,
+                            fetch(data).then((response) => response.json())
+                        );
+                    }
+                });
+                Object.values(frame.tiles || {}).forEach((templates) => {
+                    // Warm the HTTP cache so the tiles load when the frame
+                    // switches to them. Kernel tiles are not prefetched.
+                    tileUrls(templates)
+                        .filter((url) => url.startsWith("http"))
+                        .forEach((url) => fetch(url, { cache: "force-cache" }).catch(() => {}));
+                });
+            }
+
+            function setSourceData(sourceId, data) {
+                const source = map.getSource(sourceId);
+                if (!source) {
+                    return;
+                }
+                if (typeof data === "string" && prefetched.has(data)) {
+                    const promise = prefetched.get(data);
+                    prefetched.delete(data);
+                    promise.then((json) => source.setData(json)).catch(() => source.setData(data));
+                } else {
+                    source.setData(data);
+                }
+            }
+
+            function applyFrame(index) {
+                const frame = frames[index];
+                try {
+                    Object.entries(frame.filter || {}).forEach(([layerId, expr]) =>
+                        map.setFilter(layerId, expr)
+                    );
+                    Object.entries(frame.paint || {}).forEach(([layerId, props]) =>
+                        Object.entries(props).forEach(([prop, value]) =>
+                            map.setPaintProperty(layerId, prop, value)
+                        )
+                    );
+                    Object.entries(frame.layout || {}).forEach(([layerId, props]) =>
+                        Object.entries(props).forEach(([prop, value]) =>
+                            map.setLayoutProperty(layerId, prop, value)
+                        )
+                    );
+                    Object.entries(frame.data || {}).forEach(([sourceId, data]) =>
+                        setSourceData(sourceId, data)
+                    );
+                    Object.entries(frame.tiles || {}).forEach(([sourceId, tiles]) => {
+                        const source = map.getSource(sourceId);
+                        if (source && typeof source.setTiles === "function") {
+                            source.setTiles(tiles);
+                        }
+                    });
+                    if (frame.camera) {
+                        map.jumpTo(frame.camera);
+                    }
+                } catch (err) {
+                    console.warn(`Animation ${id} failed to apply frame ${index}`, err);
+                }
+                state.index = index;
+                for (let i = 1; i <= options.prefetch; i++) {
+                    const next = index + i;
+                    if (next < frames.length) {
+                        prefetch(next);
+                    } else if (options.loop) {
+                        prefetch(next % frames.length);
+                    }
+                }
+            }
+
+            function report(force) {
+                const now = performance.now();
+                if (!force && now - state.lastReport < 1000) {
+                    return;
+                }
+                state.lastReport = now;
+                const seconds = state.startTime === null ? 0 : (now - state.startTime) / 1000;
+                model.send({
+                    type: "animation_stats",
+                    id,
+                    frame: state.index,
+                    playing: state.playing,
+                    played: state.played,
+                    dropped: state.dropped,
+                    fps: seconds > 0 ? state.played / seconds : null,
+                });
+            }
+
+            function tick(now) {
+                state.raf = null;
+                if (!state.playing) {
+                    return;
+                }
+                if (state.lastTime !== null) {
+                    state.elapsed += now - state.lastTime;
+                }
+                state.lastTime = now;
+                // Frames whose time passed before the browser could show
+                // them are skipped, to keep the timeline on schedule
+                let next = state.index;
+                let advanced = 0;
+                while (state.elapsed >= duration(next)) {
+                    state.elapsed -= duration(next);
+                    next++;
+                    if (next >= frames.length) {
+                        if (!options.loop) {
+                            next = frames.length - 1;
+                            state.elapsed = 0;
+                            state.playing = false;
+                            break;
+                        }
+                        next = 0;
+                    }
+                    advanced++;
+                }
+                if (advanced > 0) {
+                    state.dropped += advanced - 1;
+                    state.played++;
+                    applyFrame(next);
+                }
+                if (state.playing) {
+                    state.raf = requestAnimationFrame(tick);
+                    report(false);
+                } else {
+                    report(true);
+                }
+            }
+
+            function play() {
+                if (state.playing) {
+                    return;
+                }
+                state.playing = true;
+                state.lastTime = null;
+                if (state.startTime === null) {
+                    state.startTime = performance.now();
+                }
+                state.raf = requestAnimationFrame(tick);
+            }
+
+            function pause() {
+                state.playing = false;
+                if (state.raf !== null) {
+                    cancelAnimationFrame(state.raf);
+                    state.raf = null;
+                }
+            }
+
+            return {
+                setState(control) {
+                    if (control.speed) {
+                        state.speed = control.speed;
+                    }
+                    if (control.frame !== undefined && control.frame !== null) {
+                        state.elapsed = 0;
+                        applyFrame(Math.max(0, Math.min(frames.length - 1, control.frame)));
+                    }
+                    if (control.playing) {
+                        play();
+                    } else {
+                        pause();
+                    }
+                    report(true);
+                },
+                stop: pause,
+                start() {
+                    applyFrame(0);
+                },
+            };
+        }
+
+        // Report how long a GeoJSON source took to decode and render
+        function reportRenderTiming(sourceId, transport, start, decodeMs) {
+            map.once("idle", () => {
+                model.send({
+                    type: "render_timing",
+                    source_id: sourceId,
+                    transport: transport,
+                    decode_ms: decodeMs,
+                    render_ms: performance.now() - start,
+                });
+            });
+        }
+
         // Function to add COG layer to the map
         function addCogLayer(map, url, sourceId, layerId, sourceOptions = {}, layerOptions = {}) {
             // Ensure COG protocol is loaded and registered
@@ -1145,14 +2534,19 @@ function render({ model, el }) {
         setTimeout(() => map.resize(), 100);
     }
 
+    // Load the stylesheet and the library in parallel, once per page
+    const assets = ["maplibre-gl.css"];
     if (typeof maplibregl === "undefined") {
-        const script = document.createElement("script");
-        script.src = "https://unpkg.com/maplibre-gl@5.5.0/dist/maplibre-gl.js";
-        script.onload = initMap;
-        document.body.appendChild(script);
-    } else {
-        initMap();
+        assets.push("maplibre-gl.js");
     }
+    loadAssets(model, assets)
+        .then(() => {
+            assetsMs = performance.now() - startTime;
+            initMap();
+        })
+        .catch((err) => console.error("Failed to load MapLibre GL:", err));
+
+    return () => cleanups.forEach((cleanup) => cleanup());
 }
 
 export default { render };
@@ -1,19 +1,9 @@
-function loadScript(src) {
-    return new Promise((resolve, reject) => {
-        let script = Object.assign(document.createElement("script"), {
-            type: "text/javascript",
-            async: true,
-            src: src,
-        });
-        script.addEventListener("load", resolve);
-        script.addEventListener("error", reject);
-        document.body.appendChild(script);
-    });
-}
+export async function render(view) {
+    // Load the stylesheet and the library in parallel, once per page
+    const startTime = performance.now();
+    await loadAssets(view.model, ["ol.css", "ol.js"]);
+    const assetsMs = performance.now() - startTime;
 
-await loadScript("https://cdn.jsdelivr.net/npm/ol@v7.3.0/dist/ol.js");
-
-export function render(view) {
     // Header
     let center = view.model.get("center");
     center.reverse();
@@ -39,6 +29,15 @@ export function render(view) {
         }),
     });
 
+    map.once("rendercomplete", function () {
+        view.model.send({
+            type: "startup",
+            mode: startupMode(view.model),
+            assets_ms: assetsMs,
+            load_ms: performance.now() - startTime - assetsMs,
+        });
+    });
+
     map.on("click", function (event) {
         var coordinate = event.coordinate;
         var lonLat = ol.proj.transform(coordinate, "EPSG:3857", "EPSG:4326");
@@ -46,7 +45,13 @@ export function render(view) {
         view.model.save_changes();
     });
 
-    map.on("moveend", function (event) {
+    // Sync the view once per gesture, plus every sync_interval ms while the
+    // map moves when it is set. Unchanged views are not sent.
+    var lastView = null;
+    var lastSyncTime = 0;
+
+    function syncView() {
+        lastSyncTime = performance.now();
         var center = map.getView().getCenter();
         var lonLat = ol.proj.transform(center, "EPSG:3857", "EPSG:4326");
         var zoomLevel = map.getView().getZoom();
@@ -57,11 +62,25 @@ export function render(view) {
             "EPSG:3857",
             "EPSG:4326"
         );
+        var key = JSON.stringify([lonLat, zoomLevel, lonLatExtent]);
+        if (key === lastView) {
+            return;
+        }
+        lastView = key;
         view.model.set("bounds", lonLatExtent);
 
         view.model.set("center", [lonLat[1], lonLat[0]]);
         view.model.set("zoom", zoomLevel);
         view.model.save_changes();
+    }
+
+    map.on("moveend", syncView);
+
+    map.getView().on(["change:center", "change:resolution"], function () {
+        var interval = view.model.get("sync_interval");
+        if (interval > 0 && performance.now() - lastSyncTime >= interval) {
+            syncView();
+        }
     });
 
     // Footer
@@ -2,6 +2,7 @@ import os
 import pathlib
 import anywidget
 import traitlets
+from .assets import asset_sources, handle_asset_message, map_esm
 
 
 class Map(anywidget.AnyWidget):
@@ -12,7 +13,7 @@ class Map(anywidget.AnyWidget):
     """
 
     _cwd = os.path.dirname(os.path.abspath(__file__))
-    _esm = pathlib.Path(os.path.join(_cwd, "js", "leaflet.js"))
+    _esm = map_esm("leaflet.js")
     _css = pathlib.Path(os.path.join(_cwd, "css", "leaflet.css"))
     center = traitlets.List([40, -100]).tag(sync=True, o=True)
     zoom = traitlets.Int(4).tag(sync=True, o=True)
@@ -20,16 +21,29 @@ class Map(anywidget.AnyWidget):
     width = traitlets.Unicode("100%").tag(sync=True, o=True)
     height = traitlets.Unicode("600px").tag(sync=True, o=True)
     clicked_latlng = traitlets.List([None, None]).tag(sync=True, o=True)
+    # Milliseconds between view updates while moving; 0 syncs when a move ends
+    sync_interval = traitlets.Int(0).tag(sync=True, o=True)
+    # Where the frontend loads each JS and CSS asset from
+    _assets = traitlets.Dict().tag(sync=True)
+
+    def __init__(self, **kwargs):
+        self.startup_timings = []
+        super().__init__(**kwargs)
+        self.on_msg(handle_asset_message)
+
+    @traitlets.default("_assets")
+    def _default_assets(self):
+        return asset_sources(["leaflet.js", "leaflet.css"])
 
     def add_basemap(self, name, opacity=1.0, **kwargs):
-        from .basemaps import get_xyz_dict
+        from .basemaps import get_basemap, get_basemap_list
 
-        xyz_tiles = get_xyz_dict()
+        basemap = get_basemap(name)
 
-        if name in xyz_tiles:
-            url = xyz_tiles[name]["url"]
-            attribution = xyz_tiles[name]["attribution"]
-            max_zoom = xyz_tiles[name]["max_zoom"]
+        if basemap is not None:
+            url = basemap["url"]
+            attribution = basemap["attribution"]
+            max_zoom = basemap["max_zoom"]
             self.send(
                 {
                     "type": "add_basemap",
@@ -43,7 +57,7 @@ class Map(anywidget.AnyWidget):
 
         else:
             raise ValueError(
-                f"Basemap {name} not found. It must be one of the following: {list(xyz_tiles.keys())}"
+                f"Basemap {name} not found. It must be one of the following: {get_basemap_list()}"
             )
 
     def add_layer(
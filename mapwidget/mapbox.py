@@ -1,7 +1,74 @@
 import os
+import hashlib
 import pathlib
 import anywidget
 import traitlets
+from .cache import LRUCache, get_url_cache
+
+# The header and footer of js/mapbox.js around the map content, by the path
+# and modification time of the file
+_templates = {}
+
+# Generated ESM, by the hash of the content and container name
+_esm_cache = LRUCache(maxsize=256)
+
+
+def _template(path):
+    """Returns the header and footer of an ESM template, reading it once.
+
+    Args:
+        path (str): The path of the template.
+
+    Returns:
+        tuple: The header, up to the '// Map content' line, and the footer,
+            from the '// Footer' line.
+    """
+    key = (path, os.path.getmtime(path))
+    if key not in _templates:
+        with open(path, "r") as f:
+            lines = f.readlines()
+        header = []
+        footer = []
+        for index, line in enumerate(lines):
+            if line.strip() == "// Map content" and not header:
+                header = lines[: index + 1]
+            elif line.strip() == "// Footer" and not footer:
+                footer = lines[index:]
+        _templates.clear()
+        _templates[key] = ("".join(header), "".join(footer))
+    return _templates[key]
+
+
+def _read(source, callback, timeout=None, block=True):
+    """Read a string, a file or a URL, then pass the content to callback.
+
+    URLs are fetched through the shared URL cache. Unless block is True, they
+    are fetched on a background thread and a future of callback's result is
+    returned.
+    """
+    if os.path.isfile(source):
+        with open(source, "r") as f:
+            content = f.read()
+    elif source.startswith("http"):
+        cache = get_url_cache()
+        if not block:
+            import concurrent.futures
+
+            result = concurrent.futures.Future()
+
+            def done(future):
+                try:
+                    result.set_result(callback(future.result().decode("utf-8")))
+                except Exception as e:
+                    result.set_exception(e)
+
+            cache.fetch_async(source, timeout=timeout).add_done_callback(done)
+            return result
+        content = cache.fetch(source, timeout=timeout).decode("utf-8")
+    else:
+        content = source
+    callback(content)
+    return None
 
 
 class Map(anywidget.AnyWidget):
@@ -19,68 +86,74 @@ class Map(anywidget.AnyWidget):
     height = traitlets.Unicode("600px").tag(sync=True, o=True)
     clicked_latlng = traitlets.List([None, None]).tag(sync=True, o=True)
 
-    def set_esm(self, esm, container="map"):
+    def set_esm(self, esm, container="map", timeout=None, block=True):
         """Set esm attribute. Can be a string, a file path, or a url.
             See examples at https://docs.mapbox.com/mapbox-gl-js/example/
             Open an example and click on the 'Edit in CodePen' button.
             Then copy the code from the 'JS' tab, and assign it to the esm parameter.
+            URLs are cached in memory and on disk, see `mapwidget.cache.URLCache`.
 
         Args:
             esm (str): The esm string, file path, or url.
             container (str, optional): The container name. Defaults to 'map'.
+            timeout (float, optional): The timeout of url requests in seconds.
+                Defaults to the timeout of the URL cache.
+            block (bool, optional): Whether to wait for url requests. If
+                False, the url is fetched in the background. Defaults to True.
 
         Raises:
             TypeError: If esm is not a string.
+
+        Returns:
+            concurrent.futures.Future: If block is False and esm is a url, a
+                future that resolves once the esm is set. Otherwise None.
         """
-        if isinstance(esm, str):
-            if os.path.isfile(esm):
-                with open(esm, "r") as f:
-                    content = f.read()
-            elif esm.startswith("http"):
-                import urllib.request
-
-                with urllib.request.urlopen(esm) as response:
-                    content = response.read().decode("utf-8")
-            else:
-                content = esm
+        if not isinstance(esm, str):
+            raise TypeError("esm must be a string")
 
+        def update(content):
             self._esm = self._create_esm(content, container=container)
 
-        else:
-            raise TypeError("esm must be a string")
+        return _read(esm, update, timeout=timeout, block=block)
 
-    def set_css(self, css, container="map"):
+    def set_css(self, css, container="map", timeout=None, block=True):
         """Set css attribute. Can be a string, a file path, or a url.
             See examples at https://docs.mapbox.com/mapbox-gl-js/example/
             Open an example and click on the 'Edit in CodePen' button.
             Then copy the code from the 'CSS' tab, and assign it to the css parameter.
+            URLs are cached in memory and on disk, see `mapwidget.cache.URLCache`.
+
         Args:
             css (str): The css string, file path, or url.
+            container (str, optional): The container name. Defaults to 'map'.
+            timeout (float, optional): The timeout of url requests in seconds.
+                Defaults to the timeout of the URL cache.
+            block (bool, optional): Whether to wait for url requests. If
+                False, the url is fetched in the background. Defaults to True.
 
         Raises:
             TypeError: If css is not a string.
+
+        Returns:
+            concurrent.futures.Future: If block is False and css is a url, a
+                future that resolves once the css is set. Otherwise None.
         """
-        if isinstance(css, str):
-            if os.path.isfile(css):
-                with open(css, "r") as f:
-                    content = f.read()
-            elif css.startswith("http"):
-                import urllib.request
-
-                with urllib.request.urlopen(css) as response:
-                    content = response.read().decode("utf-8")
-            else:
-                content = css
+        if not isinstance(css, str):
+            raise TypeError("css must be a string")
 
+        def update(content):
             self._css = content.replace(f"#{container}", f"#div").replace(
                 f".{container}", f".div"
             )
-        else:
-            raise TypeError("css must be a string")
+
+        return _read(css, update, timeout=timeout, block=block)
 
     def _create_esm(self, esm, container="map"):
         """Create esm string by replacing the container name.
 
+        The header and footer of js/mapbox.js are read once, and the result
+        is cached by the hash of the content and container name.
+
         Args:
             esm (str): The esm string.
             container (str, optional): The container name. Defaults to 'map'.
@@ -88,29 +161,17 @@ class Map(anywidget.AnyWidget):
         Returns:
             str: The esm string with the container name replaced.
         """
-        _cwd = os.path.dirname(os.path.abspath(__file__))
-        _esm = pathlib.Path(os.path.join(_cwd, "js", "mapbox.js"))
-
-        with open(_esm, "r") as f:
-            lines = f.readlines()
-
-        header = []
-        footer = []
-
-        for index, line in enumerate(lines):
-            if line.strip() == "// Map content":
-                header = lines[: index + 1]
-                break
-
-        for index, line in enumerate(lines):
-            if line.strip() == "// Footer":
-                footer = lines[index:]
-                break
-
-        content = esm.replace(f"'{container}'", "div").replace(f'"{container}"', "div")
-        esm = "".join(header) + content + "".join(footer)
-
-        return esm
+        key = hashlib.sha256(f"{container}\0{esm}".encode()).hexdigest()
+        result = _esm_cache.get(key)
+        if result is None:
+            _cwd = os.path.dirname(os.path.abspath(__file__))
+            header, footer = _template(os.path.join(_cwd, "js", "mapbox.js"))
+            content = esm.replace(f"'{container}'", "div").replace(
+                f'"{container}"', "div"
+            )
+            result = header + content + footer
+            _esm_cache.put(key, result)
+        return result
 
     def _save_esm(self, output):
         """Save esm to file
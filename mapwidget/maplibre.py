@@ -1,16 +1,48 @@
 import os
+import copy
+import asyncio
+import time
 import uuid
+import contextlib
+import hashlib
+import itertools
+import json
 import pathlib
+import urllib.parse
 import anywidget
 import traitlets
 from typing import Optional, Dict, Any
+from .assets import asset_sources, handle_asset_message, map_esm
+from .cache import LRUCache
+from .calls import CallBatch, CallLog, PendingCall
+from .features import FeatureStore
+from .spatial import SpatialIndex
+from .stats import MapStats, deep_sizeof
+from .style import StyleMirror
+
+
+def _set_result(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _DrawSource:
+    """The source of the draw features in spatial queries."""
+
+    def __repr__(self):
+        return "DRAW_SOURCE"
+
+
+# The source of the features drawn with the draw control, e.g. in the sources
+# of `Map.features_at`. No source ID equals it, so sources can have any ID.
+DRAW_SOURCE = _DrawSource()
 
 
 class Map(anywidget.AnyWidget):
     """Create a MapLibre map widget."""
 
     _cwd = os.path.dirname(os.path.abspath(__file__))
-    _esm = pathlib.Path(os.path.join(_cwd, "js", "maplibre.js"))
+    _esm = map_esm("maplibre.js")
     _css = pathlib.Path(os.path.join(_cwd, "css", "maplibre.css"))
     center = traitlets.List([0, 20]).tag(sync=True, o=True)
     zoom = traitlets.Float(2).tag(sync=True, o=True)
@@ -20,30 +52,28 @@ class Map(anywidget.AnyWidget):
     width = traitlets.Unicode("100%").tag(sync=True, o=True)
     height = traitlets.Unicode("600px").tag(sync=True, o=True)
     clicked_latlng = traitlets.List([None, None]).tag(sync=True, o=True)
-    calls = traitlets.List(traitlets.Dict(), default_value=[]).tag(sync=True, o=True)
+    sync_interval = traitlets.Int(0).tag(sync=True, o=True)
     view_state = traitlets.Dict().tag(sync=True)
-    root = traitlets.Dict().tag(sync=True)
+    # Source metadata by source ID: type, loaded status and tile counts
     sources = traitlets.Dict().tag(sync=True)
     loaded = traitlets.Bool(False).tag(sync=True)
     controls = traitlets.List(traitlets.Dict(), default_value=[]).tag(sync=True, o=True)
     style = traitlets.Any().tag(sync=True)
-
-    # Draw-related traitlets
-    draw_features_selected = traitlets.List(traitlets.Dict(), default_value=[]).tag(
-        sync=True
-    )
-    draw_feature_collection_all = traitlets.Dict(
-        default_value={"type": "FeatureCollection", "features": []}
-    ).tag(sync=True)
-    draw_features_created = traitlets.List(traitlets.Dict(), default_value=[]).tag(
-        sync=True
-    )
-    draw_features_updated = traitlets.List(traitlets.Dict(), default_value=[]).tag(
-        sync=True
-    )
-    draw_features_deleted = traitlets.List(traitlets.Dict(), default_value=[]).tag(
-        sync=True
-    )
+    # Maps with the same link group follow each other in the frontend
+    link_group = traitlets.Unicode("").tag(sync=True)
+    link_cursor = traitlets.Bool(False).tag(sync=True)
+    # Record call payloads and latencies, and trait updates, see `stats`
+    instrument = traitlets.Bool(False).tag(sync=True)
+    _tile_token = traitlets.Unicode().tag(sync=True)
+    # Where the frontend loads each JS and CSS asset from
+    _assets = traitlets.Dict().tag(sync=True)
+
+    # Draw-related traitlets. Draw changes arrive as feature operations and
+    # these hold the features of the last event, from the `draw_features` store
+    draw_features_selected = traitlets.List(traitlets.Dict(), default_value=[])
+    draw_features_created = traitlets.List(traitlets.Dict(), default_value=[])
+    draw_features_updated = traitlets.List(traitlets.Dict(), default_value=[])
+    draw_features_deleted = traitlets.List(traitlets.Dict(), default_value=[])
     draw_repeat_mode = traitlets.Bool(False).tag(sync=True)
 
     def __init__(
@@ -54,6 +84,7 @@ class Map(anywidget.AnyWidget):
         pitch=0,
         style="https://tiles.openfreemap.org/styles/liberty",
         controls=None,
+        call_history=1000,
         **kwargs,
     ):
         """Initialize the Map widget.
@@ -62,9 +93,45 @@ class Map(anywidget.AnyWidget):
             center: Initial center [lng, lat]. Defaults to [0, 20]
             zoom: Initial zoom level. Defaults to 2
             controls: List of controls to add by default. Defaults to ["navigation", "fullscreen", "globe"]
+            sync_interval: Interval in milliseconds between view state updates
+                while the map moves. 0 only syncs when a move ends. Can be
+                passed as a keyword argument. Defaults to 0
+            call_history: Number of calls kept for views catching up from a
+                sequence number. Older calls are only kept in the compacted
+                state. None keeps every call. Defaults to 1000
             **kwargs: Additional widget parameters
         """
-        self._draw_control_request = None
+        # Features drawn with the draw control, by feature ID
+        self.draw_features = FeatureStore()
+        # Spatial indexes of the draw features and the GeoJSON features of
+        # each source, by source ID. Each source has its own grid, sized for
+        # the extent and density of its features.
+        self._spatial = {}
+        self._call_log = CallLog(max_size=call_history)
+        self._batches = []
+        self.render_timings = {}
+        self.point_timings = {}
+        self._point_layers = {}
+        self._animations = {}
+        self.lod_timings = {}
+        self._lod_sources = {}
+        self._streams = {}
+        self.startup_timings = []
+        self._tilers = {}
+        # Tiles are encoded in a worker thread, see `_send_tile`
+        self._tile_executor = None
+        self._style = StyleMirror()
+        self._source_data_callbacks = {}
+        self._stats = MapStats()
+        # Asyncio futures waiting for an event, see `PendingCall`, and the
+        # last call whose camera move has ended in a view
+        self._waiters = []
+        self._moveend_seq = 0
+        # Queries in flight by request ID, and the results by query, view
+        # state and call sequence number
+        self._queries = {}
+        self._query_ids = itertools.count(1)
+        self.query_cache = LRUCache(maxsize=128)
 
         super().__init__(
             center=center,
@@ -75,81 +142,435 @@ class Map(anywidget.AnyWidget):
             **kwargs,
         )
 
-        # Store default controls to add after initialization
-        self._default_controls = (
-            controls if controls is not None else ["navigation", "fullscreen", "globe"]
+        # Like every call, the controls are applied once the map has loaded
+        if controls is None:
+            controls = ["navigation", "fullscreen", "globe"]
+        for control in controls:
+            self.add_control(control, "top-right")
+
+        self.observe(self._resolve_waiters, names="loaded")
+        self.on_msg(self._handle_message)
+        self._observe_traits({"new": self.instrument})
+        self.observe(self._observe_traits, names="instrument")
+        self.observe(self._update_lod_sources, names="zoom")
+        self.observe(self._update_streams, names="bounds")
+
+    def _stat_traits(self):
+        """Get the traits recorded by the instrumentation."""
+        names = set(self.trait_names(sync=True)) - set(
+            anywidget.AnyWidget.class_trait_names(sync=True)
+        )
+        names -= {"_anywidget_id", "_esm", "_css"}
+        return sorted(names | {name for name in self.trait_names() if "draw_" in name})
+
+    def _observe_traits(self, change):
+        """Start or stop recording the trait updates."""
+        if change["new"]:
+            self.observe(self._stats.trait_changed, names=self._stat_traits())
+        else:
+            try:
+                self.unobserve(self._stats.trait_changed, names=self._stat_traits())
+            except ValueError:
+                pass  # Not observed
+
+    def ready(self) -> PendingCall:
+        """
+        Returns an awaitable that completes once the map has loaded.
+
+        Calls made before are held by the frontend and applied in order once
+        the map has loaded, so awaiting is only needed to act on the loaded
+        map, e.g. to query it.
+
+        Returns:
+            PendingCall: The awaitable.
+
+        Example:
+            ```python
+            async def main():
+                await m.ready()
+                await m.fly_to(center=[2.35, 48.86], zoom=12)
+                print(m.bounds)
+
+            asyncio.ensure_future(main())
+            ```
+        """
+        return PendingCall(self, None, "loaded")
+
+    def _event_done(self, event, seq):
+        """Check whether the event of a `PendingCall` happened."""
+        if event == "loaded":
+            return self.loaded
+        if event == "moveend":
+            return seq <= self._moveend_seq
+        return seq <= self._call_log.acked_seq
+
+    def _wait_for(self, event, seq):
+        """Get an asyncio future of the event of a `PendingCall`."""
+        future = asyncio.get_running_loop().create_future()
+        if self._event_done(event, seq):
+            future.set_result(None)
+        else:
+            self._waiters.append((event, seq, future))
+        return future
+
+    def _resolve_waiters(self, change=None):
+        """Complete the futures whose event happened."""
+        waiting = []
+        for event, seq, future in self._waiters:
+            if future.done():
+                continue  # Cancelled, e.g. by a timeout
+            if self._event_done(event, seq):
+                future.get_loop().call_soon_threadsafe(_set_result, future)
+            else:
+                waiting.append((event, seq, future))
+        self._waiters = waiting
+
+    def _handle_message(self, widget, content, buffers):
+        """Handle custom messages sent by the frontend."""
+        msg_type = content.get("type")
+        if self.instrument:
+            self._stats.message(content, buffers)
+        if msg_type == "sync":
+            # A new view asks for the calls made before it was displayed, and
+            # applies them in one animation frame
+            self._send_calls(
+                self._call_log.replay(content.get("seq", 0)), replay=True, batch=True
+            )
+            # The new view starts without the streamed features
+            for stream in self._streams.values():
+                stream.refresh(evict=False)
+        elif msg_type == "ack":
+            self._call_log.ack(content.get("seq", 0))
+            if "timings" in content:
+                self._stats.acked(content["timings"])
+            if self._waiters:
+                self._resolve_waiters()
+        elif msg_type == "moveend":
+            self._moveend_seq = max(self._moveend_seq, content.get("seq", 0))
+            if self._waiters:
+                self._resolve_waiters()
+        elif msg_type == "style_patch":
+            self._style.apply(content)
+        elif msg_type == "source_data":
+            source_id = content["source_id"]
+            self._style.set_source_data(
+                source_id, content["data"], content.get("version")
+            )
+            for callback in self._source_data_callbacks.pop(source_id, []):
+                callback(content["data"])
+        elif msg_type == "draw":
+            self._handle_draw(content)
+        elif msg_type == "tile_request":
+            self._send_tile(content)
+        elif msg_type == "render_timing":
+            self.render_timings[content["source_id"]] = {
+                key: content[key] for key in ("transport", "decode_ms", "render_ms")
+            }
+        elif msg_type == "animation_stats":
+            animation = self._animations.get(content["id"])
+            if animation is not None:
+                animation._update(content)
+        elif msg_type == "points_timing":
+            self._handle_points_timing(content)
+        elif msg_type == "query_result":
+            self._resolve_query(content, buffers)
+        elif msg_type in ("asset_request", "startup"):
+            handle_asset_message(self, content, buffers)
+
+    def _handle_draw(self, content):
+        """Apply the draw control changes sent by the frontend."""
+        event = content.get("event")
+        if event == "selection":
+            self.draw_features_selected = [
+                self.draw_features[feature_id]
+                for feature_id in content["ids"]
+                if feature_id in self.draw_features
+            ]
+            return
+        upserted, deleted = self.draw_features.apply(content.get("ops", []))
+        index = self._spatial.setdefault(DRAW_SOURCE, SpatialIndex())
+        for feature in deleted:
+            if feature["id"] not in self.draw_features:
+                index.delete(feature["id"])
+        for feature in upserted:
+            if self.draw_features.get(feature["id"]) is feature:
+                index.insert(feature["id"], feature)
+        if event == "create":
+            self.draw_features_created = upserted
+        elif event == "update":
+            self.draw_features_updated = upserted
+        elif event == "delete":
+            self.draw_features_deleted = deleted
+        elif event == "clear":
+            self.draw_features_selected = []
+            self.draw_features_created = []
+            self.draw_features_updated = []
+            self.draw_features_deleted = []
+
+    @property
+    def draw_feature_collection_all(self) -> Dict[str, Any]:
+        """
+        The features drawn with the draw control, as a FeatureCollection.
+
+        The collection is built on access from the `draw_features` store.
+        """
+        return self.draw_features.to_geojson()
+
+    @traitlets.default("_tile_token")
+    def _default_tile_token(self):
+        return uuid.uuid4().hex
+
+    @traitlets.default("_assets")
+    def _default_assets(self):
+        return asset_sources(
+            [
+                "maplibre-gl.js",
+                "maplibre-gl.css",
+                "mapbox-gl-draw.js",
+                "mapbox-gl-draw.css",
+                "mapbox-gl-legend.js",
+                "mapbox-gl-legend.css",
+                "maplibre-gl-opacity.js",
+                "maplibre-gl-opacity.css",
+                "maplibre-cog-protocol.js",
+            ]
         )
 
-        # Add default controls after widget is ready
-        self.observe(self._add_default_controls, names="loaded")
-
-    def _add_default_controls(self, change):
-        """Add default controls when the map is loaded."""
-        if change["new"] and self._default_controls:
-            for control in self._default_controls:
-                self.add_control(control, "top-right")
-            self._default_controls = []  # Clear to avoid re-adding
-
-        if self._draw_control_request:
-            self.add_call("addDrawControl", self._draw_control_request)
-            self._draw_control_request = None
-
-        if hasattr(self, "_pending_draw_mode"):
-            for mode in self._pending_draw_mode:
-                self.add_call("setDrawMode", [mode])
-            del self._pending_draw_mode
-
-        if hasattr(self, "_pending_legend"):
-            for targets, options, position in self._pending_legend:
-                self.add_call("addLegendControl", [targets, options, position])
-            del self._pending_legend
-
-        if hasattr(self, "_pending_opacity"):
-            for (
-                baseLayers,
-                overLayers,
-                options,
-                position,
-                defaultVisibility,
-            ) in self._pending_opacity:
-                self.add_call(
-                    "addOpacityControl",
-                    [baseLayers, overLayers, options, position, defaultVisibility],
+    def _send_tile(self, request):
+        """Reply to a tile request of the kernel tile protocol.
+
+        The tile is encoded in a worker thread, so the kernel keeps handling
+        messages while large tiles are built, and the reply is sent from the
+        event loop of the kernel if one runs.
+        """
+        if self._tile_executor is None:
+            import concurrent.futures
+
+            self._tile_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="mapwidget-tiles"
+            )
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        return self._tile_executor.submit(self._encode_tile, request, loop)
+
+    def _encode_tile(self, request, loop):
+        reply = {"type": "tile_response", "id": request["id"]}
+        buffers = None
+        entry = self._tilers.get(request["source_id"])
+        try:
+            if entry is None:
+                raise KeyError(f"No kernel tile source {request['source_id']}")
+            buffers = [entry["tiler"].tile(request["z"], request["x"], request["y"])]
+        except Exception as e:
+            reply["error"] = str(e)
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.send, reply, buffers)
+        else:
+            self.send(reply, buffers=buffers)
+
+    def _send_calls(self, entries, replay=False, batch=False):
+        """Send sequenced call entries to the frontend.
+
+        Binary buffers attached to the calls are sent as message buffers, and
+        each call refers to its buffers by their index in the message.
+        """
+        calls = []
+        buffers = []
+        for entry in entries:
+            if "buffers" in entry:
+                indices = list(
+                    range(len(buffers), len(buffers) + len(entry["buffers"]))
                 )
-            del self._pending_opacity
+                buffers.extend(entry["buffers"])
+                entry = dict(entry, buffers=indices)
+            calls.append(entry)
+        msg = {"type": "calls", "calls": calls}
+        if replay:
+            msg["replay"] = True
+        if batch:
+            msg["batch"] = True
+        self.send(msg, buffers=buffers or None)
+
+    @property
+    def calls(self):
+        """Get the calls retained in the call log."""
+        return self._call_log.since(0)
+
+    @property
+    def compacted_calls(self):
+        """Get the minimal set of calls replayed to newly displayed views."""
+        return self._call_log.replay(0)
+
+    def stats(self, log: bool = False, reset: bool = False) -> Dict[str, Any]:
+        """
+        Get the measures recorded while `instrument` is on, and the memory use.
+
+        Args:
+            log (bool): Whether to include the structured log of the last
+                acknowledged calls. Defaults to False.
+            reset (bool): Whether to forget the measures afterwards. Defaults
+                to False.
+
+        Returns:
+            Dict[str, Any]: The measures, see `mapwidget.stats.MapStats.summary`:
+                for each call method, the count, total and percentiles of its
+                payload 'bytes', of its 'latency_ms' from queued in the kernel
+                to applied in the frontend, and of its JS 'handler_ms'; the
+                count and sizes of the updates of each synced trait and of the
+                messages of the frontend. 'memory' holds the kernel memory use,
+                see `memory_usage`. 'log' holds, for each call, its 'seq',
+                'method', 'bytes', 'queued' and 'applied' times, 'wait_ms',
+                'handler_ms' and 'latency_ms'.
+
+        Example:
+            ```python
+            m.instrument = True
+            ...
+            m.stats()["calls"]["setPaintProperty"]["latency_ms"]["p90"]
+            ```
+        """
+        result = self._stats.summary()
+        result["memory"] = self.memory_usage()
+        if log:
+            result["log"] = list(self._stats.log)
+        if reset:
+            self._stats.reset()
+        return result
+
+    def memory_usage(self) -> Dict[str, Any]:
+        """
+        Get the approximate kernel memory use of the map in bytes.
+
+        Returns:
+            Dict[str, Any]: The size of each synced trait ('traits'), of the
+                mirrored style ('root'), of the call log ('calls') and its
+                compacted state ('compacted_calls'), of the draw features,
+                the spatial index, the array layer tilers, the point layers and
+                the levels of detail of the GeoJSON sources.
+        """
+        return {
+            "traits": {
+                name: deep_sizeof(getattr(self, name)) for name in self._stat_traits()
+            },
+            "root": deep_sizeof(self._style),
+            "calls": deep_sizeof(self._call_log._entries),
+            "compacted_calls": deep_sizeof(self._call_log.state),
+            "draw_features": deep_sizeof(self.draw_features),
+            "spatial_index": deep_sizeof(self._spatial),
+            "tilers": sum(
+                deep_sizeof(entry["tiler"]) for entry in self._tilers.values()
+            ),
+            "point_layers": deep_sizeof(self._point_layers),
+            "lod_sources": deep_sizeof(self._lod_sources),
+        }
+
+    @property
+    def root(self):
+        """Get the current style of the map.
+
+        The style is mirrored in the kernel from structural diffs sent by the
+        frontend. Inline GeoJSON source data is only included once it has been
+        fetched with `request_source_data`, until it changes in the frontend.
+        """
+        return self._style.to_dict()
 
     @property
     def layers(self):
-        """Get the current style of the map."""
-        return self.root.get("layers", [])
+        """Get the layers of the current style of the map."""
+        return self._style.layers
 
     @property
     def layer_names(self):
         """Get the names of the layers in the map."""
         return [layer["id"] for layer in self.layers]
 
-    def add_call(self, method: str, args: list = None, kwargs: dict = None):
-        """Invoke a JS map method with arguments."""
-        if args is None:
-            args = []
-        if kwargs is None:
-            kwargs = {}
-        self.calls = self.calls + [{"method": method, "args": args, "kwargs": kwargs}]
+    def add_call(
+        self, method: str, args: list = None, kwargs: dict = None, buffers=None
+    ) -> PendingCall:
+        """Invoke a JS map method with arguments.
+
+        Each call is sequenced and sent to the frontend on its own, so the cost
+        of a call does not depend on how many calls were made before it.
+        Binary buffers, if any, are passed to the JS handler of the method.
+        The frontend holds the calls made before the map has loaded and
+        applies them in order once it has.
+
+        Returns:
+            PendingCall: An awaitable that completes once a view has applied
+                the call.
+        """
+        entry = self._call_log.append(method, args, kwargs, buffers)
+        if self.instrument:
+            self._stats.queued(entry)
+        if self._batches:
+            self._batches[-1].calls.append(entry)
+        else:
+            self._send_calls([entry])
+        return PendingCall(self, entry["seq"])
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Collect the calls made inside the context and send them as one message.
 
-    def set_center(self, lng: float, lat: float):
+        The frontend applies the whole batch within a single animation frame.
+        Nested batches are shipped by the outermost one. If the block raises,
+        the calls it made are discarded. Since this is a context manager, it can
+        also be used as a decorator with ``@m.batch()``.
+
+        Yields:
+            CallBatch: The batch. Its ``coalesced`` attribute reports how many
+                calls were coalesced into the message.
+
+        Example:
+            ```python
+            with m.batch() as batch:
+                for layer_id in layer_ids:
+                    m.set_paint_property(layer_id, "fill-opacity", 0.5)
+            print(batch.coalesced)
+            ```
+        """
+        batch = CallBatch()
+        start_seq = self._call_log.checkpoint()
+        self._batches.append(batch)
+        try:
+            yield batch
+        except BaseException:
+            self._batches.pop()
+            self._call_log.rollback(start_seq)
+            self._call_log.release()
+            batch.calls = []
+            raise
+        self._batches.pop()
+        self._call_log.release()
+        if self._batches:
+            self._batches[-1].calls.extend(batch.calls)
+        elif batch.calls:
+            self._send_calls(batch.calls, batch=True)
+
+    def _camera_call(self, method, args) -> PendingCall:
+        """Make a camera call, awaitable until the camera move has ended."""
+        return PendingCall(self, self.add_call(method, args).seq, "moveend")
+
+    def set_center(self, lng: float, lat: float) -> PendingCall:
         """Set the center of the map."""
-        self.add_call("setCenter", [[lng, lat]])
+        return self._camera_call("setCenter", [[lng, lat]])
 
-    def set_zoom(self, zoom: float):
+    def set_zoom(self, zoom: float) -> PendingCall:
         """Set the zoom level."""
-        self.add_call("setZoom", [zoom])
+        return self._camera_call("setZoom", [zoom])
 
-    def pan_to(self, lng: float, lat: float):
+    def pan_to(self, lng: float, lat: float) -> PendingCall:
         """Pan the map to a given location."""
-        self.add_call("panTo", [[lng, lat]])
+        return self._camera_call("panTo", [[lng, lat]])
 
-    def fly_to(self, center=None, zoom=None, bearing=None, pitch=None):
-        """Fly to a given location with optional zoom, bearing, and pitch."""
+    def fly_to(self, center=None, zoom=None, bearing=None, pitch=None) -> PendingCall:
+        """Fly to a given location with optional zoom, bearing, and pitch.
+
+        Like the other camera methods, returns a `PendingCall` that can be
+        awaited until the flight has ended, e.g. ``await m.fly_to(zoom=5)``.
+        """
         options = {}
         if center:
             options["center"] = center
@@ -159,69 +580,1201 @@ class Map(anywidget.AnyWidget):
             options["bearing"] = bearing
         if pitch is not None:
             options["pitch"] = pitch
-        self.add_call("flyTo", [options])
+        return self._camera_call("flyTo", [options])
 
-    def fit_bounds(self, bounds: list, options: dict = None):
+    def fit_bounds(self, bounds: list, options: dict = None) -> PendingCall:
         """Fit the map to given bounds [[west, south], [east, north]]."""
         args = [bounds]
         if options:
             args.append(options)
-        self.add_call("fitBounds", args)
+        return self._camera_call("fitBounds", args)
 
-    def set_pitch(self, pitch: float):
+    def set_pitch(self, pitch: float) -> PendingCall:
         """Set the pitch of the map."""
-        self.add_call("setPitch", [pitch])
+        return self._camera_call("setPitch", [pitch])
 
-    def set_bearing(self, bearing: float):
+    def set_bearing(self, bearing: float) -> PendingCall:
         """Set the bearing of the map."""
-        self.add_call("setBearing", [bearing])
+        return self._camera_call("setBearing", [bearing])
 
-    def resize(self):
+    def resize(self) -> PendingCall:
         """Trigger map resize."""
-        self.add_call("resize")
+        return self.add_call("resize")
 
-    def add_source(self, source_id: str, source: dict):
+    def add_source(self, source_id: str, source: dict) -> PendingCall:
         """Add a new source to the map."""
-        self.add_call("addSource", [source_id, source])
+        if source.get("type") == "geojson" and isinstance(source.get("data"), dict):
+            self._index_source(source_id, source["data"])
+        return self.add_call("addSource", [source_id, source])
+
+    def _index_source(self, source_id, data):
+        """Index the features of a GeoJSON source for spatial queries."""
+        from .encoding import _features
+
+        features = _features(data)
+        index = self._spatial[source_id] = SpatialIndex()
+        try:
+            index.insert_many(list(range(len(features))), data)
+        except ImportError:
+            for key, feature in enumerate(features):
+                index.insert(key, feature)
+
+    def add_geojson(
+        self,
+        source_id: str,
+        data: dict,
+        source_options: Optional[Dict[str, Any]] = None,
+        dtype: str = "float64",
+    ) -> PendingCall:
+        """
+        Adds GeoJSON data to the map using a binary columnar transport.
 
-    def remove_source(self, source_id: str):
+        Instead of sending the GeoJSON as JSON text, the coordinates are packed
+        into typed float buffers with ring, part and geometry offset arrays, and
+        sent as binary widget buffers. The frontend rebuilds the features and
+        feeds them to a GeoJSON source. If the source already exists, its data
+        is replaced. GeometryCollections are not supported, add such data with
+        `add_source`. Requires numpy.
+
+        Args:
+            source_id (str): The ID of the GeoJSON source.
+            data (dict): A GeoJSON FeatureCollection, Feature or geometry.
+            source_options (Optional[Dict[str, Any]]): Additional options for
+                the GeoJSON source, such as 'cluster' or 'promoteId'.
+                Defaults to None.
+            dtype (str): The coordinate type, 'float64' or 'float32'. float32
+                halves the payload at the cost of about 1 m of precision.
+                Defaults to 'float64'.
+
+        Returns:
+            PendingCall: An awaitable that completes once a view has applied
+                the call.
+        """
+        from .encoding import encode_geojson
+
+        if source_options is None:
+            source_options = {}
+
+        header, buffers = encode_geojson(data, dtype=dtype)
+        self._lod_sources.pop(source_id, None)
+        self._index_source(source_id, data)
+        return self.add_call(
+            "addGeoJSONBinary", [source_id, header, source_options], buffers=buffers
+        )
+
+    def add_geojson_lod(
+        self,
+        source_id: str,
+        data: dict,
+        bands=(0, 4, 8, 12),
+        pixels: float = 1.0,
+        method: str = "dp",
+        preserve_topology: bool = False,
+        source_options: Optional[Dict[str, Any]] = None,
+        dtype: str = "float64",
+    ) -> Dict[str, Any]:
+        """
+        Adds GeoJSON data with levels of detail that follow the zoom.
+
+        A simplified version of the data is precomputed for each zoom band,
+        and the source holds the level of the current zoom. When the synced
+        `zoom` trait crosses into another band, the source data is replaced
+        with its level, sent with the binary transport of `add_geojson`.
+        Spatial queries use the full resolution data. Requires numpy.
+
+        Args:
+            source_id (str): The ID of the GeoJSON source.
+            data (dict): A GeoJSON FeatureCollection, Feature or geometry.
+            bands (tuple): The lowest zoom of each band. Each band is
+                simplified for its upper zoom, and the last band keeps the full
+                resolution. Defaults to (0, 4, 8, 12).
+            pixels (float): The simplification tolerance in screen pixels.
+                Defaults to 1.0.
+            method (str): 'dp' (Douglas-Peucker) or 'vw'
+                (Visvalingam-Whyatt). Defaults to 'dp'.
+            preserve_topology (bool): Whether to keep the vertices shared by
+                several rings and at least four vertices per polygon ring,
+                rather than dropping the rings that collapse. Defaults to False.
+            source_options (Optional[Dict[str, Any]]): Additional options for
+                the GeoJSON source. Defaults to None.
+            dtype (str): The coordinate type, 'float64' or 'float32'.
+                Defaults to 'float64'.
+
+        Returns:
+            Dict[str, Any]: The precomputation time in 'precompute_ms' and,
+                in 'levels', the zoom band, tolerance, number of features and
+                vertices, size in bytes and simplification time of each level.
+                Also stored in `lod_timings`.
+        """
+        from .simplify import build_levels, level_index
+
+        start = time.perf_counter()
+        levels = build_levels(data, bands, pixels, method, preserve_topology, dtype)
+        report = {
+            "precompute_ms": (time.perf_counter() - start) * 1000,
+            "levels": [
+                {key: level[key] for key in level if key not in ("header", "buffers")}
+                for level in levels
+            ],
+        }
+        self.lod_timings[source_id] = report
+        self._index_source(source_id, data)
+        self._lod_sources[source_id] = {
+            "levels": levels,
+            "options": source_options or {},
+            "current": None,
+        }
+        self._send_lod_level(source_id, level_index(levels, self.zoom))
+        return report
+
+    def _send_lod_level(self, source_id, index):
+        """Replace the data of a source with one of its levels of detail."""
+        entry = self._lod_sources[source_id]
+        if entry["current"] == index:
+            return
+        entry["current"] = index
+        level = entry["levels"][index]
+        self.add_call(
+            "addGeoJSONBinary",
+            [source_id, level["header"], entry["options"]],
+            buffers=level["buffers"],
+        )
+
+    def _update_lod_sources(self, change):
+        """Swap the levels of detail of the sources as the zoom changes."""
+        from .simplify import level_index
+
+        for source_id, entry in list(self._lod_sources.items()):
+            self._send_lod_level(source_id, level_index(entry["levels"], change["new"]))
+
+    def remove_source(self, source_id: str) -> PendingCall:
         """Remove a source from the map."""
-        self.add_call("removeSource", [source_id])
+        self._lod_sources.pop(source_id, None)
+        if source_id in self._streams:
+            self._streams.pop(source_id).close()
+        self._spatial.pop(source_id, None)
+        entry = self._tilers.pop(source_id, None)
+        if entry is not None and entry.get("server") is not None:
+            entry["server"].remove_tiler(entry["name"])
+        return self.add_call("removeSource", [source_id])
+
+    def get_source(self, source_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the full definition of a source from the mirrored style.
+
+        The synced `sources` trait only holds source metadata (type, loaded
+        status and tile counts). Use this method to query a full definition.
+        Inline GeoJSON data is replaced by a placeholder until it is fetched
+        with `request_source_data`, and again once it changes in the frontend.
+
+        Args:
+            source_id (str): The ID of the source.
+
+        Returns:
+            Optional[Dict[str, Any]]: The source definition, or None if the
+                map has no such source.
+        """
+        source = self._style.sources.get(source_id)
+        return copy.deepcopy(source) if source is not None else None
+
+    def features_at(
+        self,
+        lng: Optional[float] = None,
+        lat: Optional[float] = None,
+        tolerance: Optional[float] = None,
+        sources: Optional[list] = None,
+    ) -> list:
+        """
+        Returns the features under a point, from a kernel-side spatial index.
+
+        The index holds the features drawn with the draw control (source
+        `DRAW_SOURCE`) and the GeoJSON features added through `add_source`,
+        `add_geojson` and `add_vector_tile_source`.
+
+        Args:
+            lng (Optional[float]): The longitude of the point. Defaults to the
+                last clicked location.
+            lat (Optional[float]): The latitude of the point. Defaults to the
+                last clicked location.
+            tolerance (Optional[float]): The distance in degrees within which
+                points and lines are hit. Defaults to 3 pixels at the current
+                zoom level.
+            sources (Optional[list]): The IDs of the sources to query. Defaults
+                to all sources.
+
+        Returns:
+            list: The features, polygons covering the point and points and
+                lines within tolerance of it.
+        """
+        if lng is None or lat is None:
+            lng, lat = self.clicked_latlng
+            if lng is None:
+                return []
+        if tolerance is None:
+            tolerance = 3 * 360 / (512 * 2**self.zoom)
+        return [
+            feature
+            for index in self._indexes(sources)
+            for feature in index.features_at(lng, lat, tolerance)
+        ]
+
+    def features_in_bounds(
+        self, bbox: Optional[list] = None, sources: Optional[list] = None
+    ) -> list:
+        """
+        Returns the features whose bounding box intersects a bounding box.
+
+        See `features_at` for the indexed features.
+
+        Args:
+            bbox (Optional[list]): The [west, south, east, north] bounds.
+                Defaults to the current bounds of the map.
+            sources (Optional[list]): The IDs of the sources to query. Defaults
+                to all sources.
+
+        Returns:
+            list: The features.
+        """
+        if bbox is None:
+            bbox = self.bounds
+        return [
+            feature
+            for index in self._indexes(sources)
+            for feature in index.features_in_bounds(bbox)
+        ]
+
+    def _indexes(self, sources):
+        """Get the spatial indexes of the sources, or of all sources."""
+        if sources is None:
+            return list(self._spatial.values())
+        return [
+            self._spatial[key] for key in dict.fromkeys(sources) if key in self._spatial
+        ]
+
+    def set_feature_states(
+        self,
+        source_id: str,
+        ids,
+        values,
+        state: str = "value",
+        source_layer: Optional[str] = None,
+        dtype: str = "float32",
+    ) -> PendingCall:
+        """
+        Sets the feature states of many features of a source at once.
+
+        The IDs and values are sent as packed binary buffers, and the frontend
+        applies them with `setFeatureState` within one animation frame, so
+        animating a choropleth only sends the changing values, never the
+        geometries. Use the states in paint properties with
+        ``["feature-state", state]`` expressions. Requires numpy.
+
+        Args:
+            source_id (str): The ID of the source. Its features need numeric
+                IDs, or string IDs promoted with the `promoteId` source
+                option.
+            ids (array-like): The feature IDs.
+            values (array-like | dict): The values of the state, one per
+                feature, or a dict of such arrays by state name. NaN values
+                remove the state of a feature.
+            state (str): The name of the state when values is an array.
+                Defaults to 'value'.
+            source_layer (Optional[str]): The source layer of vector tile
+                sources. Defaults to None.
+            dtype (str): The value type sent, 'float32' or 'float64'.
+                Defaults to 'float32'.
+
+        Returns:
+            PendingCall: An awaitable that completes once a view has applied
+                the call.
+
+        Example:
+            ```python
+            for frame in unemployment:
+                m.set_feature_states("counties", fips, frame, state="rate")
+            ```
+        """
+        from .encoding import encode_feature_states
+
+        if not isinstance(values, dict):
+            values = {state: values}
+        header, buffers = encode_feature_states(ids, values, dtype=dtype)
+        # Calls setting the same states of the same features supersede each
+        # other in the replayed calls
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(repr(header.get("ids")).encode())
+        if "ids" not in header:
+            digest.update(buffers[0])
+        header["key"] = digest.hexdigest()
+        if source_layer is not None:
+            header["source_layer"] = source_layer
+        return self.add_call("setFeatureStates", [source_id, header], buffers=buffers)
+
+    def request_source_data(self, source_id: str, callback=None) -> None:
+        """
+        Fetches the inline GeoJSON data of a source from the frontend.
 
-    def add_layer(self, layer: dict, before_id: str = None):
+        Inline source data is not mirrored in the kernel until it is requested.
+        Once the frontend replies, the data is stored in the mirrored style
+        (see `root`) and passed to the callback.
+
+        Args:
+            source_id (str): The ID of the GeoJSON source.
+            callback (Optional[Callable]): A function called with the data
+                when it arrives. Defaults to None.
+
+        Returns:
+            None
+        """
+        if callback is not None:
+            self._source_data_callbacks.setdefault(source_id, []).append(callback)
+        self.send({"type": "get_source_data", "source_id": source_id})
+
+    def _query(self, method, params, timeout):
+        """Send a query to the frontend and return the future of its result.
+
+        The result is cached under the query, the view state and the sequence
+        number of the last call, so a query repeated while neither the view
+        nor the map changed is answered by the kernel. Unanswered queries
+        expire in the event loop of the kernel, see `query.call_later`.
+        """
+        from .query import QueryFuture, call_later
+
+        key = (
+            method,
+            json.dumps(params, sort_keys=True, default=str),
+            json.dumps([self.center, self.zoom, self.bearing, self.pitch, self.bounds]),
+            self._call_log.seq,
+        )
+        future = self.query_cache.get(key)
+        if future is not None and not (future.done() and future.exception()):
+            return future
+
+        future = QueryFuture()
+        request_id = next(self._query_ids)
+        entry = self._queries[request_id] = [future, key, None]
+        # Concurrent identical queries share the request
+        self.query_cache.put(key, future)
+        # Scheduled once the query is registered, so it expires even if the
+        # timeout thread runs first
+        entry[2] = call_later(timeout, self._expire_query, request_id)
+        self.send(
+            {"type": "query", "id": request_id, "method": method, "params": params}
+        )
+        return future
+
+    def _resolve_query(self, content, buffers):
+        """Complete a query with the answer of the frontend."""
+        from .query import decode_features, decode_points
+
+        entry = self._queries.pop(content.get("id"), None)
+        if entry is None:
+            return  # Answered by another view, or expired
+        future, key, timer = entry
+        timer.cancel()
+        if "error" in content:
+            self.query_cache.pop(key)
+            future.set_exception(RuntimeError(content["error"]))
+            return
+        result = content.get("result")
+        kind = content.get("kind")
+        if kind == "features":
+            result = decode_features(result, buffers)
+        elif kind == "points":
+            result = decode_points(buffers)
+            if content.get("single"):
+                result = result[0]
+        future.set_result(result)
+
+    def _expire_query(self, request_id):
+        """Fail a query no view has answered in time."""
+        entry = self._queries.pop(request_id, None)
+        if entry is not None:
+            future, key, _ = entry
+            self.query_cache.pop(key)
+            future.set_exception(
+                TimeoutError(f"No view answered query {request_id} in time")
+            )
+
+    def query_rendered_features(
+        self,
+        geometry: Optional[list] = None,
+        layers: Optional[list] = None,
+        filter: Optional[list] = None,
+        timeout: float = 5.0,
+    ):
+        """
+        Queries the features rendered by a view, as a future.
+
+        The frontend waits for the map to finish rendering, and sends the
+        features back in a binary columnar encoding. The result is cached
+        until the view or the map changes.
+
+        Args:
+            geometry (Optional[list]): A [lng, lat] point or a [west, south,
+                east, north] bounding box. Defaults to the whole view.
+            layers (Optional[list]): The IDs of the layers to query. Defaults
+                to every layer.
+            filter (Optional[list]): A filter expression the features must
+                match. Defaults to None.
+            timeout (float): The time in seconds to wait for a view to answer.
+                Defaults to 5.0.
+
+        Returns:
+            QueryFuture: The future of a GeoJSON FeatureCollection, whose
+                features also have their 'layer' ID, 'source', 'sourceLayer'
+                and feature 'state'.
+
+        Example:
+            ```python
+            features = await m.query_rendered_features([2.35, 48.86])
+            ```
+        """
+        params = {}
+        if geometry is not None:
+            params["geometry"] = list(geometry)
+        if layers is not None:
+            params["layers"] = list(layers)
+        if filter is not None:
+            params["filter"] = filter
+        return self._query("queryRenderedFeatures", params, timeout)
+
+    def query_source_features(
+        self,
+        source_id: str,
+        source_layer: Optional[str] = None,
+        filter: Optional[list] = None,
+        timeout: float = 5.0,
+    ):
+        """
+        Queries the features of a source loaded by a view, as a future.
+
+        Only the features of the tiles the view has loaded are returned, and
+        features spanning several tiles may be returned once per tile.
+
+        Args:
+            source_id (str): The ID of the source.
+            source_layer (Optional[str]): The layer of a vector tile source.
+                Defaults to None.
+            filter (Optional[list]): A filter expression the features must
+                match. Defaults to None.
+            timeout (float): The time in seconds to wait for a view to answer.
+                Defaults to 5.0.
+
+        Returns:
+            QueryFuture: The future of a GeoJSON FeatureCollection.
+        """
+        params = {"source_id": source_id}
+        if source_layer is not None:
+            params["source_layer"] = source_layer
+        if filter is not None:
+            params["filter"] = filter
+        return self._query("querySourceFeatures", params, timeout)
+
+    def get_feature_state(
+        self,
+        source_id: str,
+        feature_id,
+        source_layer: Optional[str] = None,
+        timeout: float = 5.0,
+    ):
+        """
+        Gets the state of a feature in a view, as a future.
+
+        Args:
+            source_id (str): The ID of the source.
+            feature_id (int or str): The ID of the feature.
+            source_layer (Optional[str]): The layer of a vector tile source.
+                Defaults to None.
+            timeout (float): The time in seconds to wait for a view to answer.
+                Defaults to 5.0.
+
+        Returns:
+            QueryFuture: The future of the state dict.
+        """
+        params = {"source_id": source_id, "id": feature_id}
+        if source_layer is not None:
+            params["source_layer"] = source_layer
+        return self._query("getFeatureState", params, timeout)
+
+    def project(self, lnglat: list, timeout: float = 5.0):
+        """
+        Projects coordinates to pixels of a view, as a future.
+
+        Args:
+            lnglat (list): A [lng, lat] pair, or a list of them.
+            timeout (float): The time in seconds to wait for a view to answer.
+                Defaults to 5.0.
+
+        Returns:
+            QueryFuture: The future of the [x, y] pixel coordinates, or a list
+                of them.
+        """
+        return self._points_query("project", lnglat, timeout)
+
+    def unproject(self, point: list, timeout: float = 5.0):
+        """
+        Converts pixels of a view to coordinates, as a future.
+
+        Args:
+            point (list): An [x, y] pair of pixel coordinates, or a list of
+                them.
+            timeout (float): The time in seconds to wait for a view to answer.
+                Defaults to 5.0.
+
+        Returns:
+            QueryFuture: The future of the [lng, lat] coordinates, or a list
+                of them.
+        """
+        return self._points_query("unproject", point, timeout)
+
+    def _points_query(self, method, points, timeout):
+        single = len(points) > 0 and isinstance(points[0], (int, float))
+        if single:
+            points = [points]
+        params = {"points": [[float(x), float(y)] for x, y in points]}
+        if single:
+            params["single"] = True
+        return self._query(method, params, timeout)
+
+    def add_vector_tile_source(
+        self,
+        source_id: str,
+        data: dict,
+        layer_name: Optional[str] = None,
+        max_zoom: int = 14,
+        cache_size: int = 512,
+        source_options: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ):
+        """
+        Adds a vector tile source whose tiles are generated by the kernel.
+
+        Sending a very large FeatureCollection to the browser does not scale.
+        Instead, the features are indexed per tile in the kernel, and the map
+        fetches clipped, MVT-encoded tiles on demand through the custom
+        'mapwidget://' protocol, which requests them over the widget comm.
+        No HTTP server is needed. Generated tiles are kept in an LRU cache.
+        Requires numpy.
+
+        Args:
+            source_id (str): The ID of the vector source.
+            data (dict): A GeoJSON FeatureCollection, Feature or geometry.
+            layer_name (Optional[str]): The name of the layer inside the tiles,
+                to be used as 'source-layer' by the map layers. Defaults to
+                the source ID.
+            max_zoom (int): The maximum zoom level of the tiles. The map
+                overzooms the tiles beyond it. Defaults to 14.
+            cache_size (int): The number of encoded tiles kept in the LRU
+                cache. Defaults to 512.
+            source_options (Optional[Dict[str, Any]]): Additional options for
+                the vector source. Defaults to None.
+            **kwargs (Any): Additional keyword arguments for
+                `mapwidget.tiler.VectorTiler`, such as 'index_zoom', 'buffer',
+                'tolerance' or 'point_spacing'.
+
+        Returns:
+            VectorTiler: The tiler generating the tiles of the source.
+
+        Example:
+            ```python
+            m.add_vector_tile_source("parcels", parcels)
+            m.add_layer(
+                {
+                    "id": "parcels",
+                    "type": "fill",
+                    "source": "parcels",
+                    "source-layer": "parcels",
+                    "paint": {"fill-color": "#3bb2d0"},
+                }
+            )
+            ```
+        """
+        from .tiler import VectorTiler
+
+        if source_options is None:
+            source_options = {}
+        if layer_name is None:
+            layer_name = source_id
+
+        tiler = VectorTiler(
+            data,
+            layer_name=layer_name,
+            max_zoom=max_zoom,
+            cache_size=cache_size,
+            **kwargs,
+        )
+        self._tilers[source_id] = {"tiler": tiler, "version": 0}
+        self._index_source(source_id, data)
+        source = {
+            "type": "vector",
+            "tiles": [self._tile_url(source_id, 0)],
+            "maxzoom": max_zoom,
+            **source_options,
+        }
+        self.add_source(source_id, source)
+        return tiler
+
+    def invalidate_tiles(
+        self, source_id: str, data: Optional[dict] = None
+    ) -> PendingCall:
+        """
+        Clears the tile cache of a kernel tile source and reloads its tiles.
+
+        Args:
+            source_id (str): The ID of a source added with
+                `add_vector_tile_source` or `add_array_layer`.
+            data (Optional[dict]): The new features, or the new array, of the
+                source. If None, only the cache is cleared. Defaults to None.
+
+        Returns:
+            PendingCall: An awaitable that completes once a view has applied
+                the call.
+        """
+        entry = self._tilers[source_id]
+        if data is not None:
+            entry["tiler"].set_data(data)
+            if source_id in self._spatial:
+                self._index_source(source_id, data)
+        else:
+            entry["tiler"].invalidate()
+        return self._reload_tiles(source_id)
+
+    def _reload_tiles(self, source_id):
+        entry = self._tilers[source_id]
+        entry["version"] += 1
+        # A new tile URL makes the map drop the tiles it already loaded
+        return self.add_call(
+            "setSourceTiles", [source_id, [self._tile_url(source_id, entry["version"])]]
+        )
+
+    def _tile_url(self, source_id, version):
+        entry = self._tilers.get(source_id, {})
+        if entry.get("server") is not None:
+            return entry["server"].tile_url(entry["name"], version)
+        source = urllib.parse.quote(source_id, safe="")
+        return f"mapwidget://{self._tile_token}/{source}/{{z}}/{{x}}/{{y}}?v={version}"
+
+    def add_array_layer(
+        self,
+        array,
+        bounds: list,
+        colormap="viridis",
+        vmin: Optional[float] = None,
+        vmax: Optional[float] = None,
+        nodata: Optional[float] = None,
+        source_id: Optional[str] = None,
+        layer_id: Optional[str] = None,
+        opacity: float = 1.0,
+        resampling: str = "nearest",
+        transport: str = "http",
+        prerender: bool = True,
+        cache_size: int = 1024,
+        before_id: Optional[str] = None,
+        layer_options: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Adds a raster layer rendered from an in-memory NumPy array.
+
+        The array is reprojected to Web Mercator, colorized and encoded as
+        PNG tiles in the kernel, on demand. Encoded tiles are kept in an LRU
+        cache keyed by the tile and the render parameters, and the low zoom
+        levels are pre-rendered. Requires numpy.
+
+        Args:
+            array (numpy.ndarray): A (height, width) array of values, or a
+                (height, width, 3 or 4) RGB(A) array, north-up in geographic
+                coordinates.
+            bounds (list): The [west, south, east, north] bounds of the array
+                in degrees.
+            colormap (str | list): A colormap name or a list of hex colors,
+                see `mapwidget.tileserver.get_colormap`. Defaults to 'viridis'.
+            vmin (Optional[float]): The value mapped to the start of the
+                colormap. Defaults to the minimum of the array.
+            vmax (Optional[float]): The value mapped to the end of the
+                colormap. Defaults to the maximum of the array.
+            nodata (Optional[float]): A value rendered transparent, like NaN.
+                Defaults to None.
+            source_id (Optional[str]): The ID of the raster source. Defaults to
+                a generated ID.
+            layer_id (Optional[str]): The ID of the raster layer. Defaults to
+                the source ID.
+            opacity (float): The opacity of the layer. Defaults to 1.0.
+            resampling (str): 'nearest' or 'bilinear'. Defaults to 'nearest'.
+            transport (str): 'http' serves the tiles from a threaded HTTP
+                server on localhost. 'comm' sends them over the widget comm,
+                which also works when the browser runs on another machine
+                than the kernel. Defaults to 'http'.
+            prerender (bool): Whether to render the low zoom levels up front.
+                Defaults to True.
+            cache_size (int): The number of encoded tiles kept in the LRU
+                cache. Defaults to 1024.
+            before_id (Optional[str]): The ID of the layer to insert the new
+                layer before. Defaults to None.
+            layer_options (Optional[Dict[str, Any]]): Additional options for
+                the raster layer. Defaults to None.
+
+        Returns:
+            ArrayTiler: The tiler of the layer. Its `stats` method returns the
+                cache hit rate and the tile latencies.
+
+        Example:
+            ```python
+            m.add_array_layer(temperature, [-180, -90, 180, 90], colormap="rdbu")
+            ```
+        """
+        from .tileserver import ArrayTiler, get_tile_server
+
+        if transport not in ("http", "comm"):
+            raise ValueError("transport must be 'http' or 'comm'")
+        if source_id is None:
+            source_id = f"array-source-{uuid.uuid4().hex[:8]}"
+        if layer_id is None:
+            layer_id = source_id
+        if layer_options is None:
+            layer_options = {}
+
+        tiler = ArrayTiler(
+            array,
+            bounds,
+            colormap=colormap,
+            vmin=vmin,
+            vmax=vmax,
+            nodata=nodata,
+            resampling=resampling,
+            cache_size=cache_size,
+        )
+        if prerender:
+            tiler.prerender()
+
+        entry = {"tiler": tiler, "version": 0}
+        if transport == "http":
+            entry["server"] = get_tile_server()
+            entry["name"] = f"{self._tile_token}-{source_id}"
+            entry["server"].add_tiler(entry["name"], tiler)
+        self._tilers[source_id] = entry
+
+        self.add_source(
+            source_id,
+            {
+                "type": "raster",
+                "tiles": [self._tile_url(source_id, 0)],
+                "tileSize": tiler.tile_size,
+                "bounds": list(tiler.bounds),
+            },
+        )
+        layer = {
+            "id": layer_id,
+            "type": "raster",
+            "source": source_id,
+            "paint": {"raster-opacity": opacity},
+            **layer_options,
+        }
+        self.add_layer(layer, before_id)
+        return tiler
+
+    def update_array_layer(
+        self,
+        source_id: str,
+        colormap=None,
+        vmin: Optional[float] = None,
+        vmax: Optional[float] = None,
+        resampling: Optional[str] = None,
+    ) -> PendingCall:
+        """
+        Changes the render parameters of an array layer and reloads its tiles.
+
+        Tiles rendered earlier with the same parameters are served from the
+        cache.
+
+        Args:
+            source_id (str): The ID of a source added with `add_array_layer`.
+            colormap (str | list): The new colormap. Defaults to None.
+            vmin (Optional[float | str]): The new minimum value, or 'auto' for
+                the minimum of the array. Defaults to None, unchanged.
+            vmax (Optional[float | str]): The new maximum value, or 'auto' for
+                the maximum of the array. Defaults to None, unchanged.
+            resampling (Optional[str]): 'nearest' or 'bilinear'. Defaults to
+                None.
+
+        Returns:
+            PendingCall: An awaitable that completes once a view has applied
+                the call.
+        """
+        self._tilers[source_id]["tiler"].set_params(
+            colormap=colormap, vmin=vmin, vmax=vmax, resampling=resampling
+        )
+        return self._reload_tiles(source_id)
+
+    def add_points(
+        self,
+        lng,
+        lat,
+        layer_id: Optional[str] = None,
+        color: str = "#3887be",
+        color_by: Optional[str] = None,
+        colormap="viridis",
+        vmin: Optional[float] = None,
+        vmax: Optional[float] = None,
+        radius: float = 3.0,
+        opacity: float = 0.8,
+        chunk_size: int = 1_000_000,
+        before_id: Optional[str] = None,
+        **columns,
+    ) -> Dict[str, Any]:
+        """
+        Adds a layer of points from coordinate and attribute arrays.
+
+        The points skip GeoJSON entirely: coordinates are quantized to int32
+        fixed-point values, attribute columns are sent as float32, and both
+        travel as binary buffers, in chunks of `chunk_size` points. The
+        frontend uploads each chunk to the GPU once and draws it as GL points,
+        so millions of points stay interactive. Requires numpy.
+
+        Args:
+            lng (array-like): The longitudes of the points in degrees.
+            lat (array-like): The latitudes of the points in degrees.
+            layer_id (Optional[str]): The ID of the layer. Defaults to a
+                generated ID.
+            color (str): The hex color of the points when they are not colored
+                by a column. Defaults to '#3887be'.
+            color_by (Optional[str]): The name of the column to color the
+                points by. Defaults to None.
+            colormap (str | list): The colormap of color_by, see
+                `mapwidget.tileserver.get_colormap`. Defaults to 'viridis'.
+            vmin (Optional[float]): The value mapped to the start of the
+                colormap. Defaults to the minimum of the column.
+            vmax (Optional[float]): The value mapped to the end of the
+                colormap. Defaults to the maximum of the column.
+            radius (float): The radius of the points in pixels. Defaults to 3.
+            opacity (float): The opacity of the points. Defaults to 0.8.
+            chunk_size (int): The number of points sent per message. Defaults
+                to 1,000,000.
+            before_id (Optional[str]): The ID of the layer to insert the new
+                layer before. Defaults to None.
+            **columns: Attribute columns as arrays with one value per point.
+                Text or categorical columns are sent as category codes.
+
+        Returns:
+            Dict[str, Any]: The timings of the layer, also in
+                `point_timings[layer_id]`: the number of 'points', 'chunks'
+                and 'bytes' sent and the 'encode_ms' spent in the kernel.
+                Once the frontend has drawn every chunk, it adds the
+                'decode_ms', 'upload_ms' and 'render_ms' spent in the browser
+                and the 'transfer_ms' spent in between.
+
+        Example:
+            ```python
+            m.add_points(df.lng, df.lat, speed=df.speed, color_by="speed")
+            ```
+        """
+        from .points import encode_points
+
+        if color_by is not None and color_by not in columns:
+            raise ValueError(f"color_by must be one of the columns: {list(columns)}")
+        if layer_id is None:
+            layer_id = f"points-{uuid.uuid4().hex[:8]}"
+        elif layer_id in self._point_layers:
+            self.remove_layer(layer_id)
+
+        start = time.perf_counter()
+        info, chunks = encode_points(lng, lat, columns, chunk_size=chunk_size)
+        encode_ms = (time.perf_counter() - start) * 1000
+
+        self._point_layers[layer_id] = {
+            "columns": info["columns"],
+            "style": {
+                "color": color,
+                "color_by": color_by,
+                "colormap": colormap,
+                "vmin": vmin,
+                "vmax": vmax,
+                "radius": radius,
+                "opacity": opacity,
+            },
+        }
+        timings = {
+            "points": info["count"],
+            "chunks": len(chunks),
+            "bytes": sum(b.nbytes for _, buffers in chunks for b in buffers),
+            "encode_ms": encode_ms,
+        }
+        self.point_timings[layer_id] = timings
+        self.add_call("addPoints", [layer_id, self._points_style(layer_id), before_id])
+        # Chunks are sent one message each, to keep messages bounded
+        self._point_layers[layer_id]["sent"] = time.perf_counter()
+        for header, buffers in chunks:
+            self.add_call("addPointsChunk", [layer_id, header], buffers=buffers)
+        return timings
+
+    def set_points_style(self, layer_id: str, **style) -> PendingCall:
+        """
+        Changes the style of a layer added with `add_points`.
+
+        The points are restyled on the GPU without sending them again.
+
+        Args:
+            layer_id (str): The ID of the layer.
+            **style: The arguments of `add_points` to change: color,
+                color_by, colormap, vmin, vmax, radius and opacity.
+
+        Returns:
+            PendingCall: An awaitable that completes once a view has applied
+                the call.
+        """
+        layer = self._point_layers[layer_id]
+        unknown = set(style) - set(layer["style"])
+        if unknown:
+            raise ValueError(f"Unsupported point style arguments: {sorted(unknown)}")
+        color_by = style.get("color_by", layer["style"]["color_by"])
+        if color_by is not None and color_by not in layer["columns"]:
+            raise ValueError(f"color_by must be one of {list(layer['columns'])}")
+        layer["style"].update(style)
+        return self.add_call("setPointsStyle", [layer_id, self._points_style(layer_id)])
+
+    def _points_style(self, layer_id):
+        """Build the style sent to the frontend for a point layer."""
+        from .points import point_colors
+
+        layer = self._point_layers[layer_id]
+        style = layer["style"]
+        column = layer["columns"].get(style["color_by"])
+        result = {
+            "radius": style["radius"],
+            "opacity": style["opacity"],
+            "value": style["color_by"],
+            "discrete": False,
+            "vmin": 0.0,
+            "vmax": 0.0,
+        }
+        if column is None:
+            result["colors"] = point_colors(style["color"])
+        elif "categories" in column:
+            result["colors"] = point_colors(
+                colormap=style["colormap"], categories=column["categories"]
+            )
+            result["discrete"] = True
+        else:
+            result["colors"] = point_colors(colormap=style["colormap"])
+            result["vmin"] = column["min"] if style["vmin"] is None else style["vmin"]
+            result["vmax"] = column["max"] if style["vmax"] is None else style["vmax"]
+        return result
+
+    def _handle_points_timing(self, content):
+        """Complete the timings of a point layer drawn by the frontend."""
+        layer = self._point_layers.get(content["layer_id"])
+        if layer is None or "sent" not in layer:
+            return  # Already reported, e.g. by another view
+        elapsed_ms = (time.perf_counter() - layer.pop("sent")) * 1000
+        timings = self.point_timings[content["layer_id"]]
+        for key in ("decode_ms", "upload_ms", "render_ms"):
+            timings[key] = content[key]
+        # The render time runs from the arrival of the first chunk
+        timings["transfer_ms"] = max(elapsed_ms - content["render_ms"], 0.0)
+
+    def add_animation(
+        self,
+        frames: list,
+        interval: float = 500,
+        loop: bool = True,
+        autoplay: bool = True,
+        speed: float = 1.0,
+        prefetch: int = 2,
+        animation_id: Optional[str] = None,
+    ):
+        """
+        Uploads a timeline of frames that the frontend plays by itself.
+
+        Playing frames in the browser keeps the frame rate steady, whereas a
+        Python loop of `set_filter` and `time.sleep` pays a round trip per
+        frame. See `mapwidget.animation` for the content of the frames.
+
+        Args:
+            frames (list): The frames, each a dict of the filters, paint and
+                layout properties, source data, tiles or camera it sets.
+            interval (float): How long each frame is shown in milliseconds,
+                unless it has a 'duration'. Defaults to 500.
+            loop (bool): Whether to start over after the last frame. Defaults
+                to True.
+            autoplay (bool): Whether to start playing right away. Defaults to
+                True.
+            speed (float): The playback rate. Defaults to 1.0.
+            prefetch (int): The number of upcoming frames whose GeoJSON and
+                tiles are fetched ahead of time. Defaults to 2.
+            animation_id (Optional[str]): The ID of the animation. Defaults to
+                a generated ID.
+
+        Returns:
+            Animation: The handle to play, pause, seek and change the speed
+                of the animation, and to read its playback stats.
+
+        Example:
+            ```python
+            frames = [{"filter": {"quakes": ["==", "year", y]}} for y in years]
+            anim = m.add_animation(frames, interval=250)
+            anim.speed = 2
+            ```
+        """
+        from .animation import Animation, validate_frames
+
+        validate_frames(frames)
+        if speed <= 0:
+            raise ValueError("speed must be positive")
+        if animation_id is None:
+            animation_id = f"animation-{uuid.uuid4().hex[:8]}"
+        animation = Animation(self, animation_id, frames, autoplay, float(speed))
+        self._animations[animation_id] = animation
+        options = {"interval": interval, "loop": loop, "prefetch": prefetch}
+        with self.batch():
+            self.add_call("addAnimation", [animation_id, frames, options])
+            animation._send()
+        return animation
+
+    def remove_animation(self, animation_id: str) -> PendingCall:
+        """Stops an animation and removes it from the map."""
+        self._animations.pop(animation_id, None)
+        return self.add_call("removeAnimation", [animation_id])
+
+    def add_layer(self, layer: dict, before_id: str = None) -> PendingCall:
         """Add a new layer to the map."""
         args = [layer]
         if before_id:
             args.append(before_id)
-        self.add_call("addLayer", args)
+        return self.add_call("addLayer", args)
+
+    def add_stream_layer(
+        self,
+        layer_id: str,
+        source,
+        layer_type: str = "circle",
+        paint: Optional[Dict[str, Any]] = None,
+        layout: Optional[Dict[str, Any]] = None,
+        before_id: Optional[str] = None,
+        chunk_size: int = 500,
+        margin: float = 0.5,
+        max_features: int = 100_000,
+        min_zoom: float = 0,
+        id_property: Optional[str] = None,
+        dtype: str = "float64",
+        max_workers: int = 2,
+    ):
+        """
+        Adds a layer fed with the features of a Python source around the view.
+
+        The layer and its GeoJSON source share the ID. As the map moves, the
+        features in the view and a margin around it are fetched from the
+        source on a thread pool and streamed to the frontend in binary chunks,
+        and the features that left it are evicted. A pan cancels the fetch in
+        flight. See `mapwidget.streaming` for the sources. Requires numpy.
 
-    def remove_layer(self, layer_id: str):
+        Args:
+            layer_id (str): The ID of the layer and of its source.
+            source (callable or iterable): A callable source(bbox, zoom)
+                returning or yielding the GeoJSON features in the bbox, or an
+                iterable of GeoJSON features.
+            layer_type (str): The type of the layer, e.g. 'circle', 'line' or
+                'fill'. Defaults to 'circle'.
+            paint (Optional[Dict[str, Any]]): The paint properties. Defaults
+                to None.
+            layout (Optional[Dict[str, Any]]): The layout properties. Defaults
+                to None.
+            before_id (Optional[str]): The ID of the layer to insert the layer
+                before. Defaults to None.
+            chunk_size (int): The number of features per message. Defaults to
+                500.
+            margin (float): The fraction of the view size fetched ahead on
+                every side. Defaults to 0.5.
+            max_features (int): The maximum number of features held by the
+                frontend. Defaults to 100000.
+            min_zoom (float): The zoom below which no features are fetched.
+                Defaults to 0.
+            id_property (Optional[str]): The property identifying features that
+                have no 'id'. Defaults to a hash of the features.
+            dtype (str): The coordinate type, 'float64' or 'float32'. Defaults
+                to 'float64'.
+            max_workers (int): The number of fetch threads. Defaults to 2.
+
+        Returns:
+            FeatureStream: The stream, with the features held by the frontend
+                and the fetch stats.
+
+        Example:
+            ```python
+            def query(bbox, zoom):
+                return db.features_in(bbox, limit=20_000)
+
+            m.add_stream_layer("buildings", query, "fill", min_zoom=12)
+            ```
+        """
+        from .streaming import FeatureStream
+
+        if layer_id in self._streams:
+            self._streams.pop(layer_id).close()
+        stream = FeatureStream(
+            self,
+            layer_id,
+            source,
+            chunk_size=chunk_size,
+            margin=margin,
+            max_features=max_features,
+            min_zoom=min_zoom,
+            id_property=id_property,
+            dtype=dtype,
+            max_workers=max_workers,
+        )
+        layer = {"id": layer_id, "type": layer_type, "source": layer_id}
+        if paint:
+            layer["paint"] = paint
+        if layout:
+            layer["layout"] = layout
+        with self.batch():
+            self.add_source(
+                layer_id,
+                {
+                    "type": "geojson",
+                    "data": {"type": "FeatureCollection", "features": []},
+                },
+            )
+            self.add_layer(layer, before_id)
+        self._streams[layer_id] = stream
+        stream.update()
+        return stream
+
+    def _update_streams(self, change):
+        """Stream the features of the new view."""
+        for stream in list(self._streams.values()):
+            stream.update(change["new"], self.zoom)
+
+    def remove_layer(self, layer_id: str) -> PendingCall:
         """Remove a layer from the map."""
-        self.add_call("removeLayer", [layer_id])
+        self._point_layers.pop(layer_id, None)
+        if layer_id in self._streams:
+            self._streams.pop(layer_id).close()
+        return self.add_call("removeLayer", [layer_id])
 
-    def set_paint_property(self, layer_id: str, prop: str, value):
+    def set_paint_property(self, layer_id: str, prop: str, value) -> PendingCall:
         """Set a paint property on a layer."""
-        self.add_call("setPaintProperty", [layer_id, prop, value])
+        return self.add_call("setPaintProperty", [layer_id, prop, value])
 
-    def set_layout_property(self, layer_id: str, prop: str, value):
+    def set_layout_property(self, layer_id: str, prop: str, value) -> PendingCall:
         """Set a layout property on a layer."""
-        self.add_call("setLayoutProperty", [layer_id, prop, value])
+        return self.add_call("setLayoutProperty", [layer_id, prop, value])
 
-    def set_filter(self, layer_id: str, filter_expr):
+    def set_filter(self, layer_id: str, filter_expr) -> PendingCall:
         """Set a filter expression on a layer."""
-        self.add_call("setFilter", [layer_id, filter_expr])
+        return self.add_call("setFilter", [layer_id, filter_expr])
 
-    def set_style(self, style_url: str):
+    def set_style(self, style_url: str) -> PendingCall:
         """Set the map style."""
-        self.add_call("setStyle", [style_url])
+        return self.add_call("setStyle", [style_url])
 
-    def set_layer_visibility(self, layer_id: str, visibility: str):
+    def set_layer_visibility(self, layer_id: str, visibility: str) -> PendingCall:
         """Set visibility of a layer ('visible' or 'none')."""
-        self.set_layout_property(layer_id, "visibility", visibility)
+        return self.set_layout_property(layer_id, "visibility", visibility)
 
     def add_control(
         self, control_type: str, position: str = "top-right", options: dict = None
-    ):
+    ) -> PendingCall:
         """Add a control to the map.
 
         Args:
@@ -239,21 +1792,23 @@ class Map(anywidget.AnyWidget):
         """
         if options is None:
             options = {}
-        self.add_call("addControl", [control_type, position, options])
+        pending = self.add_call("addControl", [control_type, position, options])
         self.controls.append(
             {"type": control_type, "position": position, "options": options}
         )
+        return pending
 
-    def remove_control(self, control_type: str):
+    def remove_control(self, control_type: str) -> PendingCall:
         """Remove a control from the map.
 
         Args:
             control_type: The type of control to remove (e.g., 'navigation', 'fullscreen')
         """
-        self.add_call("removeControl", [control_type])
+        pending = self.add_call("removeControl", [control_type])
         self.controls = [
             control for control in self.controls if control["type"] != control_type
         ]
+        return pending
 
     def add_draw_control(
         self,
@@ -262,7 +1817,7 @@ class Map(anywidget.AnyWidget):
         position: str = "top-right",
         geojson: Optional[Dict[str, Any]] = None,
         **kwargs: Any,
-    ) -> None:
+    ) -> PendingCall:
         """
         Adds a drawing control to the map.
 
@@ -285,7 +1840,8 @@ class Map(anywidget.AnyWidget):
                 drawing control.
 
         Returns:
-            None
+            PendingCall: An awaitable that completes once a view has applied
+                the call.
         """
         if options is None:
             options = {}
@@ -295,12 +1851,9 @@ class Map(anywidget.AnyWidget):
         # Merge kwargs into options
         options.update(kwargs)
 
-        if self.loaded:
-            self.add_call("addDrawControl", [options, controls, position, geojson])
-        else:
-            self._draw_control_request = [options, controls, position, geojson]
+        return self.add_call("addDrawControl", [options, controls, position, geojson])
 
-    def remove_draw_control(self) -> None:
+    def remove_draw_control(self) -> PendingCall:
         """
         Removes the drawing control from the map.
 
@@ -308,11 +1861,12 @@ class Map(anywidget.AnyWidget):
         draw features from the map and model.
 
         Returns:
-            None
+            PendingCall: An awaitable that completes once a view has applied
+                the call.
         """
-        self.add_call("removeDrawControl")
+        return self.add_call("removeDrawControl")
 
-    def draw_features_delete_all(self) -> None:
+    def draw_features_delete_all(self) -> PendingCall:
         """
         Deletes all features from the drawing control.
 
@@ -320,16 +1874,17 @@ class Map(anywidget.AnyWidget):
         the model accordingly.
 
         Returns:
-            None
+            PendingCall: An awaitable that completes once a view has applied
+                the call.
         """
-        self.add_call("drawFeaturesDeleteAll")
+        return self.add_call("drawFeaturesDeleteAll")
 
     def add_legend(
         self,
         targets: Dict[str, str],
         options: Optional[Dict[str, Any]] = None,
         position: str = "top-right",
-    ) -> None:
+    ) -> PendingCall:
         """
         Adds a legend control to the map using mapbox-gl-legend plugin.
 
@@ -344,7 +1899,8 @@ class Map(anywidget.AnyWidget):
             position (str): The position of the control on the map. Defaults to "top-right".
 
         Returns:
-            None
+            PendingCall: An awaitable that completes once a view has applied
+                the call.
         """
         if options is None:
             options = {
@@ -354,21 +1910,11 @@ class Map(anywidget.AnyWidget):
                 "reverseOrder": True,
             }
 
-        if self.loaded:
-            self.add_call("addLegendControl", [targets, options, position])
-        else:
-            if not hasattr(self, "_pending_legend"):
-                self._pending_legend = []
-            self._pending_legend.append((targets, options, position))
+        return self.add_call("addLegendControl", [targets, options, position])
 
-    def set_draw_mode(self, mode: str):
+    def set_draw_mode(self, mode: str) -> PendingCall:
         """Set the drawing mode, even if the map is not yet loaded."""
-        if self.loaded:
-            self.add_call("setDrawMode", [mode])
-        else:
-            if not hasattr(self, "_pending_draw_mode"):
-                self._pending_draw_mode = []
-            self._pending_draw_mode.append(mode)
+        return self.add_call("setDrawMode", [mode])
 
     def add_opacity_control(
         self,
@@ -378,7 +1924,7 @@ class Map(anywidget.AnyWidget):
         position: str = "top-right",
         default_visibility: Optional[Dict[str, bool]] = None,
         collapsible: bool = False,
-    ) -> None:
+    ) -> PendingCall:
         """
         Adds an opacity control to the map using maplibre-gl-opacity plugin.
 
@@ -401,7 +1947,8 @@ class Map(anywidget.AnyWidget):
                 Defaults to False.
 
         Returns:
-            None
+            PendingCall: An awaitable that completes once a view has applied
+                the call.
 
         Example:
             ```python
@@ -446,17 +1993,10 @@ class Map(anywidget.AnyWidget):
         if collapsible:
             options["collapsible"] = True
 
-        if self.loaded:
-            self.add_call(
-                "addOpacityControl",
-                [base_layers, over_layers, options, position, default_visibility],
-            )
-        else:
-            if not hasattr(self, "_pending_opacity"):
-                self._pending_opacity = []
-            self._pending_opacity.append(
-                (base_layers, over_layers, options, position, default_visibility)
-            )
+        return self.add_call(
+            "addOpacityControl",
+            [base_layers, over_layers, options, position, default_visibility],
+        )
 
     def add_cog_layer(
         self,
@@ -465,7 +2005,7 @@ class Map(anywidget.AnyWidget):
         layer_id: Optional[str] = None,
         source_options: Optional[Dict[str, Any]] = None,
         layer_options: Optional[Dict[str, Any]] = None,
-    ) -> None:
+    ) -> PendingCall:
         """
         Adds a Cloud Optimized GeoTIFF (COG) layer to the map.
 
@@ -491,7 +2031,8 @@ class Map(anywidget.AnyWidget):
                 - beforeId (str): ID of the layer before which to insert this layer.
 
         Returns:
-            None
+            PendingCall: An awaitable that completes once a view has applied
+                the call.
 
         Example:
             ```python
@@ -524,6 +2065,54 @@ class Map(anywidget.AnyWidget):
             layer_id = f"cog-layer-{uuid.uuid4().hex[:8]}"
 
         # Add the COG layer
-        self.add_call(
+        return self.add_call(
             "addCogLayer", [url, source_id, layer_id, source_options, layer_options]
         )
+
+    def link(self, *others: "Map", cursor: bool = False) -> str:
+        """
+        Links the camera of this map with other maps, in the frontend.
+
+        Linked maps follow each other directly in the browser at frame rate,
+        without a round-trip through the kernel, and each map only syncs its
+        settled view state to the kernel. The other maps first jump to the
+        view of this map.
+
+        Args:
+            *others (Map): The maps to link with.
+            cursor (bool): Whether to show the mouse position of a map on the
+                other linked maps. Defaults to False.
+
+        Returns:
+            str: The link group of the maps.
+
+        Example:
+            ```python
+            left, right = Map(), Map()
+            left.link(right, cursor=True)
+            ```
+        """
+        group = self.link_group or uuid.uuid4().hex
+        camera = {
+            "center": self.center,
+            "zoom": self.zoom,
+            "bearing": self.bearing,
+            "pitch": self.pitch,
+        }
+        self.link_group = group
+        self.link_cursor = cursor
+        for other in others:
+            other.link_group = group
+            other.link_cursor = cursor
+            other.add_call("jumpTo", [camera])
+        return group
+
+    def unlink(self) -> None:
+        """
+        Unlinks this map from the maps it was linked with by `link`.
+
+        Returns:
+            None
+        """
+        self.link_group = ""
+        self.link_cursor = False
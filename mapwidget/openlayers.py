@@ -2,6 +2,7 @@ import os
 import pathlib
 import anywidget
 import traitlets
+from .assets import asset_sources, handle_asset_message, map_esm
 
 
 class Map(anywidget.AnyWidget):
@@ -12,7 +13,7 @@ class Map(anywidget.AnyWidget):
     """
 
     _cwd = os.path.dirname(os.path.abspath(__file__))
-    _esm = pathlib.Path(os.path.join(_cwd, "js", "openlayers.js"))
+    _esm = map_esm("openlayers.js")
     _css = pathlib.Path(os.path.join(_cwd, "css", "openlayers.css"))
     center = traitlets.List([0, 20]).tag(sync=True, o=True)
     zoom = traitlets.Float(2).tag(sync=True, o=True)
@@ -20,3 +21,16 @@ class Map(anywidget.AnyWidget):
     width = traitlets.Unicode("100%").tag(sync=True, o=True)
     height = traitlets.Unicode("600px").tag(sync=True, o=True)
     clicked_latlng = traitlets.List([None, None]).tag(sync=True, o=True)
+    # Milliseconds between view updates while moving; 0 syncs when a move ends
+    sync_interval = traitlets.Int(0).tag(sync=True, o=True)
+    # Where the frontend loads each JS and CSS asset from
+    _assets = traitlets.Dict().tag(sync=True)
+
+    def __init__(self, **kwargs):
+        self.startup_timings = []
+        super().__init__(**kwargs)
+        self.on_msg(handle_asset_message)
+
+    @traitlets.default("_assets")
+    def _default_assets(self):
+        return asset_sources(["ol.js", "ol.css"])
@@ -0,0 +1,160 @@
+"""Module for encoding large point datasets from NumPy columns.
+
+Coordinates are quantized to fixed-point int32 values with 1e-7 degree
+resolution (about 1 cm), which halves the payload of float64 values without
+visible loss. Attribute columns are sent as float32, and text or categorical
+columns as float32 category codes with the categories in the header. The
+points are split into chunks, each sent as one message with its own buffers.
+Requires numpy.
+"""
+
+# Fixed-point scale of the quantized coordinates
+SCALE = 10_000_000
+
+MAX_LATITUDE = 85.0511287798
+
+# The number of color stops of the GL point layers
+MAX_COLORS = 8
+
+
+def quantize(values, clip=None):
+    """Quantizes coordinates in degrees to fixed-point int32 values.
+
+    Args:
+        values (array-like): The coordinates in degrees.
+        clip (float, optional): Clip the coordinates to [-clip, clip].
+            Defaults to None.
+
+    Returns:
+        numpy.ndarray: The int32 values, in units of 1 / SCALE degree.
+    """
+    import numpy as np
+
+    values = np.asarray(values, dtype=np.float64)
+    if clip is not None:
+        values = np.clip(values, -clip, clip)
+    return np.round(values * SCALE).astype(np.int32)
+
+
+def encode_column(values):
+    """Encodes an attribute column as float32 values.
+
+    Pandas categorical columns reuse their codes, which avoids sorting the
+    values. Missing categories are encoded as NaN.
+
+    Args:
+        values (array-like): Numeric values, or text or categorical values.
+
+    Returns:
+        tuple: The float32 array and a dict with the 'min' and 'max' of the
+            values, and the 'categories' of text or categorical values.
+    """
+    import numpy as np
+
+    categorical = getattr(values, "cat", values)
+    info = {}
+    if hasattr(categorical, "codes") and hasattr(categorical, "categories"):
+        encoded = np.asarray(categorical.codes, dtype=np.float32)
+        encoded[encoded < 0] = np.nan
+        info["categories"] = [str(c) for c in categorical.categories]
+    elif np.asarray(values).dtype.kind in "biuf":
+        encoded = np.asarray(values).astype(np.float32)
+    else:
+        values = np.asarray(values)
+        categories, encoded = np.unique(values.astype(str), return_inverse=True)
+        encoded = encoded.astype(np.float32)
+        info["categories"] = categories.tolist()
+    finite = encoded[np.isfinite(encoded)]
+    info["min"] = float(finite.min()) if finite.size else 0.0
+    info["max"] = float(finite.max()) if finite.size else 0.0
+    return encoded, info
+
+
+def encode_points(lng, lat, columns=None, chunk_size=1_000_000):
+    """Encodes points and their attributes as chunks of binary buffers.
+
+    Points with a NaN coordinate are dropped.
+
+    Args:
+        lng (array-like): The longitudes in degrees.
+        lat (array-like): The latitudes in degrees.
+        columns (dict, optional): Attribute columns by name, each as long as
+            the coordinates. Defaults to None.
+        chunk_size (int, optional): The number of points per chunk. Defaults
+            to 1,000,000.
+
+    Returns:
+        tuple: A dict with the number of points ('count') and the
+            information of each column ('columns', see `encode_column`), and
+            the list of chunks. Each chunk is a header dict and its buffers:
+            the quantized longitudes and latitudes as int32, then one float32
+            buffer per column.
+    """
+    import numpy as np
+
+    lng = np.asarray(lng, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    if lng.shape != lat.shape or lng.ndim != 1:
+        raise ValueError("lng and lat must be 1D arrays of the same length")
+    columns = columns or {}
+    for name, values in columns.items():
+        if len(values) != len(lng):
+            raise ValueError(f"Column {name} must have one value per point")
+
+    encoded = {}
+    info = {}
+    for name, values in columns.items():
+        encoded[name], info[name] = encode_column(values)
+
+    valid = np.isfinite(lng) & np.isfinite(lat)
+    if not valid.all():
+        lng = lng[valid]
+        lat = lat[valid]
+        encoded = {name: values[valid] for name, values in encoded.items()}
+
+    x = quantize(lng)
+    y = quantize(lat, clip=MAX_LATITUDE)
+
+    count = len(x)
+    names = list(encoded)
+    chunks = []
+    for index, start in enumerate(range(0, max(count, 1), chunk_size)):
+        stop = min(start + chunk_size, count)
+        header = {
+            "index": index,
+            "offset": start,
+            "count": stop - start,
+            "scale": SCALE,
+            "columns": names,
+            "last": stop >= count,
+        }
+        buffers = [x[start:stop], y[start:stop]]
+        buffers.extend(encoded[name][start:stop] for name in names)
+        chunks.append((header, [memoryview(np.ascontiguousarray(b)) for b in buffers]))
+    return {"count": count, "columns": info}, chunks
+
+
+def point_colors(color=None, colormap=None, categories=None):
+    """Returns the color stops of a point layer as RGBA values in [0, 1].
+
+    Args:
+        color (str, optional): A hex color for every point. Defaults to None.
+        colormap (str | list, optional): A colormap, see
+            `mapwidget.tileserver.get_colormap`. Defaults to None.
+        categories (list, optional): The categories colored by the colormap,
+            one color each, cycling after MAX_COLORS. Defaults to None.
+
+    Returns:
+        list: Up to MAX_COLORS [r, g, b, a] colors.
+    """
+    import numpy as np
+
+    from .tileserver import _hex_to_rgba, get_colormap
+
+    if colormap is None:
+        stops = np.array([_hex_to_rgba(color or "#3887be")], dtype=float)
+    else:
+        lut = get_colormap(colormap)
+        n = MAX_COLORS if categories is None else min(len(categories), MAX_COLORS)
+        stops = lut[np.round(np.linspace(0, 255, max(n, 1))).astype(int)]
+    return np.round(stops / 255, 4).tolist()
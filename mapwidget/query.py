@@ -0,0 +1,158 @@
+"""Module for querying the frontends of a map, e.g. for the features in view.
+
+The kernel sends a 'query' message with a request ID, and the frontend
+answers with a 'query_result' message with the same ID. Features come back
+in the binary columnar layout of `mapwidget.encoding`, along with the layer,
+source and state of each rendered feature. Results are futures, which can
+be awaited in asyncio or, in a notebook, read in a later cell with
+``result()``, since the kernel handles the answer between cells.
+
+Queries time out in the event loop of the kernel, where the answers of the
+frontends are handled too. Without a running loop, a single thread expires
+the queries of all maps.
+"""
+
+import asyncio
+import concurrent.futures
+import heapq
+import itertools
+import threading
+import time
+
+from .encoding import _values, decode_geojson
+
+# The frontend properties of rendered features: header key -> feature key
+_FEATURE_EXTRAS = {
+    "layers": "layer",
+    "sources": "source",
+    "source_layers": "sourceLayer",
+    "states": "state",
+}
+
+
+class QueryFuture(concurrent.futures.Future):
+    """The result of a query to the frontends of a map.
+
+    A `concurrent.futures.Future` that can also be awaited. If no view answers
+    within the timeout of the query, it fails with a TimeoutError.
+    """
+
+    def __await__(self):
+        return asyncio.wrap_future(self).__await__()
+
+
+class _Timeout:
+    """A callback scheduled by `_Timeouts`, which is skipped once cancelled."""
+
+    __slots__ = ("callback", "args", "cancelled")
+
+    def __init__(self, callback, args):
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class _Timeouts:
+    """Calls callbacks at their deadlines from one thread, like `call_later`.
+
+    The thread is started by the first callback and keeps the deadlines in a
+    heap, so any number of pending queries share it.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def call_later(self, delay, callback, *args):
+        timeout = _Timeout(callback, args)
+        deadline = time.monotonic() + delay
+        with self._condition:
+            heapq.heappush(self._heap, (deadline, next(self._order), timeout))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="mapwidget-timeouts", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+        return timeout
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    while self._heap and self._heap[0][2].cancelled:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    delay = self._heap[0][0] - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._condition.wait(delay)
+                _, _, timeout = heapq.heappop(self._heap)
+            if not timeout.cancelled:
+                timeout.callback(*timeout.args)
+
+
+_timeouts = _Timeouts()
+
+
+def call_later(delay, callback, *args):
+    """Schedules the timeout of a query.
+
+    Args:
+        delay (float): The timeout in seconds.
+        callback (Callable): The function to call with args once the delay
+            has passed.
+        *args: The arguments of the callback.
+
+    Returns:
+        The handle of the call, whose ``cancel()`` method unschedules it.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return _timeouts.call_later(delay, callback, *args)
+    return loop.call_later(delay, callback, *args)
+
+
+def decode_features(header, buffers):
+    """Decodes the features of a query result.
+
+    Args:
+        header (dict): The JSON header, as in `mapwidget.encoding`, with the
+            'layers', 'sources', 'source_layers' and 'states' of the features
+            if they were rendered.
+        buffers (list): The binary buffers.
+
+    Returns:
+        dict: A GeoJSON FeatureCollection. Rendered features also have their
+            'layer' ID, 'source', 'sourceLayer' and feature 'state'.
+    """
+    data = decode_geojson(header, buffers)
+    for header_key, feature_key in _FEATURE_EXTRAS.items():
+        values = header.get(header_key)
+        if values is None:
+            continue
+        for feature, value in zip(data["features"], values):
+            if value is not None:
+                feature[feature_key] = value
+    return data
+
+
+def decode_points(buffers):
+    """Decodes the points of a project or unproject result.
+
+    Args:
+        buffers (list): One buffer of interleaved float64 x, y values.
+
+    Returns:
+        list: The [x, y] pairs.
+    """
+    values = _values(buffers[0], "d")
+    return [[x, y] for x, y in zip(values[::2], values[1::2])]
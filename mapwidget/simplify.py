@@ -0,0 +1,391 @@
+"""Module for simplifying GeoJSON geometries into zoom-dependent levels of detail.
+
+Geometries are simplified on the columnar coordinate arrays of
+`mapwidget.encoding`, with every ring of every feature processed at once:
+
+- 'dp' (Douglas-Peucker) splits all the open segments of all rings in each
+  pass, keeping the vertex farthest from each segment while it is farther
+  than the tolerance.
+- 'vw' (Visvalingam-Whyatt) removes, in each pass, the vertices whose
+  triangle with their neighbors has the smallest area of its neighborhood,
+  while that area is smaller than the square of the tolerance.
+
+With ``preserve_topology``, vertices shared by several rings, such as the
+corners of adjacent parcels, are always kept, so shared boundaries are
+simplified identically between them, and polygon rings keep at least four
+vertices. Otherwise, rings that collapse are dropped, which also drops
+features smaller than the tolerance. Points are never simplified.
+Requires numpy.
+"""
+
+import time
+
+from .encoding import GEOMETRY_TYPES, decode_geojson, encode_geojson
+
+METHODS = ("dp", "vw")
+
+_POLYGON_TYPES = (GEOMETRY_TYPES.index("Polygon"), GEOMETRY_TYPES.index("MultiPolygon"))
+_POINT_TYPES = (GEOMETRY_TYPES.index("Point"), GEOMETRY_TYPES.index("MultiPoint"))
+
+
+def zoom_tolerance(zoom, pixels=1.0, tile_size=512):
+    """Returns the size in degrees of a number of pixels at a zoom level.
+
+    Args:
+        zoom (float): The zoom level.
+        pixels (float, optional): The number of pixels. Defaults to 1.0.
+        tile_size (int, optional): The size of the tiles of the zoom levels.
+            Defaults to 512, as in MapLibre.
+
+    Returns:
+        float: The size in degrees of longitude.
+    """
+    return pixels * 360 / (tile_size * 2**zoom)
+
+
+def _squared_distances(x, y, points, a, b):
+    """Returns the squared distances of points to the segments from a to b."""
+    import numpy as np
+
+    ax, ay = x[a], y[a]
+    dx, dy = x[b] - ax, y[b] - ay
+    ex, ey = x[points] - ax, y[points] - ay
+    length = dx * dx + dy * dy
+    t = np.zeros(len(points))
+    np.divide(ex * dx + ey * dy, length, out=t, where=length > 0)
+    np.clip(t, 0, 1, out=t)
+    ex -= t * dx
+    ey -= t * dy
+    return ex * ex + ey * ey
+
+
+def _open_segments(keep, ring_of):
+    """Returns the starts and ends of the runs of dropped vertices."""
+    import numpy as np
+
+    kept = np.flatnonzero(keep)
+    same_ring = ring_of[kept[:-1]] == ring_of[kept[1:]]
+    gap = kept[1:] - kept[:-1] > 1
+    mask = same_ring & gap
+    return kept[:-1][mask], kept[1:][mask]
+
+
+def _douglas_peucker(coords, keep, ring_of, tolerance):
+    import numpy as np
+
+    x, y = np.ascontiguousarray(coords[:, 0]), np.ascontiguousarray(coords[:, 1])
+    threshold = tolerance * tolerance
+    starts, ends = _open_segments(keep, ring_of)
+    while len(starts):
+        lengths = ends - starts - 1
+        total = int(lengths.sum())
+        group_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        segment = np.repeat(np.arange(len(starts)), lengths)
+        a = starts[segment]
+        points = a + 1 + np.arange(total) - group_starts[segment]
+        distances = _squared_distances(x, y, points, a, ends[segment])
+        farthest = np.maximum.reduceat(distances, group_starts)
+        positions = np.where(distances == farthest[segment], np.arange(total), total)
+        split = points[np.minimum.reduceat(positions, group_starts)]
+        far = farthest > threshold
+        keep[split[far]] = True
+        starts = np.concatenate([starts[far], split[far]])
+        ends = np.concatenate([split[far], ends[far]])
+        open_ = ends - starts > 1
+        starts, ends = starts[open_], ends[open_]
+    return keep
+
+
+def _visvalingam(coords, keep, fixed, ring_of, tolerance):
+    import numpy as np
+
+    threshold = tolerance * tolerance
+    while True:
+        kept = np.flatnonzero(keep)
+        prev = np.concatenate([[-1], kept[:-1]])
+        next_ = np.concatenate([kept[1:], [-1]])
+        interior = (
+            ~fixed[kept]
+            & (prev >= 0)
+            & (next_ >= 0)
+            & (ring_of[np.maximum(prev, 0)] == ring_of[kept])
+            & (ring_of[np.maximum(next_, 0)] == ring_of[kept])
+        )
+        area = np.full(len(kept), np.inf)
+        if interior.any():
+            p = coords[kept[interior]]
+            u = coords[prev[interior]] - p
+            v = coords[next_[interior]] - p
+            area[interior] = 0.5 * np.abs(u[:, 0] * v[:, 1] - u[:, 1] * v[:, 0])
+        before = np.concatenate([[np.inf], area[:-1]])
+        after = np.concatenate([area[1:], [np.inf]])
+        # Removing only local minima keeps neighbors from being removed
+        # together, which approximates the one-at-a-time order
+        remove = (area < threshold) & (area < before) & (area <= after)
+        if not remove.any():
+            return keep
+        keep[kept[remove]] = False
+
+
+def _shared_vertices(coords, ring_of):
+    """Returns a mask of the vertices that belong to several rings."""
+    import numpy as np
+
+    order = np.lexsort((ring_of, coords[:, 1], coords[:, 0]))
+    x, y, rings = coords[order, 0], coords[order, 1], ring_of[order]
+    new = np.concatenate([[True], (x[1:] != x[:-1]) | (y[1:] != y[:-1])])
+    starts = np.flatnonzero(new)
+    group = np.cumsum(new) - 1
+    several = np.minimum.reduceat(rings, starts) != np.maximum.reduceat(rings, starts)
+    shared = np.empty(len(coords), dtype=bool)
+    shared[order] = several[group]
+    return shared
+
+
+def _counts(mask, offsets):
+    """Returns the number of True values of mask between consecutive offsets."""
+    import numpy as np
+
+    cumulative = np.concatenate([[0], np.cumsum(mask)])
+    return cumulative[offsets[1:]] - cumulative[offsets[:-1]]
+
+
+def _offsets(counts):
+    import numpy as np
+
+    return np.concatenate([[0], np.cumsum(counts)]).astype(np.uint32)
+
+
+class _Geometries:
+    """The encoded geometries of GeoJSON, prepared for simplification."""
+
+    def __init__(self, header, buffers, preserve_topology):
+        import numpy as np
+
+        self.header = header
+        self.coords = np.frombuffer(buffers[0], dtype=header["dtype"]).reshape(-1, 2)
+        self.geometry_offsets = np.frombuffer(buffers[1], dtype=np.uint32).astype(
+            np.intp
+        )
+        self.part_offsets = np.frombuffer(buffers[2], dtype=np.uint32).astype(np.intp)
+        self.ring_offsets = np.frombuffer(buffers[3], dtype=np.uint32).astype(np.intp)
+        self.types = np.frombuffer(buffers[4], dtype=np.uint8)
+        self.preserve_topology = preserve_topology
+
+        self.ring_sizes = np.diff(self.ring_offsets)
+        self.ring_of = np.repeat(np.arange(len(self.ring_sizes)), self.ring_sizes)
+        self.part_feature = np.repeat(
+            np.arange(len(self.types)), np.diff(self.geometry_offsets)
+        )
+        self.ring_part = np.repeat(
+            np.arange(len(self.part_offsets) - 1), np.diff(self.part_offsets)
+        )
+        self.polygon_features = np.isin(self.types, _POLYGON_TYPES)
+        self.polygon_rings = self.polygon_features[self.part_feature[self.ring_part]]
+
+        # Ring ends, points and shared vertices are never removed
+        self.fixed = np.zeros(len(self.coords), dtype=bool)
+        nonempty = self.ring_sizes > 0
+        self.fixed[self.ring_offsets[:-1][nonempty]] = True
+        self.fixed[self.ring_offsets[1:][nonempty] - 1] = True
+        point_features = np.isin(self.types, _POINT_TYPES)
+        self.fixed[point_features[self.part_feature[self.ring_part]][self.ring_of]] = (
+            True
+        )
+        if preserve_topology and len(self.coords):
+            self.fixed |= _shared_vertices(self.coords, self.ring_of)
+
+    def simplify(self, tolerance, method):
+        """Returns the header and buffers of the simplified geometries."""
+        import numpy as np
+
+        if method == "dp":
+            keep = _douglas_peucker(
+                self.coords, self.fixed.copy(), self.ring_of, tolerance
+            )
+        else:
+            keep = _visvalingam(
+                self.coords,
+                np.ones(len(self.coords), dtype=bool),
+                self.fixed,
+                self.ring_of,
+                tolerance,
+            )
+
+        counts = _counts(keep, self.ring_offsets)
+        collapsed = self.polygon_rings & (counts < 4)
+        if self.preserve_topology:
+            # Restore collapsed polygon rings to four evenly spaced vertices
+            collapsed &= self.ring_sizes >= 4
+            starts = self.ring_offsets[:-1][collapsed]
+            sizes = self.ring_sizes[collapsed]
+            for step in range(4):
+                keep[starts + np.minimum(step * sizes // 3, sizes - 1)] = True
+            counts = _counts(keep, self.ring_offsets)
+            features = np.ones(len(self.types), dtype=bool)
+            parts = np.ones(len(self.part_feature), dtype=bool)
+            rings = np.ones(len(counts), dtype=bool)
+        else:
+            # Drop the polygons whose exterior ring collapsed, the holes that
+            # collapsed and the polygon features left without polygons
+            first_rings = self.part_offsets[:-1]
+            has_rings = np.diff(self.part_offsets) > 0
+            parts = np.ones(len(self.part_feature), dtype=bool)
+            parts[has_rings] = ~collapsed[first_rings[has_rings]]
+            features = ~self.polygon_features | (
+                _counts(parts, self.geometry_offsets) > 0
+            )
+            features |= np.diff(self.geometry_offsets) == 0
+            parts &= features[self.part_feature]
+            rings = ~collapsed & parts[self.ring_part]
+            keep &= rings[self.ring_of]
+
+        header = dict(self.header)
+        if not features.all():
+            selected = np.flatnonzero(features).tolist()
+            header["count"] = len(selected)
+            header["properties"] = [self.header["properties"][i] for i in selected]
+            if "ids" in self.header:
+                header["ids"] = [self.header["ids"][i] for i in selected]
+        buffers = [
+            np.ascontiguousarray(self.coords[keep]).ravel(),
+            _offsets(_counts(parts, self.geometry_offsets)[features]),
+            _offsets(_counts(rings, self.part_offsets)[parts]),
+            _offsets(counts[rings]),
+            self.types[features],
+        ]
+        return header, [memoryview(buffer) for buffer in buffers]
+
+
+def simplify_encoded(header, buffers, tolerance, method="dp", preserve_topology=False):
+    """Simplifies geometries encoded by `mapwidget.encoding.encode_geojson`.
+
+    Args:
+        header (dict): The JSON header.
+        buffers (list): The binary buffers, in the order of BUFFER_NAMES.
+        tolerance (float): The tolerance in degrees.
+        method (str, optional): 'dp' (Douglas-Peucker) or 'vw'
+            (Visvalingam-Whyatt). Defaults to 'dp'.
+        preserve_topology (bool, optional): Whether to keep the vertices
+            shared by several rings and at least four vertices per polygon
+            ring. Defaults to False.
+
+    Returns:
+        tuple: The header dict and the list of buffers of the simplified
+            geometries.
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    return _Geometries(header, buffers, preserve_topology).simplify(tolerance, method)
+
+
+def simplify_geojson(data, tolerance, method="dp", preserve_topology=False):
+    """Simplifies the geometries of GeoJSON.
+
+    Args:
+        data (dict): A GeoJSON FeatureCollection, Feature or geometry.
+        tolerance (float): The tolerance in degrees.
+        method (str, optional): 'dp' (Douglas-Peucker) or 'vw'
+            (Visvalingam-Whyatt). Defaults to 'dp'.
+        preserve_topology (bool, optional): Whether to keep the vertices
+            shared by several rings and at least four vertices per polygon
+            ring. Defaults to False.
+
+    Returns:
+        dict: The simplified FeatureCollection. Properties are shared with
+            the input.
+    """
+    header, buffers = encode_geojson(data)
+    return decode_geojson(
+        *simplify_encoded(header, buffers, tolerance, method, preserve_topology)
+    )
+
+
+def build_levels(
+    data,
+    bands=(0, 4, 8, 12),
+    pixels=1.0,
+    method="dp",
+    preserve_topology=False,
+    dtype="float64",
+):
+    """Precomputes the levels of detail of GeoJSON for zoom bands.
+
+    Each band runs from its zoom to the next one, and is simplified with the
+    tolerance of `pixels` at its upper zoom, so it looks right throughout.
+    The last band, from the last zoom on, keeps the full resolution.
+
+    Args:
+        data (dict): A GeoJSON FeatureCollection, Feature or geometry.
+        bands (tuple, optional): The lowest zoom of each band. Defaults to
+            (0, 4, 8, 12).
+        pixels (float, optional): The tolerance in screen pixels. Defaults
+            to 1.0.
+        method (str, optional): 'dp' or 'vw'. Defaults to 'dp'.
+        preserve_topology (bool, optional): See `simplify_geojson`. Defaults
+            to False.
+        dtype (str, optional): The coordinate type of the encoded levels,
+            'float64' or 'float32'. Defaults to 'float64'.
+
+    Returns:
+        list: For each band, a dict with its 'min_zoom' and 'max_zoom', the
+            'tolerance' in degrees, the number of 'features' and
+            'vertices', the encoded 'header' and 'buffers', their size in
+            'bytes' and the time spent simplifying ('simplify_ms'). The data
+            is encoded and prepared once, which counts toward the first level.
+    """
+    import numpy as np
+
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    bands = sorted(bands)
+    start = time.perf_counter()
+    header, buffers = encode_geojson(data)
+    geometries = _Geometries(header, buffers, preserve_topology)
+    prepare_ms = (time.perf_counter() - start) * 1000
+    levels = []
+    for index, min_zoom in enumerate(bands):
+        max_zoom = bands[index + 1] if index + 1 < len(bands) else None
+        start = time.perf_counter()
+        if max_zoom is None:
+            tolerance = 0.0
+            level_header, level_buffers = header, buffers
+        else:
+            tolerance = zoom_tolerance(max_zoom, pixels)
+            level_header, level_buffers = geometries.simplify(tolerance, method)
+        if dtype != level_header["dtype"]:
+            level_header = dict(level_header, dtype=dtype)
+            level_buffers = [
+                memoryview(np.asarray(level_buffers[0]).astype(dtype))
+            ] + level_buffers[1:]
+        levels.append(
+            {
+                "min_zoom": min_zoom,
+                "max_zoom": max_zoom,
+                "tolerance": tolerance,
+                "features": level_header["count"],
+                "vertices": len(level_buffers[0]) // 2,
+                "header": level_header,
+                "buffers": level_buffers,
+                "bytes": sum(buffer.nbytes for buffer in level_buffers),
+                "simplify_ms": (time.perf_counter() - start) * 1000 + prepare_ms,
+            }
+        )
+        prepare_ms = 0.0
+    return levels
+
+
+def level_index(levels, zoom):
+    """Returns the index of the level of a zoom.
+
+    Args:
+        levels (list): The levels of `build_levels`.
+        zoom (float): The zoom level.
+
+    Returns:
+        int: The index of the level whose band holds the zoom.
+    """
+    for index, level in enumerate(levels):
+        if level["max_zoom"] is None or zoom < level["max_zoom"]:
+            return index
+    return len(levels) - 1
@@ -0,0 +1,355 @@
+"""Module for indexing features in space, to query them by point or bounds.
+
+The index is a uniform grid over longitude and latitude. Each feature is
+registered in the grid cells its bounding box overlaps, except features
+spanning many cells, which are checked on every query. The cell size is
+derived from the extent and the number of features of the first bulk load.
+Bulk loading computes the bounding boxes with numpy.
+"""
+
+import math
+
+from .encoding import _features, encode_geojson
+
+# Features spanning more grid cells than this are checked on every query
+_MAX_CELLS = 64
+
+
+def _bbox(geometry):
+    """Returns the bounding box of a geometry, or None if it is empty."""
+    if geometry is None:
+        return None
+    if geometry["type"] == "GeometryCollection":
+        boxes = [_bbox(part) for part in geometry.get("geometries", [])]
+        boxes = [box for box in boxes if box is not None]
+        if not boxes:
+            return None
+        return (
+            min(box[0] for box in boxes),
+            min(box[1] for box in boxes),
+            max(box[2] for box in boxes),
+            max(box[3] for box in boxes),
+        )
+    xs = []
+    ys = []
+    stack = [geometry["coordinates"]]
+    while stack:
+        coords = stack.pop()
+        if coords and isinstance(coords[0], (int, float)):
+            xs.append(coords[0])
+            ys.append(coords[1])
+        else:
+            stack.extend(coords)
+    if not xs:
+        return None
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def _point_in_ring(x, y, ring):
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i][0], ring[i][1]
+        xj, yj = ring[j][0], ring[j][1]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def _segment_distance(x, y, a, b):
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    length = dx * dx + dy * dy
+    t = 0.0
+    if length > 0:
+        t = max(0.0, min(1.0, ((x - a[0]) * dx + (y - a[1]) * dy) / length))
+    return math.hypot(x - a[0] - t * dx, y - a[1] - t * dy)
+
+
+def _line_hit(x, y, line, tolerance):
+    if len(line) == 1:
+        return math.hypot(x - line[0][0], y - line[0][1]) <= tolerance
+    return any(
+        _segment_distance(x, y, line[i], line[i + 1]) <= tolerance
+        for i in range(len(line) - 1)
+    )
+
+
+def _polygon_hit(x, y, rings, tolerance):
+    if _point_in_ring(x, y, rings[0]) and not any(
+        _point_in_ring(x, y, hole) for hole in rings[1:]
+    ):
+        return True
+    return tolerance > 0 and any(_line_hit(x, y, ring, tolerance) for ring in rings)
+
+
+def geometry_contains(geometry, x, y, tolerance=0.0):
+    """Returns whether a geometry covers a point, within a tolerance.
+
+    Args:
+        geometry (dict): A GeoJSON geometry.
+        x (float): The longitude of the point.
+        y (float): The latitude of the point.
+        tolerance (float, optional): The distance in degrees within which
+            points and lines are hit. Defaults to 0.0.
+
+    Returns:
+        bool: True if the point is in a polygon of the geometry, or within
+            tolerance of one of its points or lines.
+    """
+    geom_type = geometry["type"]
+    coords = geometry.get("coordinates")
+    if geom_type == "Point":
+        return math.hypot(x - coords[0], y - coords[1]) <= tolerance
+    elif geom_type == "MultiPoint":
+        return any(math.hypot(x - c[0], y - c[1]) <= tolerance for c in coords)
+    elif geom_type == "LineString":
+        return _line_hit(x, y, coords, tolerance)
+    elif geom_type == "MultiLineString":
+        return any(_line_hit(x, y, line, tolerance) for line in coords)
+    elif geom_type == "Polygon":
+        return _polygon_hit(x, y, coords, tolerance)
+    elif geom_type == "MultiPolygon":
+        return any(_polygon_hit(x, y, rings, tolerance) for rings in coords)
+    elif geom_type == "GeometryCollection":
+        return any(
+            geometry_contains(part, x, y, tolerance)
+            for part in geometry.get("geometries", [])
+        )
+    return False
+
+
+class SpatialIndex:
+    """A grid index of GeoJSON features, each registered under a key.
+
+    The grid is sized for the first bulk load, so data of a different extent
+    or density, such as another map source, belongs in another index.
+
+    Args:
+        cell_size (float, optional): The size of the grid cells in degrees.
+            Defaults to a size derived from the first bulk load.
+    """
+
+    def __init__(self, cell_size=None):
+        self.cell_size = cell_size
+        self._auto_cell_size = cell_size is None
+        self.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Returns the feature registered under key, or default."""
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else default
+
+    def clear(self):
+        """Removes every feature."""
+        self._entries = {}
+        self._cells = {}
+        self._large = set()
+        if self._auto_cell_size:
+            self.cell_size = None
+
+    def _cell_range(self, bbox):
+        size = self.cell_size
+        return (
+            math.floor(bbox[0] / size),
+            math.floor(bbox[1] / size),
+            math.floor(bbox[2] / size),
+            math.floor(bbox[3] / size),
+        )
+
+    def _register(self, key, feature, bbox, cells=None):
+        if key in self._entries:
+            self.delete(key)
+        self._entries[key] = (feature, bbox)
+        x0, y0, x1, y1 = cells or self._cell_range(bbox)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > _MAX_CELLS:
+            self._large.add(key)
+            return
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                self._cells.setdefault((cx, cy), set()).add(key)
+
+    def insert(self, key, feature):
+        """Adds a feature, or replaces the feature registered under key.
+
+        Args:
+            key (hashable): The key of the feature.
+            feature (dict): A GeoJSON Feature. Features without geometry are
+                not indexed.
+        """
+        bbox = _bbox(feature.get("geometry"))
+        if bbox is None:
+            self.delete(key)
+            return
+        if self.cell_size is None:
+            self.cell_size = 1.0
+        self._register(key, feature, bbox)
+
+    def insert_many(self, keys, data):
+        """Adds many features at once, computing their bounding boxes in bulk.
+
+        Args:
+            keys (list): The keys of the features.
+            data (dict): A GeoJSON FeatureCollection, Feature or geometry with
+                as many features as keys. Requires numpy.
+        """
+        import numpy as np
+
+        features = _features(data)
+        if len(keys) != len(features):
+            raise ValueError("keys and features must have the same length")
+        try:
+            header, buffers = encode_geojson(data)
+        except (KeyError, ValueError):
+            # GeometryCollections are not encoded
+            for key, feature in zip(keys, features):
+                self.insert(key, feature)
+            return
+        coords = np.frombuffer(buffers[0], dtype=np.float64).reshape(-1, 2)
+        geometry_offsets = np.frombuffer(buffers[1], dtype=np.uint32)
+        part_offsets = np.frombuffer(buffers[2], dtype=np.uint32)
+        ring_offsets = np.frombuffer(buffers[3], dtype=np.uint32)
+
+        # The vertices of each feature are contiguous
+        vertex_offsets = ring_offsets[part_offsets[geometry_offsets]].astype(np.intp)
+        starts = vertex_offsets[:-1]
+        has_vertices = vertex_offsets[1:] > starts
+        boxes = np.zeros((len(features), 4))
+        if has_vertices.any():
+            valid_starts = starts[has_vertices]
+            boxes[has_vertices, 0] = np.minimum.reduceat(coords[:, 0], valid_starts)
+            boxes[has_vertices, 1] = np.minimum.reduceat(coords[:, 1], valid_starts)
+            boxes[has_vertices, 2] = np.maximum.reduceat(coords[:, 0], valid_starts)
+            boxes[has_vertices, 3] = np.maximum.reduceat(coords[:, 1], valid_starts)
+
+        if self._auto_cell_size and not self._entries:
+            self.cell_size = 1.0
+            if has_vertices.any():
+                valid = boxes[has_vertices]
+                width = valid[:, 2].max() - valid[:, 0].min()
+                height = valid[:, 3].max() - valid[:, 1].min()
+                # About four features per cell if they are spread evenly
+                spread = 2 * math.sqrt(max(width * height, 1e-12) / len(valid))
+                sizes = np.maximum(valid[:, 2] - valid[:, 0], valid[:, 3] - valid[:, 1])
+                self.cell_size = max(spread, float(np.median(sizes)), 1e-6)
+
+        cells = np.floor(boxes / self.cell_size).astype(np.int64).tolist()
+        for key, feature, bbox, cell_range, valid in zip(
+            keys, features, boxes.tolist(), cells, has_vertices.tolist()
+        ):
+            if valid:
+                self._register(key, feature, tuple(bbox), cell_range)
+            else:
+                self.delete(key)
+
+    def delete(self, key):
+        """Removes the feature registered under key, if any.
+
+        Args:
+            key (hashable): The key of the feature.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        if key in self._large:
+            self._large.discard(key)
+            return
+        x0, y0, x1, y1 = self._cell_range(entry[1])
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = self._cells.get((cx, cy))
+                if cell is not None:
+                    cell.discard(key)
+                    if not cell:
+                        del self._cells[(cx, cy)]
+
+    def delete_many(self, keys):
+        """Removes the features registered under keys."""
+        for key in keys:
+            self.delete(key)
+
+    def keys_in_bounds(self, bbox):
+        """Returns the keys of the features whose bounding box intersects bbox.
+
+        Args:
+            bbox (list): The [west, south, east, north] bounds.
+
+        Returns:
+            list: The keys.
+        """
+        if not self._entries:
+            return []
+        west, south, east, north = bbox
+        x0, y0, x1, y1 = self._cell_range(bbox)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self._cells):
+            candidates = self._entries.keys()
+        else:
+            candidates = set(self._large)
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    cell = self._cells.get((cx, cy))
+                    if cell:
+                        candidates.update(cell)
+        keys = []
+        for key in candidates:
+            box = self._entries[key][1]
+            if (
+                box[0] <= east
+                and box[2] >= west
+                and box[1] <= north
+                and box[3] >= south
+            ):
+                keys.append(key)
+        return keys
+
+    def features_in_bounds(self, bbox):
+        """Returns the features whose bounding box intersects bbox.
+
+        Args:
+            bbox (list): The [west, south, east, north] bounds.
+
+        Returns:
+            list: The features.
+        """
+        return [self._entries[key][0] for key in self.keys_in_bounds(bbox)]
+
+    def keys_at(self, lng, lat, tolerance=0.0):
+        """Returns the keys of the features covering a point.
+
+        Args:
+            lng (float): The longitude of the point.
+            lat (float): The latitude of the point.
+            tolerance (float, optional): The distance in degrees within which
+                points and lines are hit. Defaults to 0.0.
+
+        Returns:
+            list: The keys.
+        """
+        keys = self.keys_in_bounds(
+            [lng - tolerance, lat - tolerance, lng + tolerance, lat + tolerance]
+        )
+        return [
+            key
+            for key in keys
+            if geometry_contains(self._entries[key][0]["geometry"], lng, lat, tolerance)
+        ]
+
+    def features_at(self, lng, lat, tolerance=0.0):
+        """Returns the features covering a point.
+
+        Args:
+            lng (float): The longitude of the point.
+            lat (float): The latitude of the point.
+            tolerance (float, optional): The distance in degrees within which
+                points and lines are hit. Defaults to 0.0.
+
+        Returns:
+            list: The features.
+        """
+        return [self._entries[key][0] for key in self.keys_at(lng, lat, tolerance)]
@@ -0,0 +1,208 @@
+"""Module for measuring the calls, messages and trait updates of a map.
+
+With instrumentation on, every call records its serialized payload size and
+the time it was queued in the kernel. The frontend reports, in the
+acknowledgement of the calls, how long each call waited before it was
+applied and how long its JS handler took. The kernel derives the latency of
+each call from the time the acknowledgement arrives, minus the time the
+frontend held it back to coalesce acknowledgements. Synced trait updates and
+frontend messages are counted and sized too.
+"""
+
+import collections
+import json
+import sys
+import time
+
+# The number of samples kept per method for the percentiles
+MAX_SAMPLES = 1000
+
+# The number of unacknowledged calls tracked, e.g. while no view is displayed
+MAX_PENDING = 10000
+
+
+def percentiles(values, qs=(50, 90, 99)):
+    """Returns percentiles of values, interpolating between samples.
+
+    Args:
+        values (list): The values.
+        qs (tuple, optional): The percentiles to compute, in [0, 100].
+            Defaults to (50, 90, 99).
+
+    Returns:
+        dict: The value of each percentile by key, e.g. 'p50', or None for
+            every key if there are no values.
+    """
+    ordered = sorted(values)
+    result = {}
+    for q in qs:
+        if not ordered:
+            result[f"p{q}"] = None
+            continue
+        position = (len(ordered) - 1) * q / 100
+        lower = int(position)
+        upper = min(lower + 1, len(ordered) - 1)
+        result[f"p{q}"] = ordered[lower] + (ordered[upper] - ordered[lower]) * (
+            position - lower
+        )
+    return result
+
+
+def payload_size(content, buffers=None):
+    """Returns the size in bytes of a message serialized as JSON with buffers.
+
+    Args:
+        content (object): The JSON content.
+        buffers (list, optional): The binary buffers. Defaults to None.
+
+    Returns:
+        int: The size in bytes.
+    """
+    size = len(json.dumps(content, separators=(",", ":"), default=str).encode())
+    for buffer in buffers or []:
+        size += memoryview(buffer).nbytes
+    return size
+
+
+def deep_sizeof(obj, seen=None):
+    """Returns the approximate memory footprint of an object and its contents.
+
+    Containers are followed, and every object is counted once. Buffers count
+    their bytes.
+
+    Args:
+        obj (object): The object.
+
+    Returns:
+        int: The size in bytes.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, memoryview):
+        return sys.getsizeof(obj) + obj.nbytes
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_sizeof(key, seen) + deep_sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset, collections.deque)):
+        for item in obj:
+            size += deep_sizeof(item, seen)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+class _Series:
+    """The count, total and recent samples of a measure."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = collections.deque(maxlen=MAX_SAMPLES)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.samples.append(value)
+
+    def summary(self):
+        return {"count": self.count, "total": self.total, **percentiles(self.samples)}
+
+
+class MapStats:
+    """Records the calls, messages and trait updates of a map.
+
+    Args:
+        log_size (int, optional): The number of call records kept in the
+            structured log. Defaults to 1000.
+    """
+
+    def __init__(self, log_size=1000):
+        self.log = collections.deque(maxlen=log_size)
+        self.reset()
+
+    def reset(self):
+        """Forgets everything recorded so far."""
+        self._pending = {}
+        self._calls = collections.defaultdict(
+            lambda: {name: _Series() for name in ("bytes", "latency_ms", "handler_ms")}
+        )
+        self._traits = collections.defaultdict(_Series)
+        self._messages = collections.defaultdict(_Series)
+        self.log.clear()
+
+    def queued(self, entry):
+        """Records a call queued for the frontend.
+
+        Args:
+            entry (dict): The call entry.
+        """
+        content = {key: entry[key] for key in entry if key != "buffers"}
+        size = payload_size(content, entry.get("buffers"))
+        record = {
+            "seq": entry["seq"],
+            "method": entry["method"],
+            "bytes": size,
+            "queued": time.time(),
+        }
+        self._pending[entry["seq"]] = (record, time.perf_counter())
+        if len(self._pending) > MAX_PENDING:
+            del self._pending[next(iter(self._pending))]
+        self._calls[entry["method"]]["bytes"].add(size)
+
+    def acked(self, timings):
+        """Records the timings of applied calls reported with an ack.
+
+        Args:
+            timings (list): [seq, wait_ms, handler_ms, held_ms] per call: how
+                long the call waited in the frontend before it was applied,
+                how long its handler took, and how long the ack was held back
+                after it.
+        """
+        now = time.perf_counter()
+        for seq, wait_ms, handler_ms, held_ms in timings:
+            pending = self._pending.pop(seq, None)
+            if pending is None:
+                continue  # Replayed, or applied by another view
+            record, queued = pending
+            latency_ms = max((now - queued) * 1000 - held_ms, 0.0)
+            record.update(
+                wait_ms=wait_ms,
+                handler_ms=handler_ms,
+                latency_ms=latency_ms,
+                applied=record["queued"] + latency_ms / 1000,
+            )
+            series = self._calls[record["method"]]
+            series["latency_ms"].add(latency_ms)
+            series["handler_ms"].add(handler_ms)
+            self.log.append(record)
+
+    def trait_changed(self, change):
+        """Records a trait update, as a traitlets observer."""
+        self._traits[change["name"]].add(payload_size(change["new"]))
+
+    def message(self, content, buffers=None):
+        """Records a message sent by the frontend."""
+        self._messages[content.get("type")].add(payload_size(content, buffers))
+
+    def summary(self):
+        """Returns the recorded measures.
+
+        Returns:
+            dict: For each call method ('calls'), trait ('traits') and
+                frontend message type ('messages'), the count, total and
+                50th, 90th and 99th percentiles of its measures, and the
+                number of calls not acknowledged yet ('pending').
+        """
+        return {
+            "calls": {
+                method: {name: s.summary() for name, s in series.items()}
+                for method, series in self._calls.items()
+            },
+            "traits": {name: s.summary() for name, s in self._traits.items()},
+            "messages": {name: s.summary() for name, s in self._messages.items()},
+            "pending": len(self._pending),
+        }
@@ -0,0 +1,377 @@
+"""Module for streaming the features of Python data sources to map views.
+
+A stream holds, in the frontend, only the features around the view of the
+map. Its source is either:
+
+- a callable ``source(bbox, zoom)`` returning or yielding the GeoJSON
+  features in the [west, south, east, north] bounding box, or a
+  FeatureCollection, e.g. a query against a database or a partitioned file;
+- any other iterable of GeoJSON features, such as a generator or a
+  FeatureCollection, read once into a `mapwidget.spatial.SpatialIndex`
+  in the background and then queried by bounding box.
+
+Whenever the synced `bounds` change, the features that left the view and
+its margin are evicted, the fetch in flight is cancelled, and the features
+of the new view are fetched on a thread pool. They are sent in binary chunks
+as they come, skipping the features the frontend already holds.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+
+from .encoding import _features, encode_geojson
+from .spatial import SpatialIndex, _bbox
+
+# The number of features of an iterable source indexed at once
+_INDEX_CHUNK_SIZE = 10000
+
+
+def _intersects(a, b):
+    return a[0] <= b[2] and a[2] >= b[0] and a[1] <= b[3] and a[3] >= b[1]
+
+
+def expand_bounds(bounds, margin):
+    """Returns bounds grown by a fraction of their size on every side.
+
+    Args:
+        bounds (list): The [west, south, east, north] bounds.
+        margin (float): The fraction of the width and height added on each
+            side.
+
+    Returns:
+        list: The expanded bounds, with latitudes clipped to [-90, 90].
+    """
+    west, south, east, north = bounds
+    dx = (east - west) * margin
+    dy = (north - south) * margin
+    return [west - dx, max(south - dy, -90.0), east + dx, min(north + dy, 90.0)]
+
+
+class FeatureStream:
+    """Streams the features of a Python source around the view of a map.
+
+    Created by `mapwidget.maplibre.Map.add_stream_layer`.
+
+    Args:
+        map (mapwidget.maplibre.Map): The map.
+        source_id (str): The ID of the GeoJSON source fed by the stream.
+        source (callable or iterable): The features, see the module
+            docstring.
+        chunk_size (int, optional): The number of features per message.
+            Defaults to 500.
+        margin (float, optional): The fraction of the view size fetched
+            ahead on every side, so that short pans need no fetch. Defaults
+            to 0.5.
+        max_features (int, optional): The maximum number of features held by
+            the frontend. Defaults to 100000.
+        min_zoom (float, optional): The zoom below which no features are
+            shown. Defaults to 0.
+        id_property (str, optional): The property identifying features that
+            have no 'id'. Defaults to a hash of the geometry and properties.
+        dtype (str, optional): The coordinate type, 'float64' or 'float32'.
+            Defaults to 'float64'.
+        max_workers (int, optional): The number of fetch threads. Defaults
+            to 2.
+
+    Attributes:
+        loaded (dict): The bounding box of each feature held by the
+            frontend, by feature ID.
+        stats (dict): The number of 'fetches', 'cancelled' fetches,
+            'chunks', features 'sent' and 'evicted', 'bytes' sent, and the
+            duration of the last completed fetch ('fetch_ms').
+        error (Exception): The error of the last fetch, if it failed.
+    """
+
+    def __init__(
+        self,
+        map,
+        source_id,
+        source,
+        chunk_size=500,
+        margin=0.5,
+        max_features=100_000,
+        min_zoom=0,
+        id_property=None,
+        dtype="float64",
+        max_workers=2,
+    ):
+        self.map = map
+        self.id = source_id
+        self.source = source
+        self.chunk_size = chunk_size
+        self.margin = margin
+        self.max_features = max_features
+        self.min_zoom = min_zoom
+        self.id_property = id_property
+        self.dtype = dtype
+        self.max_workers = max_workers
+        self.loaded = {}
+        self.stats = {
+            "fetches": 0,
+            "cancelled": 0,
+            "chunks": 0,
+            "sent": 0,
+            "evicted": 0,
+            "bytes": 0,
+            "fetch_ms": None,
+        }
+        self.error = None
+        self._generation = 0
+        self._future = None
+        self._executor = None
+        self._index = None
+        self._lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        try:
+            # Results are handed to the kernel event loop when there is one,
+            # so that messages are only sent from its thread
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+
+    def feature_id(self, feature):
+        """Returns the ID of a feature.
+
+        Args:
+            feature (dict): A GeoJSON Feature.
+
+        Returns:
+            int or str: The 'id' of the feature, its `id_property`, or else a
+                hash of its geometry and properties.
+        """
+        if feature.get("id") is not None:
+            return feature["id"]
+        properties = feature.get("properties") or {}
+        if (
+            self.id_property is not None
+            and properties.get(self.id_property) is not None
+        ):
+            return properties[self.id_property]
+        text = json.dumps(
+            [feature.get("geometry"), properties], sort_keys=True, default=str
+        )
+        return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+    def update(self, bounds=None, zoom=None):
+        """Evicts the features out of view and fetches those in view.
+
+        Called whenever the synced bounds of the map change.
+
+        Args:
+            bounds (list, optional): The [west, south, east, north] bounds.
+                Defaults to the bounds of the map.
+            zoom (float, optional): The zoom. Defaults to the zoom of the map.
+
+        Returns:
+            concurrent.futures.Future: The fetch, or None if nothing is
+                fetched.
+        """
+        bounds = self.map.bounds if bounds is None else bounds
+        zoom = self.map.zoom if zoom is None else zoom
+        if bounds[0] == bounds[2] or bounds[1] == bounds[3]:
+            return None  # No view yet
+        bbox = expand_bounds(bounds, self.margin)
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            if self._future is not None and self._future.cancel():
+                self.stats["cancelled"] += 1
+            if zoom < self.min_zoom:
+                self._evict(list(self.loaded))
+                self._future = None
+                return None
+            self._evict(
+                [key for key, box in self.loaded.items() if not _intersects(box, bbox)]
+            )
+            if self._executor is None:
+                import concurrent.futures
+
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="mapwidget-stream"
+                )
+            self.stats["fetches"] += 1
+            self._future = self._executor.submit(self._fetch, generation, bbox, zoom)
+            return self._future
+
+    def refresh(self, evict=True):
+        """Fetches the features in view again, e.g. after the source changed.
+
+        Iterable sources are read again, unless they are iterators such as
+        generators, which can only be read once.
+
+        Args:
+            evict (bool, optional): Whether to remove the features from the
+                frontend first. Without it, the features are sent again and
+                replace those with the same ID, e.g. for a newly displayed
+                view. Defaults to True.
+
+        Returns:
+            concurrent.futures.Future: The fetch, or None if nothing is
+                fetched.
+        """
+        with self._lock:
+            if evict:
+                self._evict(list(self.loaded))
+            else:
+                self.loaded.clear()
+        if not callable(self.source) and iter(self.source) is not self.source:
+            with self._index_lock:
+                self._index = None
+        return self.update()
+
+    def wait(self, timeout=None):
+        """Waits for the current fetch to complete.
+
+        Args:
+            timeout (float, optional): The maximum time to wait in seconds.
+                Defaults to None, which waits until the fetch is done.
+
+        Raises:
+            Exception: The error of the fetch, if it failed.
+        """
+        future = self._future
+        if future is not None and not future.cancelled():
+            future.result(timeout)
+
+    def close(self):
+        """Cancels the fetches and stops the fetch threads."""
+        with self._lock:
+            self._generation += 1
+            if self._future is not None:
+                self._future.cancel()
+            self.loaded.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _cancelled(self, generation):
+        return generation != self._generation
+
+    def _query(self, bbox, zoom):
+        """Yields the features of the source in a bounding box."""
+        if callable(self.source):
+            result = self.source(bbox, zoom)
+            if isinstance(result, dict):
+                result = _features(result)
+            yield from result
+            return
+        with self._index_lock:
+            if self._index is None:
+                self._index = self._build_index()
+            index = self._index
+        if index is not None:
+            yield from index.features_in_bounds(bbox)
+
+    def _build_index(self):
+        """Reads an iterable source into a spatial index."""
+        source = self.source
+        if isinstance(source, dict):
+            source = _features(source)
+        index = SpatialIndex()
+        chunk = []
+
+        def insert(chunk):
+            keys = [self.feature_id(feature) for feature in chunk]
+            try:
+                index.insert_many(
+                    keys, {"type": "FeatureCollection", "features": chunk}
+                )
+            except ImportError:
+                for key, feature in zip(keys, chunk):
+                    index.insert(key, feature)
+
+        for feature in source:
+            chunk.append(feature)
+            if len(chunk) >= _INDEX_CHUNK_SIZE:
+                insert(chunk)
+                chunk = []
+        if chunk:
+            insert(chunk)
+        return index
+
+    def _fetch(self, generation, bbox, zoom):
+        """Fetches the features in a bounding box and sends them in chunks."""
+        start = time.perf_counter()
+        seen = set()
+        chunk = []
+        room = self.max_features - len(self.loaded)
+        features = self._query(bbox, zoom)
+        try:
+            for feature in features:
+                if self._cancelled(generation):
+                    self.stats["cancelled"] += 1
+                    return
+                key = self.feature_id(feature)
+                if key in seen or key in self.loaded:
+                    continue
+                box = _bbox(feature.get("geometry"))
+                if box is None or not _intersects(box, bbox):
+                    continue
+                if len(seen) >= room:
+                    break
+                seen.add(key)
+                chunk.append((key, box, feature))
+                if len(chunk) >= self.chunk_size:
+                    self._deliver(generation, chunk)
+                    chunk = []
+            if chunk:
+                self._deliver(generation, chunk)
+        except Exception as e:
+            self.error = e
+            raise
+        finally:
+            features.close()
+        self.error = None
+        self.stats["fetch_ms"] = (time.perf_counter() - start) * 1000
+
+    def _deliver(self, generation, chunk):
+        """Encodes a chunk of features and sends it from the kernel thread."""
+        header, buffers = encode_geojson(
+            {
+                "type": "FeatureCollection",
+                "features": [
+                    {
+                        "type": "Feature",
+                        "id": key,
+                        "geometry": feature.get("geometry"),
+                        "properties": feature.get("properties") or {},
+                    }
+                    for key, _, feature in chunk
+                ],
+            },
+            dtype=self.dtype,
+        )
+
+        def send():
+            with self._lock:
+                if self._cancelled(generation):
+                    return
+                for key, box, _ in chunk:
+                    self.loaded[key] = box
+                self._send({"header": header}, buffers)
+                self.stats["chunks"] += 1
+                self.stats["sent"] += len(chunk)
+
+        if self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(send)
+        else:
+            send()
+
+    def _evict(self, keys):
+        """Removes features from the frontend, with the lock held."""
+        if not keys:
+            return
+        for key in keys:
+            del self.loaded[key]
+        self._send({"remove": keys})
+        self.stats["evicted"] += len(keys)
+
+    def _send(self, content, buffers=None):
+        from .stats import payload_size
+
+        content = {"type": "stream", "source_id": self.id, **content}
+        self.stats["bytes"] += payload_size(content, buffers)
+        self.map.send(content, buffers=buffers)
@@ -0,0 +1,91 @@
+"""Module for mirroring the style of a map in the kernel."""
+
+import copy
+
+# Placeholder for inline source data that has not been requested yet. The
+# frontend adds the 'version' of the data, which changes with the data.
+INLINE_DATA = {"inline": True}
+
+
+def _placeholder(version=None):
+    return INLINE_DATA if version is None else dict(INLINE_DATA, version=version)
+
+
+class StyleMirror:
+    """A kernel-side copy of a map style, kept up to date by style patches.
+
+    The frontend sends structural diffs of its style: layers and sources that
+    were added, changed or removed, the layer order, and the other top-level
+    style properties. Inline GeoJSON data is replaced by INLINE_DATA and only
+    fetched on request. Fetched data is kept until a patch brings another
+    version of it.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Empties the mirror."""
+        self.meta = {}
+        self.sources = {}
+        self._layers = {}
+        self._order = []
+        # The placeholders of the inline data fetched, by source ID
+        self._fetched = {}
+
+    def apply(self, patch):
+        """Applies a style patch sent by the frontend.
+
+        Args:
+            patch (dict): The patch, with optional 'reset', 'meta', 'layers',
+                'removed_layers', 'order', 'sources' and 'removed_sources' keys.
+        """
+        if patch.get("reset"):
+            self.clear()
+        if "meta" in patch:
+            self.meta = patch["meta"]
+        for layer_id in patch.get("removed_layers", []):
+            self._layers.pop(layer_id, None)
+        for layer in patch.get("layers", []):
+            self._layers[layer["id"]] = layer
+        if "order" in patch:
+            self._order = patch["order"]
+        for source_id in patch.get("removed_sources", []):
+            self.sources.pop(source_id, None)
+            self._fetched.pop(source_id, None)
+        for source_id, source in patch.get("sources", {}).items():
+            # Keep data fetched earlier if its version came in again
+            fetched = self._fetched.pop(source_id, None)
+            if fetched is not None and source.get("data") == fetched:
+                source = dict(source, data=self.sources[source_id]["data"])
+                self._fetched[source_id] = fetched
+            self.sources[source_id] = source
+
+    def set_source_data(self, source_id, data, version=None):
+        """Stores the inline data of a source fetched from the frontend.
+
+        Args:
+            source_id (str): The ID of the source.
+            data (dict): The GeoJSON data.
+            version (int, optional): The version of the data in the frontend.
+                Defaults to None.
+        """
+        if source_id in self.sources:
+            self.sources[source_id] = dict(self.sources[source_id], data=data)
+            self._fetched[source_id] = _placeholder(version)
+
+    @property
+    def layers(self):
+        """list: The style layers, in rendering order."""
+        return [self._layers[layer_id] for layer_id in self._order]
+
+    def to_dict(self):
+        """Returns the mirrored style as a MapLibre style dict.
+
+        Returns:
+            dict: A deep copy of the style.
+        """
+        style = dict(self.meta)
+        style["sources"] = self.sources
+        style["layers"] = self.layers
+        return copy.deepcopy(style)
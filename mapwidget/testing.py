@@ -0,0 +1,113 @@
+"""Module for exercising map widgets without a browser.
+
+`FakeFrontend` stands in for the JS side of a widget: it records the
+messages the kernel sends, acknowledges calls like a displayed view does, and
+sends frontend messages such as draw operations back to the kernel. It is
+meant for tests and benchmarks, which then run headless and offline.
+"""
+
+from .stats import payload_size
+
+
+class FakeFrontend:
+    """Records the messages of a widget and plays the part of its frontend.
+
+    Attaching replaces the `send` method of the widget. Trait updates the
+    kernel would sync to a displayed view are recorded too.
+
+    Args:
+        widget (anywidget.AnyWidget): The map widget.
+        auto_ack (bool, optional): Whether to acknowledge sequenced calls as
+            soon as they are sent, like a displayed view, so the call log of
+            a maplibre map only retains what it would in a notebook. Defaults
+            to True.
+        keep (bool, optional): Whether to keep the messages, rather than
+            only counting them. Defaults to True.
+
+    Attributes:
+        messages (list): The (content, buffers) pairs sent by the kernel.
+        message_count (int): The number of messages sent by the kernel.
+        bytes_sent (int): The size of the messages sent by the kernel.
+        trait_updates (int): The number of synced trait updates.
+        trait_bytes (int): The size of the synced trait updates.
+        bytes_received (int): The size of the messages sent to the kernel.
+    """
+
+    def __init__(self, widget, auto_ack=True, keep=True):
+        self.widget = widget
+        self.auto_ack = auto_ack
+        self.keep = keep
+        self.seq = 0
+        self.clear()
+        widget.send = self._receive
+        names = [name for name in widget.trait_names(sync=True) if name[0] != "_"]
+        widget.observe(self._trait_changed, names=names)
+
+    def clear(self):
+        """Forgets the recorded messages and resets the counters."""
+        self.messages = []
+        self.message_count = 0
+        self.bytes_sent = 0
+        self.trait_updates = 0
+        self.trait_bytes = 0
+        self.bytes_received = 0
+
+    def _receive(self, content, buffers=None):
+        self.message_count += 1
+        self.bytes_sent += payload_size(content, buffers)
+        if self.keep:
+            self.messages.append((content, buffers))
+        if content.get("type") == "calls" and content["calls"]:
+            self.seq = max(self.seq, content["calls"][-1]["seq"])
+            if self.auto_ack:
+                self.ack()
+
+    def _trait_changed(self, change):
+        self.trait_updates += 1
+        self.trait_bytes += payload_size(change["new"])
+
+    @property
+    def calls(self):
+        """list: The call entries sent by the kernel, in order."""
+        return [
+            call
+            for content, _ in self.messages
+            if content.get("type") == "calls"
+            for call in content["calls"]
+        ]
+
+    def send(self, content, buffers=None):
+        """Sends a custom message to the kernel, as the frontend would.
+
+        Args:
+            content (dict): The message content.
+            buffers (list, optional): The message buffers. Defaults to None.
+        """
+        self.bytes_received += payload_size(content, buffers)
+        self.widget._handle_custom_msg(content, buffers or [])
+
+    def sync(self, seq=0):
+        """Asks for the calls made after seq, as a newly displayed view."""
+        self.send({"type": "sync", "seq": seq})
+
+    def ack(self, seq=None):
+        """Acknowledges the calls up to seq, by default every call sent."""
+        self.send({"type": "ack", "seq": self.seq if seq is None else seq})
+
+    def draw(self, event, ops=None, ids=None):
+        """Sends the feature operations of a draw control event.
+
+        Args:
+            event (str): 'create', 'update', 'delete', 'selection', 'reset'
+                or 'clear'.
+            ops (list, optional): The feature operations, see
+                `mapwidget.features.FeatureStore`. Defaults to None.
+            ids (list, optional): The selected feature IDs of a 'selection'
+                event. Defaults to None.
+        """
+        content = {"type": "draw", "event": event}
+        if event == "selection":
+            content["ids"] = ids or []
+        else:
+            content["ops"] = ops or []
+        self.send(content)
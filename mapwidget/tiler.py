@@ -0,0 +1,556 @@
+"""Module for cutting GeoJSON into Mapbox Vector Tiles (MVT) in the kernel.
+
+The tiler projects the input features to Web Mercator once, keeps a per-tile
+index of the features at an index zoom level, and clips and encodes the tiles
+on demand. Encoded tiles are kept in an LRU cache until the data changes.
+
+As in geojson-vt, the tiles below the maximum zoom level are simplified: the
+importance of each vertex is computed once with Douglas-Peucker, and each
+zoom level keeps the vertices more important than its tolerance. Lines and
+polygons smaller than the tolerance are dropped, and points are thinned to
+one per cell of a grid. Requires numpy.
+"""
+
+import json
+import struct
+import threading
+
+from .cache import LRUCache
+from .encoding import GEOMETRY_TYPES, encode_geojson
+from .simplify import _squared_distances
+
+MAX_LATITUDE = 85.0511287798
+
+# MVT geometry types
+_POINT, _LINESTRING, _POLYGON = 1, 2, 3
+
+# Features spanning more index cells than this are checked on every query
+_MAX_INDEX_CELLS = 16
+
+_POINT_TYPE = GEOMETRY_TYPES.index("Point")
+_MULTIPOINT_TYPE = GEOMETRY_TYPES.index("MultiPoint")
+
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _zigzag(value):
+    return (value << 1) if value >= 0 else ((-value) << 1) - 1
+
+
+def _key(field, wire_type):
+    return _varint((field << 3) | wire_type)
+
+
+def _length_delimited(field, data):
+    return _key(field, 2) + _varint(len(data)) + data
+
+
+def _packed(field, values):
+    return _length_delimited(field, b"".join(_varint(value) for value in values))
+
+
+def _encode_value(value):
+    """Encodes a property value as an MVT Value message."""
+    if isinstance(value, bool):
+        return _key(7, 0) + _varint(int(value))
+    elif isinstance(value, int):
+        if value >= 0:
+            return _key(5, 0) + _varint(value)
+        return _key(6, 0) + _varint(_zigzag(value))
+    elif isinstance(value, float):
+        return _key(3, 1) + struct.pack("<d", value)
+    elif isinstance(value, str):
+        return _length_delimited(1, value.encode("utf-8"))
+    return _length_delimited(1, json.dumps(value).encode("utf-8"))
+
+
+def _clip_ring(ring, lo, hi):
+    """Clips a polygon ring to the square [lo, hi] (Sutherland-Hodgman)."""
+    for axis, bound, keep_above in ((0, lo, True), (0, hi, False)) + (
+        (1, lo, True),
+        (1, hi, False),
+    ):
+        if not ring:
+            break
+        clipped = []
+        previous = ring[-1]
+        previous_in = (previous[axis] >= bound) == keep_above
+        for point in ring:
+            point_in = (point[axis] >= bound) == keep_above
+            if point_in != previous_in:
+                t = (bound - previous[axis]) / (point[axis] - previous[axis])
+                other = 1 - axis
+                crossing = [0, 0]
+                crossing[axis] = bound
+                crossing[other] = previous[other] + t * (point[other] - previous[other])
+                clipped.append(tuple(crossing))
+            if point_in:
+                clipped.append(point)
+            previous, previous_in = point, point_in
+        ring = clipped
+    return ring
+
+
+def _clip_line(line, lo, hi):
+    """Clips a polyline to the square [lo, hi] (Liang-Barsky per segment)."""
+    pieces = []
+    current = []
+    for (x0, y0), (x1, y1) in zip(line, line[1:]):
+        t0, t1 = 0.0, 1.0
+        dx, dy = x1 - x0, y1 - y0
+        visible = True
+        for p, q in ((-dx, x0 - lo), (dx, hi - x0), (-dy, y0 - lo), (dy, hi - y0)):
+            if p == 0:
+                if q < 0:
+                    visible = False
+                    break
+            else:
+                t = q / p
+                if p < 0:
+                    t0 = max(t0, t)
+                else:
+                    t1 = min(t1, t)
+                if t0 > t1:
+                    visible = False
+                    break
+        if not visible:
+            if current:
+                pieces.append(current)
+                current = []
+            continue
+        start = (x0 + t0 * dx, y0 + t0 * dy)
+        end = (x0 + t1 * dx, y0 + t1 * dy)
+        if not current:
+            current = [start]
+        current.append(end)
+        if t1 < 1.0:
+            pieces.append(current)
+            current = []
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _quantize(points, closed=False):
+    """Rounds points to integer tile coordinates, dropping repeated points."""
+    out = []
+    for x, y in points:
+        point = (int(round(x)), int(round(y)))
+        if not out or point != out[-1]:
+            out.append(point)
+    if closed and len(out) > 1 and out[0] == out[-1]:
+        out.pop()
+    return out
+
+
+def _importance(x, y, ring_offsets, threshold):
+    """Returns the Douglas-Peucker importance of each vertex of the rings.
+
+    The importance is the squared distance at which a vertex is kept, bounded
+    by the importance of the vertex that split its segment, so the vertices
+    more important than any tolerance form a valid simplification. Ring ends
+    are always kept, and vertices less important than threshold get 0.
+    """
+    import numpy as np
+
+    importance = np.zeros(len(x))
+    sizes = np.diff(ring_offsets)
+    nonempty = sizes > 0
+    starts = ring_offsets[:-1][nonempty].astype(np.int64)
+    ends = ring_offsets[1:][nonempty].astype(np.int64) - 1
+    importance[starts] = np.inf
+    importance[ends] = np.inf
+    bounds = np.full(len(starts), np.inf)
+    open_ = ends - starts > 1
+    starts, ends, bounds = starts[open_], ends[open_], bounds[open_]
+    while len(starts):
+        lengths = ends - starts - 1
+        total = int(lengths.sum())
+        group_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        segment = np.repeat(np.arange(len(starts)), lengths)
+        a = starts[segment]
+        points = a + 1 + np.arange(total) - group_starts[segment]
+        distances = _squared_distances(x, y, points, a, ends[segment])
+        farthest = np.maximum.reduceat(distances, group_starts)
+        positions = np.where(distances == farthest[segment], np.arange(total), total)
+        split = points[np.minimum.reduceat(positions, group_starts)]
+        far = farthest > threshold
+        split, bound = split[far], np.minimum(farthest[far], bounds[far])
+        importance[split] = bound
+        starts = np.concatenate([starts[far], split])
+        ends = np.concatenate([split, ends[far]])
+        bounds = np.concatenate([bound, bound])
+        open_ = ends - starts > 1
+        starts, ends, bounds = starts[open_], ends[open_], bounds[open_]
+    return importance
+
+
+def _ring_area(ring):
+    area = 0
+    for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]):
+        area += x0 * y1 - x1 * y0
+    return area
+
+
+class VectorTiler:
+    """Cuts GeoJSON features into Mapbox Vector Tiles on demand.
+
+    Args:
+        data (dict): A GeoJSON FeatureCollection, Feature or geometry.
+        layer_name (str, optional): The name of the layer inside the tiles,
+            used as 'source-layer' by the map layers. Defaults to 'features'.
+        max_zoom (int, optional): The maximum zoom level of the tiles. The map
+            overzooms the tiles beyond it. Defaults to 14.
+        index_zoom (int, optional): The zoom level of the per-tile feature
+            index. Defaults to 8.
+        extent (int, optional): The tile extent in tile coordinates.
+            Defaults to 4096.
+        buffer (int, optional): The buffer around each tile, in tile
+            coordinates. Defaults to 64.
+        cache_size (int, optional): The number of encoded tiles kept in the LRU
+            cache. Defaults to 512.
+        tolerance (float, optional): The simplification tolerance below the
+            maximum zoom level, in tile coordinates. Lines and polygons
+            smaller than it are dropped. Defaults to 3.
+        point_spacing (float, optional): The size in tile coordinates of the
+            grid cells that keep one point each below the maximum zoom level.
+            0 keeps every point. Defaults to 32, 4 pixels of a 512 pixel
+            tile.
+    """
+
+    def __init__(
+        self,
+        data,
+        layer_name="features",
+        max_zoom=14,
+        index_zoom=8,
+        extent=4096,
+        buffer=64,
+        cache_size=512,
+        tolerance=3,
+        point_spacing=32,
+    ):
+        self.layer_name = layer_name
+        self.max_zoom = max_zoom
+        self.index_zoom = min(index_zoom, max_zoom)
+        self.extent = extent
+        self.buffer = buffer
+        self.tolerance = tolerance
+        self.point_spacing = point_spacing
+        self.cache = LRUCache(cache_size)
+        # Tiles may be encoded in another thread while the data is replaced
+        self._lock = threading.RLock()
+        self.set_data(data)
+
+    def set_data(self, data):
+        """Replaces the features, rebuilding the index and clearing the cache.
+
+        Args:
+            data (dict): A GeoJSON FeatureCollection, Feature or geometry.
+        """
+        with self._lock:
+            self._set_data(data)
+
+    def _set_data(self, data):
+        import numpy as np
+
+        header, buffers = encode_geojson(data)
+        coords = np.frombuffer(buffers[0], dtype=np.float64).reshape(-1, 2)
+        self._geometry_offsets = np.frombuffer(buffers[1], dtype=np.uint32)
+        self._part_offsets = np.frombuffer(buffers[2], dtype=np.uint32)
+        self._ring_offsets = np.frombuffer(buffers[3], dtype=np.uint32)
+        self._types = np.frombuffer(buffers[4], dtype=np.uint8)
+        self._properties = header["properties"]
+        self._ids = header.get("ids")
+        self.count = header["count"]
+
+        # Project to Web Mercator in [0, 1] world units
+        lat = np.radians(np.clip(coords[:, 1], -MAX_LATITUDE, MAX_LATITUDE))
+        self._x = (coords[:, 0] + 180.0) / 360.0
+        self._y = 0.5 - np.log(np.tan(np.pi / 4 + lat / 2)) / (2 * np.pi)
+
+        # Vertex range and bounding box of each feature
+        starts = self._ring_offsets[self._part_offsets[self._geometry_offsets[:-1]]]
+        ends = self._ring_offsets[self._part_offsets[self._geometry_offsets[1:]]]
+        self._starts = starts.astype(np.int64)
+        self._ends = ends.astype(np.int64)
+        self._minx = np.full(self.count, np.inf)
+        self._miny = np.full(self.count, np.inf)
+        self._maxx = np.full(self.count, -np.inf)
+        self._maxy = np.full(self.count, -np.inf)
+        nonempty = np.nonzero(ends > starts)[0]
+        if len(nonempty):
+            # Features are stored contiguously, so each reduction runs up to
+            # the first vertex of the next non-empty feature
+            first = self._starts[nonempty]
+            self._minx[nonempty] = np.minimum.reduceat(self._x, first)
+            self._miny[nonempty] = np.minimum.reduceat(self._y, first)
+            self._maxx[nonempty] = np.maximum.reduceat(self._x, first)
+            self._maxy[nonempty] = np.maximum.reduceat(self._y, first)
+
+        # Vertices less important than the tolerance of the maximum zoom
+        # level are only kept at the maximum zoom level
+        threshold = (self.tolerance / (self.extent * 2 ** (self.max_zoom - 1))) ** 2
+        self._importance = _importance(self._x, self._y, self._ring_offsets, threshold)
+
+        self._build_index(nonempty)
+        self.invalidate()
+
+    def _build_index(self, features):
+        """Builds the per-tile index of the features at the index zoom."""
+        import numpy as np
+
+        n = 2**self.index_zoom
+        x0 = np.clip(np.floor(self._minx[features] * n), 0, n - 1).astype(np.int64)
+        y0 = np.clip(np.floor(self._miny[features] * n), 0, n - 1).astype(np.int64)
+        x1 = np.clip(np.floor(self._maxx[features] * n), 0, n - 1).astype(np.int64)
+        y1 = np.clip(np.floor(self._maxy[features] * n), 0, n - 1).astype(np.int64)
+        cells = (x1 - x0 + 1) * (y1 - y0 + 1)
+
+        self._index = {}
+        single = cells == 1
+        keys = y0[single] * n + x0[single]
+        order = np.argsort(keys, kind="stable")
+        keys, members = keys[order], features[single][order]
+        if len(keys):
+            split = np.nonzero(np.diff(keys))[0] + 1
+            for key, group in zip(keys[np.r_[0, split]], np.split(members, split)):
+                self._index[int(key)] = [group]
+
+        several = np.nonzero((cells > 1) & (cells <= _MAX_INDEX_CELLS))[0]
+        for i in several:
+            for ty in range(y0[i], y1[i] + 1):
+                for tx in range(x0[i], x1[i] + 1):
+                    self._index.setdefault(ty * n + tx, []).append(
+                        np.array([features[i]])
+                    )
+        self._large = features[cells > _MAX_INDEX_CELLS]
+
+    def invalidate(self):
+        """Clears the tile cache, for example after the features were changed."""
+        self.cache.clear()
+
+    def features_in_tile(self, z, x, y):
+        """Returns the indices of the features intersecting a buffered tile.
+
+        Args:
+            z (int): The zoom level.
+            x (int): The tile column.
+            y (int): The tile row.
+
+        Returns:
+            numpy.ndarray: The feature indices.
+        """
+        import numpy as np
+
+        size = 1.0 / 2**z
+        pad = size * self.buffer / self.extent
+        west, north = x * size - pad, y * size - pad
+        east, south = (x + 1) * size + pad, (y + 1) * size + pad
+
+        n = 2**self.index_zoom
+        cx0, cx1 = max(int(west * n), 0), min(int(east * n), n - 1)
+        cy0, cy1 = max(int(north * n), 0), min(int(south * n), n - 1)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) <= 9:
+            groups = [self._large]
+            for cy in range(cy0, cy1 + 1):
+                for cx in range(cx0, cx1 + 1):
+                    groups.extend(self._index.get(cy * n + cx, []))
+            candidates = np.unique(np.concatenate(groups))
+        else:
+            candidates = np.arange(self.count)
+
+        hit = (
+            (self._minx[candidates] <= east)
+            & (self._maxx[candidates] >= west)
+            & (self._miny[candidates] <= south)
+            & (self._maxy[candidates] >= north)
+        )
+        return candidates[hit]
+
+    def tile(self, z, x, y):
+        """Returns an encoded vector tile, from the cache when possible.
+
+        Args:
+            z (int): The zoom level.
+            x (int): The tile column.
+            y (int): The tile row.
+
+        Returns:
+            bytes: The MVT-encoded tile. Empty if no feature intersects it.
+        """
+        key = (z, x, y)
+        data = self.cache.get(key)
+        if data is None:
+            with self._lock:
+                data = self._encode_tile(z, x, y)
+                self.cache.put(key, data)
+        return data
+
+    def _thin(self, features, z):
+        """Drops the features too small or too dense to show at a zoom level."""
+        import numpy as np
+
+        if z >= self.max_zoom or not len(features):
+            return features
+        scale = 2**z * self.extent
+        size = np.maximum(
+            self._maxx[features] - self._minx[features],
+            self._maxy[features] - self._miny[features],
+        )
+        types = self._types[features]
+        points = (types == _POINT_TYPE) | (types == _MULTIPOINT_TYPE)
+        keep = points | (size * scale >= self.tolerance)
+        single = np.flatnonzero(types == _POINT_TYPE)
+        if self.point_spacing > 0 and len(single):
+            # The first point of each cell of a grid of the world
+            cells = scale / self.point_spacing
+            vertices = self._starts[features[single]]
+            cx = np.floor(self._x[vertices] * cells).astype(np.int64)
+            cy = np.floor(self._y[vertices] * cells).astype(np.int64)
+            _, first = np.unique(cy * int(cells + 1) + cx, return_index=True)
+            keep[single] = False
+            keep[single[first]] = True
+        return features[keep]
+
+    def _encode_tile(self, z, x, y):
+        scale = 2**z
+        keys, key_index = [], {}
+        values, value_index = [], {}
+        features = []
+
+        for index in self._thin(self.features_in_tile(z, x, y), z):
+            geometry = self._clip_feature(index, z, x, y, scale)
+            if geometry is None:
+                continue
+            geom_type, commands = geometry
+
+            tags = []
+            for name, value in self._properties[index].items():
+                if value is None:
+                    continue
+                if name not in key_index:
+                    key_index[name] = len(keys)
+                    keys.append(name)
+                value_key = (type(value), value)
+                if isinstance(value, (dict, list)):
+                    value_key = (type(value), json.dumps(value, sort_keys=True))
+                if value_key not in value_index:
+                    value_index[value_key] = len(values)
+                    values.append(value)
+                tags.extend((key_index[name], value_index[value_key]))
+
+            feature = b""
+            feature_id = self._ids[index] if self._ids else None
+            if isinstance(feature_id, int) and feature_id >= 0:
+                feature += _key(1, 0) + _varint(feature_id)
+            if tags:
+                feature += _packed(2, tags)
+            feature += _key(3, 0) + _varint(geom_type)
+            feature += _packed(4, commands)
+            features.append(_length_delimited(2, feature))
+
+        if not features:
+            return b""
+
+        layer = _key(15, 0) + _varint(2)
+        layer += _length_delimited(1, self.layer_name.encode("utf-8"))
+        layer += b"".join(features)
+        layer += b"".join(_length_delimited(3, k.encode("utf-8")) for k in keys)
+        layer += b"".join(_length_delimited(4, _encode_value(v)) for v in values)
+        layer += _key(5, 0) + _varint(self.extent)
+        return _length_delimited(3, layer)
+
+    def _clip_feature(self, index, z, x, y, scale):
+        """Clips a feature to a tile and encodes its geometry commands."""
+        import numpy as np
+
+        geom_type = GEOMETRY_TYPES[self._types[index]]
+        lo, hi = -self.buffer, self.extent + self.buffer
+        start, end = self._starts[index], self._ends[index]
+        if geom_type == "Point":
+            px = round((float(self._x[start]) * scale - x) * self.extent)
+            py = round((float(self._y[start]) * scale - y) * self.extent)
+            if not (lo <= px <= hi and lo <= py <= hi):
+                return None
+            return _POINT, [1 | (1 << 3), _zigzag(px), _zigzag(py)]
+
+        xs = (self._x[start:end] * scale - x) * self.extent
+        ys = (self._y[start:end] * scale - y) * self.extent
+        first_ring = self._part_offsets[self._geometry_offsets[index]]
+        last_ring = self._part_offsets[self._geometry_offsets[index + 1]]
+        offsets = self._ring_offsets[first_ring : last_ring + 1] - start
+        if z < self.max_zoom and geom_type != "MultiPoint":
+            tolerance = self.tolerance / (self.extent * scale)
+            kept = self._importance[start:end] > tolerance * tolerance
+            offsets = np.concatenate([[0], np.cumsum(kept)])[offsets]
+            xs, ys = xs[kept], ys[kept]
+        xs, ys, offsets = xs.tolist(), ys.tolist(), offsets.tolist()
+
+        parts = []
+        for part in range(
+            self._geometry_offsets[index], self._geometry_offsets[index + 1]
+        ):
+            rings = []
+            for ring in range(self._part_offsets[part], self._part_offsets[part + 1]):
+                a = offsets[ring - first_ring]
+                b = offsets[ring - first_ring + 1]
+                rings.append(list(zip(xs[a:b], ys[a:b])))
+            parts.append(rings)
+
+        cursor = [0, 0]
+        commands = []
+
+        def move_to(points, closed=False):
+            for i, (px, py) in enumerate(points):
+                if i == 0:
+                    commands.append(1 | (1 << 3))
+                elif i == 1:
+                    commands.append(2 | ((len(points) - 1) << 3))
+                commands.extend((_zigzag(px - cursor[0]), _zigzag(py - cursor[1])))
+                cursor[0], cursor[1] = px, py
+            if closed:
+                commands.append(7 | (1 << 3))
+
+        if geom_type == "MultiPoint":
+            points = [
+                (int(round(px)), int(round(py)))
+                for px, py in parts[0][0]
+                if lo <= px <= hi and lo <= py <= hi
+            ]
+            if not points:
+                return None
+            commands.append(1 | (len(points) << 3))
+            for px, py in points:
+                commands.extend((_zigzag(px - cursor[0]), _zigzag(py - cursor[1])))
+                cursor[0], cursor[1] = px, py
+            return _POINT, commands
+
+        elif geom_type in ("LineString", "MultiLineString"):
+            for line in parts[0]:
+                for piece in _clip_line(line, lo, hi):
+                    piece = _quantize(piece)
+                    if len(piece) >= 2:
+                        move_to(piece)
+            return (_LINESTRING, commands) if commands else None
+
+        for rings in parts:
+            for ring_index, ring in enumerate(rings):
+                ring = _quantize(_clip_ring(ring, lo, hi), closed=True)
+                area = _ring_area(ring) if len(ring) >= 3 else 0
+                if area == 0:
+                    if ring_index == 0:
+                        break  # Without its exterior ring the polygon is gone
+                    continue
+                # Exterior rings have a positive area in tile coordinates
+                if (area > 0) != (ring_index == 0):
+                    ring.reverse()
+                move_to(ring, closed=True)
+        return (_POLYGON, commands) if commands else None
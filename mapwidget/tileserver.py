@@ -0,0 +1,600 @@
+"""Module for serving in-memory NumPy arrays as raster map tiles.
+
+An `ArrayTiler` reprojects a north-up array in geographic coordinates to Web
+Mercator tiles, colorizes it and encodes the tiles as PNG, all with vectorized
+NumPy. Encoded tiles are kept in an LRU cache keyed by the tile and the render
+parameters, so switching back to an earlier colormap does not render again,
+and the low zoom levels can be pre-rendered. A `TileServer` serves tilers over
+HTTP from a background thread of the kernel. Requires numpy.
+"""
+
+import collections
+import math
+import struct
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .cache import LRUCache
+from .tiler import MAX_LATITUDE
+
+# Colormaps as evenly spaced color stops
+COLORMAPS = {
+    "gray": ["#000000", "#ffffff"],
+    "viridis": ["#440154", "#3b528b", "#21918c", "#5ec962", "#fde725"],
+    "magma": ["#000004", "#3b0f70", "#8c2981", "#de4968", "#fe9f6d", "#fcfdbf"],
+    "terrain": ["#333399", "#0294fa", "#00cc66", "#ffff99", "#805c54", "#ffffff"],
+    "rdbu": ["#67001f", "#d6604d", "#f7f7f7", "#4393c3", "#053061"],
+}
+
+RESAMPLING = ("nearest", "bilinear")
+
+
+def _hex_to_rgba(color):
+    color = color.lstrip("#")
+    if len(color) == 6:
+        color += "ff"
+    return [int(color[i : i + 2], 16) for i in range(0, 8, 2)]
+
+
+def get_colormap(colormap):
+    """Returns a colormap as a lookup table of 256 RGBA colors.
+
+    Args:
+        colormap (str | list): The name of a colormap in COLORMAPS or, if
+            matplotlib is installed, of a matplotlib colormap, or a list of
+            hex colors spaced evenly from the minimum to the maximum value.
+
+    Returns:
+        numpy.ndarray: A (256, 4) uint8 array.
+    """
+    import numpy as np
+
+    if isinstance(colormap, str) and colormap.lower() in COLORMAPS:
+        colormap = COLORMAPS[colormap.lower()]
+    elif isinstance(colormap, str):
+        try:
+            import matplotlib
+        except ImportError:
+            raise ValueError(
+                f"Colormap {colormap} not found. It must be one of {list(COLORMAPS)}"
+            )
+        lut = matplotlib.colormaps[colormap](np.linspace(0, 1, 256))
+        return np.round(lut * 255).astype(np.uint8)
+
+    stops = np.array([_hex_to_rgba(color) for color in colormap], dtype=float)
+    positions = np.linspace(0, 1, len(stops))
+    values = np.linspace(0, 1, 256)
+    lut = np.stack(
+        [np.interp(values, positions, stops[:, band]) for band in range(4)], axis=1
+    )
+    return np.round(lut).astype(np.uint8)
+
+
+def encode_png(rgba, compress_level=1):
+    """Encodes an RGBA image as PNG.
+
+    Args:
+        rgba (numpy.ndarray): A (height, width, 4) uint8 array.
+        compress_level (int, optional): The zlib compression level. Low levels
+            encode much faster for slightly larger tiles. Defaults to 1.
+
+    Returns:
+        bytes: The PNG file.
+    """
+    import numpy as np
+
+    height, width = rgba.shape[:2]
+    # Every row starts with its filter type, 0 for no filter
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(tag, data):
+        crc = zlib.crc32(tag + data) & 0xFFFFFFFF
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", crc)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(raw.tobytes(), compress_level))
+        + chunk(b"IEND", b"")
+    )
+
+
+def _downsample(data):
+    """Halves the resolution of an array, averaging the valid values."""
+    import numpy as np
+
+    height, width = data.shape[0] // 2 * 2, data.shape[1] // 2 * 2
+    blocks = data[:height, :width].reshape(
+        height // 2, 2, width // 2, 2, *data.shape[2:]
+    )
+    valid = ~np.isnan(blocks)
+    total = np.where(valid, blocks, 0).sum(axis=(1, 3))
+    count = valid.sum(axis=(1, 3))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / count, np.nan).astype(np.float32)
+
+
+def _summary(values):
+    import numpy as np
+
+    if not values:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+    values = np.asarray(values)
+    return {
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "max": float(values.max()),
+    }
+
+
+def _value_limit(value, name):
+    """Returns a vmin or vmax value, None for the range of the array."""
+    if isinstance(value, str):
+        if value != "auto":
+            raise ValueError(f"{name} must be a number or 'auto'")
+        return None
+    return value
+
+
+class ArrayTiler:
+    """Renders PNG map tiles from a NumPy array in geographic coordinates.
+
+    Args:
+        array (numpy.ndarray): A (height, width) array of values, or a
+            (height, width, 3 or 4) RGB(A) array. The first row is the
+            northern edge.
+        bounds (list): The [west, south, east, north] bounds of the array in
+            degrees.
+        colormap (str | list, optional): The colormap of single band arrays,
+            see `get_colormap`. Defaults to 'viridis'.
+        vmin (float, optional): The value mapped to the start of the colormap,
+            or to 0 for RGB(A) arrays. Defaults to the minimum of the array,
+            or 0 for uint8 RGB(A) arrays.
+        vmax (float, optional): The value mapped to the end of the colormap,
+            or to 255 for RGB(A) arrays. Defaults to the maximum of the array,
+            or 255 for uint8 RGB(A) arrays.
+        nodata (float, optional): A value rendered transparent, like NaN.
+            Defaults to None.
+        resampling (str, optional): 'nearest' or 'bilinear'. Defaults to
+            'nearest'.
+        tile_size (int, optional): The tile size in pixels. Defaults to 256.
+        cache_size (int, optional): The number of encoded tiles kept in the
+            LRU cache. Defaults to 1024.
+        compress_level (int, optional): The zlib compression level of the
+            PNG tiles. Defaults to 1.
+    """
+
+    def __init__(
+        self,
+        array,
+        bounds,
+        colormap="viridis",
+        vmin=None,
+        vmax=None,
+        nodata=None,
+        resampling="nearest",
+        tile_size=256,
+        cache_size=1024,
+        compress_level=1,
+    ):
+        self.tile_size = tile_size
+        self.compress_level = compress_level
+        self.cache = LRUCache(cache_size)
+        self.rendered = 0
+        self._render_ms = collections.deque(maxlen=1000)
+        self._latency_ms = collections.deque(maxlen=1000)
+        self._lock = threading.Lock()
+        self.set_data(array, bounds, nodata)
+        self.set_params(colormap=colormap, vmin=vmin, vmax=vmax, resampling=resampling)
+
+    def set_data(self, array, bounds=None, nodata=None):
+        """Replaces the array and clears the tile cache.
+
+        Args:
+            array (numpy.ndarray): The new array, see `ArrayTiler`.
+            bounds (list, optional): The new bounds. Defaults to the current
+                bounds.
+            nodata (float, optional): A value rendered transparent. Defaults
+                to None.
+        """
+        import numpy as np
+
+        array = np.asarray(array)
+        if array.ndim not in (2, 3) or (
+            array.ndim == 3 and array.shape[2] not in (3, 4)
+        ):
+            raise ValueError(
+                "array must have shape (height, width) or (height, width, 3|4)"
+            )
+        if bounds is not None:
+            west, south, east, north = bounds
+            if west >= east or south >= north:
+                raise ValueError("bounds must be [west, south, east, north]")
+            self.bounds = [float(west), float(south), float(east), float(north)]
+
+        self._uint8 = array.dtype == np.uint8
+        data = array.astype(np.float32)
+        if nodata is not None:
+            data[array == nodata] = np.nan
+        # Overviews halve the resolution until the array fits in one tile
+        self._levels = [data]
+        while min(self._levels[-1].shape[:2]) > self.tile_size:
+            self._levels.append(_downsample(self._levels[-1]))
+        self._range = None
+        self.invalidate()
+
+    def set_params(self, colormap=None, vmin=None, vmax=None, resampling=None):
+        """Changes the render parameters.
+
+        Tiles are cached per render parameters, so the cache is kept.
+        Parameters left to None are unchanged.
+
+        Args:
+            colormap (str | list, optional): The new colormap.
+            vmin (float | str, optional): The new minimum value, or 'auto'
+                for the minimum of the array.
+            vmax (float | str, optional): The new maximum value, or 'auto'
+                for the maximum of the array.
+            resampling (str, optional): 'nearest' or 'bilinear'.
+        """
+        if colormap is not None:
+            self.colormap = colormap
+            self._lut = get_colormap(colormap)
+        if vmin is not None or not hasattr(self, "vmin"):
+            self.vmin = _value_limit(vmin, "vmin")
+        if vmax is not None or not hasattr(self, "vmax"):
+            self.vmax = _value_limit(vmax, "vmax")
+        if resampling is not None:
+            if resampling not in RESAMPLING:
+                raise ValueError(f"resampling must be one of {RESAMPLING}")
+            self.resampling = resampling
+        colormap_key = (
+            self.colormap if isinstance(self.colormap, str) else tuple(self.colormap)
+        )
+        self._params_key = (colormap_key, self.vmin, self.vmax, self.resampling)
+
+    def invalidate(self):
+        """Clears the tile cache."""
+        self.cache.clear()
+
+    @property
+    def value_range(self):
+        """tuple: The minimum and maximum values, ignoring NaN."""
+        import numpy as np
+
+        if self._range is None:
+            if self._uint8 and self._levels[0].ndim == 3:
+                self._range = (0.0, 255.0)
+            else:
+                smallest = self._levels[-1]
+                if np.isnan(smallest).all():
+                    self._range = (0.0, 1.0)
+                else:
+                    self._range = (
+                        float(np.nanmin(self._levels[0])),
+                        float(np.nanmax(self._levels[0])),
+                    )
+        return self._range
+
+    def tile_range(self, z):
+        """Returns the tiles of zoom level z covering the array.
+
+        Args:
+            z (int): The zoom level.
+
+        Returns:
+            tuple: The minimum and maximum x and y tile indices.
+        """
+        n = 2**z
+        west, south, east, north = self.bounds
+
+        def tile_y(lat):
+            lat = math.radians(max(-MAX_LATITUDE, min(MAX_LATITUDE, lat)))
+            return (1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n
+
+        x_min = int(max(0, math.floor((west + 180) / 360 * n)))
+        x_max = int(min(n - 1, math.ceil((east + 180) / 360 * n) - 1))
+        y_min = int(max(0, math.floor(tile_y(north))))
+        y_max = int(min(n - 1, math.ceil(tile_y(south)) - 1))
+        return x_min, x_max, y_min, y_max
+
+    def overview_zoom(self):
+        """Returns the highest zoom level covering the array with 2x2 tiles."""
+        z = 0
+        while z < 24:
+            x_min, x_max, y_min, y_max = self.tile_range(z + 1)
+            if x_max - x_min > 1 or y_max - y_min > 1:
+                break
+            z += 1
+        return z
+
+    def prerender(self, max_zoom=None):
+        """Renders the tiles of the low zoom levels into the cache.
+
+        Args:
+            max_zoom (int, optional): The highest zoom level to render.
+                Defaults to `overview_zoom`.
+
+        Returns:
+            int: The number of tiles rendered.
+        """
+        if max_zoom is None:
+            max_zoom = self.overview_zoom()
+        count = 0
+        for z in range(max_zoom + 1):
+            x_min, x_max, y_min, y_max = self.tile_range(z)
+            for x in range(x_min, x_max + 1):
+                for y in range(y_min, y_max + 1):
+                    self.tile(z, x, y)
+                    count += 1
+        return count
+
+    def tile(self, z, x, y):
+        """Returns a PNG tile, transparent outside the array.
+
+        Args:
+            z (int): The zoom level.
+            x (int): The tile column.
+            y (int): The tile row.
+
+        Returns:
+            bytes: The encoded tile.
+        """
+        start = time.perf_counter()
+        key = (z, x, y) + self._params_key
+        data = self.cache.get(key)
+        if data is None:
+            data = encode_png(self.render(z, x, y), self.compress_level)
+            self.cache.put(key, data)
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self.rendered += 1
+                self._render_ms.append(elapsed)
+        with self._lock:
+            self._latency_ms.append((time.perf_counter() - start) * 1000)
+        return data
+
+    def render(self, z, x, y):
+        """Renders a tile as an RGBA image.
+
+        Args:
+            z (int): The zoom level.
+            x (int): The tile column.
+            y (int): The tile row.
+
+        Returns:
+            numpy.ndarray: A (tile_size, tile_size, 4) uint8 array.
+        """
+        import numpy as np
+
+        size = self.tile_size
+        n = 2**z
+        west, south, east, north = self.bounds
+
+        # Use the overview closest to the tile resolution
+        level = 0
+        tile_deg = 360 / (size * n)
+        pixel_deg = (east - west) / self._levels[0].shape[1]
+        if tile_deg > pixel_deg:
+            level = min(int(math.log2(tile_deg / pixel_deg)), len(self._levels) - 1)
+        data = self._levels[level]
+        height, width = data.shape[:2]
+
+        # Longitude is linear in x and latitude only depends on y, so the
+        # array positions of the tile pixels are an outer product
+        steps = (np.arange(size) + 0.5) / size
+        lon = (x + steps) / n * 360 - 180
+        lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + steps) / n))))
+        cols = (lon - west) / (east - west) * width - 0.5
+        rows = (north - lat) / (north - south) * height - 0.5
+        col_valid = (cols > -1) & (cols < width)
+        row_valid = (rows > -1) & (rows < height)
+        if not col_valid.any() or not row_valid.any():
+            return np.zeros((size, size, 4), dtype=np.uint8)
+
+        if self.resampling == "nearest":
+            c = np.clip(np.floor(cols + 0.5), 0, width - 1).astype(np.intp)
+            r = np.clip(np.floor(rows + 0.5), 0, height - 1).astype(np.intp)
+            values = data[r[:, None], c[None, :]]
+        else:
+            c0 = np.floor(cols)
+            r0 = np.floor(rows)
+            fc = cols - c0
+            fr = rows - r0
+            c0 = np.clip(c0, 0, width - 1).astype(np.intp)
+            r0 = np.clip(r0, 0, height - 1).astype(np.intp)
+            c1 = np.minimum(c0 + 1, width - 1)
+            r1 = np.minimum(r0 + 1, height - 1)
+            if data.ndim == 3:
+                fc = fc[:, None]
+                fr = fr[:, None]
+            top = (
+                data[r0[:, None], c0[None, :]] * (1 - fc)[None, :]
+                + data[r0[:, None], c1[None, :]] * fc[None, :]
+            )
+            bottom = (
+                data[r1[:, None], c0[None, :]] * (1 - fc)[None, :]
+                + data[r1[:, None], c1[None, :]] * fc[None, :]
+            )
+            values = top * (1 - fr)[:, None] + bottom * fr[:, None]
+
+        valid = row_valid[:, None] & col_valid[None, :]
+        return self._colorize(values, valid)
+
+    def _colorize(self, values, valid):
+        import numpy as np
+
+        vmin, vmax = self.value_range
+        if self.vmin is not None:
+            vmin = self.vmin
+        if self.vmax is not None:
+            vmax = self.vmax
+        scale = 1 / (vmax - vmin) if vmax > vmin else 0.0
+
+        with np.errstate(invalid="ignore"):
+            if values.ndim == 2:
+                valid &= ~np.isnan(values)
+                index = np.clip((values - vmin) * scale * 255, 0, 255)
+                rgba = self._lut[np.where(valid, index, 0).astype(np.uint8)]
+            else:
+                valid &= ~np.isnan(values).any(axis=2)
+                rgba = np.full(values.shape[:2] + (4,), 255, dtype=np.uint8)
+                bands = np.clip((values[..., :3] - vmin) * scale * 255, 0, 255)
+                rgba[..., :3] = np.where(valid[..., None], bands, 0).astype(np.uint8)
+                if values.shape[2] == 4:
+                    alpha = np.clip(values[..., 3], 0, 255)
+                    rgba[..., 3] = np.where(valid, alpha, 0).astype(np.uint8)
+        rgba[~valid, 3] = 0
+        return rgba
+
+    def stats(self):
+        """Returns the cache and latency statistics of the tiler.
+
+        Returns:
+            dict: The number of tile requests, cache hits and misses, the hit
+                rate, the number of tiles rendered, and summaries (mean, p50,
+                p95 and max) of the render time and of the request latency in
+                milliseconds, over the last 1000 tiles.
+        """
+        info = self.cache.info()
+        requests = info["hits"] + info["misses"]
+        with self._lock:
+            render_ms = list(self._render_ms)
+            latency_ms = list(self._latency_ms)
+        return {
+            "requests": requests,
+            "hits": info["hits"],
+            "misses": info["misses"],
+            "hit_rate": info["hits"] / requests if requests else 0.0,
+            "rendered": self.rendered,
+            "cached_tiles": info["size"],
+            "render_ms": _summary(render_ms),
+            "latency_ms": _summary(latency_ms),
+        }
+
+
+class _TileHandler(BaseHTTPRequestHandler):
+    """Serves /<layer>/<z>/<x>/<y>.png from the tilers of the tile server."""
+
+    def do_GET(self):
+        path = urllib.parse.urlsplit(self.path).path
+        parts = path.strip("/").split("/")
+        tiler = None
+        if len(parts) == 4 and parts[3].endswith(".png"):
+            tiler = self.server.tilers.get(urllib.parse.unquote(parts[0]))
+        if tiler is None:
+            self.send_error(404)
+            return
+        try:
+            z, x, y = int(parts[1]), int(parts[2]), int(parts[3][:-4])
+        except ValueError:
+            self.send_error(400)
+            return
+        try:
+            data = tiler.tile(z, x, y)
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        except Exception as e:
+            # Report rendering errors rather than dropping the connection
+            self.send_error(500, f"{type(e).__name__}: {e}")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TileServer:
+    """A threaded HTTP server for the tiles of array tilers.
+
+    The server listens on localhost, so the browser displaying the map must
+    run on the same machine as the kernel. Otherwise, serve the tiles over the
+    widget comm instead, see `mapwidget.maplibre.Map.add_array_layer`.
+
+    Args:
+        host (str, optional): The host to listen on. Defaults to '127.0.0.1'.
+        port (int, optional): The port to listen on. Defaults to a free port.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self._httpd = ThreadingHTTPServer((host, port), _TileHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.tilers = {}
+        self.host, self.port = self._httpd.server_address[:2]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self):
+        """str: The base URL of the server."""
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def tilers(self):
+        """dict: The served tilers by layer name."""
+        return self._httpd.tilers
+
+    def add_tiler(self, name, tiler):
+        """Serves a tiler under a layer name.
+
+        Args:
+            name (str): The layer name used in the tile URLs.
+            tiler (ArrayTiler): The tiler.
+
+        Returns:
+            str: The tile URL template of the layer.
+        """
+        self.tilers[name] = tiler
+        return self.tile_url(name)
+
+    def remove_tiler(self, name):
+        """Stops serving a layer."""
+        self.tilers.pop(name, None)
+
+    def tile_url(self, name, version=0):
+        """Returns the tile URL template of a layer.
+
+        Args:
+            name (str): The layer name.
+            version (int, optional): A version number added to the URL so the
+                map reloads its tiles when it changes. Defaults to 0.
+
+        Returns:
+            str: The URL template, with {z}, {x} and {y} placeholders.
+        """
+        name = urllib.parse.quote(name, safe="")
+        return f"{self.url}/{name}/{{z}}/{{x}}/{{y}}.png?v={version}"
+
+    def stop(self):
+        """Stops the server."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_tile_server():
+    """Returns the tile server shared by the maps, starting it on first use.
+
+    Returns:
+        TileServer: The tile server.
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = TileServer()
+        return _server
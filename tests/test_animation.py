@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+"""Tests for `mapwidget.animation` module."""
+
+import unittest
+
+from mapwidget import maplibre
+
+FRAMES = [
+    {
+        "filter": {"quakes": ["==", "year", year]},
+        "paint": {"quakes": {"circle-radius": year % 5}},
+    }
+    for year in range(2000, 2010)
+]
+
+
+class TestAnimation(unittest.TestCase):
+    """Tests for `mapwidget.animation` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.map = maplibre.Map(controls=[])
+        self.sent = []
+        self.map.send = lambda content, buffers=None: self.sent.append(content)
+
+    def test_upload_once(self):
+        """The timeline is uploaded in one message with its initial state."""
+        animation = self.map.add_animation(FRAMES, interval=100, autoplay=False)
+        self.assertEqual(len(self.sent), 1)
+        calls = self.sent[0]["calls"]
+        self.assertEqual(
+            [call["method"] for call in calls], ["addAnimation", "setAnimationState"]
+        )
+        self.assertEqual(len(calls[0]["args"][1]), 10)
+        self.assertEqual(calls[1]["args"][1], {"playing": False, "speed": 1.0})
+        self.assertEqual(len(animation), 10)
+
+        with self.assertRaises(ValueError):
+            self.map.add_animation([{"colour": "red"}])
+        with self.assertRaises(ValueError):
+            self.map.add_animation([])
+
+    def test_controls(self):
+        """Controls only send the playback state, which compacts to the latest."""
+        animation = self.map.add_animation(FRAMES, animation_id="years")
+        animation.pause()
+        animation.speed = 4
+        animation.seek(-1)
+        control = self.sent[-1]["calls"][0]["args"][1]
+        self.assertEqual(control, {"playing": False, "speed": 4.0, "frame": 9})
+        with self.assertRaises(IndexError):
+            animation.seek(10)
+        with self.assertRaises(ValueError):
+            animation.speed = 0
+        self.assertEqual(
+            [call["method"] for call in self.map.compacted_calls],
+            ["addAnimation", "setAnimationState"],
+        )
+
+        self.map._handle_message(
+            self.map,
+            {
+                "type": "animation_stats",
+                "id": "years",
+                "frame": 3,
+                "played": 40,
+                "dropped": 2,
+                "fps": 9.5,
+            },
+            [],
+        )
+        self.assertEqual(animation.frame, 3)
+        self.assertEqual(animation.stats["dropped"], 2)
+
+        animation.remove()
+        self.assertEqual(self.map.compacted_calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
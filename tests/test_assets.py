@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+"""Tests for `mapwidget.assets` module."""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from mapwidget import assets, leaflet, maplibre, openlayers
+
+
+class TestAssets(unittest.TestCase):
+    """Tests for `mapwidget.assets` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.tmp = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.tmp.name, "maplibre-gl.js"), "wb") as f:
+            f.write(b"var maplibregl = {};")
+        self.env = mock.patch.dict(os.environ, {"MAPWIDGET_ASSET_DIR": self.tmp.name})
+        self.env.start()
+        self.mode = assets.get_asset_mode()
+        assets._contents.clear()
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        assets.set_asset_mode(self.mode)
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def test_asset_sources(self):
+        assets.set_asset_mode("cdn")
+        sources = assets.asset_sources(["maplibre-gl.js", "maplibre-gl.css"])
+        self.assertFalse(any(source["local"] for source in sources.values()))
+
+        assets.set_asset_mode("auto")
+        sources = assets.asset_sources(["maplibre-gl.js", "maplibre-gl.css"])
+        self.assertTrue(sources["maplibre-gl.js"]["local"])
+        self.assertFalse(sources["maplibre-gl.css"]["local"])
+        self.assertEqual(
+            sources["maplibre-gl.css"]["url"], assets.ASSETS["maplibre-gl.css"]
+        )
+
+        with self.assertRaises(ValueError):
+            assets.set_asset_mode("offline")
+
+    def test_asset_requests(self):
+        assets.set_asset_mode("local")
+        m = maplibre.Map()
+        self.assertTrue(m._assets["maplibre-gl.css"]["local"])
+        sent = []
+        m.send = lambda content, buffers=None: sent.append((content, buffers))
+
+        m._handle_message(m, {"type": "asset_request", "name": "maplibre-gl.js"}, [])
+        self.assertEqual(sent[-1][0]["type"], "asset_response")
+        self.assertEqual(bytes(sent[-1][1][0]), b"var maplibregl = {};")
+
+        # Missing assets are reported so the frontend can fall back to the CDN
+        m._handle_message(m, {"type": "asset_request", "name": "maplibre-gl.css"}, [])
+        self.assertIn("error", sent[-1][0])
+
+    def test_shared_loader(self):
+        for widget in (maplibre.Map, leaflet.Map, openlayers.Map):
+            esm = widget._esm
+            self.assertEqual(esm.count("function loadAssets("), 1)
+            self.assertLess(esm.index("function loadAssets("), esm.index("render("))
+        sources = assets.asset_sources(["leaflet.js", "leaflet.css"])
+        self.assertTrue(sources["leaflet.js"]["module"])
+        self.assertFalse(sources["leaflet.css"]["module"])
+
+    def test_startup_timings(self):
+        m = openlayers.Map()
+        m._handle_msg(
+            {
+                "content": {
+                    "data": {
+                        "method": "custom",
+                        "content": {
+                            "type": "startup",
+                            "mode": "local",
+                            "assets_ms": 12.5,
+                            "load_ms": 80.0,
+                        },
+                    }
+                },
+                "buffers": [],
+            }
+        )
+        self.assertEqual(
+            m.startup_timings, [{"mode": "local", "assets_ms": 12.5, "load_ms": 80.0}]
+        )
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+"""Tests for `mapwidget.basemaps` module."""
+
+import unittest
+
+from mapwidget import basemaps
+from mapwidget.leaflet import Map
+
+
+class TestBasemaps(unittest.TestCase):
+    """Tests for `mapwidget.basemaps` module."""
+
+    def test_free_view_excludes_token_basemaps(self):
+        """Listing all basemaps does not leak token-gated ones into the free view."""
+        full = basemaps.get_xyz_dict(free_only=False)
+        free = basemaps.get_xyz_dict(free_only=True)
+        self.assertLess(len(free), len(full))
+        self.assertNotIn("MapBox", free)
+        self.assertIn("MapBox", full)
+        self.assertIn("{accessToken}", full["MapBox"]["url"])
+
+    def test_lookup(self):
+        """Basemaps are looked up by name, custom ones included."""
+        self.assertEqual(basemaps.get_basemap("ROADMAP")["name"], "Google Maps")
+        self.assertIn("{z}", basemaps.get_basemap("OpenTopoMap")["url"])
+        self.assertIsNone(basemaps.get_basemap("MapBox"))
+        self.assertEqual(basemaps.get_basemap_list()[0], "OpenStreetMap")
+
+    def test_catalog_is_cached(self):
+        """The returned dicts are copies of one cached catalog."""
+        first = basemaps.get_xyz_dict()
+        first.clear()
+        self.assertIn("OpenTopoMap", basemaps.get_xyz_dict())
+
+    def test_leaflet_add_basemap(self):
+        """Unknown basemaps raise a ValueError."""
+        m = Map()
+        with self.assertRaises(ValueError):
+            m.add_basemap("NotABasemap")
+
+
+if __name__ == "__main__":
+    unittest.main()
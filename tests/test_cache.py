@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+"""Tests for `mapwidget.cache` module."""
+
+import http.server
+import tempfile
+import threading
+import unittest
+import urllib.error
+
+from mapwidget.cache import URLCache
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Serves /<name> with an ETag, honoring If-None-Match."""
+
+    content = {"/app.js": b"console.log('map');", "/style.css": b"#map {}"}
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.path == "/slow":
+            threading.Event().wait(1)
+        body = self.content.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        etag = f'"{hash(body)}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestURLCache(unittest.TestCase):
+    """Tests for `mapwidget.cache.URLCache`."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        Handler.requests.clear()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_memory_and_disk(self):
+        """Fresh entries are served from memory, then from disk."""
+        cache = URLCache(cache_dir=self.dir.name)
+        url = f"{self.base}/app.js"
+        for _ in range(50):
+            self.assertEqual(cache.fetch(url), b"console.log('map');")
+        self.assertEqual(len(Handler.requests), 1)
+
+        other = URLCache(cache_dir=self.dir.name)
+        self.assertEqual(other.fetch(url), b"console.log('map');")
+        self.assertEqual(other.requests, 0)
+
+    def test_revalidation(self):
+        """Stale entries are revalidated with their ETag."""
+        cache = URLCache(cache_dir=self.dir.name, max_age=0)
+        url = f"{self.base}/style.css"
+        cache.fetch(url)
+        self.assertEqual(cache.fetch(url), b"#map {}")
+        self.assertEqual(len(Handler.requests), 2)
+        self.assertIsNone(Handler.requests[0][1])
+        self.assertIsNotNone(Handler.requests[1][1])
+
+    def test_errors_and_timeouts(self):
+        """Missing URLs raise, and slow servers time out."""
+        cache = URLCache(cache_dir=False)
+        with self.assertRaises(urllib.error.HTTPError):
+            cache.fetch(f"{self.base}/missing.js")
+        with self.assertRaises(OSError):
+            cache.fetch(f"{self.base}/slow", timeout=0.1)
+
+    def test_async(self):
+        """Concurrent background fetches of a URL share one request."""
+        cache = URLCache(cache_dir=self.dir.name)
+        url = f"{self.base}/app.js"
+        futures = [cache.fetch_async(url) for _ in range(10)]
+        results = {future.result(timeout=5) for future in futures}
+        self.assertEqual(results, {b"console.log('map');"})
+        self.assertEqual(cache.requests, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+"""Tests for `mapwidget.calls` module."""
+
+import random
+import unittest
+
+from mapwidget import maplibre
+from mapwidget.calls import CallLog
+
+
+class TestCalls(unittest.TestCase):
+    """Tests for `mapwidget.calls` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.map = maplibre.Map(controls=[], call_history=10)
+        self.map.send = lambda content, buffers=None: None
+
+    def methods(self):
+        return [call["method"] for call in self.map.compacted_calls]
+
+    def test_superseded_calls(self):
+        for i in range(100):
+            self.map.set_zoom(i)
+            self.map.set_center(i, i)
+            self.map.set_paint_property("water", "fill-color", f"#0000{i:02d}")
+        self.map.fly_to(zoom=3)
+        self.assertEqual(self.methods(), ["setCenter", "setPaintProperty", "flyTo"])
+        self.assertEqual(self.map.compacted_calls[1]["args"][2], "#000099")
+
+        # A camera move keeps the earlier calls setting other properties
+        self.map.fly_to(center=[1, 2], zoom=4)
+        self.map.set_bearing(10)
+        self.assertEqual(self.methods(), ["setPaintProperty", "flyTo", "setBearing"])
+
+    def test_added_then_removed(self):
+        self.map.add_source("points", {"type": "geojson", "data": None})
+        self.map.add_layer({"id": "points", "type": "circle", "source": "points"})
+        self.map.set_paint_property("points", "circle-radius", 4)
+        self.map.set_filter("points", ["==", "id", 1])
+        self.map.remove_layer("points")
+        self.map.remove_source("points")
+        self.map.add_control("scale")
+        self.map.remove_control("scale")
+        self.assertEqual(self.map.compacted_calls, [])
+
+        # Removals of layers from the style are kept
+        self.map.set_paint_property("water", "fill-color", "#000")
+        self.map.remove_layer("water")
+        self.assertEqual(self.methods(), ["removeLayer"])
+
+        self.map.set_style("https://example.com/style.json")
+        self.assertEqual(self.methods(), ["setStyle"])
+
+    def test_replay_stays_bounded(self):
+        sent = []
+        self.map.send = lambda content, buffers=None: sent.append(content)
+        self.map.add_layer({"id": "a", "type": "background"})
+        for i in range(1000):
+            self.map.set_paint_property("a", "background-opacity", i / 1000)
+            self.map._handle_message(self.map, {"type": "ack", "seq": i}, [])
+        self.map._handle_message(self.map, {"type": "sync", "seq": 0}, [])
+        self.assertEqual(len(sent[-1]["calls"]), 2)
+        self.assertTrue(sent[-1]["replay"] and sent[-1]["batch"])
+        self.assertEqual(len(self.map.calls), 10)
+
+    def test_idempotent_calls(self):
+        for _ in range(100):
+            self.map.resize()
+            self.map.add_legend({"roads": "Roads"})
+        self.assertEqual(self.methods(), ["resize", "addLegendControl"])
+        self.map.remove_control("legend")
+        self.assertEqual(self.methods(), ["resize"])
+
+    def test_layer_moves(self):
+        """The compacted moves give the same layer order as every move."""
+
+        def layer_order(calls):
+            order = ["background", "water", "roads"]
+            for call in calls:
+                method, args = call["method"], call["args"]
+                if method not in ("addLayer", "moveLayer"):
+                    continue
+                layer = args[0]["id"] if method == "addLayer" else args[0]
+                if layer in order:
+                    order.remove(layer)
+                before = args[1] if len(args) > 1 else None
+                order.insert(order.index(before) if before else len(order), layer)
+            return order
+
+        log = CallLog(max_size=None)
+        rng = random.Random(0)
+        layers = ["background", "water", "roads"]
+        for i in range(2000):
+            if i % 100 == 0:
+                before = rng.choice(layers + [None])
+                layers.append(f"layer-{i}")
+                log.append("addLayer", [{"id": layers[-1]}] + [before] * bool(before))
+            layer = rng.choice(layers)
+            before = rng.choice([other for other in layers if other != layer] + [None])
+            log.append("moveLayer", [layer] + [before] * bool(before))
+            self.assertEqual(layer_order(log.replay()), layer_order(log.since(0)))
+        self.assertLess(len(log.replay()), 10 * len(layers))
+
+        # Bringing layers to the front in turn stays bounded
+        for _ in range(100):
+            for layer in layers:
+                log.append("moveLayer", [layer])
+        self.assertEqual(layer_order(log.replay()), layer_order(log.since(0)))
+        self.assertEqual(len(log.replay()), 2 * len(layers) - 3)
+
+    def test_rollback(self):
+        log = CallLog()
+        log.append("setZoom", [1])
+        log.append("addLayer", [{"id": "a"}])
+        seq = log.checkpoint()
+        log.append("setZoom", [2])
+        log.append("removeLayer", ["a"])
+        log.rollback(seq)
+        log.release()
+        self.assertEqual([e["method"] for e in log.replay()], ["setZoom", "addLayer"])
+        self.assertEqual(log.replay()[0]["args"], [1])
+
+    def test_replay_after_trim_keeps_removals(self):
+        """Views behind the retained calls still get the removals they need."""
+
+        def methods(entries):
+            return [entry["method"] for entry in entries]
+
+        log = CallLog(max_size=5)
+        log.append("addLayer", [{"id": "a"}])
+        for i in range(10):
+            log.append("setZoom", [i])
+        log.append("removeLayer", ["a"])
+        for i in range(10):
+            log.append("setZoom", [i])
+        self.assertEqual(methods(log.replay(1)), ["removeLayer", "setZoom"])
+        self.assertEqual(methods(log.replay(0)), ["setZoom"])
+        self.assertEqual(methods(log.replay(12)), ["setZoom"])
+
+        # Rolling back the removal drops its tombstone
+        log = CallLog(max_size=5)
+        log.append("addLayer", [{"id": "a"}])
+        seq = log.checkpoint()
+        log.append("removeLayer", ["a"])
+        log.rollback(seq)
+        log.release()
+        for i in range(10):
+            log.append("setZoom", [i])
+        self.assertEqual(methods(log.replay(1)), ["setZoom"])
+        self.assertEqual(methods(log.replay(0)), ["addLayer", "setZoom"])
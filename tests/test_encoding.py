@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+"""Tests for `mapwidget.encoding` module."""
+
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from mapwidget import maplibre
+from mapwidget.encoding import (
+    decode_feature_states,
+    decode_geojson,
+    encode_feature_states,
+    encode_geojson,
+)
+
+FEATURES = {
+    "type": "FeatureCollection",
+    "features": [
+        {
+            "type": "Feature",
+            "id": 1,
+            "geometry": {"type": "Point", "coordinates": [1.5, 2.5]},
+            "properties": {"name": "a"},
+        },
+        {
+            "type": "Feature",
+            "geometry": {
+                "type": "Polygon",
+                "coordinates": [
+                    [[0, 0], [4, 0], [4, 4], [0, 0]],
+                    [[1, 1], [2, 1], [2, 2], [1, 1]],
+                ],
+            },
+            "properties": {},
+        },
+        {
+            "type": "Feature",
+            "geometry": {
+                "type": "MultiPolygon",
+                "coordinates": [
+                    [[[0, 0], [1, 0], [1, 1], [0, 0]]],
+                    [[[5, 5], [6, 5], [6, 6], [5, 5]]],
+                ],
+            },
+            "properties": {"name": "c"},
+        },
+        {
+            "type": "Feature",
+            "geometry": {
+                "type": "MultiLineString",
+                "coordinates": [[[0, 0], [1, 1]], [[2, 2], [3, 3]]],
+            },
+            "properties": {},
+        },
+        {"type": "Feature", "geometry": None, "properties": {}},
+    ],
+}
+
+
+class TestEncoding(unittest.TestCase):
+    """Tests for `mapwidget.encoding` module."""
+
+    @unittest.skipIf(numpy is None, "requires numpy")
+    def test_round_trip(self):
+        """Decoding the buffers gives back the original features."""
+        header, buffers = encode_geojson(FEATURES)
+        self.assertEqual(decode_geojson(header, buffers), FEATURES)
+
+    @unittest.skipIf(numpy is None, "requires numpy")
+    def test_offsets(self):
+        """Rings, parts and geometries are indexed by offset arrays."""
+        header, buffers = encode_geojson(FEATURES, dtype="float32")
+        self.assertEqual(header["count"], 5)
+        self.assertEqual(buffers[0].nbytes, 4 * 2 * 21)
+        self.assertEqual(buffers[1].tolist(), [0, 1, 2, 4, 5, 5])
+        self.assertEqual(buffers[2].tolist(), [0, 1, 3, 4, 5, 7])
+
+    @unittest.skipIf(numpy is None, "requires numpy")
+    def test_geometry_collection(self):
+        """Unsupported geometry types fail with a clear error."""
+        collection = {
+            "type": "GeometryCollection",
+            "geometries": [{"type": "Point", "coordinates": [0, 0]}],
+        }
+        data = {
+            "type": "FeatureCollection",
+            "features": FEATURES["features"]
+            + [{"type": "Feature", "geometry": collection, "properties": {}}],
+        }
+        with self.assertRaisesRegex(ValueError, "Feature 5 has a GeometryCollection"):
+            encode_geojson(data)
+        m = maplibre.Map(controls=[])
+        m.send = lambda content, buffers=None: None
+        with self.assertRaisesRegex(ValueError, "add_source"):
+            m.add_geojson("shapes", data)
+        self.assertEqual(m.calls, [])
+        m.add_source("shapes", {"type": "geojson", "data": data})
+        self.assertEqual(len(m.features_in_bounds([-1, -1, 1, 1])), 4)
+
+    @unittest.skipIf(numpy is None, "requires numpy")
+    def test_add_geojson_sends_buffers(self):
+        """add_geojson sends the buffers alongside the call."""
+        m = maplibre.Map(controls=[])
+        sent = []
+        m.send = lambda content, buffers=None: sent.append((content, buffers))
+        m.add_geojson("points", FEATURES)
+        content, buffers = sent[-1]
+        self.assertEqual(content["calls"][0]["method"], "addGeoJSONBinary")
+        self.assertEqual(content["calls"][0]["buffers"], [0, 1, 2, 3, 4])
+        self.assertEqual(len(buffers), 5)
+
+    @unittest.skipIf(numpy is None, "requires numpy")
+    def test_feature_states_round_trip(self):
+        """Feature states decode to the values and removals they encode."""
+        nan = float("nan")
+        header, buffers = encode_feature_states(
+            [1, 2, 3], {"rate": [0.5, nan, 2.0], "hover": [True, False, True]}
+        )
+        self.assertEqual(header["id_dtype"], "int32")
+        self.assertEqual(header["booleans"], ["hover"])
+        self.assertEqual(len(buffers), 3)
+        self.assertEqual(
+            decode_feature_states(header, buffers),
+            {
+                1: {"rate": 0.5, "hover": True},
+                2: {"rate": None, "hover": False},
+                3: {"rate": 2.0, "hover": True},
+            },
+        )
+        header, buffers = encode_feature_states(["a", "b"], {"v": [1, 2]})
+        self.assertEqual(header["ids"], ["a", "b"])
+        self.assertEqual(decode_feature_states(header, buffers)["b"], {"v": 2.0})
+        header, _ = encode_feature_states([2**40], {"v": [1]})
+        self.assertEqual(header["id_dtype"], "float64")
+
+    @unittest.skipIf(numpy is None, "requires numpy")
+    def test_set_feature_states(self):
+        """Repeated updates of the same features supersede each other."""
+        m = maplibre.Map(controls=[])
+        sent = []
+        m.send = lambda content, buffers=None: sent.append((content, buffers))
+        m.add_geojson("points", FEATURES)
+        for frame in range(10):
+            m.set_feature_states("points", [1, 2], [frame, frame + 1])
+        content, buffers = sent[-1]
+        self.assertEqual(content["calls"][0]["method"], "setFeatureStates")
+        self.assertEqual(len(buffers), 2)
+        methods = [call["method"] for call in m.compacted_calls]
+        self.assertEqual(methods, ["addGeoJSONBinary", "setFeatureStates"])
+        m.set_feature_states("points", [3], [1])
+        self.assertEqual(len(m.compacted_calls), 3)
+        m.remove_source("points")
+        self.assertEqual(m.compacted_calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
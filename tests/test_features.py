@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+"""Tests for `mapwidget.features` module."""
+
+import unittest
+
+from mapwidget.features import FeatureStore
+
+
+def point(feature_id, x=0, y=0):
+    return {
+        "id": feature_id,
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [x, y]},
+        "properties": {},
+    }
+
+
+class TestFeatures(unittest.TestCase):
+    """Tests for `mapwidget.features` module."""
+
+    def test_apply(self):
+        store = FeatureStore([point("a"), point("b")])
+        upserted, deleted = store.apply(
+            [
+                {"op": "upsert", "feature": point("a", 1, 1)},
+                {"op": "upsert", "feature": point("c")},
+                {"op": "delete", "id": "b"},
+                {"op": "delete", "id": "missing"},
+            ]
+        )
+        self.assertEqual([f["id"] for f in upserted], ["a", "c"])
+        self.assertEqual([f["id"] for f in deleted], ["b"])
+        self.assertEqual(store.ids, ["a", "c"])
+        self.assertEqual(store["a"]["geometry"]["coordinates"], [1, 1])
+
+        upserted, deleted = store.apply([{"op": "clear"}])
+        self.assertEqual(len(deleted), 2)
+        self.assertEqual(len(store), 0)
+
+    def test_errors(self):
+        store = FeatureStore()
+        with self.assertRaises(ValueError):
+            store.upsert({"type": "Feature", "geometry": None, "properties": {}})
+        with self.assertRaises(ValueError):
+            store.apply([{"op": "move"}])
+
+    def test_to_geojson(self):
+        feature = point("a")
+        store = FeatureStore([feature])
+        version = store.version
+        collection = store.to_geojson()
+        self.assertEqual(collection["type"], "FeatureCollection")
+        self.assertIs(collection["features"][0], feature)
+        store.delete("a")
+        self.assertGreater(store.version, version)
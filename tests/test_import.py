@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+"""Tests for the lazy imports of the `mapwidget` package."""
+
+import subprocess
+import sys
+import unittest
+
+
+def run(code):
+    """Runs code in a fresh interpreter and returns its output."""
+    return subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout.split()
+
+
+class TestImport(unittest.TestCase):
+    """Tests for the lazy imports of the `mapwidget` package."""
+
+    def test_import_is_light(self):
+        """Importing the package or the basemaps does not import the maps."""
+        for statement in ("import mapwidget", "import mapwidget.basemaps"):
+            loaded = run(
+                f"{statement}; import sys; "
+                "print(*[m in sys.modules for m in "
+                "('anywidget', 'traitlets', 'xyzservices', 'mapwidget.maplibre')])"
+            )
+            self.assertEqual(loaded, ["False"] * 4, statement)
+
+    def test_public_api(self):
+        """Submodules and the maplibre names resolve on first access."""
+        loaded = run(
+            "import mapwidget, sys; "
+            "print(mapwidget.Map is mapwidget.maplibre.Map, "
+            "mapwidget.leaflet.Map.__module__, "
+            "'mapwidget.maplibre' in sys.modules)"
+        )
+        self.assertEqual(loaded, ["True", "mapwidget.leaflet", "True"])
+        loaded = run("from mapwidget import *; print(Map.__module__)")
+        self.assertEqual(loaded, ["mapwidget.maplibre"])
+
+    def test_import_time(self):
+        """Importing the package takes a fraction of importing anywidget."""
+        code = (
+            "import time; start = time.perf_counter(); import {}; "
+            "print(time.perf_counter() - start)"
+        )
+        package = min(float(run(code.format("mapwidget"))[0]) for _ in range(3))
+        anywidget = min(float(run(code.format("anywidget"))[0]) for _ in range(3))
+        self.assertLess(package, anywidget / 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
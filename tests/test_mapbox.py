@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+"""Tests for `mapwidget.mapbox` module."""
+
+import unittest
+from unittest import mock
+
+from mapwidget import mapbox
+from mapwidget.cache import URLCache
+
+EXAMPLE = """
+const map = new mapboxgl.Map({
+    container: 'map',
+    style: 'mapbox://styles/mapbox/light-v11',
+});
+"""
+
+
+class TestMapbox(unittest.TestCase):
+    """Tests for `mapwidget.mapbox` module."""
+
+    def test_set_esm(self):
+        """The template is read once and the generated esm is cached."""
+        m = mapbox.Map(token="token")
+        m.set_esm(EXAMPLE)
+        self.assertIn("container: div", m._esm)
+        self.assertTrue(m._esm.startswith('import mapboxgl from "https://esm.sh/'))
+        self.assertIn("// Footer", m._esm)
+        with mock.patch("builtins.open") as open_:
+            other = mapbox.Map(token="token")
+            other.set_esm(EXAMPLE)
+            open_.assert_not_called()
+        self.assertEqual(other._esm, m._esm)
+
+    def test_set_from_url(self):
+        """URLs go through the URL cache, blocking or in the background."""
+        cache = URLCache(cache_dir=False)
+        cache.fetch = lambda url, timeout=None, refresh=False: b"#map { color: red }"
+        m = mapbox.Map(token="token")
+        with mock.patch.object(mapbox, "get_url_cache", return_value=cache):
+            self.assertIsNone(m.set_css("https://example.com/map.css"))
+            self.assertEqual(m._css, "#div { color: red }")
+            m._css = ""
+            future = m.set_css("https://example.com/map.css", block=False)
+            future.result(timeout=5)
+            self.assertEqual(m._css, "#div { color: red }")
+        with self.assertRaises(TypeError):
+            m.set_esm(None)
+
+
+if __name__ == "__main__":
+    unittest.main()
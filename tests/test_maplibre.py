@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+"""Tests for `mapwidget.maplibre` module."""
+
+import asyncio
+import unittest
+
+from mapwidget import maplibre
+
+
+class TestMaplibre(unittest.TestCase):
+    """Tests for `mapwidget.maplibre` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.map = maplibre.Map(controls=[])
+        self.sent = []
+        self.map.send = lambda content, buffers=None: self.sent.append(content)
+
+    def frontend_message(self, content):
+        """Simulate a custom message sent by the frontend."""
+        self.map._handle_message(self.map, content, [])
+
+    def test_add_call_sends_delta(self):
+        """Each call is sent on its own, with a sequence number."""
+        for i in range(100):
+            self.map.set_zoom(i)
+        self.assertEqual(len(self.sent), 100)
+        last = self.sent[-1]
+        self.assertEqual(last["type"], "calls")
+        self.assertEqual(len(last["calls"]), 1)
+        self.assertEqual(last["calls"][0]["seq"], 100)
+        self.assertEqual(last["calls"][0]["args"], [99])
+
+    def test_sync_replays_history(self):
+        """A newly displayed view receives the calls it has not seen."""
+        self.map.set_center(10, 20)
+        self.map.set_zoom(5)
+        self.sent.clear()
+        self.frontend_message({"type": "sync", "seq": 1})
+        self.assertEqual(len(self.sent), 1)
+        self.assertTrue(self.sent[0]["replay"])
+        self.assertEqual([c["method"] for c in self.sent[0]["calls"]], ["setZoom"])
+
+    def test_retention_is_bounded(self):
+        """Calls are dropped from the retention window without a frontend."""
+        m = maplibre.Map(controls=[], call_history=10)
+        data = {"type": "FeatureCollection", "features": []}
+        source = {"type": "geojson", "data": data}
+        for i in range(50):
+            m.set_zoom(i)
+            m.add_source(f"source-{i}", source)
+        self.assertEqual(len(m.calls), 10)
+        self.assertEqual(m.calls[0]["seq"], 91)
+        # Views behind the retained calls catch up from the compacted state
+        replay = m._call_log.replay(5)
+        self.assertEqual(len(replay), 49)
+        self.assertEqual(replay[0]["args"], ["source-2", source])
+        self.assertEqual(m._call_log.replay(95), m.calls[-5:])
+
+    def test_batch_sends_one_message(self):
+        """Calls made inside a batch are shipped together."""
+        with self.map.batch() as batch:
+            for i in range(20):
+                self.map.set_paint_property(f"layer-{i}", "fill-opacity", 0.5)
+            with self.map.batch():
+                self.map.set_filter("layer-0", ["==", "id", 1])
+        self.assertEqual(batch.coalesced, 21)
+        self.assertEqual(len(self.sent), 1)
+        self.assertTrue(self.sent[0]["batch"])
+        self.assertEqual(len(self.sent[0]["calls"]), 21)
+
+    def test_batch_rolls_back_on_error(self):
+        """A batch that raises discards its calls."""
+        self.map.set_zoom(3)
+        with self.assertRaises(RuntimeError):
+            with self.map.batch():
+                self.map.set_zoom(4)
+                raise RuntimeError("boom")
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual([c["args"] for c in self.map.calls], [[3]])
+
+    def test_draw_ops(self):
+        """Draw changes are applied to the feature store by feature ID."""
+        features = [
+            {
+                "id": str(i),
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [i, i]},
+                "properties": {},
+            }
+            for i in range(3)
+        ]
+        ops = [{"op": "upsert", "feature": f} for f in features]
+        self.map._handle_message(
+            self.map, {"type": "draw", "event": "create", "ops": ops}, []
+        )
+        moved = dict(features[1], geometry={"type": "Point", "coordinates": [9, 9]})
+        self.map._handle_message(
+            self.map,
+            {
+                "type": "draw",
+                "event": "update",
+                "ops": [{"op": "upsert", "feature": moved}],
+            },
+            [],
+        )
+        self.map._handle_message(
+            self.map,
+            {"type": "draw", "event": "delete", "ops": [{"op": "delete", "id": "0"}]},
+            [],
+        )
+        self.map._handle_message(
+            self.map, {"type": "draw", "event": "selection", "ids": ["1"]}, []
+        )
+
+        collection = self.map.draw_feature_collection_all
+        self.assertEqual([f["id"] for f in collection["features"]], ["1", "2"])
+        self.assertEqual(self.map.draw_features_updated, [moved])
+        self.assertEqual(self.map.draw_features_deleted, [features[0]])
+        # The selection refers to the stored feature rather than a copy
+        self.assertIs(self.map.draw_features_selected[0], self.map.draw_features["1"])
+
+    def test_link(self):
+        """Linked maps share a link group and jump to the leading view."""
+        self.map.center = [10, 20]
+        others = [maplibre.Map(controls=[]) for _ in range(2)]
+        for other in others:
+            other.send = lambda content, buffers=None: None
+        group = self.map.link(*others, cursor=True)
+        self.assertTrue(group)
+        for other in others:
+            self.assertEqual(other.link_group, group)
+            self.assertTrue(other.link_cursor)
+            self.assertEqual(other.calls[-1]["method"], "jumpTo")
+            self.assertEqual(other.calls[-1]["args"][0]["center"], [10, 20])
+        others[0].unlink()
+        self.assertEqual(others[0].link_group, "")
+        self.assertEqual(self.map.link_group, group)
+
+    def test_calls_made_before_load(self):
+        """Every call is sent right away, the frontend holds it until loaded."""
+        m = maplibre.Map()
+        sent = []
+        m.send = lambda content, buffers=None: sent.append(content)
+        m.add_draw_control()
+        m.set_draw_mode("draw_polygon")
+        m.add_legend({"roads": "Roads"})
+        m.add_layer({"id": "roads", "type": "line", "source": "osm"})
+        methods = [call["method"] for call in m.calls]
+        self.assertEqual(
+            methods,
+            ["addControl"] * 3
+            + ["addDrawControl", "setDrawMode", "addLegendControl", "addLayer"],
+        )
+        self.assertEqual(len(sent), 4)
+        m.loaded = True
+        self.assertEqual(len(m.calls), 7)
+
+    def test_await_calls(self):
+        """Calls resolve on ack, camera moves on moveend and ready on load."""
+
+        async def main():
+            pending = self.map.add_layer({"id": "roads", "type": "line"})
+            self.assertFalse(pending.done())
+            task = asyncio.ensure_future(asyncio.gather(pending, self.map.ready()))
+            await asyncio.sleep(0)
+            self.assertFalse(task.done())
+            self.frontend_message({"type": "ack", "seq": pending.seq})
+            self.map.loaded = True
+            await asyncio.wait_for(task, 1)
+
+            flight = self.map.fly_to(center=[10, 20], zoom=5)
+            self.frontend_message({"type": "ack", "seq": flight.seq})
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(flight, 0.01)
+            task = asyncio.ensure_future(flight)
+            await asyncio.sleep(0)
+            self.frontend_message({"type": "moveend", "seq": flight.seq})
+            await asyncio.wait_for(task, 1)
+            self.assertTrue(flight.done())
+            self.assertEqual(self.map._waiters, [])
+            # Completed calls do not wait
+            await asyncio.wait_for(self.map.ready(), 1)
+
+        asyncio.run(main())
+
+    def test_calls_return_pending(self):
+        """Every method issuing a call returns the PendingCall of that call."""
+        m = self.map
+        pendings = [
+            m.resize(),
+            m.set_style("https://demotiles.maplibre.org/style.json"),
+            m.set_layer_visibility("roads", "none"),
+            m.add_control("scale"),
+            m.remove_control("scale"),
+            m.add_draw_control(),
+            m.draw_features_delete_all(),
+            m.remove_draw_control(),
+            m.remove_animation("flow"),
+        ]
+        for pending in pendings:
+            self.assertIsInstance(pending, maplibre.PendingCall)
+        self.assertEqual(
+            [pending.seq for pending in pendings],
+            [call["seq"] for call in m.calls[-len(pendings) :]],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+"""Tests for `mapwidget.points` module."""
+
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from mapwidget import maplibre
+from mapwidget.points import SCALE, encode_points, point_colors
+
+
+@unittest.skipIf(np is None, "requires numpy")
+class TestPoints(unittest.TestCase):
+    """Tests for `mapwidget.points` module."""
+
+    def test_encode_points(self):
+        """Coordinates are quantized and chunked with their columns."""
+        lng = np.array([-122.4194155, 2.3522219, np.nan, 151.2092955, 0.0])
+        lat = np.array([37.7749295, 48.856614, 10.0, -33.8688197, 89.9])
+        kind = np.array(["a", "b", "a", "c", "b"])
+        info, chunks = encode_points(
+            lng, lat, {"speed": np.arange(5), "kind": kind}, chunk_size=2
+        )
+        self.assertEqual(info["count"], 4)
+        self.assertEqual(info["columns"]["speed"], {"min": 0.0, "max": 4.0})
+        self.assertEqual(info["columns"]["kind"]["categories"], ["a", "b", "c"])
+        self.assertEqual([header["count"] for header, _ in chunks], [2, 2])
+        self.assertEqual([header["last"] for header, _ in chunks], [False, True])
+
+        header, buffers = chunks[1]
+        self.assertEqual(header["offset"], 2)
+        self.assertEqual(header["columns"], ["speed", "kind"])
+        x = np.frombuffer(buffers[0], dtype=np.int32)
+        y = np.frombuffer(buffers[1], dtype=np.int32)
+        np.testing.assert_allclose(x / SCALE, [151.2092955, 0.0], atol=1e-7)
+        # Latitudes are clipped to the Web Mercator range
+        np.testing.assert_allclose(y / SCALE, [-33.8688197, 85.0511288], atol=1e-7)
+        # The point with a NaN coordinate is dropped along with its values
+        np.testing.assert_array_equal(np.frombuffer(buffers[2], np.float32), [3, 4])
+        np.testing.assert_array_equal(np.frombuffer(buffers[3], np.float32), [2, 1])
+
+        with self.assertRaises(ValueError):
+            encode_points(lng, lat[:2])
+
+    def test_point_colors(self):
+        """Colors are RGBA stops in [0, 1]."""
+        self.assertEqual(point_colors("#ff0000"), [[1.0, 0.0, 0.0, 1.0]])
+        self.assertEqual(len(point_colors(colormap="viridis")), 8)
+        self.assertEqual(len(point_colors(colormap="viridis", categories="ab")), 2)
+
+    def test_add_points(self):
+        """Points are sent as binary chunks and timed end to end."""
+        m = maplibre.Map(controls=[])
+        sent = []
+        m.send = lambda content, buffers=None: sent.append((content, buffers))
+        lng = np.linspace(-10, 10, 25)
+        timings = m.add_points(
+            lng, lng / 2, layer_id="gps", speed=lng * 3, color_by="speed", chunk_size=10
+        )
+        self.assertEqual(timings["points"], 25)
+        self.assertEqual(timings["chunks"], 3)
+        self.assertEqual(timings["bytes"], 25 * 12)
+        self.assertGreaterEqual(timings["encode_ms"], 0)
+
+        add = sent[0][0]["calls"][0]
+        self.assertEqual(add["method"], "addPoints")
+        self.assertEqual(add["args"][1]["value"], "speed")
+        self.assertEqual((add["args"][1]["vmin"], add["args"][1]["vmax"]), (-30, 30))
+        content, buffers = sent[1]
+        self.assertEqual(content["calls"][0]["method"], "addPointsChunk")
+        self.assertEqual(content["calls"][0]["buffers"], [0, 1, 2])
+        self.assertEqual(len(buffers), 3)
+
+        m.set_points_style("gps", radius=5, vmax=10)
+        style = sent[-1][0]["calls"][0]["args"][1]
+        self.assertEqual((style["radius"], style["vmax"]), (5, 10))
+        with self.assertRaises(ValueError):
+            m.set_points_style("gps", color_by="missing")
+
+        m._handle_message(
+            m,
+            {
+                "type": "points_timing",
+                "layer_id": "gps",
+                "decode_ms": 1.0,
+                "upload_ms": 2.0,
+                "render_ms": 0.0,
+            },
+            [],
+        )
+        self.assertEqual(timings["upload_ms"], 2.0)
+        self.assertGreaterEqual(timings["transfer_ms"], 0)
+
+        # Removing the layer drops its chunks from the replayed calls
+        self.assertEqual(len(m.compacted_calls), 5)
+        m.remove_layer("gps")
+        self.assertEqual(m.compacted_calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+
+"""Tests for `mapwidget.query` module."""
+
+import asyncio
+import concurrent.futures
+import struct
+import threading
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from mapwidget import maplibre
+from mapwidget.encoding import encode_geojson
+from mapwidget.testing import FakeFrontend
+
+FEATURES = {
+    "type": "FeatureCollection",
+    "features": [
+        {
+            "type": "Feature",
+            "id": 1,
+            "geometry": {"type": "Point", "coordinates": [2.35, 48.86]},
+            "properties": {"name": "Paris"},
+        },
+        {
+            "type": "Feature",
+            "geometry": {
+                "type": "LineString",
+                "coordinates": [[0.0, 0.0], [1.0, 1.0]],
+            },
+            "properties": {},
+        },
+    ],
+}
+
+
+class TestQuery(unittest.TestCase):
+    """Tests for `mapwidget.query` module."""
+
+    def setUp(self):
+        self.m = maplibre.Map(controls=[])
+        self.frontend = FakeFrontend(self.m)
+
+    def queries(self):
+        return [
+            content
+            for content, _ in self.frontend.messages
+            if content.get("type") == "query"
+        ]
+
+    def answer_features(self, query):
+        header, buffers = encode_geojson(FEATURES)
+        header["layers"] = ["cities", "roads"]
+        header["sources"] = ["cities", "roads"]
+        header["source_layers"] = [None, None]
+        header["states"] = [{"hover": True}, None]
+        self.frontend.send(
+            {
+                "type": "query_result",
+                "id": query["id"],
+                "kind": "features",
+                "result": header,
+            },
+            buffers,
+        )
+
+    @unittest.skipIf(numpy is None, "requires numpy")
+    def test_query_rendered_features(self):
+        future = self.m.query_rendered_features([2.35, 48.86], layers=["cities"])
+        self.assertFalse(future.done())
+        (query,) = self.queries()
+        self.assertEqual(query["method"], "queryRenderedFeatures")
+        self.assertEqual(
+            query["params"], {"geometry": [2.35, 48.86], "layers": ["cities"]}
+        )
+
+        self.answer_features(query)
+        features = future.result(0)["features"]
+        self.assertEqual(features[0]["id"], 1)
+        self.assertEqual(features[0]["geometry"]["coordinates"], [2.35, 48.86])
+        self.assertEqual(features[0]["layer"], "cities")
+        self.assertEqual(features[0]["state"], {"hover": True})
+        self.assertEqual(features[1]["geometry"]["type"], "LineString")
+        self.assertNotIn("state", features[1])
+
+    @unittest.skipIf(numpy is None, "requires numpy")
+    def test_query_cache(self):
+        future = self.m.query_rendered_features()
+        self.assertIs(self.m.query_rendered_features(), future)
+        self.answer_features(self.queries()[0])
+        self.assertIs(self.m.query_rendered_features(), future)
+        self.assertEqual(len(self.queries()), 1)
+
+        # A new view state or a new call makes the query again
+        self.m.bounds = [-10, -10, 10, 10]
+        self.assertIsNot(self.m.query_rendered_features(), future)
+        self.m.set_zoom(3)
+        self.m.query_rendered_features()
+        self.assertEqual(len(self.queries()), 3)
+
+    @unittest.skipIf(numpy is None, "requires numpy")
+    def test_query_error_and_duplicates(self):
+        future = self.m.query_source_features("roads", filter=["==", "kind", "a"])
+        (query,) = self.queries()
+        self.assertEqual(query["method"], "querySourceFeatures")
+        self.frontend.send(
+            {"type": "query_result", "id": query["id"], "error": "No source"}
+        )
+        with self.assertRaisesRegex(RuntimeError, "No source"):
+            future.result(0)
+        # Another view answering late is ignored
+        self.answer_features(query)
+        # Failed queries are not cached
+        self.assertIsNot(
+            self.m.query_source_features("roads", filter=["==", "kind", "a"]), future
+        )
+
+    def test_query_timeout(self):
+        future = self.m.get_feature_state("roads", 3, timeout=0.01)
+        with self.assertRaises(TimeoutError):
+            future.result(1)
+        self.assertEqual(self.m._queries, {})
+
+    def test_query_timeouts_share_a_thread(self):
+        futures = [
+            self.m.get_feature_state("roads", i, timeout=0.01 * (i % 5))
+            for i in range(50)
+        ]
+        threads = threading.active_count()
+        futures += [self.m.get_feature_state("roads", -1, timeout=0.01)]
+        self.assertEqual(threading.active_count(), threads)
+        for future in futures:
+            with self.assertRaises(TimeoutError):
+                future.result(1)
+        self.assertEqual(self.m._queries, {})
+
+    def test_query_timeout_in_loop(self):
+        expired = []
+        expire = self.m._expire_query
+
+        def record(request_id):
+            expired.append(threading.current_thread())
+            expire(request_id)
+
+        self.m._expire_query = record
+
+        async def query():
+            with self.assertRaises(TimeoutError):
+                await self.m.get_feature_state("roads", 3, timeout=0.01)
+
+        asyncio.run(query())
+        # Expired by the event loop rather than another thread
+        self.assertEqual(expired, [threading.main_thread()])
+        self.assertEqual(self.m._queries, {})
+
+    def test_feature_state(self):
+        future = self.m.get_feature_state("roads", 3, source_layer="lines")
+        (query,) = self.queries()
+        self.assertEqual(
+            query["params"], {"source_id": "roads", "id": 3, "source_layer": "lines"}
+        )
+        self.frontend.send(
+            {"type": "query_result", "id": query["id"], "result": {"hover": True}}
+        )
+        self.assertEqual(future.result(0), {"hover": True})
+
+    def test_project(self):
+        future = self.m.project([2.35, 48.86])
+        points = self.m.unproject([[0, 0], [10, 20]])
+        single, many = self.queries()
+        self.assertTrue(single["params"]["single"])
+        self.assertEqual(many["method"], "unproject")
+        self.frontend.send(
+            {
+                "type": "query_result",
+                "id": single["id"],
+                "kind": "points",
+                "single": True,
+            },
+            [struct.pack("=2d", 100.0, 200.0)],
+        )
+        self.frontend.send(
+            {"type": "query_result", "id": many["id"], "kind": "points"},
+            [struct.pack("=4d", 1.0, 2.0, 3.0, 4.0)],
+        )
+        self.assertEqual(future.result(0), [100.0, 200.0])
+        self.assertEqual(points.result(0), [[1.0, 2.0], [3.0, 4.0]])
+
+    def test_await(self):
+        async def query():
+            future = self.m.get_feature_state("roads", 3)
+            self.assertIsInstance(future, concurrent.futures.Future)
+            (query,) = self.queries()
+            asyncio.get_running_loop().call_soon(
+                self.frontend.send,
+                {"type": "query_result", "id": query["id"], "result": {}},
+            )
+            return await future
+
+        self.assertEqual(asyncio.run(query()), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
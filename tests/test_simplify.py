@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+"""Tests for `mapwidget.simplify` module."""
+
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from mapwidget import maplibre
+from mapwidget.simplify import (
+    build_levels,
+    level_index,
+    simplify_geojson,
+    zoom_tolerance,
+)
+
+
+def _feature(geom_type, coordinates):
+    return {
+        "type": "Feature",
+        "geometry": {"type": geom_type, "coordinates": coordinates},
+        "properties": {},
+    }
+
+
+def _wavy_circle(n=1001, x=0.0):
+    t = np.linspace(0, 2 * np.pi, n)
+    ring = np.column_stack([x + np.cos(t), np.sin(t) + 0.001 * np.sin(50 * t)])
+    ring[-1] = ring[0]
+    return ring.tolist()
+
+
+@unittest.skipIf(np is None, "requires numpy")
+class TestSimplify(unittest.TestCase):
+    """Tests for `mapwidget.simplify` module."""
+
+    def setUp(self):
+        self.data = {
+            "type": "FeatureCollection",
+            "features": [
+                _feature("Polygon", [_wavy_circle()]),
+                _feature("LineString", _wavy_circle(500, x=5)[:250]),
+                _feature("Point", [1, 2]),
+                # Smaller than the tolerances
+                _feature("Polygon", [[[9, 9], [9.001, 9], [9.001, 9.001], [9, 9]]]),
+            ],
+        }
+
+    def test_zoom_tolerance(self):
+        """The tolerance is the size of pixels of 512 px tiles."""
+        self.assertEqual(zoom_tolerance(0), 360 / 512)
+        self.assertEqual(zoom_tolerance(3, pixels=2), 2 * 360 / 512 / 8)
+
+    def test_douglas_peucker(self):
+        """Vertices within the tolerance of the kept segments are dropped."""
+        result = simplify_geojson(self.data, 0.01)
+        polygon, line, point = result["features"]
+        ring = polygon["geometry"]["coordinates"][0]
+        self.assertLess(len(ring), 60)
+        self.assertEqual(ring[0], ring[-1])
+        coords = line["geometry"]["coordinates"]
+        self.assertLess(len(coords), 20)
+        self.assertEqual(
+            coords[0], self.data["features"][1]["geometry"]["coordinates"][0]
+        )
+        self.assertEqual(point["geometry"]["coordinates"], [1.0, 2.0])
+
+        # Every original vertex is within the tolerance of the simplified ring
+        original = np.array(self.data["features"][0]["geometry"]["coordinates"][0])
+        a, b = np.array(ring[:-1]), np.array(ring[1:])
+        ab = b - a
+        ap = original[:, None, :] - a[None]
+        t = np.clip((ap * ab).sum(-1) / (ab * ab).sum(-1), 0, 1)
+        distances = np.hypot(*np.moveaxis(ap - t[..., None] * ab, -1, 0)).min(axis=1)
+        self.assertLessEqual(distances.max(), 0.01)
+
+        self.assertEqual(len(simplify_geojson(self.data, 0.0)["features"]), 4)
+
+    def test_visvalingam(self):
+        """Vertices with small effective areas are dropped."""
+        result = simplify_geojson(self.data, 0.01, method="vw")
+        self.assertEqual(len(result["features"]), 3)
+        ring = result["features"][0]["geometry"]["coordinates"][0]
+        self.assertLess(len(ring), 200)
+        self.assertEqual(ring[0], ring[-1])
+        with self.assertRaises(ValueError):
+            simplify_geojson(self.data, 0.01, method="rdp")
+
+    def test_preserve_topology(self):
+        """Shared vertices are kept and polygon rings do not collapse."""
+        left = [[0, 0], [0.5, 0.001], [1, 0], [1, 0.5], [1, 1], [0, 1], [0, 0]]
+        right = [[1, 0], [2, 0], [2, 1], [1, 1], [1, 0.5], [1, 0]]
+        data = {
+            "type": "FeatureCollection",
+            "features": [
+                _feature("Polygon", [left]),
+                _feature("Polygon", [right]),
+                _feature("Polygon", [[[9, 9], [9.001, 9], [9.001, 9.001], [9, 9]]]),
+            ],
+        }
+        for method in ("dp", "vw"):
+            result = simplify_geojson(data, 0.1, method, preserve_topology=True)
+            left_ring, right_ring, tiny = [
+                f["geometry"]["coordinates"][0] for f in result["features"]
+            ]
+            self.assertNotIn([0.5, 0.001], left_ring)
+            self.assertIn([1.0, 0.5], left_ring)
+            self.assertIn([1.0, 0.5], right_ring)
+            self.assertEqual(len(tiny), 4)
+            self.assertEqual(len(simplify_geojson(data, 0.1, method)["features"]), 2)
+
+    def test_levels(self):
+        """Each band is simplified for its upper zoom, the last is full."""
+        levels = build_levels(self.data, bands=(0, 6, 10))
+        self.assertEqual([level["max_zoom"] for level in levels], [6, 10, None])
+        self.assertEqual(levels[0]["tolerance"], zoom_tolerance(6))
+        self.assertEqual(levels[-1]["tolerance"], 0.0)
+        self.assertEqual(levels[-1]["vertices"], 1001 + 250 + 1 + 4)
+        vertices = [level["vertices"] for level in levels]
+        self.assertEqual(vertices, sorted(vertices))
+        self.assertLess(levels[0]["bytes"], levels[-1]["bytes"])
+        self.assertEqual(
+            [level_index(levels, z) for z in (0, 5.9, 6, 12)], [0, 0, 1, 2]
+        )
+
+    def test_add_geojson_lod(self):
+        """The source data is swapped as the zoom crosses the bands."""
+        m = maplibre.Map(controls=[], zoom=2)
+        sent = []
+        m.send = lambda content, buffers=None: sent.append((content, buffers))
+        report = m.add_geojson_lod("shapes", self.data, bands=(0, 6, 10))
+        self.assertEqual(len(report["levels"]), 3)
+        self.assertNotIn("buffers", report["levels"][0])
+        self.assertGreater(report["precompute_ms"], 0)
+        self.assertIs(m.lod_timings["shapes"], report)
+
+        def levels_sent():
+            return [
+                call["args"][1]["count"]
+                for content, _ in sent
+                for call in content.get("calls", [])
+                if call["method"] == "addGeoJSONBinary"
+            ]
+
+        self.assertEqual(levels_sent(), [3])
+        m.zoom = 4
+        self.assertEqual(levels_sent(), [3])
+        m.zoom = 11
+        m.zoom = 12
+        self.assertEqual(levels_sent(), [3, 4])
+        # Only the current level is kept for replay
+        state = m._call_log.state
+        self.assertEqual(
+            [entry["method"] for entry in state.entries()].count("addGeoJSONBinary"),
+            1,
+        )
+        self.assertEqual(len(m.features_in_bounds([-2, -2, 0, 0])), 1)
+
+        m.remove_source("shapes")
+        m.zoom = 2
+        self.assertEqual(levels_sent(), [3, 4])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+"""Tests for `mapwidget.spatial` module."""
+
+import random
+import unittest
+from unittest import mock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from mapwidget import maplibre, spatial
+from mapwidget.spatial import SpatialIndex
+
+
+def square(x, y, size=1):
+    ring = [[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]]
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Polygon", "coordinates": [ring]},
+        "properties": {"x": x, "y": y},
+    }
+
+
+class TestSpatial(unittest.TestCase):
+    """Tests for `mapwidget.spatial` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        random.seed(0)
+        self.features = [
+            {
+                "type": "Feature",
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [random.uniform(-10, 10), random.uniform(-10, 10)],
+                },
+                "properties": {"index": i},
+            }
+            for i in range(2000)
+        ]
+        self.data = {"type": "FeatureCollection", "features": self.features}
+
+    @unittest.skipIf(numpy is None, "requires numpy")
+    def test_bulk_load_matches_linear_scan(self):
+        index = SpatialIndex()
+        index.insert_many(list(range(len(self.features))), self.data)
+        bbox = [-2, -3, 1.5, 0.5]
+        expected = [
+            i
+            for i, f in enumerate(self.features)
+            if bbox[0] <= f["geometry"]["coordinates"][0] <= bbox[2]
+            and bbox[1] <= f["geometry"]["coordinates"][1] <= bbox[3]
+        ]
+        self.assertEqual(sorted(index.keys_in_bounds(bbox)), expected)
+        # Queries covering the whole index scan it
+        self.assertEqual(len(index.keys_in_bounds([-180, -90, 180, 90])), 2000)
+
+    def test_insert_delete(self):
+        index = SpatialIndex(cell_size=1)
+        index.insert("a", square(0, 0))
+        index.insert("b", square(5, 5, size=20))
+        index.insert(
+            "line",
+            {
+                "type": "Feature",
+                "geometry": {"type": "LineString", "coordinates": [[0, 3], [4, 3]]},
+                "properties": {},
+            },
+        )
+        self.assertEqual(index.keys_at(0.5, 0.5), ["a"])
+        self.assertEqual(index.keys_at(2, 3.01), [])
+        self.assertEqual(index.keys_at(2, 3.01, tolerance=0.05), ["line"])
+        self.assertEqual(index.keys_at(20, 20), ["b"])
+
+        index.insert("a", square(10, 10))
+        self.assertEqual(index.keys_at(0.5, 0.5), [])
+        self.assertEqual(sorted(index.keys_at(10.5, 10.5)), ["a", "b"])
+        index.delete("b")
+        self.assertEqual(index.keys_at(20, 20), [])
+        self.assertEqual(len(index), 2)
+
+    def test_polygon_holes(self):
+        index = SpatialIndex()
+        feature = square(0, 0, size=10)
+        feature["geometry"]["coordinates"].append(
+            [[4, 4], [6, 4], [6, 6], [4, 6], [4, 4]]
+        )
+        index.insert("donut", feature)
+        self.assertEqual(index.keys_at(2, 2), ["donut"])
+        self.assertEqual(index.keys_at(5, 5), [])
+
+    def test_map_queries(self):
+        m = maplibre.Map(controls=[])
+        m.send = lambda content, buffers=None: None
+        m.add_source(
+            "squares",
+            {
+                "type": "geojson",
+                "data": {
+                    "type": "FeatureCollection",
+                    "features": [square(0, 0), square(2, 0)],
+                },
+            },
+        )
+        m._handle_message(
+            m,
+            {
+                "type": "draw",
+                "event": "create",
+                "ops": [
+                    {"op": "upsert", "feature": dict(square(0, 0, size=3), id="d1")}
+                ],
+            },
+            [],
+        )
+
+        self.assertEqual(len(m.features_at(0.5, 0.5)), 2)
+        self.assertEqual(
+            len(m.features_at(0.5, 0.5, sources=[maplibre.DRAW_SOURCE])), 1
+        )
+        # A source named like the draw control is another source
+        m.add_source(
+            "draw",
+            {"type": "geojson", "data": {"type": "FeatureCollection", "features": []}},
+        )
+        self.assertEqual(m.features_at(0.5, 0.5, sources=["draw"]), [])
+        self.assertEqual(len(m.features_at(0.5, 0.5)), 2)
+        self.assertEqual(len(m.features_in_bounds([1.9, 0, 5, 1])), 2)
+
+        m.clicked_latlng = [2.5, 0.5]
+        self.assertEqual(m.features_at(sources=["squares"])[0]["properties"]["x"], 2)
+
+        m.remove_source("squares")
+        m._handle_message(
+            m,
+            {"type": "draw", "event": "delete", "ops": [{"op": "delete", "id": "d1"}]},
+            [],
+        )
+        self.assertEqual(m.features_in_bounds([-180, -90, 180, 90]), [])
+
+    @unittest.skipIf(numpy is None, "requires numpy")
+    def test_sources_have_their_own_grid(self):
+        m = maplibre.Map(controls=[])
+        m.send = lambda content, buffers=None: None
+        point = {"type": "Point", "coordinates": [0.5, 0.5]}
+        m.add_source("point", {"type": "geojson", "data": point})
+        squares = {
+            "type": "FeatureCollection",
+            "features": [
+                square(x / 10, y / 10, size=0.1) for x in range(100) for y in range(100)
+            ],
+        }
+        m.add_source("squares", {"type": "geojson", "data": squares})
+
+        fresh = SpatialIndex()
+        fresh.insert_many(list(range(10000)), squares)
+        index = m._spatial["squares"]
+        self.assertEqual(index.cell_size, fresh.cell_size)
+        self.assertEqual(len(index._large), 0)
+
+        # Only the features near the point are tested
+        with mock.patch.object(
+            spatial, "geometry_contains", wraps=spatial.geometry_contains
+        ) as contains:
+            features = m.features_at(5.05, 5.05, tolerance=0)
+        self.assertEqual(len(features), 1)
+        self.assertLess(contains.call_count, 20)
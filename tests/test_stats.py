@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+"""Tests for `mapwidget.stats` module."""
+
+import unittest
+
+from mapwidget import maplibre
+from mapwidget.stats import deep_sizeof, payload_size, percentiles
+
+
+class TestStats(unittest.TestCase):
+    """Tests for `mapwidget.stats` module."""
+
+    def test_helpers(self):
+        """Percentiles interpolate, sizes count JSON and buffer bytes."""
+        self.assertEqual(
+            percentiles(range(101)), {"p50": 50.0, "p90": 90.0, "p99": 99.0}
+        )
+        self.assertEqual(percentiles([]), {"p50": None, "p90": None, "p99": None})
+        self.assertEqual(payload_size({"a": 1}, [b"1234"]), 7 + 4)
+        shared = list(range(1000))
+        self.assertLess(deep_sizeof([shared, shared]), 2 * deep_sizeof(shared))
+
+    def test_map_stats(self):
+        """Calls are sized when queued and timed when acknowledged."""
+        m = maplibre.Map(controls=[], instrument=True)
+        m.send = lambda content, buffers=None: None
+        m.set_zoom(3)
+        m.set_paint_property("water", "fill-color", "#0000ff")
+        m.view_state = {"center": {"lng": 1, "lat": 2}, "zoom": 3}
+        stats = m.stats()
+        self.assertEqual(stats["pending"], 2)
+        self.assertEqual(stats["calls"]["setZoom"]["bytes"]["count"], 1)
+        self.assertEqual(stats["traits"]["view_state"]["count"], 1)
+
+        m._handle_message(
+            m,
+            {
+                "type": "ack",
+                "seq": 2,
+                "timings": [[1, 0.5, 0.2, 10.0], [2, 0.5, 3.0, 10.0]],
+            },
+            [],
+        )
+        stats = m.stats(log=True)
+        self.assertEqual(stats["pending"], 0)
+        self.assertEqual(stats["calls"]["setPaintProperty"]["handler_ms"]["p50"], 3.0)
+        self.assertEqual(stats["messages"]["ack"]["count"], 1)
+        self.assertEqual(
+            [record["method"] for record in stats["log"]],
+            ["setZoom", "setPaintProperty"],
+        )
+        self.assertIn("latency_ms", stats["log"][0])
+        self.assertGreater(stats["memory"]["traits"]["view_state"], 0)
+        self.assertGreater(stats["memory"]["calls"], 0)
+
+        m.stats(reset=True)
+        m.instrument = False
+        m.set_zoom(4)
+        self.assertEqual(m.stats()["calls"], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
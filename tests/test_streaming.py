@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+"""Tests for `mapwidget.streaming` module."""
+
+import threading
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from mapwidget import maplibre
+from mapwidget.encoding import decode_geojson
+from mapwidget.streaming import expand_bounds
+from mapwidget.testing import FakeFrontend
+
+
+def _points():
+    """Yields a point every degree between -50 and 50."""
+    for x in range(-50, 51):
+        for y in range(-50, 51):
+            yield {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [x, y]},
+                "properties": {"name": f"{x},{y}"},
+            }
+
+
+def _query(bbox, zoom):
+    west, south, east, north = bbox
+    return [
+        feature
+        for feature in _points()
+        if west <= feature["geometry"]["coordinates"][0] <= east
+        and south <= feature["geometry"]["coordinates"][1] <= north
+    ]
+
+
+class TestStreaming(unittest.TestCase):
+    """Tests for `mapwidget.streaming` module."""
+
+    def setUp(self):
+        self.m = maplibre.Map(controls=[], zoom=6)
+        self.frontend = FakeFrontend(self.m)
+
+    def streamed(self):
+        added, removed = [], []
+        for content, buffers in self.frontend.messages:
+            if content.get("type") != "stream":
+                continue
+            if "header" in content:
+                data = decode_geojson(content["header"], buffers)
+                added.extend(feature["id"] for feature in data["features"])
+            removed.extend(content.get("remove", []))
+        return added, removed
+
+    def test_expand_bounds(self):
+        """Bounds grow on every side, within the valid latitudes."""
+        self.assertEqual(expand_bounds([0, 0, 10, 20], 0.5), [-5, -10, 15, 30])
+        self.assertEqual(expand_bounds([0, -80, 10, 80], 0.5)[1::2], [-90, 90])
+
+    @unittest.skipIf(numpy is None, "requires numpy")
+    def test_callable_source(self):
+        """The features around the view are streamed and evicted."""
+        stream = self.m.add_stream_layer(
+            "grid", _query, paint={"circle-radius": 2}, margin=0.5, chunk_size=10
+        )
+        methods = [call["method"] for call in self.frontend.calls]
+        self.assertEqual(methods, ["addSource", "addLayer"])
+        self.assertIsNone(stream.update())  # No view yet
+
+        self.m.bounds = [0, 0, 4, 4]
+        stream.wait(5)
+        added, removed = self.streamed()
+        # The view and half its size on every side: -2 to 6 in each direction
+        self.assertEqual(len(added), 81)
+        self.assertEqual(len(set(added)), 81)
+        self.assertEqual(removed, [])
+        self.assertEqual(stream.stats["chunks"], 9)
+        self.assertEqual(len(stream.loaded), 81)
+
+        # Panning keeps the features still in range and only sends new ones
+        self.frontend.clear()
+        self.m.bounds = [2, 0, 6, 4]
+        stream.wait(5)
+        added, removed = self.streamed()
+        self.assertEqual(len(removed), 18)
+        self.assertEqual(len(added), 18)
+        self.assertEqual(len(stream.loaded), 81)
+        self.assertEqual(stream.stats["evicted"], 18)
+        self.assertGreater(stream.stats["bytes"], 0)
+
+    @unittest.skipIf(numpy is None, "requires numpy")
+    def test_cancel(self):
+        """A pan cancels the fetch in flight, whose features are never sent."""
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow(bbox, zoom):
+            if bbox[0] < 0:
+                started.set()
+                release.wait(5)
+            yield from _query(bbox, zoom)
+
+        stream = self.m.add_stream_layer("grid", slow, margin=0, max_workers=2)
+        self.m.bounds = [-10, 0, -5, 5]
+        started.wait(5)
+        first = stream._future
+        self.m.bounds = [20, 20, 21, 21]
+        stream.wait(5)
+        release.set()
+        first.result(5)
+        added, _ = self.streamed()
+        self.assertEqual(len(added), 4)
+        self.assertEqual(set(stream.loaded), set(added))
+        self.assertEqual(stream.stats["cancelled"], 1)
+
+    @unittest.skipIf(numpy is None, "requires numpy")
+    def test_iterable_source(self):
+        """Iterables are indexed once, and zooming out evicts everything."""
+        consumed = []
+
+        def features():
+            consumed.append(True)
+            yield from _points()
+
+        stream = self.m.add_stream_layer(
+            "grid", features(), min_zoom=4, max_features=10, id_property="name"
+        )
+        self.m.bounds = [0, 0, 10, 10]
+        stream.wait(5)
+        self.assertEqual(len(stream.loaded), 10)
+        self.assertTrue(all("," in key for key in stream.loaded))
+        self.m.bounds = [1, 1, 11, 11]
+        stream.wait(5)
+        self.assertEqual(len(consumed), 1)
+
+        self.m.zoom = 3
+        self.m.bounds = [0, 0, 20, 20]
+        self.assertIsNone(stream.wait(5))
+        self.assertEqual(stream.loaded, {})
+
+        # A new view starts over
+        self.m.zoom = 6
+        self.m.bounds = [0, 0, 10, 10]
+        stream.wait(5)
+        self.frontend.clear()
+        self.frontend.sync()
+        stream.wait(5)
+        added, _ = self.streamed()
+        self.assertEqual(len(added), 10)
+
+        self.m.remove_layer("grid")
+        self.assertNotIn("grid", self.m._streams)
+        self.m.bounds = [5, 5, 10, 10]
+        self.assertEqual(self.streamed()[0], added)
+
+    def test_error(self):
+        """Errors of the source are kept and raised by wait."""
+
+        def broken(bbox, zoom):
+            raise RuntimeError("no database")
+
+        stream = self.m.add_stream_layer("grid", broken)
+        self.m.bounds = [0, 0, 1, 1]
+        with self.assertRaises(RuntimeError):
+            stream.wait(5)
+        self.assertIsInstance(stream.error, RuntimeError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+"""Tests for `mapwidget.style` module."""
+
+import unittest
+
+from mapwidget import maplibre
+from mapwidget.style import INLINE_DATA, StyleMirror
+
+
+class TestStyle(unittest.TestCase):
+    """Tests for `mapwidget.style` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.mirror = StyleMirror()
+        self.mirror.apply(
+            {
+                "reset": True,
+                "meta": {"version": 8, "name": "test"},
+                "order": ["background", "points"],
+                "layers": [
+                    {"id": "background", "type": "background"},
+                    {"id": "points", "type": "circle", "source": "points"},
+                ],
+                "sources": {"points": {"type": "geojson", "data": INLINE_DATA}},
+            }
+        )
+
+    def test_patches(self):
+        """Patches add, change and remove layers and sources."""
+        self.mirror.apply(
+            {
+                "order": ["points"],
+                "removed_layers": ["background"],
+                "layers": [{"id": "points", "type": "circle", "paint": {}}],
+            }
+        )
+        style = self.mirror.to_dict()
+        self.assertEqual(style["name"], "test")
+        self.assertEqual(
+            style["layers"], [{"id": "points", "type": "circle", "paint": {}}]
+        )
+        self.mirror.apply({"removed_sources": ["points"]})
+        self.assertEqual(self.mirror.sources, {})
+
+    def test_source_data_is_kept(self):
+        """Fetched inline data survives later patches of the source."""
+        data = {"type": "FeatureCollection", "features": []}
+        self.mirror.set_source_data("points", data)
+        self.mirror.apply(
+            {
+                "sources": {
+                    "points": {"type": "geojson", "data": INLINE_DATA, "maxzoom": 10}
+                }
+            }
+        )
+        self.assertEqual(self.mirror.sources["points"]["data"], data)
+
+    def test_changed_source_data(self):
+        """Fetched inline data is dropped once the frontend data changes."""
+        data = {"type": "FeatureCollection", "features": []}
+        placeholder = {"inline": True, "version": 1}
+        self.mirror.apply(
+            {"sources": {"points": {"type": "geojson", "data": placeholder}}}
+        )
+        self.mirror.set_source_data("points", data, version=1)
+        self.mirror.apply(
+            {
+                "sources": {
+                    "points": {"type": "geojson", "data": placeholder, "maxzoom": 9}
+                }
+            }
+        )
+        self.assertEqual(self.mirror.sources["points"]["data"], data)
+        # e.g. after setData
+        changed = {"inline": True, "version": 2}
+        self.mirror.apply({"sources": {"points": {"type": "geojson", "data": changed}}})
+        self.assertEqual(self.mirror.to_dict()["sources"]["points"]["data"], changed)
+        # Data fetched before the change is stale too
+        self.mirror.set_source_data("points", data, version=1)
+        self.mirror.apply({"sources": {"points": {"type": "geojson", "data": changed}}})
+        self.assertEqual(self.mirror.sources["points"]["data"], changed)
+
+    def test_map_layer_names(self):
+        """The map derives its layers from the mirrored style."""
+        m = maplibre.Map(controls=[])
+        m.send = lambda content, buffers=None: None
+        m._handle_message(
+            m,
+            {
+                "type": "style_patch",
+                "reset": True,
+                "order": ["a"],
+                "layers": [{"id": "a"}],
+            },
+            [],
+        )
+        self.assertEqual(m.layer_names, ["a"])
+        received = []
+        m.request_source_data("points", received.append)
+        m._handle_message(
+            m, {"type": "source_data", "source_id": "points", "data": {}}, []
+        )
+        self.assertEqual(received, [{}])
+
+    def test_map_get_source(self):
+        """Full source definitions are queried from the mirrored style."""
+        m = maplibre.Map(controls=[])
+        source = {"type": "raster", "tiles": ["https://example.com/{z}/{x}/{y}.png"]}
+        m._handle_message(m, {"type": "style_patch", "sources": {"osm": source}}, [])
+        self.assertEqual(m.get_source("osm"), source)
+        self.assertIsNone(m.get_source("missing"))
+
+
+if __name__ == "__main__":
+    unittest.main()
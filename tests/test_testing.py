@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+"""Tests for `mapwidget.testing` module."""
+
+import unittest
+
+from mapwidget import leaflet, maplibre
+from mapwidget.testing import FakeFrontend
+
+
+class TestFakeFrontend(unittest.TestCase):
+    """Tests for `mapwidget.testing` module."""
+
+    def test_records_and_acks(self):
+        """Calls are recorded and acknowledged like a displayed view does."""
+        m = maplibre.Map(controls=[], call_history=10)
+        frontend = FakeFrontend(m)
+        for i in range(100):
+            m.set_zoom(i)
+        self.assertEqual(frontend.message_count, 100)
+        self.assertEqual(len(frontend.calls), 100)
+        self.assertGreater(frontend.bytes_sent, 0)
+        self.assertEqual(len(m.calls), 10)
+
+        frontend.clear()
+        frontend.sync()
+        self.assertEqual(frontend.calls[0]["method"], "setZoom")
+        self.assertEqual(frontend.calls[0]["args"], [99])
+
+    def test_draw_and_traits(self):
+        """Draw operations reach the kernel and trait updates are counted."""
+        m = maplibre.Map(controls=[])
+        frontend = FakeFrontend(m)
+        feature = {
+            "type": "Feature",
+            "id": "a",
+            "geometry": {"type": "Point", "coordinates": [1, 2]},
+            "properties": {},
+        }
+        frontend.draw("create", [{"op": "upsert", "feature": feature}])
+        self.assertIn("a", m.draw_features)
+        frontend.draw("selection", ids=["a"])
+        self.assertEqual(m.draw_features_selected, [feature])
+        self.assertGreater(frontend.bytes_received, 0)
+
+        m.zoom = 4
+        self.assertEqual(frontend.trait_updates, 1)
+
+    def test_other_maps(self):
+        """Maps without a call log are recorded too."""
+        m = leaflet.Map()
+        frontend = FakeFrontend(m)
+        m.send({"type": "custom"})
+        self.assertEqual(frontend.messages, [({"type": "custom"}, None)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+
+"""Tests for `mapwidget.tiler` module."""
+
+import math
+import struct
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from mapwidget import maplibre
+from mapwidget.tiler import VectorTiler, _clip_ring
+
+
+def make_points(count=1000):
+    """Returns a FeatureCollection of points spread over the world."""
+    features = [
+        {
+            "type": "Feature",
+            "id": i,
+            "geometry": {
+                "type": "Point",
+                "coordinates": [-170 + (i * 37) % 340, -60 + (i * 11) % 120],
+            },
+            "properties": {"value": i, "name": f"point {i}"},
+        }
+        for i in range(count)
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, pos
+
+
+def read_message(data):
+    """Returns the (field, value) pairs of a protobuf message."""
+    fields = []
+    pos = 0
+    while pos < len(data):
+        key, pos = read_varint(data, pos)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = read_varint(data, pos)
+        elif wire_type == 1:
+            value, pos = data[pos : pos + 8], pos + 8
+        elif wire_type == 2:
+            length, pos = read_varint(data, pos)
+            value, pos = data[pos : pos + length], pos + length
+        else:
+            raise ValueError(f"Unexpected wire type {wire_type}")
+        fields.append((field, value))
+    return fields
+
+
+def read_packed(data):
+    values = []
+    pos = 0
+    while pos < len(data):
+        value, pos = read_varint(data, pos)
+        values.append(value)
+    return values
+
+
+def unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def decode_value(data):
+    ((field, value),) = read_message(data)
+    if field == 1:
+        return value.decode("utf-8")
+    elif field == 3:
+        return struct.unpack("<d", value)[0]
+    elif field == 5:
+        return value
+    elif field == 6:
+        return unzigzag(value)
+    elif field == 7:
+        return bool(value)
+    raise ValueError(f"Unexpected value field {field}")
+
+
+def decode_geometry(commands):
+    """Returns the command names and the absolute points of each command."""
+    decoded = []
+    x = y = 0
+    pos = 0
+    while pos < len(commands):
+        command, count = commands[pos] & 7, commands[pos] >> 3
+        pos += 1
+        if command == 7:
+            decoded.append(("ClosePath", count, []))
+            continue
+        points = []
+        for _ in range(count):
+            x += unzigzag(commands[pos])
+            y += unzigzag(commands[pos + 1])
+            pos += 2
+            points.append((x, y))
+        decoded.append(({1: "MoveTo", 2: "LineTo"}[command], count, points))
+    return decoded
+
+
+def decode_tile(data):
+    """Decodes an MVT tile into a dict of layers by name."""
+    layers = {}
+    for field, layer_data in read_message(data):
+        assert field == 3
+        layer = {"features": [], "keys": [], "values": []}
+        for field, value in read_message(layer_data):
+            if field == 1:
+                layer["name"] = value.decode("utf-8")
+            elif field == 2:
+                layer["features"].append(dict(read_message(value)))
+            elif field == 3:
+                layer["keys"].append(value.decode("utf-8"))
+            elif field == 4:
+                layer["values"].append(decode_value(value))
+            elif field == 5:
+                layer["extent"] = value
+            elif field == 15:
+                layer["version"] = value
+        for feature in layer["features"]:
+            tags = read_packed(feature.get(2, b""))
+            feature["properties"] = {
+                layer["keys"][k]: layer["values"][v]
+                for k, v in zip(tags[::2], tags[1::2])
+            }
+            feature["geometry"] = decode_geometry(read_packed(feature[4]))
+        layers[layer["name"]] = layer
+    return layers
+
+
+def ring_area(points):
+    return sum(
+        x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1])
+    )
+
+
+@unittest.skipIf(numpy is None, "requires numpy")
+class TestTiler(unittest.TestCase):
+    """Tests for `mapwidget.tiler` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.tiler = VectorTiler(make_points(), layer_name="points", max_zoom=10)
+
+    def test_index_matches_linear_scan(self):
+        """The per-tile index finds the same features as a full scan."""
+        for z, x, y in [(0, 0, 0), (2, 1, 1), (9, 100, 200)]:
+            indexed = set(self.tiler.features_in_tile(z, x, y).tolist())
+            n = 2**z
+            tiles = {
+                i
+                for i in range(self.tiler.count)
+                if int(self.tiler._x[i] * n) == x and int(self.tiler._y[i] * n) == y
+            }
+            self.assertTrue(tiles <= indexed)
+
+    def test_tiles_are_cached(self):
+        """Tiles are encoded once and invalidated on demand."""
+        tile = self.tiler.tile(0, 0, 0)
+        self.assertTrue(tile.startswith(b"\x1a"))
+        self.assertIs(self.tiler.tile(0, 0, 0), tile)
+        self.assertEqual(self.tiler.cache.hits, 1)
+        self.tiler.invalidate()
+        self.assertEqual(len(self.tiler.cache), 0)
+
+    def test_decoded_points(self):
+        """Point tiles hold the layer, feature IDs, tags and MoveTo commands."""
+        tiler = VectorTiler(make_points(10), layer_name="points", max_zoom=0)
+        layer = decode_tile(tiler.tile(0, 0, 0))["points"]
+        self.assertEqual((layer["version"], layer["extent"]), (2, 4096))
+        self.assertEqual(len(layer["features"]), 10)
+        for feature in layer["features"]:
+            i = feature[1]
+            self.assertEqual(feature[3], 1)
+            self.assertEqual(feature["properties"], {"value": i, "name": f"point {i}"})
+            ((command, count, (point,)),) = feature["geometry"]
+            self.assertEqual((command, count), ("MoveTo", 1))
+            lng, lat = make_points(10)["features"][i]["geometry"]["coordinates"]
+            self.assertAlmostEqual(point[0], (lng + 180) / 360 * 4096, delta=0.5)
+
+    def test_decoded_polygon(self):
+        """Polygon rings are closed, wound by role and clipped to the buffer."""
+        polygon = {
+            "type": "Feature",
+            "geometry": {
+                "type": "Polygon",
+                "coordinates": [
+                    [[-10, -10], [100, -10], [100, 80], [-10, 80], [-10, -10]],
+                    [[30, 20], [30, 40], [60, 40], [60, 20], [30, 20]],
+                ],
+            },
+            "properties": {"kind": "park", "area": 1.5, "small": False},
+        }
+        line = {
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": [[-100, 10], [100, 10]]},
+            "properties": {"kind": "road"},
+        }
+        data = {"type": "FeatureCollection", "features": [polygon, line]}
+        tiler = VectorTiler(data, layer_name="shapes", max_zoom=2)
+        layer = decode_tile(tiler.tile(2, 2, 1))["shapes"]
+        polygon, line = layer["features"]
+        self.assertEqual(
+            polygon["properties"], {"kind": "park", "area": 1.5, "small": False}
+        )
+        self.assertEqual(line["properties"], {"kind": "road"})
+        # The tags share the key 'kind'
+        self.assertEqual(layer["keys"].count("kind"), 1)
+
+        self.assertEqual(polygon[3], 3)
+        commands = [(command, count) for command, count, _ in polygon["geometry"]]
+        self.assertEqual(
+            commands,
+            [
+                ("MoveTo", 1),
+                ("LineTo", 3),
+                ("ClosePath", 1),
+                ("MoveTo", 1),
+                ("LineTo", 3),
+                ("ClosePath", 1),
+            ],
+        )
+        exterior = polygon["geometry"][0][2] + polygon["geometry"][1][2]
+        hole = polygon["geometry"][3][2] + polygon["geometry"][4][2]
+        # Exterior rings are clockwise in tile coordinates, with y down
+        self.assertGreater(ring_area(exterior), 0)
+        self.assertLess(ring_area(hole), 0)
+        # The exterior is clipped to the tile and its buffer of 64
+        self.assertEqual(
+            sorted(exterior), [(-64, -64), (-64, 4160), (4160, -64), (4160, 4160)]
+        )
+
+        self.assertEqual(line[3], 2)
+        (move, _, start), (line_to, count, end) = line["geometry"]
+        self.assertEqual((move, line_to, count), ("MoveTo", "LineTo", 1))
+        self.assertEqual((start[0][0], end[0][0]), (-64, 4160))
+        self.assertEqual(start[0][1], end[0][1])
+
+    def test_empty_tile(self):
+        """Tiles without features are empty."""
+        tiler = VectorTiler(make_points(1))
+        self.assertEqual(tiler.tile(10, 0, 0), b"")
+
+    def test_low_zoom_thinning(self):
+        """Dense points and small polygons are dropped below the max zoom."""
+        dense = VectorTiler(make_points(20000), max_zoom=10)
+        everything = dense.features_in_tile(0, 0, 0)
+        thinned = dense._thin(everything, 0)
+        self.assertLess(len(thinned), len(everything) / 4)
+        # One point per cell of 32 tile coordinates, at most 128 x 128
+        self.assertLessEqual(len(thinned), (4096 // 32) ** 2)
+        self.assertEqual(len(dense._thin(dense.features_in_tile(10, 0, 0), 10)), 0)
+        self.assertEqual(
+            len(dense._thin(everything, 10)), len(everything), "max zoom keeps all"
+        )
+
+        small = {
+            "type": "Polygon",
+            "coordinates": [[[0, 0], [0.01, 0], [0.01, 0.01], [0, 0.01], [0, 0]]],
+        }
+        tiler = VectorTiler(small, max_zoom=10)
+        self.assertEqual(tiler.tile(0, 0, 0), b"")
+        self.assertNotEqual(tiler.tile(10, 512, 511), b"")
+
+    def test_low_zoom_simplification(self):
+        """Low zoom tiles keep the vertices more important than the tolerance."""
+        ring = [
+            [10 * math.cos(i * math.pi / 500), 10 * math.sin(i * math.pi / 500)]
+            for i in range(1000)
+        ]
+        circle = {"type": "Polygon", "coordinates": [ring + ring[:1]]}
+        tiler = VectorTiler(circle, max_zoom=10)
+        self.assertLess(len(tiler.tile(0, 0, 0)), len(tiler.tile(4, 8, 7)))
+        # Ring ends are always kept
+        self.assertTrue(math.isinf(tiler._importance[0]))
+        self.assertTrue(math.isinf(tiler._importance[-1]))
+        self.assertEqual(len(tiler._importance), 1001)
+
+    def test_collapsed_exterior_ring(self):
+        """Holes are dropped with an exterior ring that has no area."""
+        polygon = {
+            "type": "Polygon",
+            "coordinates": [
+                [[0, 0], [10, 0], [20, 0], [0, 0]],
+                [[1, 1], [1, 5], [5, 5], [5, 1], [1, 1]],
+            ],
+        }
+        self.assertEqual(VectorTiler(polygon, max_zoom=0).tile(0, 0, 0), b"")
+
+    def test_clip_ring(self):
+        """Polygon rings are clipped to the tile."""
+        ring = [(-10, -10), (10, -10), (10, 10), (-10, 10)]
+        self.assertEqual(
+            sorted(_clip_ring(ring, 0, 20)), [(0, 0), (0, 10), (10, 0), (10, 10)]
+        )
+
+    def test_tile_request(self):
+        """The map answers tile requests of the frontend."""
+        m = maplibre.Map(controls=[])
+        sent = []
+        m.send = lambda content, buffers=None: sent.append((content, buffers))
+        m.add_vector_tile_source("points", make_points())
+        url = sent[-1][0]["calls"][0]["args"][1]["tiles"][0]
+        self.assertTrue(url.startswith(f"mapwidget://{m._tile_token}/points/"))
+
+        m._handle_message(
+            m,
+            {
+                "type": "tile_request",
+                "id": 7,
+                "source_id": "points",
+                "z": 0,
+                "x": 0,
+                "y": 0,
+            },
+            [],
+        )
+        # Tiles are encoded in order by one worker thread
+        m._tile_executor.submit(lambda: None).result(5)
+        content, buffers = sent[-1]
+        self.assertEqual(content, {"type": "tile_response", "id": 7})
+        self.assertGreater(len(buffers[0]), 0)
+
+        m.invalidate_tiles("points")
+        self.assertTrue(sent[-1][0]["calls"][0]["args"][1][0].endswith("?v=1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+"""Tests for `mapwidget.tileserver` module."""
+
+import struct
+import unittest
+import urllib.error
+import urllib.request
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from mapwidget import maplibre
+from mapwidget.tileserver import ArrayTiler, TileServer, encode_png
+
+
+def decode_png(data):
+    """Decodes an unfiltered RGBA PNG written by `encode_png`."""
+    width, height = struct.unpack(">II", data[16:24])
+    idat = data.index(b"IDAT")
+    length = struct.unpack(">I", data[idat - 4 : idat])[0]
+    raw = zlib.decompress(data[idat + 4 : idat + 4 + length])
+    rows = np.frombuffer(raw, dtype=np.uint8).reshape(height, width * 4 + 1)
+    return rows[:, 1:].reshape(height, width, 4)
+
+
+@unittest.skipIf(np is None, "requires numpy")
+class TestTileServer(unittest.TestCase):
+    """Tests for `mapwidget.tileserver` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        # West half 0, east half 1, over the whole world
+        self.array = np.zeros((90, 180), dtype=np.float32)
+        self.array[:, 90:] = 1
+        self.tiler = ArrayTiler(self.array, [-180, -90, 180, 90], colormap="gray")
+
+    def test_encode_png(self):
+        rgba = np.random.randint(0, 255, (16, 8, 4), dtype=np.uint8)
+        np.testing.assert_array_equal(decode_png(encode_png(rgba)), rgba)
+
+    def test_render(self):
+        rgba = decode_png(self.tiler.tile(0, 0, 0))
+        self.assertEqual(rgba.shape, (256, 256, 4))
+        self.assertEqual(rgba[128, 10].tolist(), [0, 0, 0, 255])
+        self.assertEqual(rgba[128, 250].tolist(), [255, 255, 255, 255])
+
+        # Tiles outside the bounds are transparent
+        tiler = ArrayTiler(self.array, [0, 0, 10, 10])
+        self.assertEqual(decode_png(tiler.tile(2, 0, 0))[..., 3].max(), 0)
+
+        # NaN and nodata values are transparent
+        tiler = ArrayTiler(self.array, [-180, -90, 180, 90], nodata=0)
+        rgba = decode_png(tiler.tile(0, 0, 0))
+        self.assertEqual(rgba[128, 10, 3], 0)
+        self.assertEqual(rgba[128, 250, 3], 255)
+
+    def test_cache(self):
+        self.tiler.tile(1, 0, 0)
+        self.tiler.tile(1, 0, 0)
+        self.tiler.set_params(colormap="viridis")
+        self.tiler.tile(1, 0, 0)
+        self.tiler.set_params(colormap="gray")
+        self.tiler.tile(1, 0, 0)
+        stats = self.tiler.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 2))
+        self.assertEqual(stats["rendered"], 2)
+
+        self.assertEqual(self.tiler.prerender(1), 5)
+
+    def test_auto_value_range(self):
+        auto = decode_png(self.tiler.tile(0, 0, 0))
+        self.tiler.set_params(vmax=2)
+        self.assertEqual(decode_png(self.tiler.tile(0, 0, 0))[128, 250, 0], 127)
+        # None leaves vmax unchanged, 'auto' goes back to the array range
+        self.tiler.set_params(colormap="gray")
+        self.assertEqual(self.tiler.vmax, 2)
+        self.tiler.set_params(vmax="auto")
+        self.assertIsNone(self.tiler.vmax)
+        np.testing.assert_array_equal(decode_png(self.tiler.tile(0, 0, 0)), auto)
+        with self.assertRaises(ValueError):
+            self.tiler.set_params(vmin="min")
+
+    def test_server(self):
+        server = TileServer()
+        try:
+            url = server.add_tiler("test layer", self.tiler)
+            with urllib.request.urlopen(url.format(z=0, x=0, y=0)) as response:
+                self.assertEqual(response.headers["Content-Type"], "image/png")
+                self.assertEqual(response.read(), self.tiler.tile(0, 0, 0))
+
+            def fail(z, x, y):
+                raise RuntimeError("colormap failed")
+
+            self.tiler.tile = fail
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                urllib.request.urlopen(url.format(z=1, x=0, y=0))
+            self.assertEqual(context.exception.code, 500)
+            self.assertIn("colormap failed", context.exception.reason)
+            context.exception.close()
+        finally:
+            server.stop()
+
+    def test_add_array_layer(self):
+        m = maplibre.Map()
+        m.send = lambda content, buffers=None: None
+        tiler = m.add_array_layer(
+            self.array, [-180, -90, 180, 90], source_id="array", transport="comm"
+        )
+        source = m.calls[-2]["args"][1]
+        self.assertEqual(source["type"], "raster")
+        self.assertTrue(source["tiles"][0].startswith("mapwidget://"))
+        self.assertEqual(m.calls[-1]["args"][0]["source"], "array")
+        self.assertGreater(tiler.stats()["rendered"], 0)
+
+        m.update_array_layer("array", colormap="magma")
+        self.assertEqual(m.calls[-1]["method"], "setSourceTiles")
+        m.remove_source("array")